@@ -0,0 +1,34 @@
+import datetime
+from typing import List, Literal, Optional
+from fastapi import APIRouter, HTTPException, Query, status
+from app.modelos import esquemas
+from app.servicos import servico_agregados
+
+router = APIRouter()
+
+@router.get(
+    "/agregados",
+    response_model=List[esquemas.AgregadoPeriodo],
+    summary="Retorna estatísticas pré-agregadas por hora, dia ou mês."
+)
+async def listar_agregados(
+    granularidade: Literal["hora", "dia", "mes"] = Query(default="dia", description="Tamanho do período."),
+    id_dispositivo: Optional[str] = Query(default=None, description="Filtra por um dispositivo."),
+    inicio: Optional[datetime.datetime] = Query(default=None, description="Início do intervalo (inclusivo)."),
+    fim: Optional[datetime.datetime] = Query(default=None, description="Fim do intervalo (exclusivo)."),
+    metricas: Optional[List[str]] = Query(default=None, description="Métricas desejadas (padrão: todas)."),
+):
+    """
+    Endpoint para dashboards e comparativos lerem poucas linhas agregadas
+    em vez de milhares de leituras brutas.
+
+    - **Retorna**: Contagem, média, desvio padrão, mínimo e máximo de cada métrica por período.
+    """
+    try:
+        return await servico_agregados.consultar_agregados(granularidade, id_dispositivo, inicio, fim, metricas)
+    except Exception as e:
+        print(f"Erro ao consultar agregados: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ocorreu um erro interno ao consultar os agregados."
+        )
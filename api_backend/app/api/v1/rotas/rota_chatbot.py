@@ -1,62 +1,47 @@
-import requests
 from fastapi import APIRouter, Body
-from app.servicos import servico_chatbot
-from app.nucleo.configuracoes import settings
+from fastapi.responses import JSONResponse
+from app.servicos import servico_telegram
+from app.servicos.cliente_llm import estatisticas_llm
 
 router = APIRouter()
 
-def limpar_texto_para_telegram(texto: str) -> str:
-    """
-    Remove caracteres de formatação Markdown que podem quebrar o envio.
-    """
-    # Remove asteriscos duplos e simples
-    texto_limpo = texto.replace("**", "").replace("*", "")
-    # Remove sublinhados que também podem dar erro
-    texto_limpo = texto_limpo.replace("__", "")
-    return texto_limpo
-
-def enviar_mensagem_telegram(chat_id, texto):
-    if not settings.TELEGRAM_BOT_TOKEN:
-        print("ERRO: Token do Telegram não configurado.")
-        return
-
-    # --- A MÁGICA ACONTECE AQUI ---
-    texto_seguro = limpar_texto_para_telegram(texto)
-    # ------------------------------
-
-    url = f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage"
-    
-    # Enviamos sem parse_mode, garantindo que vá como texto puro
-    payload = {
-        "chat_id": chat_id,
-        "text": texto_seguro
-    }
-    
-    try:
-        response = requests.post(url, json=payload)
-        if response.status_code != 200:
-            print(f"Erro ao enviar para Telegram: {response.text}")
-    except Exception as e:
-        print(f"Erro de conexão com Telegram: {e}")
-
 @router.post("/webhook", summary="Recebe mensagens do Telegram")
 async def webhook_telegram(update: dict = Body(...)):
+    """
+    Responde ao Telegram na hora; a mensagem é processada e respondida em
+    segundo plano pela fila do Telegram. Com a fila cheia, responde 503 para
+    o Telegram reenviar o update.
+    """
     try:
-        message = update.get("message", {})
-        texto_usuario = message.get("text", "")
-        chat_id = message.get("chat", {}).get("id")
-
-        if not texto_usuario or not chat_id:
-            return {"status": "ignorado"}
-
-        print(f"--- Telegram: Mensagem de {chat_id}: {texto_usuario}")
-
-        resposta_ia = await servico_chatbot.processar_mensagem_usuario(texto_usuario)
-        
-        enviar_mensagem_telegram(chat_id, resposta_ia)
-        
-        return {"status": "sucesso"}
+        if servico_telegram.fila_telegram is None:
+            print("Fila do Telegram não iniciada; mensagem ignorada.")
+            return {"status": "indisponivel"}
+        status = await servico_telegram.fila_telegram.receber_update(update)
+        if status == "fila_cheia":
+            # Resposta de erro: o Telegram tenta entregar o update de novo
+            return JSONResponse(status_code=503, content={"status": status})
+        return {"status": status}
 
     except Exception as e:
         print(f"Erro no webhook: {e}")
-        return {"status": "erro"}
\ No newline at end of file
+        return {"status": "erro"}
+
+@router.get("/memoria", summary="Estatísticas da memória do chatbot")
+async def estatisticas_memoria():
+    """
+    Quantas conversas e mensagens estão guardadas, quantas foram descartadas
+    e o uso do cache de respostas.
+    """
+    # Carregado sob demanda, como no processamento das mensagens
+    from app.servicos import servico_chatbot
+    return {
+        "conversas": await servico_chatbot.historico_conversas.estatisticas(),
+        "cache_respostas": await servico_chatbot.cache_respostas.estatisticas(),
+    }
+
+@router.get("/uso-llm", summary="Tokens consumidos pelo modelo")
+async def uso_llm():
+    """
+    Total de chamadas ao modelo e tokens de entrada/saída informados por ele.
+    """
+    return estatisticas_llm() or {"chamadas": 0, "tokens_entrada": 0, "tokens_saida": 0}
@@ -1,34 +1,164 @@
-from fastapi import APIRouter, status, HTTPException
+import asyncio
+import datetime
+import json
+from collections import OrderedDict
+from typing import List, Optional
+from fastapi import APIRouter, Query, Request, WebSocket, WebSocketDisconnect, status, HTTPException
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from app.modelos import esquemas
+from app.nucleo import codificacao, metricas
+from app.nucleo.configuracoes import settings
+from app.nucleo.metricas import ETAPA_INGESTAO
 # Importa o serviço que acabamos de criar
 from app.servicos import servico_banco_de_dados 
+from app.servicos.hub_telemetria import hub_telemetria
 
-# Cria o roteador (isso já existia)
+# Cria o roteador (isso já existia): rotas de ingestão, carregadas em todos os perfis
 router = APIRouter()
+# Consultas (últimas leituras, stream e histórico): só no perfil "completo"
+router_consultas = APIRouter()
+
+# --- Estado do WebSocket de ingestão (por worker) ---
+conexoes_ws = 0
+# Último 'seq' confirmado de cada dispositivo, enviado de novo quando ele reconecta
+ultimo_ack_por_dispositivo: OrderedDict[str, int] = OrderedDict()
+MAX_DISPOSITIVOS_LEMBRADOS = 10000
+
+metricas.registro.medidor_callback(
+    "horta_ws_conexoes", "Conexões abertas no WebSocket de ingestão.", lambda: conexoes_ws
+)
+
+def _corpo_documentado(esquema: dict) -> dict:
+    """
+    Documentação do corpo para o OpenAPI: o mesmo esquema em todos os
+    formatos aceitos (o corpo é lido manualmente por _ler_corpo).
+    """
+    return {"requestBody": {
+        "required": True,
+        "content": {
+            tipo: {"schema": esquema}
+            for tipo in ("application/json", "application/msgpack", "application/cbor")
+        },
+    }}
+
+async def _ler_bytes(request: Request, max_bytes: int) -> bytes:
+    """
+    Lê o corpo como chega na rede (ainda comprimido), recusando-o pelo
+    Content-Length ou assim que passar de 'max_bytes', sem guardá-lo inteiro.
+    """
+    tamanho = request.headers.get("content-length", "")
+    if tamanho.isdigit() and int(tamanho) > max_bytes:
+        raise codificacao.CorpoMuitoGrandeError(f"Corpo maior que o limite de {max_bytes} bytes.")
+    partes, total = [], 0
+    async for parte in request.stream():
+        total += len(parte)
+        if total > max_bytes:
+            raise codificacao.CorpoMuitoGrandeError(f"Corpo maior que o limite de {max_bytes} bytes.")
+        partes.append(parte)
+    return b"".join(partes)
+
+async def _ler_corpo(request: Request):
+    """
+    Lê o corpo em JSON, MessagePack ou CBOR (opcionalmente com gzip),
+    conforme Content-Type e Content-Encoding. INGESTAO_MAX_BYTES vale para
+    os bytes recebidos e para o corpo descomprimido.
+    """
+    try:
+        corpo = await _ler_bytes(request, settings.INGESTAO_MAX_BYTES)
+        with ETAPA_INGESTAO.cronometrar(etapa="decodificacao"):
+            return codificacao.decodificar_corpo(
+                corpo,
+                request.headers.get("content-type"),
+                request.headers.get("content-encoding"),
+                settings.INGESTAO_MAX_BYTES,
+            )
+    except codificacao.FormatoNaoSuportadoError as e:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=str(e))
+    except codificacao.CorpoMuitoGrandeError as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    except codificacao.CorpoInvalidoError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+async def _processar_lote(itens: list) -> tuple[list[esquemas.ResultadoItemLote], int]:
+    """
+    Valida cada item (esquema DadosSensorLoteItem) e grava os válidos em
+    uma única escrita. Retorna o resultado de cada item, na ordem recebida,
+    e quantos itens passaram na validação.
+    """
+    resultados: list[esquemas.ResultadoItemLote | None] = [None] * len(itens)
+    validos: list[tuple[int, esquemas.DadosSensorLoteItem]] = []
+
+    # 1. Validação de todos os itens em uma passada
+    with ETAPA_INGESTAO.cronometrar(etapa="validacao"):
+        for indice, item in enumerate(itens):
+            try:
+                validos.append((indice, esquemas.DadosSensorLoteItem.model_validate(item)))
+            except ValidationError as e:
+                resultados[indice] = esquemas.ResultadoItemLote(
+                    indice=indice, status="erro",
+                    erro="; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+                )
+
+    print(f"Lote recebido: {len(itens)} itens ({len(validos)} válidos)")
+
+    # 2. Persistência dos válidos em uma única escrita
+    gravados = await servico_banco_de_dados.salvar_lote_dados_sensor([dados for _, dados in validos])
+    for (indice, _), (id_inserido, erro) in zip(validos, gravados):
+        if id_inserido is None:
+            resultados[indice] = esquemas.ResultadoItemLote(indice=indice, status="erro", erro=erro)
+        else:
+            resultados[indice] = esquemas.ResultadoItemLote(
+                indice=indice, status="sucesso", id_inserido=str(id_inserido)
+            )
+    return resultados, len(validos)
 
 @router.post(
     "/dados-sensores", 
     # Atualizamos o response_model para refletir o que realmente retornamos
     response_model=esquemas.CreateResponse, 
     status_code=status.HTTP_201_CREATED,
-    summary="Recebe e salva dados de um sensor."
+    summary="Recebe e salva dados de um sensor.",
+    # O corpo é lido e validado dentro da função (para aceitar outros formatos
+    # e medir cada etapa), mas a documentação continua mostrando o esquema
+    openapi_extra=_corpo_documentado(esquemas.DadosSensorCreate.model_json_schema()),
 )
-async def criar_dados_sensor(dados: esquemas.DadosSensorCreate):
+async def criar_dados_sensor(request: Request):
     """
     Endpoint para receber e salvar dados de sensores.
 
-    - **Recebe**: JSON com dados do sensor (esquema DadosSensorCreate).
-    - **Valida**: Automaticamente pelo Pydantic (como antes).
+    - **Recebe**: Dados do sensor (esquema DadosSensorCreate) em JSON, MessagePack
+      ou CBOR, opcionalmente com Content-Encoding: gzip.
+    - **Valida**: Pelo Pydantic, com o tempo da validação medido em /metrics.
     - **Salva**: Chama o serviço para salvar no banco de dados (novo).
     - **Retorna**: O ID do novo registro (novo).
     """
     
+    corpo = await _ler_corpo(request)
+    try:
+        with ETAPA_INGESTAO.cronometrar(etapa="validacao"):
+            dados = esquemas.DadosSensorCreate.model_validate(corpo)
+    except ValidationError as e:
+        # Mesmo formato de erro 422 da validação automática do FastAPI
+        raise RequestValidationError(
+            [{**erro, "loc": ("body", *erro["loc"])} for erro in e.errors(include_url=False)]
+        )
+
     # Esta linha ainda é útil para vermos a atividade no log
     print(f"Dados recebidos do dispositivo: {dados.id_dispositivo}")
     
     # --- A GRANDE MUDANÇA ESTÁ AQUI ---
     # Em vez de só printar, chamamos a função do serviço
-    inserted_id = servico_banco_de_dados.salvar_dados_sensor(dados)
+    try:
+        inserted_id = await servico_banco_de_dados.salvar_dados_sensor(dados)
+    except (servico_banco_de_dados.BufferCheioError, servico_banco_de_dados.IngestaoPausadaError) as e:
+        # Buffer de escrita lotado ou manutenção do banco: o dispositivo deve tentar de novo em instantes
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "1"}
+        )
     
     # Se o serviço retornar None, algo deu errado (ex: banco offline)
     if inserted_id is None:
@@ -39,4 +169,302 @@ async def criar_dados_sensor(dados: esquemas.DadosSensorCreate):
         )
     
     # Se tudo deu certo, retorna uma resposta de sucesso
-    return {"status": "sucesso", "id_inserido": str(inserted_id)}
\ No newline at end of file
+    return {"status": "sucesso", "id_inserido": str(inserted_id)}
+
+
+@router.post(
+    "/dados-sensores/lote",
+    response_model=esquemas.LoteResponse,
+    summary="Recebe e salva um lote de leituras de sensores.",
+    openapi_extra=_corpo_documentado({
+        "type": "array", "items": esquemas.DadosSensorLoteItem.model_json_schema()
+    }),
+)
+async def criar_lote_dados_sensor(request: Request):
+    """
+    Endpoint para o dispositivo reenviar de uma vez as leituras acumuladas offline.
+
+    - **Recebe**: Lista de leituras (esquema DadosSensorLoteItem), com 'timestamp' opcional,
+      em JSON, MessagePack ou CBOR (opcionalmente com gzip); ou o formato compacto
+      'application/vnd.horta.compacto+json|msgpack|cbor' (ver app/nucleo/codificacao.py).
+    - **Valida**: Cada item individualmente; itens inválidos não derrubam o lote.
+    - **Salva**: Todos os itens válidos em uma única escrita em lote.
+    - **Retorna**: O resultado de cada item na posição em que foi enviado.
+    """
+    itens = await _ler_corpo(request)
+    if not isinstance(itens, list):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="O corpo do lote deve ser uma lista de leituras."
+        )
+    if len(itens) > settings.LOTE_MAX_ITENS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"O lote excede o limite de {settings.LOTE_MAX_ITENS} itens."
+        )
+
+    try:
+        resultados, _ = await _processar_lote(itens)
+    except servico_banco_de_dados.IngestaoPausadaError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "5"}
+        )
+
+    sucesso = sum(1 for r in resultados if r.status == "sucesso")
+    return {
+        "total": len(itens),
+        "sucesso": sucesso,
+        "falhas": len(itens) - sucesso,
+        "resultados": resultados,
+    }
+
+
+@router.websocket("/dados-sensores/ws")
+async def canal_dados_sensores(
+    websocket: WebSocket,
+    formato: str = "json",
+    compacto: bool = False,
+    id_dispositivo: Optional[str] = None,
+):
+    """
+    Canal persistente de ingestão: o dispositivo mantém uma conexão aberta e
+    envia as leituras sem pagar um handshake TCP/TLS e um POST a cada envio.
+
+    Conexão: /api/v1/dados-sensores/ws?formato=json|msgpack|cbor&compacto=false&id_dispositivo=ESP32_01
+    - Mensagens de texto são JSON; as binárias usam 'formato'.
+    - Cada mensagem é {"seq": n, "leituras": [...]}, com os itens do POST
+      /dados-sensores/lote; com compacto=true, "leituras" segue o formato
+      compacto (ver app/nucleo/codificacao.py).
+
+    Respostas do servidor (no mesmo formato):
+    - {"tipo": "pronto", "ultimo_ack": n | null}: ao conectar. Com 'id_dispositivo',
+      traz o último seq confirmado nesse worker, para o dispositivo descartar o
+      que já foi gravado caso a confirmação tenha se perdido. Um dispositivo que
+      reinicia deve continuar a numeração a partir dele (ou conectar sem
+      'id_dispositivo', o que desliga essa memória).
+    - {"tipo": "ack", "ack": n, "sucesso": k, "falhas": [{"indice", "erro"}]}:
+      confirmação cumulativa; tudo até 'n' foi processado e pode sair do buffer
+      do dispositivo. Itens inválidos vêm em 'falhas' e não devem ser reenviados.
+      Um seq já confirmado recebe o mesmo ack sem gravar de novo.
+    - {"tipo": "erro", "seq": n | null, "erro": "..."}: a mensagem não foi
+      gravada (ex.: banco fora); o ack não avança e o dispositivo deve reenviar.
+
+    Cada conexão ociosa custa só esta corrotina esperando a próxima mensagem.
+    Para milhares por worker, ajuste no uvicorn --ws-max-size (próximo de
+    INGESTAO_MAX_BYTES) e --ws-ping-interval, e o limite de arquivos abertos.
+    """
+    global conexoes_ws
+    if not codificacao.serializacao_disponivel(formato):
+        await websocket.close(code=1008, reason=f"Formato indisponível: {formato}")
+        return
+    if conexoes_ws >= settings.WS_MAX_CONEXOES:
+        # 1013: tente de novo mais tarde
+        await websocket.close(code=1013, reason="Limite de conexões atingido.")
+        return
+
+    await websocket.accept()
+    conexoes_ws += 1
+    ultimo_ack = ultimo_ack_por_dispositivo.get(id_dispositivo) if id_dispositivo else None
+
+    async def responder(mensagem: dict):
+        conteudo = codificacao.codificar(mensagem, formato)
+        if formato == "json":
+            await websocket.send_text(conteudo.decode())
+        else:
+            await websocket.send_bytes(conteudo)
+
+    try:
+        await responder({"tipo": "pronto", "ultimo_ack": ultimo_ack})
+        while True:
+            recebimento = websocket.receive()
+            if settings.WS_TEMPO_OCIOSO_S > 0:
+                recebimento = asyncio.wait_for(recebimento, settings.WS_TEMPO_OCIOSO_S)
+            try:
+                quadro = await recebimento
+            except asyncio.TimeoutError:
+                await websocket.close(code=1000, reason="Conexão ociosa.")
+                break
+            if quadro["type"] == "websocket.disconnect":
+                break
+            mensagem = quadro.get("bytes") if quadro.get("bytes") is not None else quadro.get("text")
+
+            seq = None
+            try:
+                with ETAPA_INGESTAO.cronometrar(etapa="decodificacao"):
+                    envelope = codificacao.decodificar_mensagem(mensagem, formato, settings.INGESTAO_MAX_BYTES)
+                    if not isinstance(envelope, dict) or not isinstance(envelope.get("seq"), int):
+                        raise codificacao.CorpoInvalidoError('A mensagem deve ser {"seq": n, "leituras": [...]}.')
+                    seq = envelope["seq"]
+                    itens = envelope.get("leituras")
+                    if compacto:
+                        itens = codificacao.expandir_compacto(itens)
+                if not isinstance(itens, list):
+                    raise codificacao.CorpoInvalidoError("'leituras' deve ser uma lista de leituras.")
+                if len(itens) > settings.LOTE_MAX_ITENS:
+                    raise codificacao.CorpoInvalidoError(f"A mensagem excede o limite de {settings.LOTE_MAX_ITENS} leituras.")
+            except (codificacao.CorpoInvalidoError, codificacao.FormatoNaoSuportadoError) as e:
+                await responder({"tipo": "erro", "seq": seq, "erro": str(e)})
+                continue
+
+            if ultimo_ack is not None and seq <= ultimo_ack:
+                # Reenvio de algo já gravado: só confirma de novo
+                await responder({"tipo": "ack", "ack": ultimo_ack, "sucesso": 0, "falhas": []})
+                continue
+
+            try:
+                resultados, validos = await _processar_lote(itens)
+            except servico_banco_de_dados.IngestaoPausadaError as e:
+                # Sem ack: o dispositivo reenvia depois
+                await responder({"tipo": "erro", "seq": seq, "erro": str(e)})
+                continue
+            sucesso = sum(1 for r in resultados if r.status == "sucesso")
+            if validos and not sucesso:
+                # Nada gravado (ex.: banco fora): sem ack, o dispositivo reenvia depois
+                await responder({"tipo": "erro", "seq": seq, "erro": "Erro ao gravar as leituras no banco de dados."})
+                continue
+
+            ultimo_ack = seq
+            if id_dispositivo:
+                ultimo_ack_por_dispositivo[id_dispositivo] = seq
+                ultimo_ack_por_dispositivo.move_to_end(id_dispositivo)
+                if len(ultimo_ack_por_dispositivo) > MAX_DISPOSITIVOS_LEMBRADOS:
+                    ultimo_ack_por_dispositivo.popitem(last=False)
+            falhas = [{"indice": r.indice, "erro": r.erro} for r in resultados if r.status != "sucesso"]
+            await responder({"tipo": "ack", "ack": seq, "sucesso": sucesso, "falhas": falhas})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        conexoes_ws -= 1
+
+
+@router_consultas.get(
+    "/dados-sensores/ultimos",
+    response_model=List[esquemas.UltimaLeitura],
+    summary="Retorna a última leitura de cada dispositivo."
+)
+async def listar_ultimas_leituras(
+    id_dispositivo: Optional[str] = Query(default=None, description="Filtra por um dispositivo.")
+):
+    """
+    Endpoint leve para dashboards e bots lerem os valores atuais sem consultar o MongoDB
+    (com vários workers, ESTADO_BACKEND diferente de "memoria", a consulta vai ao banco).
+
+    - **Retorna**: A última leitura de cada dispositivo, com a idade e se está desatualizada.
+    """
+    try:
+        ultimas = await servico_banco_de_dados.estado_ultimas_leituras(id_dispositivo)
+    except Exception as e:
+        print(f"Erro ao buscar as últimas leituras: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ocorreu um erro interno ao buscar as últimas leituras."
+        )
+    if id_dispositivo is not None and not ultimas:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Nenhuma leitura conhecida para o dispositivo '{id_dispositivo}'."
+        )
+    return ultimas
+
+
+@router_consultas.get(
+    "/dados-sensores/stream",
+    response_class=StreamingResponse,
+    summary="Envia as leituras em tempo real (Server-Sent Events)."
+)
+async def stream_dados_sensores(
+    id_dispositivo: List[str] = Query(default=[], description="Dispositivos desejados (vazio = todos)."),
+    # Parâmetro 'metricas' na URL; 'campos' aqui para não esconder o módulo app.nucleo.metricas
+    campos: List[str] = Query(default=[], alias="metricas", description="Métricas desejadas (vazio = todas)."),
+):
+    """
+    Stream para dashboards: cada leitura aceita pela API é enviada como um
+    evento 'data: {"id_dispositivo", "timestamp" (UTC), <métricas>}'.
+
+    - **Sem leituras**: um comentário ': ping' a cada STREAM_INTERVALO_PING_S.
+    - **Cliente lento**: se não acompanhar, recebe 'event: desligado' e a conexão
+      é encerrada; ao reconectar, busque no banco o que ficou para trás.
+    - **Vários workers**: cada conexão vê só as leituras do worker que a atende.
+    """
+    invalidas = [m for m in campos if m not in esquemas.METRICAS]
+    if invalidas:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Métricas desconhecidas: {', '.join(invalidas)}."
+        )
+    assinatura = hub_telemetria.assinar(id_dispositivo, campos)
+    if assinatura is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Limite de assinantes do stream atingido.",
+            headers={"Retry-After": "5"}
+        )
+
+    async def eventos():
+        try:
+            yield ": conectado\n\n"
+            while True:
+                leitura = await assinatura.proxima(settings.STREAM_INTERVALO_PING_S)
+                if leitura is None:
+                    if assinatura.desligada:
+                        yield "event: desligado\ndata: {}\n\n"
+                        return
+                    yield ": ping\n\n"
+                    continue
+                # Junta no mesmo envio o que já estiver na fila
+                leituras = [leitura]
+                while not assinatura.fila.empty():
+                    leituras.append(assinatura.fila.get_nowait())
+                yield "".join(f"data: {json.dumps(l, separators=(',', ':'))}\n\n" for l in leituras)
+        finally:
+            hub_telemetria.cancelar(assinatura)
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router_consultas.get(
+    "/dados-sensores/historico",
+    response_model=esquemas.HistoricoResponse,
+    summary="Retorna o histórico das métricas, reduzido para gráficos."
+)
+async def buscar_historico(
+    # Parâmetro 'metricas' na URL; 'campos' aqui para não esconder o módulo app.nucleo.metricas
+    campos: List[str] = Query(default=["temperatura", "umidade"], alias="metricas", description="Métricas desejadas."),
+    id_dispositivo: Optional[str] = Query(default=None, description="Filtra por um dispositivo."),
+    inicio: Optional[datetime.datetime] = Query(default=None, description="Início do intervalo (inclusivo)."),
+    fim: Optional[datetime.datetime] = Query(default=None, description="Fim do intervalo (exclusivo)."),
+    max_pontos: Optional[int] = Query(
+        default=None, ge=0,
+        description="Máximo de pontos por série (LTTB). Padrão: HISTORICO_MAX_PONTOS_PADRAO; 0 desliga a redução."
+    ),
+):
+    """
+    Endpoint de histórico para gráficos.
+
+    - **Reduz**: Cada série é limitada a 'max_pontos' com o algoritmo LTTB, que preserva picos e vales.
+    - **Retorna**: Uma lista de pontos (timestamp, valor) por métrica.
+    """
+    invalidas = [m for m in campos if m not in esquemas.METRICAS]
+    if invalidas:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Métricas desconhecidas: {', '.join(invalidas)}."
+        )
+
+    if max_pontos is None:
+        max_pontos = settings.HISTORICO_MAX_PONTOS_PADRAO
+
+    try:
+        return await servico_banco_de_dados.buscar_historico(campos, id_dispositivo, inicio, fim, max_pontos or None)
+    except Exception as e:
+        print(f"Erro ao buscar histórico: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ocorreu um erro interno ao buscar o histórico."
+        )
@@ -0,0 +1,50 @@
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query, status
+from app.modelos import esquemas
+from app.nucleo import culturas
+from app.servicos.motor_regras import motor_regras
+
+router = APIRouter()
+
+@router.get(
+    "/regras/culturas",
+    response_model=List[esquemas.Cultura],
+    summary="Lista as culturas e as faixas de referência de cada métrica."
+)
+async def listar_culturas():
+    return [{"nome": nome, **cultura} for nome, cultura in culturas.CULTURAS.items()]
+
+@router.get(
+    "/regras/diagnostico",
+    response_model=List[esquemas.Diagnostico],
+    summary="Retorna o diagnóstico pré-calculado dos dispositivos."
+)
+async def obter_diagnostico(
+    id_dispositivo: Optional[str] = Query(default=None, description="Filtra por um dispositivo."),
+    cultura: Optional[str] = Query(default=None, description="Avalia com outra cultura (padrão: a do dispositivo)."),
+):
+    """
+    Lido do motor de regras, que acompanha as leituras à medida que chegam:
+    não consulta o banco.
+
+    - **Retorna**: Status geral e, por métrica, estado, dica e estatísticas das janelas.
+    """
+    if cultura is not None and cultura not in culturas.CULTURAS:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Cultura '{cultura}' não cadastrada.")
+    if id_dispositivo is not None:
+        diagnostico = motor_regras.diagnostico(id_dispositivo, cultura)
+        if diagnostico is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dispositivo sem leituras recentes.")
+        return [diagnostico]
+    return [motor_regras.diagnostico(dispositivo, cultura) for dispositivo in motor_regras.dispositivos()]
+
+@router.get(
+    "/regras/alertas",
+    response_model=List[esquemas.Alerta],
+    summary="Retorna os alertas mais recentes do motor de regras."
+)
+async def listar_alertas(
+    id_dispositivo: Optional[str] = Query(default=None, description="Filtra por um dispositivo."),
+    limite: int = Query(default=50, ge=1, le=500, description="Quantidade máxima de alertas."),
+):
+    return motor_regras.alertas_recentes(id_dispositivo, limite)
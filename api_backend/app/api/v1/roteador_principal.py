@@ -1,13 +1,28 @@
 from fastapi import APIRouter
+from app.nucleo.configuracoes import settings
 
 # Importa as rotas
 from app.api.v1.rotas import rota_dados_sensores
-from app.api.v1.rotas import rota_chatbot  # <--- CERTIFIQUE-SE DE QUE ESTA LINHA EXISTE
 
 api_router_v1 = APIRouter()
 
-# Inclui a rota de Sensores
+# Inclui as rotas de ingestão dos Sensores
 api_router_v1.include_router(rota_dados_sensores.router, tags=["Dados dos Sensores"])
 
-# Inclui a rota do Chatbot (ADICIONE ESTA LINHA)
-api_router_v1.include_router(rota_chatbot.router, prefix="/chatbot", tags=["Chatbot"])
\ No newline at end of file
+# No perfil "ingestao" só as rotas de ingestão são carregadas
+if settings.PERFIL_API == "completo":
+    # Consultas às leituras (últimas, stream e histórico)
+    api_router_v1.include_router(rota_dados_sensores.router_consultas, tags=["Dados dos Sensores"])
+
+    from app.api.v1.rotas import rota_agregados
+    from app.api.v1.rotas import rota_regras
+    from app.api.v1.rotas import rota_chatbot
+
+    # Inclui a rota de Agregados (hora/dia/mês)
+    api_router_v1.include_router(rota_agregados.router, tags=["Agregados"])
+
+    # Inclui a rota do Motor de Regras (diagnóstico e alertas)
+    api_router_v1.include_router(rota_regras.router, tags=["Regras e Alertas"])
+
+    # Inclui a rota do Chatbot
+    api_router_v1.include_router(rota_chatbot.router, prefix="/chatbot", tags=["Chatbot"])
@@ -0,0 +1,36 @@
+"""
+Arquiva em Parquet as leituras mais antigas que a janela quente e as apaga do MongoDB.
+
+Uso (dentro de api_backend/):
+    python -m app.comandos.arquivar_leituras [--dias-quentes 90] [--diretorio arquivo_frio]
+                                             [--colecao dados_reais ...] [--lote 5000] [--sem-apagar]
+
+É a mesma rodada que a API executa periodicamente com RETENCAO_ATIVA=true
+(ver app/servicos/servico_retencao.py). Pode ser interrompido e rodado de novo:
+um dia arquivado outra vez substitui o próprio arquivo.
+"""
+import argparse
+from pymongo import MongoClient
+from app.db.conexao_mongodb import NOME_BANCO
+from app.nucleo.configuracoes import settings
+from app.servicos import servico_retencao
+
+def arquivar(dias_quentes: int, diretorio: str, colecoes: list[str] | None, tamanho_lote: int, apagar: bool = True):
+    print("--- ARQUIVAMENTO DAS LEITURAS ---")
+    client = MongoClient(settings.MONGODB_URI)
+    resumo = servico_retencao.executar_retencao(
+        client[NOME_BANCO], colecoes, dias_quentes, diretorio, tamanho_lote, apagar
+    )
+    for nome, quantidade in resumo.items():
+        print(f"✅ {nome}: {quantidade} leituras arquivadas.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Arquiva em Parquet as leituras fora da janela quente.")
+    parser.add_argument("--dias-quentes", type=int, default=settings.RETENCAO_DIAS_QUENTES,
+                        help="Dias mantidos no MongoDB.")
+    parser.add_argument("--diretorio", default=settings.RETENCAO_DIRETORIO, help="Pasta do arquivo frio.")
+    parser.add_argument("--colecao", action="append", help="Coleção a arquivar (repita para várias).")
+    parser.add_argument("--lote", type=int, default=settings.RETENCAO_LOTE, help="Leituras buscadas por vez.")
+    parser.add_argument("--sem-apagar", action="store_true", help="Só grava os arquivos, sem apagar do banco.")
+    args = parser.parse_args()
+    arquivar(args.dias_quentes, args.diretorio, args.colecao, args.lote, apagar=not args.sem_apagar)
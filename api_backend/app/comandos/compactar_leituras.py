@@ -0,0 +1,231 @@
+"""
+Remove das leituras já gravadas os campos de calendário derivados de
+'timestamp' (data, hora, dia, mes, ano, hora_simples) e mostra o espaço economizado.
+
+Uso (dentro de api_backend/):
+    python -m app.comandos.compactar_leituras [--lote 1000] [--apagar-legado]
+
+Ligue ARMAZENAMENTO_COMPACTO=true na API antes, para que as leituras novas
+já cheguem sem esses campos. Ferramentas de BI podem ler a visão
+'dados_reais_bi', que calcula os campos na consulta.
+
+- Coleção comum: os campos são removidos com $unset, em lotes ordenados por _id.
+- Série temporal: o MongoDB não permite renomear nem (antes da 8.0) alterar
+  campos de medição de uma série temporal. As leituras são copiadas, já sem os
+  campos, para a coleção comum 'dados_reais_legado'; com a ingestão da API
+  pausada (app/db/pausa_ingestao.py), a última cópia é feita, a série temporal
+  é recriada, e ela recebe os dados de volta pela cópia de 'migrar_serie_temporal'.
+  Se a coleção continuar recebendo leituras durante a pausa, o comando desiste.
+
+O progresso é salvo na coleção 'migracoes': se o comando for interrompido,
+basta rodá-lo de novo para continuar de onde parou.
+"""
+import argparse
+import datetime
+from pymongo import ASCENDING, MongoClient
+from pymongo.errors import BulkWriteError
+from app.comandos import migrar_serie_temporal
+from app.comandos.migrar_serie_temporal import COLECAO_LEGADO, COLECAO_MIGRACOES
+from app.db import pausa_ingestao
+from app.db.conexao_mongodb import NOME_BANCO
+from app.db.provisionamento import CAMPOS_CALENDARIO, COLECAO_LEITURAS
+from app.nucleo.configuracoes import settings
+
+ID_MIGRACAO = "armazenamento_compacto"
+# Qualquer documento que ainda tenha algum campo de calendário
+FILTRO_COM_CALENDARIO = {"$or": [{campo: {"$exists": True}} for campo in CAMPOS_CALENDARIO]}
+PROJECAO_SEM_CALENDARIO = {campo: 0 for campo in CAMPOS_CALENDARIO}
+
+def estatisticas(db, nome_colecao: str) -> dict:
+    """Documentos e tamanhos (bytes) da coleção, segundo o $collStats."""
+    try:
+        stats = next(db[nome_colecao].aggregate([{"$collStats": {"storageStats": {}}}]))["storageStats"]
+    except Exception as e:
+        print(f"⚠️ Não foi possível ler o tamanho de '{nome_colecao}': {e}")
+        return {}
+    return {
+        "documentos": stats.get("count", 0),
+        "tamanho_dados": stats.get("size", 0),
+        "tamanho_disco": stats.get("storageSize", 0),
+        "tamanho_indices": stats.get("totalIndexSize", 0),
+    }
+
+def _mb(valor: int) -> str:
+    return f"{valor / 1024 ** 2:.1f} MB"
+
+def relatar_economia(antes: dict, depois: dict):
+    if not antes or not depois:
+        return
+    print("📊 Espaço (antes -> depois):")
+    for chave in ("tamanho_dados", "tamanho_disco", "tamanho_indices"):
+        a, d = antes.get(chave, 0), depois.get(chave, 0)
+        economia = f" ({1 - d / a:.0%} menor)" if a else ""
+        print(f"   {chave}: {_mb(a)} -> {_mb(d)}{economia}")
+
+def _salvar_progresso(db, **campos):
+    db[COLECAO_MIGRACOES].update_one(
+        {"_id": ID_MIGRACAO},
+        {"$set": {**campos, "atualizado_em": datetime.datetime.now(datetime.timezone.utc)}},
+        upsert=True
+    )
+
+def compactar_colecao_comum(db, tamanho_lote: int, progresso: dict):
+    """Remove os campos de calendário com $unset, em lotes de _id."""
+    total = db[COLECAO_LEITURAS].count_documents(FILTRO_COM_CALENDARIO)
+    atualizados = progresso.get("atualizados", 0)
+    ultimo_id = progresso.get("ultimo_id")
+    print(f"🔧 {total} documentos com campos de calendário em '{COLECAO_LEITURAS}'.")
+
+    while True:
+        filtro = dict(FILTRO_COM_CALENDARIO)
+        if ultimo_id is not None:
+            filtro["_id"] = {"$gt": ultimo_id}
+        ids = [d["_id"] for d in db[COLECAO_LEITURAS].find(filtro, {"_id": 1}).sort("_id", ASCENDING).limit(tamanho_lote)]
+        if not ids:
+            break
+        resultado = db[COLECAO_LEITURAS].update_many(
+            {"_id": {"$in": ids}}, {"$unset": {campo: "" for campo in CAMPOS_CALENDARIO}}
+        )
+        atualizados += resultado.modified_count
+        ultimo_id = ids[-1]
+        _salvar_progresso(db, ultimo_id=ultimo_id, atualizados=atualizados)
+        print(f"   {atualizados}/{total} documentos compactados...")
+
+    print(f"✅ {atualizados} documentos compactados.")
+    print("ℹ️ O WiredTiger só devolve o espaço em disco após o comando 'compact' na coleção.")
+
+def _copiar_para_legado(db, tamanho_lote: int, progresso: dict):
+    """
+    Copia a série temporal para a coleção comum COLECAO_LEGADO, sem os
+    campos de calendário, em ordem de timestamp. Reinserções do mesmo _id
+    (após uma interrupção) são ignoradas.
+    """
+    filtro = {}
+    if progresso.get("ultimo_timestamp") is not None:
+        # $gte: documentos com o mesmo timestamp do último lote podem ter ficado de fora
+        filtro["timestamp"] = {"$gte": progresso["ultimo_timestamp"]}
+        print(f"↪️ Retomando a partir de {progresso['ultimo_timestamp']}.")
+
+    cursor = (
+        db[COLECAO_LEITURAS].find(filtro, PROJECAO_SEM_CALENDARIO)
+        .sort("timestamp", ASCENDING).batch_size(tamanho_lote)
+    )
+    copiados = progresso.get("copiados", 0)
+    lote = []
+    for documento in cursor:
+        lote.append(documento)
+        if len(lote) >= tamanho_lote:
+            copiados += _inserir_ignorando_duplicados(db[COLECAO_LEGADO], lote)
+            _salvar_progresso(db, ultimo_timestamp=lote[-1]["timestamp"], copiados=copiados)
+            print(f"   {copiados} documentos copiados para '{COLECAO_LEGADO}'...")
+            lote = []
+    if lote:
+        copiados += _inserir_ignorando_duplicados(db[COLECAO_LEGADO], lote)
+        _salvar_progresso(db, ultimo_timestamp=lote[-1]["timestamp"], copiados=copiados)
+    return copiados
+
+def _inserir_ignorando_duplicados(collection, lote: list[dict]) -> int:
+    try:
+        return len(collection.insert_many(lote, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        erros = e.details.get("writeErrors", [])
+        outros = [erro for erro in erros if erro.get("code") != 11000]
+        if outros:
+            print(f"⚠️ {len(outros)} documentos rejeitados neste lote: {outros[0].get('errmsg')}")
+        return e.details.get("nInserted", 0)
+
+def _trocar_colecao(db, tamanho_lote: int, pausa_max_s: float) -> bool:
+    """
+    Com a ingestão pausada: copia o que faltar para o legado, apaga a série
+    temporal e a recria vazia. A fase 'trocando' é salva antes de apagar, então
+    uma interrupção em qualquer ponto é retomada por aqui (a cópia de volta
+    não começa antes de tudo estar no legado).
+    """
+    with pausa_ingestao.pausar_ingestao(db, "compactar_leituras", pausa_max_s):
+        if COLECAO_LEITURAS in db.list_collection_names():
+            # Última passada, sem ninguém gravando
+            progresso = db[COLECAO_MIGRACOES].find_one({"_id": ID_MIGRACAO}) or {}
+            _copiar_para_legado(db, tamanho_lote, progresso)
+            esperado = db[COLECAO_LEITURAS].count_documents({})
+            if db[COLECAO_LEGADO].count_documents({}) < esperado:
+                # Leituras com timestamp anterior ao ponto de parada: cópia completa
+                # (os _id já copiados são ignorados)
+                print("↪️ Faltam leituras no legado; copiando a coleção inteira de novo.")
+                _copiar_para_legado(db, tamanho_lote, {})
+            no_legado = db[COLECAO_LEGADO].count_documents({})
+            if no_legado < esperado:
+                print(f"❌ Cópia incompleta ({no_legado}/{esperado}). Nada foi apagado; rode o comando de novo.")
+                return False
+
+            _salvar_progresso(db, fase="trocando")
+            db[COLECAO_LEITURAS].drop()
+
+        if not migrar_serie_temporal.criar_serie_temporal(db):
+            return False
+        # A cópia de volta começa do zero: descarta o progresso de migrações antigas
+        db[COLECAO_MIGRACOES].delete_one({"_id": migrar_serie_temporal.ID_MIGRACAO})
+        _salvar_progresso(db, fase="devolvendo")
+    return True
+
+def compactar_serie_temporal(db, tamanho_lote: int, progresso: dict, apagar_legado: bool, pausa_max_s: float):
+    """Copia para uma coleção comum, recria a série temporal e copia de volta."""
+    fase = progresso.get("fase", "copiando")
+
+    if fase == "copiando":
+        if COLECAO_LEGADO in db.list_collection_names() and not progresso.get("copiados"):
+            print(f"❌ '{COLECAO_LEGADO}' já existe. Termine ou desfaça a migração anterior antes.")
+            return False
+        # Cópia com a API gravando normalmente; só a troca é feita com a ingestão pausada
+        _copiar_para_legado(db, tamanho_lote, progresso)
+        fase = "trocando"
+
+    if fase == "trocando":
+        try:
+            if not _trocar_colecao(db, tamanho_lote, pausa_max_s):
+                return False
+        except pausa_ingestao.IngestaoAtivaError as e:
+            print(f"❌ {e}")
+            return False
+
+    return migrar_serie_temporal.migrar(tamanho_lote, apagar_legado, pausa_max_s)
+
+def compactar(tamanho_lote: int = 1000, apagar_legado: bool = False, pausa_max_s: float = 900.0):
+    print("--- COMPACTAÇÃO DAS LEITURAS ---")
+    if not settings.ARMAZENAMENTO_COMPACTO:
+        print("⚠️ ARMAZENAMENTO_COMPACTO está desligado: a API continuará gravando os campos de calendário.")
+
+    client = MongoClient(settings.MONGODB_URI)
+    db = client[NOME_BANCO]
+    progresso = db[COLECAO_MIGRACOES].find_one({"_id": ID_MIGRACAO}) or {}
+    # Uma compactação interrompida continua pela fase salva, mesmo sem 'dados_reais'
+    em_troca = progresso.get("fase") in ("trocando", "devolvendo")
+    if COLECAO_LEITURAS not in db.list_collection_names() and not em_troca:
+        print(f"✅ Nada a compactar: '{COLECAO_LEITURAS}' não existe.")
+        return True
+
+    antes = progresso.get("estatisticas_antes")
+    if antes is None:
+        antes = estatisticas(db, COLECAO_LEITURAS)
+        _salvar_progresso(db, estatisticas_antes=antes)
+
+    if em_troca or "timeseries" in db[COLECAO_LEITURAS].options():
+        concluido = compactar_serie_temporal(db, tamanho_lote, progresso, apagar_legado, pausa_max_s)
+    else:
+        compactar_colecao_comum(db, tamanho_lote, progresso)
+        concluido = True
+
+    if concluido:
+        relatar_economia(antes, estatisticas(db, COLECAO_LEITURAS))
+        db[COLECAO_MIGRACOES].delete_one({"_id": ID_MIGRACAO})
+    return concluido
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Remove os campos de calendário derivados das leituras gravadas.")
+    parser.add_argument("--lote", type=int, default=1000, help="Documentos por lote.")
+    parser.add_argument("--apagar-legado", action="store_true",
+                        help="Série temporal: apaga a cópia intermediária ao final.")
+    parser.add_argument("--pausa-max-s", type=float, default=900.0,
+                        help="Série temporal: duração máxima da pausa da ingestão durante a troca.")
+    args = parser.parse_args()
+    if not compactar(args.lote, args.apagar_legado, args.pausa_max_s):
+        raise SystemExit(1)
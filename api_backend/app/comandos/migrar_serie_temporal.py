@@ -0,0 +1,165 @@
+"""
+Converte a coleção comum 'dados_reais' em uma coleção de série temporal.
+
+Uso (dentro de api_backend/):
+    python -m app.comandos.migrar_serie_temporal [--lote 1000] [--apagar-legado]
+
+Passos:
+1. Pausa a ingestão da API (app/db/pausa_ingestao.py) e confere que ela parou.
+2. Renomeia 'dados_reais' para 'dados_reais_legado' e cria 'dados_reais' como
+   série temporal, com os índices da aplicação. Libera a ingestão, que passa
+   a gravar na nova coleção.
+3. Copia os documentos antigos em lotes, em ordem de _id, salvando o progresso.
+   Se o comando for interrompido, basta rodá-lo de novo para continuar de onde parou.
+
+Documentos rejeitados pela série temporal são guardados em
+'dados_reais_rejeitados' (com o erro) e a cópia para, para serem analisados
+antes de continuar.
+"""
+import argparse
+import datetime
+from pymongo import ASCENDING, MongoClient
+from pymongo.errors import BulkWriteError
+from app.db import pausa_ingestao
+from app.db.conexao_mongodb import NOME_BANCO
+from app.db.pausa_ingestao import COLECAO_MIGRACOES
+from app.db.provisionamento import COLECAO_LEITURAS, INDICES_LEITURAS, opcoes_serie_temporal
+from app.nucleo.configuracoes import settings
+
+COLECAO_LEGADO = f"{COLECAO_LEITURAS}_legado"
+# Documentos que a série temporal recusou, com o erro
+COLECAO_REJEITADOS = f"{COLECAO_LEITURAS}_rejeitados"
+ID_MIGRACAO = "serie_temporal"
+
+def criar_serie_temporal(db) -> bool:
+    """
+    Cria 'dados_reais' como série temporal (se não existir) com os índices
+    e confere o resultado. Retorna False se a coleção existente não for
+    uma série temporal.
+    """
+    if COLECAO_LEITURAS not in db.list_collection_names():
+        db.create_collection(COLECAO_LEITURAS, timeseries=opcoes_serie_temporal())
+        print(f"🆕 '{COLECAO_LEITURAS}' criada como série temporal.")
+    if "timeseries" not in db[COLECAO_LEITURAS].options():
+        print(f"❌ '{COLECAO_LEITURAS}' existe como coleção comum (alguém gravou nela durante a troca?). "
+              f"Resolva manualmente antes de copiar.")
+        return False
+    for nome, chaves in INDICES_LEITURAS:
+        db[COLECAO_LEITURAS].create_index(chaves, name=nome)
+    return True
+
+def migrar(tamanho_lote: int = 1000, apagar_legado: bool = False, pausa_max_s: float = 900.0) -> bool:
+    """Executa a migração. Retorna True se terminou (ou não havia o que migrar)."""
+    print("--- MIGRAÇÃO PARA SÉRIE TEMPORAL ---")
+    client = MongoClient(settings.MONGODB_URI)
+    db = client[NOME_BANCO]
+    existentes = db.list_collection_names()
+
+    # 1. Troca a coleção comum pela série temporal (só na primeira execução),
+    # com a ingestão pausada para nenhuma gravação recriar 'dados_reais' no meio
+    if COLECAO_LEITURAS in existentes and "timeseries" not in db[COLECAO_LEITURAS].options():
+        if COLECAO_LEGADO in existentes:
+            print(f"❌ '{COLECAO_LEITURAS}' e '{COLECAO_LEGADO}' são coleções comuns. Resolva manualmente.")
+            return False
+        try:
+            with pausa_ingestao.pausar_ingestao(db, "migrar_serie_temporal", pausa_max_s):
+                db[COLECAO_LEITURAS].rename(COLECAO_LEGADO)
+                print(f"📦 '{COLECAO_LEITURAS}' renomeada para '{COLECAO_LEGADO}'.")
+                if not criar_serie_temporal(db):
+                    return False
+        except pausa_ingestao.IngestaoAtivaError as e:
+            print(f"❌ {e}")
+            return False
+        existentes = db.list_collection_names()
+
+    if COLECAO_LEGADO not in existentes:
+        print("✅ Nada a migrar: não existe coleção legada.")
+        return True
+
+    # 2. Garante a série temporal e os índices; nunca copia para uma coleção comum
+    if not criar_serie_temporal(db):
+        return False
+
+    # 3. Cópia em lotes, retomando do último _id salvo
+    progresso = db[COLECAO_MIGRACOES].find_one({"_id": ID_MIGRACAO}) or {}
+    filtro = {"timestamp": {"$exists": True}}
+    if progresso.get("ultimo_id") is not None:
+        filtro["_id"] = {"$gt": progresso["ultimo_id"]}
+        print(f"↪️ Retomando após o _id {progresso['ultimo_id']} ({progresso.get('copiados', 0)} já copiados).")
+
+    total = db[COLECAO_LEGADO].count_documents({})
+    copiados = progresso.get("copiados", 0)
+    cursor = db[COLECAO_LEGADO].find(filtro).sort("_id", ASCENDING).batch_size(tamanho_lote)
+
+    lote = []
+    rejeitados = 0
+    for documento in cursor:
+        lote.append(documento)
+        if len(lote) >= tamanho_lote:
+            rejeitados = _copiar_lote(db, lote, copiados)
+            copiados += len(lote)
+            print(f"   {copiados}/{total} documentos copiados...")
+            lote = []
+            if rejeitados:
+                break
+    if lote and not rejeitados:
+        rejeitados = _copiar_lote(db, lote, copiados)
+        copiados += len(lote)
+
+    if rejeitados:
+        print(f"❌ {rejeitados} documentos rejeitados pela série temporal foram guardados em "
+              f"'{COLECAO_REJEITADOS}'. Corrija ou descarte-os e rode o comando de novo para continuar.")
+        return False
+
+    sem_timestamp = db[COLECAO_LEGADO].count_documents({"timestamp": {"$exists": False}})
+    print(f"✅ Migração concluída: {copiados} documentos copiados.")
+    if sem_timestamp:
+        print(f"⚠️ {sem_timestamp} documentos sem 'timestamp' ficaram em '{COLECAO_LEGADO}'.")
+
+    if COLECAO_REJEITADOS in db.list_collection_names():
+        print(f"⚠️ Há documentos rejeitados em '{COLECAO_REJEITADOS}' de execuções anteriores.")
+
+    if apagar_legado and not sem_timestamp:
+        db[COLECAO_LEGADO].drop()
+        db[COLECAO_MIGRACOES].delete_one({"_id": ID_MIGRACAO})
+        print(f"🗑️ '{COLECAO_LEGADO}' apagada.")
+    return True
+
+def _copiar_lote(db, lote: list[dict], copiados: int) -> int:
+    """
+    Insere um lote na série temporal e salva o ponto de parada. Os documentos
+    rejeitados são guardados em COLECAO_REJEITADOS antes de avançar o ponto de
+    parada. Retorna quantos foram rejeitados.
+    """
+    rejeitados = []
+    try:
+        db[COLECAO_LEITURAS].insert_many(lote, ordered=False)
+    except BulkWriteError as e:
+        agora = datetime.datetime.now(datetime.timezone.utc)
+        rejeitados = [
+            {"documento": lote[erro["index"]], "erro": erro.get("errmsg"), "codigo": erro.get("code"), "em": agora}
+            for erro in e.details.get("writeErrors", [])
+        ]
+        if rejeitados:
+            db[COLECAO_REJEITADOS].insert_many(rejeitados)
+
+    db[COLECAO_MIGRACOES].update_one(
+        {"_id": ID_MIGRACAO},
+        {"$set": {
+            "ultimo_id": lote[-1]["_id"],
+            "copiados": copiados + len(lote),
+            "atualizado_em": datetime.datetime.now(datetime.timezone.utc),
+        }},
+        upsert=True
+    )
+    return len(rejeitados)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migra 'dados_reais' para uma coleção de série temporal.")
+    parser.add_argument("--lote", type=int, default=1000, help="Documentos por lote de cópia.")
+    parser.add_argument("--apagar-legado", action="store_true", help="Apaga a coleção antiga ao final.")
+    parser.add_argument("--pausa-max-s", type=float, default=900.0,
+                        help="Duração máxima da pausa da ingestão durante a troca das coleções.")
+    args = parser.parse_args()
+    if not migrar(args.lote, args.apagar_legado, args.pausa_max_s):
+        raise SystemExit(1)
@@ -0,0 +1,155 @@
+"""
+Recalcula as coleções de agregados (por hora e por dia) a partir das leituras brutas.
+
+Uso (dentro de api_backend/):
+    python -m app.comandos.reconstruir_agregados [--inicio 2025-01-01] [--fim 2025-06-01]
+                                                 [--dias-por-bloco 7] [--paralelos 4] [--pausa-max-s 900]
+
+O intervalo é dividido em blocos de dias inteiros (horário de Brasília), processados
+em paralelo. Cada bloco apaga seus agregados e os recalcula no próprio MongoDB com
+$group + $merge, então nenhum período fica dividido entre dois blocos.
+
+A API incrementa os mesmos documentos a cada leitura gravada; um incremento que
+caísse entre o delete e o $merge se perderia. Por isso a reconstrução roda com a
+ingestão pausada (app/db/pausa_ingestao.py), por no máximo --pausa-max-s segundos:
+os blocos que não começarem nesse tempo são pulados e ficam para uma nova execução.
+"""
+import argparse
+import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pymongo import ASCENDING, DESCENDING, MongoClient
+from app.db import pausa_ingestao
+from app.db.conexao_mongodb import NOME_BANCO
+from app.db.provisionamento import COLECAO_LEITURAS, COLECOES_AGREGADOS
+from app.modelos.esquemas import METRICAS
+from app.nucleo.configuracoes import settings
+from app.servicos.servico_agregados import FUSO_BRASIL, NOME_FUSO
+
+# Unidade do $dateTrunc de cada granularidade
+UNIDADES = {"hora": "hour", "dia": "day"}
+
+def pipeline_agregado(inicio: datetime.datetime, fim: datetime.datetime, granularidade: str) -> list[dict]:
+    """Agrupa as leituras de [inicio, fim) por dispositivo e período e grava com $merge."""
+    grupo = {
+        "_id": {
+            "id_dispositivo": "$id_dispositivo",
+            "inicio": {"$dateTrunc": {"date": "$timestamp", "unit": UNIDADES[granularidade], "timezone": NOME_FUSO}},
+        },
+        "contagem": {"$sum": 1},
+    }
+    metricas = {}
+    for metrica in METRICAS:
+        campo = f"${metrica}"
+        grupo[f"{metrica}__contagem"] = {"$sum": {"$cond": [{"$isNumber": campo}, 1, 0]}}
+        grupo[f"{metrica}__soma"] = {"$sum": campo}
+        grupo[f"{metrica}__soma_quadrados"] = {"$sum": {"$multiply": [campo, campo]}}
+        grupo[f"{metrica}__min"] = {"$min": campo}
+        grupo[f"{metrica}__max"] = {"$max": campo}
+        # Métricas sem nenhuma leitura no período não aparecem no documento
+        metricas[metrica] = {"$cond": [
+            {"$gt": [f"${metrica}__contagem", 0]},
+            {nome: f"${metrica}__{nome}" for nome in ("contagem", "soma", "soma_quadrados", "min", "max")},
+            "$$REMOVE",
+        ]}
+
+    return [
+        {"$match": {"timestamp": {"$gte": inicio, "$lt": fim}, "id_dispositivo": {"$exists": True}}},
+        {"$group": grupo},
+        {"$project": {
+            "_id": 0,
+            "id_dispositivo": "$_id.id_dispositivo",
+            "inicio": "$_id.inicio",
+            "contagem": 1,
+            "metricas": metricas,
+        }},
+        {"$merge": {
+            "into": COLECOES_AGREGADOS[granularidade],
+            "on": ["id_dispositivo", "inicio"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert",
+        }},
+    ]
+
+def reconstruir_bloco(db, inicio: datetime.datetime, fim: datetime.datetime, limite: float | None = None) -> str:
+    """
+    Apaga e recalcula os agregados de um bloco de dias. Com 'limite' (instante
+    de time.monotonic() em que a pausa da ingestão vence), não começa depois dele.
+    """
+    if limite is not None and time.monotonic() >= limite:
+        raise RuntimeError(f"pausa da ingestão vencida; bloco {inicio:%d/%m/%Y} a {fim:%d/%m/%Y} não reconstruído")
+    for granularidade, nome_colecao in COLECOES_AGREGADOS.items():
+        db[nome_colecao].delete_many({"inicio": {"$gte": inicio, "$lt": fim}})
+        db[COLECAO_LEITURAS].aggregate(pipeline_agregado(inicio, fim, granularidade))
+    return f"{inicio:%d/%m/%Y} a {fim:%d/%m/%Y}"
+
+def _meia_noite(momento: datetime.datetime) -> datetime.datetime:
+    """Início do dia (horário de Brasília) que contém o momento."""
+    if momento.tzinfo is None:
+        momento = momento.replace(tzinfo=datetime.timezone.utc)
+    local = momento.astimezone(FUSO_BRASIL).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    return FUSO_BRASIL.localize(local)
+
+def reconstruir(inicio: datetime.date | None, fim: datetime.date | None, dias_por_bloco: int, paralelos: int,
+                pausa_max_s: float = 900.0) -> bool:
+    """Reconstrói os agregados do intervalo. Retorna False se algum bloco falhou."""
+    print("--- RECONSTRUÇÃO DOS AGREGADOS ---")
+    client = MongoClient(settings.MONGODB_URI, maxPoolSize=paralelos + 2)
+    db = client[NOME_BANCO]
+    leituras = db[COLECAO_LEITURAS]
+
+    # Sem intervalo informado, usa a primeira e a última leitura do banco
+    if inicio is None or fim is None:
+        primeira = leituras.find_one({}, {"timestamp": 1}, sort=[("timestamp", ASCENDING)])
+        ultima = leituras.find_one({}, {"timestamp": 1}, sort=[("timestamp", DESCENDING)])
+        if not primeira:
+            print("✅ Nenhuma leitura encontrada.")
+            return True
+    inicio_dt = FUSO_BRASIL.localize(datetime.datetime.combine(inicio, datetime.time())) if inicio else _meia_noite(primeira["timestamp"])
+    fim_dt = FUSO_BRASIL.localize(datetime.datetime.combine(fim, datetime.time())) if fim else _meia_noite(ultima["timestamp"]) + datetime.timedelta(days=1)
+
+    blocos = []
+    atual = inicio_dt
+    while atual < fim_dt:
+        proximo = min(_meia_noite(atual + datetime.timedelta(days=dias_por_bloco, hours=12)), fim_dt)
+        blocos.append((atual, proximo))
+        atual = proximo
+
+    print(f"📦 {len(blocos)} blocos de até {dias_por_bloco} dias, {paralelos} em paralelo.")
+    falhas = 0
+    # A validade da pausa começa a contar ao gravá-la, antes da espera pelos workers
+    limite = time.monotonic() + pausa_max_s
+    try:
+        with pausa_ingestao.pausar_ingestao(db, "reconstruir_agregados", pausa_max_s):
+            with ThreadPoolExecutor(max_workers=paralelos) as executor:
+                futuros = [executor.submit(reconstruir_bloco, db, a, b, limite) for a, b in blocos]
+                for concluidos, futuro in enumerate(as_completed(futuros), start=1):
+                    try:
+                        print(f"   [{concluidos}/{len(blocos)}] {futuro.result()}")
+                    except Exception as e:
+                        falhas += 1
+                        print(f"❌ Erro em um bloco: {e}")
+    except pausa_ingestao.IngestaoAtivaError as e:
+        print(f"❌ {e}")
+        return False
+
+    if falhas:
+        print(f"⚠️ {falhas} de {len(blocos)} blocos não foram reconstruídos; rode de novo para esses dias.")
+        return False
+    print("✅ Agregados reconstruídos.")
+    return True
+
+def _data(texto: str) -> datetime.date:
+    return datetime.date.fromisoformat(texto)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recalcula os agregados por hora e por dia.")
+    parser.add_argument("--inicio", type=_data, help="Primeiro dia (AAAA-MM-DD). Padrão: primeira leitura.")
+    parser.add_argument("--fim", type=_data, help="Dia final, exclusivo (AAAA-MM-DD). Padrão: após a última leitura.")
+    parser.add_argument("--dias-por-bloco", type=int, default=7, help="Tamanho de cada bloco em dias.")
+    parser.add_argument("--paralelos", type=int, default=4, help="Blocos processados ao mesmo tempo.")
+    parser.add_argument("--pausa-max-s", type=float, default=900.0,
+                        help="Duração máxima da pausa da ingestão durante a reconstrução.")
+    args = parser.parse_args()
+    if not reconstruir(args.inicio, args.fim, args.dias_por_bloco, args.paralelos, args.pausa_max_s):
+        raise SystemExit(1)
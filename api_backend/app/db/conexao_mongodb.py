@@ -1,53 +1,149 @@
-from pymongo import MongoClient
-from pymongo.database import Database
+import asyncio
+from typing import Awaitable, Callable
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 from app.nucleo.configuracoes import settings
 
+# Nome do banco de dados usado pela aplicação
+NOME_BANCO = "horta_inteligente"
+
 class DBConnection:
     """
     Classe simples para manter o estado da conexão (cliente e banco)
     acessível em um único lugar.
     """
-    client: MongoClient | None = None
-    db: Database | None = None
+    client: AsyncIOMotorClient | None = None
+    db: AsyncIOMotorDatabase | None = None
+    # Tarefa de fundo que conecta e acompanha a conexão (reconectando se cair)
+    tarefa_reconexao: asyncio.Task | None = None
+    # True depois que o servidor respondeu e os ganchos de conexão rodaram
+    pronto: bool = False
 
 # Instância única que será importada por outros módulos
 db_conn = DBConnection()
 
-def connect_to_db():
+# Função que cria o cliente do banco. Os testes de carga trocam por um
+# banco em memória (ex: mongomock_motor.AsyncMongoMockClient)
+fabrica_cliente: Callable[..., AsyncIOMotorClient] = AsyncIOMotorClient
+
+def definir_fabrica_cliente(fabrica: Callable[..., AsyncIOMotorClient]):
     """
-    Inicia a conexão com o MongoDB.
-    Esta função será chamada quando a API iniciar.
+    Troca a classe/função usada para criar o cliente do MongoDB.
+    Deve ser chamada antes de connect_to_db().
+    """
+    global fabrica_cliente
+    fabrica_cliente = fabrica
+
+# Funções executadas sempre que o servidor volta a responder, ex: criar índices
+ganchos_conexao: list[Callable[[AsyncIOMotorDatabase], Awaitable[None]]] = []
+
+def registrar_gancho_conexao(gancho: Callable[[AsyncIOMotorDatabase], Awaitable[None]]):
+    """
+    Registra uma função assíncrona que recebe o banco e roda em segundo
+    plano, logo que o servidor responder (mesmo que demore a subir) e de
+    novo a cada reconexão (ex.: o banco foi restaurado ou trocado).
+    """
+    if gancho not in ganchos_conexao:
+        ganchos_conexao.append(gancho)
+
+def _criar_cliente():
+    """
+    Cria o cliente assíncrono. O driver só abre conexões no primeiro uso,
+    então isto não espera pelo servidor.
+    """
+    return fabrica_cliente(
+        settings.MONGODB_URI,
+        maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+        minPoolSize=settings.MONGODB_MIN_POOL_SIZE,
+        serverSelectionTimeoutMS=settings.MONGODB_TIMEOUT_SELECAO_MS
+    )
+
+async def _tentar_conectar() -> bool:
+    """
+    Testa a conexão com o servidor e, se ele respondeu, roda os ganchos de conexão.
+    Retorna True se o banco ficou disponível.
     """
-    print("Conectando ao MongoDB...")
     try:
-        # Usa a URI carregada pelo arquivo de configurações
-        db_conn.client = MongoClient(
-            settings.MONGODB_URI,
-            serverSelectionTimeoutMS=5000  # Tenta por 5s antes de falhar
-        )
-        
         # Testa a conexão para garantir que está tudo OK
-        db_conn.client.server_info() 
-        
-        # Define qual banco de dados queremos usar dentro do cluster
-        # Se não existir, o MongoDB o criará na primeira inserção
-        db_conn.db = db_conn.client.get_database("horta_inteligente")
-        
-        print("Conexão com MongoDB estabelecida com sucesso.")
-        
+        await db_conn.client.server_info()
     except Exception as e:
         print(f"Erro ao conectar ao MongoDB: {e}")
-        db_conn.client = None
-        db_conn.db = None
+        return False
+
+    print("Conexão com MongoDB estabelecida com sucesso.")
 
-def close_db_connection():
+    for gancho in ganchos_conexao:
+        try:
+            await gancho(db_conn.db)
+        except Exception as e:
+            print(f"⚠️ Erro no gancho de conexão '{gancho.__name__}': {e}")
+    # Só fica pronto depois dos ganchos: coleções e índices já existem
+    db_conn.pronto = True
+    return True
+
+async def _conectar_em_segundo_plano():
+    """
+    Tenta conectar até o banco ficar disponível, com espera crescente entre
+    as tentativas. Depois faz um ping a cada MONGODB_RECONEXAO_INTERVALO_S:
+    se o servidor parar de responder, 'pronto' volta a False e, quando ele
+    voltar, os ganchos de conexão rodam de novo.
+    """
+    while True:
+        espera = settings.MONGODB_RECONEXAO_INTERVALO_S
+        while not await _tentar_conectar():
+            await asyncio.sleep(espera)
+            print("Tentando reconectar ao MongoDB...")
+            espera = min(espera * 2, settings.MONGODB_RECONEXAO_INTERVALO_MAX_S)
+
+        while True:
+            await asyncio.sleep(settings.MONGODB_RECONEXAO_INTERVALO_S)
+            try:
+                await db_conn.db.command("ping")
+            except Exception as e:
+                print(f"⚠️ MongoDB parou de responder: {e}")
+                db_conn.pronto = False
+                break
+
+async def connect_to_db():
+    """
+    Inicia a conexão com o MongoDB.
+    Esta função será chamada quando a API iniciar. Não espera pelo servidor:
+    o cliente é criado na hora (as requisições já podem usá-lo) e o teste de
+    conexão e os ganchos rodam em segundo plano, repetindo enquanto o banco
+    estiver fora. 'db_conn.pronto' indica quando o banco respondeu.
+    """
+    print("Conectando ao MongoDB...")
+    db_conn.client = _criar_cliente()
+    # Define qual banco de dados queremos usar dentro do cluster
+    # Se não existir, o MongoDB o criará na primeira inserção
+    db_conn.db = db_conn.client.get_database(NOME_BANCO)
+    db_conn.pronto = False
+    db_conn.tarefa_reconexao = asyncio.create_task(_conectar_em_segundo_plano())
+
+async def verificar_banco(timeout_s: float) -> bool:
+    """Ping rápido no servidor, usado pela verificação de prontidão."""
+    if db_conn.db is None or not db_conn.pronto:
+        return False
+    try:
+        await asyncio.wait_for(db_conn.db.command("ping"), timeout_s)
+        return True
+    except Exception:
+        return False
+
+async def close_db_connection():
     """
     Fecha a conexão com o MongoDB.
     Esta função será chamada quando a API desligar.
     """
+    if db_conn.tarefa_reconexao and not db_conn.tarefa_reconexao.done():
+        db_conn.tarefa_reconexao.cancel()
+    db_conn.tarefa_reconexao = None
+
     if db_conn.client:
         db_conn.client.close()
         print("Conexão com MongoDB fechada.")
+    db_conn.client = None
+    db_conn.db = None
+    db_conn.pronto = False
 
 def get_db_collection(collection_name: str):
     """
@@ -57,6 +153,6 @@ def get_db_collection(collection_name: str):
     if db_conn.db is None:
         # Se o banco não estiver conectado, levanta um erro
         raise Exception("A conexão com o banco de dados não foi estabelecida.")
-        
+
     # Retorna a coleção (ex: "dados_sensores")
-    return db_conn.db[collection_name]
\ No newline at end of file
+    return db_conn.db[collection_name]
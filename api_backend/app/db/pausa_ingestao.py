@@ -0,0 +1,149 @@
+"""
+Pausa da ingestão durante os comandos de manutenção que trocam a coleção de
+leituras (migrar_serie_temporal, compactar_leituras) ou recalculam os
+agregados que a ingestão incrementa (reconstruir_agregados).
+
+O comando grava o documento 'pausa_ingestao' na coleção 'migracoes', com
+uma validade. Cada worker da API consulta esse documento a cada
+PAUSA_VERIFICACAO_S segundos e, enquanto a pausa vale, não grava em
+'dados_reais': as rotas de ingestão respondem 503 (os dispositivos tentam de
+novo) e o buffer de escrita segura os lotes. Se o comando morrer, a pausa
+vence sozinha e a ingestão volta.
+
+Antes de mexer na coleção, o comando confere que ela parou de receber
+leituras; se não parou (ex.: uma API sem esta verificação), desiste.
+"""
+import asyncio
+import datetime
+import time
+from contextlib import contextmanager
+from app.db.conexao_mongodb import get_db_collection
+from app.db.provisionamento import COLECAO_LEITURAS
+from app.nucleo.configuracoes import settings
+
+COLECAO_MIGRACOES = "migracoes"
+ID_PAUSA = "pausa_ingestao"
+
+
+class IngestaoPausadaError(Exception):
+    """A ingestão está pausada para manutenção; o cliente deve tentar de novo."""
+    pass
+
+
+class IngestaoAtivaError(RuntimeError):
+    """A coleção de leituras continuou recebendo gravações depois da pausa."""
+    pass
+
+
+# --- Lado da API (por worker) ---
+
+# Até quando a pausa vale, segundo a última consulta ao banco
+_pausada_ate: datetime.datetime | None = None
+_tarefa: asyncio.Task | None = None
+
+
+def _agora() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def ingestao_pausada() -> bool:
+    return _pausada_ate is not None and _agora() < _pausada_ate
+
+
+def exigir_ingestao_liberada():
+    """Levanta IngestaoPausadaError se um comando de manutenção pausou a ingestão."""
+    if ingestao_pausada():
+        raise IngestaoPausadaError("Ingestão pausada para manutenção do banco. Tente de novo em instantes.")
+
+
+async def atualizar_pausa():
+    """Lê o documento da pausa no banco."""
+    global _pausada_ate
+    documento = await get_db_collection(COLECAO_MIGRACOES).find_one({"_id": ID_PAUSA})
+    ate = documento.get("ate") if documento else None
+    # Datas sem fuso já estão em UTC (padrão do MongoDB)
+    if ate is not None and ate.tzinfo is None:
+        ate = ate.replace(tzinfo=datetime.timezone.utc)
+    if (ate is not None and ate > _agora()) != ingestao_pausada():
+        print("⏸️ Ingestão pausada para manutenção." if ate and ate > _agora() else "▶️ Ingestão retomada.")
+    _pausada_ate = ate
+
+
+async def _laco_pausa():
+    while True:
+        try:
+            await atualizar_pausa()
+        except Exception as e:
+            # Banco fora: mantém o último estado (a validade da pausa continua valendo)
+            print(f"⚠️ Erro ao verificar a pausa da ingestão: {e}")
+        await asyncio.sleep(settings.PAUSA_VERIFICACAO_S)
+
+
+def iniciar_monitor_pausa():
+    """Começa a consultar a pausa. Chamada pelo 'lifespan' ao iniciar a API."""
+    global _tarefa
+    _tarefa = asyncio.create_task(_laco_pausa())
+
+
+async def encerrar_monitor_pausa():
+    global _tarefa, _pausada_ate
+    if _tarefa is None:
+        return
+    _tarefa.cancel()
+    try:
+        await _tarefa
+    except asyncio.CancelledError:
+        pass
+    _tarefa = None
+    _pausada_ate = None
+
+
+# --- Lado dos comandos (pymongo síncrono) ---
+
+def _marca_escrita(db) -> tuple | None:
+    """
+    Marca barata do estado de 'dados_reais' (sem contar a coleção inteira): a
+    contagem estimada pelos metadados e o _id da leitura mais recente, pelo
+    índice de 'timestamp'. Se mudou, a coleção recebeu gravações. Na série
+    temporal a contagem é a dos buckets, então uma leitura atrasada gravada
+    num bucket já existente pode passar despercebida.
+    """
+    if COLECAO_LEITURAS not in db.list_collection_names():
+        return None
+    collection = db[COLECAO_LEITURAS]
+    # A série temporal é uma visão: os metadados ficam na coleção de buckets
+    metadados = db[f"system.buckets.{COLECAO_LEITURAS}"] if "timeseries" in collection.options() else collection
+    ultima = collection.find_one({}, {"_id": 1}, sort=[("timestamp", -1)])
+    return metadados.estimated_document_count(), ultima["_id"] if ultima else None
+
+
+@contextmanager
+def pausar_ingestao(db, motivo: str, duracao_max_s: float = 900.0):
+    """
+    Pausa a ingestão da API enquanto o bloco roda (no máximo 'duracao_max_s').
+    Antes de entrar, espera os workers verem a pausa e confere que
+    'dados_reais' parou de receber gravações (ver _marca_escrita); se não
+    parou, levanta IngestaoAtivaError.
+    """
+    db[COLECAO_MIGRACOES].update_one(
+        {"_id": ID_PAUSA},
+        {"$set": {"ate": _agora() + datetime.timedelta(seconds=duracao_max_s), "motivo": motivo}},
+        upsert=True
+    )
+    try:
+        # Dois ciclos de verificação dos workers, mais as gravações em andamento
+        espera = 2 * settings.PAUSA_VERIFICACAO_S + 1
+        print(f"⏸️ Ingestão pausada ({motivo}); aguardando {espera:.0f}s para os workers pararem...")
+        time.sleep(espera)
+        antes = _marca_escrita(db)
+        time.sleep(settings.PAUSA_VERIFICACAO_S)
+        depois = _marca_escrita(db)
+        if depois != antes:
+            raise IngestaoAtivaError(
+                f"'{COLECAO_LEITURAS}' continuou recebendo gravações durante a pausa. "
+                f"Atualize ou pare a API (ou os outros processos que gravam) e rode de novo."
+            )
+        yield
+    finally:
+        db[COLECAO_MIGRACOES].delete_one({"_id": ID_PAUSA})
+        print("▶️ Ingestão liberada.")
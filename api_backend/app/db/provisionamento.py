@@ -0,0 +1,115 @@
+from pymongo import ASCENDING, DESCENDING
+from app.nucleo.configuracoes import settings
+
+# Coleção onde a API grava as leituras reais dos sensores
+COLECAO_LEITURAS = "dados_reais"
+# Coleção lida pelo dashboard (dados do simulador)
+COLECAO_SINTETICA = "dados_sinteticos"
+
+# Visão para ferramentas de BI: leituras com os campos de calendário calculados
+VISAO_BI = "dados_reais_bi"
+# Fuso dos campos de calendário (o mesmo usado ao gravar as leituras)
+FUSO_CALENDARIO = "America/Sao_Paulo"
+
+# Campos derivados de 'timestamp', omitidos no armazenamento compacto
+CAMPOS_CALENDARIO = ("data", "hora", "dia", "mes", "ano", "hora_simples")
+
+# Coleções de agregados mantidas a cada gravação, por granularidade
+COLECOES_AGREGADOS = {
+    "hora": "agregados_hora",
+    "dia": "agregados_dia",
+}
+
+# Índices garantidos nas coleções de leituras: (nome, chaves)
+INDICES_LEITURAS = [
+    ("dispositivo_timestamp", [("id_dispositivo", ASCENDING), ("timestamp", DESCENDING)]),
+    ("timestamp", [("timestamp", DESCENDING)]),
+]
+
+def opcoes_serie_temporal() -> dict:
+    """
+    Opções de criação da coleção de leituras como série temporal do MongoDB:
+    'timestamp' é o campo de tempo e 'id_dispositivo' o campo de metadados.
+    """
+    return {
+        "timeField": "timestamp",
+        "metaField": "id_dispositivo",
+        "granularity": settings.MONGODB_SERIE_GRANULARIDADE,
+    }
+
+def pipeline_calendario() -> list[dict]:
+    """
+    Calcula na leitura os campos de calendário que o armazenamento
+    compacto deixa de gravar (data, hora, dia, mes, ano, hora_simples).
+    """
+    data = {"date": "$timestamp", "timezone": FUSO_CALENDARIO}
+    return [{"$addFields": {
+        "data": {"$dateToString": {**data, "format": "%d/%m/%Y"}},
+        "hora": {"$dateToString": {**data, "format": "%H:%M:%S"}},
+        "dia": {"$dayOfMonth": data},
+        "mes": {"$month": data},
+        "ano": {"$year": data},
+        "hora_simples": {"$hour": data},
+    }}]
+
+async def provisionar_banco(db):
+    """
+    Cria a coleção de leituras como série temporal (se ainda não existir)
+    e garante os índices usados pelas consultas de "última leitura" e
+    pelo dashboard. Chamada sempre que a conexão com o banco é estabelecida.
+
+    Cada etapa tem seu próprio tratamento de erro: uma que falhe (ex.: sem
+    permissão para criar a série temporal ou a visão) não impede as outras,
+    principalmente a criação dos índices.
+    """
+    try:
+        existentes = await db.list_collection_names()
+    except Exception as e:
+        print(f"⚠️ Erro ao listar as coleções: {e}")
+        return
+
+    try:
+        if COLECAO_LEITURAS not in existentes and settings.MONGODB_SERIE_TEMPORAL:
+            await db.create_collection(COLECAO_LEITURAS, timeseries=opcoes_serie_temporal())
+            print(f"Coleção '{COLECAO_LEITURAS}' criada como série temporal.")
+        elif COLECAO_LEITURAS in existentes and settings.MONGODB_SERIE_TEMPORAL:
+            opcoes = await db[COLECAO_LEITURAS].options()
+            if "timeseries" not in opcoes:
+                print(f"⚠️ '{COLECAO_LEITURAS}' é uma coleção comum. "
+                      f"Rode 'python -m app.comandos.migrar_serie_temporal' para convertê-la.")
+    except Exception as e:
+        print(f"⚠️ Erro ao criar '{COLECAO_LEITURAS}' como série temporal: {e}")
+
+    try:
+        # Visão de BI sobre as leituras; atualizada se já existir
+        if VISAO_BI not in existentes:
+            await db.create_collection(VISAO_BI, viewOn=COLECAO_LEITURAS, pipeline=pipeline_calendario())
+            print(f"Visão '{VISAO_BI}' criada.")
+        else:
+            await db.command("collMod", VISAO_BI, viewOn=COLECAO_LEITURAS, pipeline=pipeline_calendario())
+    except Exception as e:
+        print(f"⚠️ Erro ao criar a visão '{VISAO_BI}': {e}")
+
+    # Índices: uma falha aqui não impede a API de funcionar, apenas deixa as consultas mais lentas
+    falhas = 0
+    for nome_colecao in (COLECAO_LEITURAS, COLECAO_SINTETICA):
+        for nome, chaves in INDICES_LEITURAS:
+            try:
+                await db[nome_colecao].create_index(chaves, name=nome)
+            except Exception as e:
+                falhas += 1
+                print(f"⚠️ Erro ao criar o índice '{nome}' em '{nome_colecao}': {e}")
+
+    # Um documento por (dispositivo, início do período): usado pelos upserts e pelo $merge
+    for nome_colecao in COLECOES_AGREGADOS.values():
+        try:
+            await db[nome_colecao].create_index(
+                [("id_dispositivo", ASCENDING), ("inicio", ASCENDING)],
+                name="dispositivo_inicio", unique=True
+            )
+        except Exception as e:
+            falhas += 1
+            print(f"⚠️ Erro ao criar o índice 'dispositivo_inicio' em '{nome_colecao}': {e}")
+
+    if not falhas:
+        print("Índices do banco verificados.")
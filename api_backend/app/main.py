@@ -1,8 +1,13 @@
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
 from app.api.v1.roteador_principal import api_router_v1
 # Importa o módulo de conexão que criamos no Passo 6
-from app.db import conexao_mongodb 
+from app.db import conexao_mongodb, pausa_ingestao
+from app.db.provisionamento import provisionar_banco
+from app.nucleo import metricas
+from app.nucleo.configuracoes import settings
+from app.servicos import estado_compartilhado, servico_banco_de_dados
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -12,16 +17,52 @@ async def lifespan(app: FastAPI):
     Executa o código depois do 'yield' ao desligar.
     """
     # Código a ser executado ANTES da aplicação iniciar
-    print("Iniciando aplicação...")
-    # Chama nossa função para conectar ao banco de dados
-    conexao_mongodb.connect_to_db()
+    print(f"Iniciando aplicação (perfil '{settings.PERFIL_API}')...")
+    # O perfil "ingestao" não carrega chatbot, Telegram, alertas nem retenção
+    completo = settings.PERFIL_API == "completo"
+    if completo:
+        from app.servicos import leitor_regras, servico_alertas, servico_retencao, servico_telegram
+        # Histórico das conversas, cache de respostas e dedup do Telegram (ESTADO_BACKEND)
+        try:
+            await estado_compartilhado.verificar_estado()
+        except Exception as e:
+            print(f"⚠️ Estado compartilhado indisponível ({settings.ESTADO_BACKEND}): {e}")
+    # Garante coleções e índices sempre que o banco conectar (ou reconectar)
+    conexao_mongodb.registrar_gancho_conexao(provisionar_banco)
+    # Carrega a última leitura de cada dispositivo para o cache em memória
+    conexao_mongodb.registrar_gancho_conexao(servico_banco_de_dados.aquecer_cache_ultimas_leituras)
+    # Chama nossa função para conectar ao banco de dados (não espera o servidor
+    # responder: o teste de conexão e os ganchos rodam em segundo plano)
+    await conexao_mongodb.connect_to_db()
+    # Acompanha as pausas da ingestão pedidas pelos comandos de manutenção
+    pausa_ingestao.iniciar_monitor_pausa()
+    # Liga o buffer de escrita em segundo plano (se habilitado no .env)
+    servico_banco_de_dados.iniciar_buffer_escrita()
+    if completo:
+        # Workers que respondem o Telegram fora da requisição do webhook
+        servico_telegram.iniciar_fila_telegram()
+        # Alertas do motor de regras vão para os assinantes pela fila do Telegram
+        servico_alertas.iniciar_alertas(servico_telegram.fila_telegram.enviar)
+        # Com vários workers, o motor de regras lê todas as leituras gravadas no banco
+        leitor_regras.iniciar_leitor_regras()
+        # Arquivamento periódico das leituras antigas (se habilitado no .env)
+        servico_retencao.iniciar_retencao()
     
     yield  # Este 'yield' é o ponto onde a aplicação fica rodando
     
     # Código a ser executado DEPOIS da aplicação parar
     print("Desligando aplicação...")
+    if completo:
+        await servico_retencao.encerrar_retencao()
+        await leitor_regras.encerrar_leitor_regras()
+        await servico_alertas.encerrar_alertas()
+        await servico_telegram.encerrar_fila_telegram()
+    # Grava o que ainda estiver no buffer antes de fechar o banco
+    await servico_banco_de_dados.encerrar_buffer_escrita()
+    await pausa_ingestao.encerrar_monitor_pausa()
     # Chama nossa função para fechar a conexão
-    conexao_mongodb.close_db_connection()
+    await conexao_mongodb.close_db_connection()
+    await estado_compartilhado.encerrar_estado()
 
 # Cria a instância principal da aplicação FastAPI
 app = FastAPI(
@@ -31,6 +72,14 @@ app = FastAPI(
     lifespan=lifespan  # Informa ao FastAPI para usar nosso gerenciador de ciclo de vida
 )
 
+# Mede a duração de cada requisição (e, se habilitado, amostra perfis das lentas)
+app.add_middleware(
+    metricas.MiddlewareMetricas,
+    perfil_amostragem=settings.METRICAS_PERFIL_AMOSTRAGEM,
+    perfil_limite_s=settings.METRICAS_PERFIL_LIMITE_MS / 1000,
+    perfil_diretorio=settings.METRICAS_PERFIL_DIRETORIO,
+)
+
 # Inclui todas as rotas da v1 que foram agregadas no 'roteador_principal'.
 app.include_router(api_router_v1, prefix="/api/v1")
 
@@ -39,4 +88,28 @@ async def read_root():
     """
     Endpoint raiz para verificar se a API está online.
     """
-    return {"status": "ok", "mensagem": "Bem-vindo à API da Horta Inteligente!"}
\ No newline at end of file
+    return {"status": "ok", "mensagem": "Bem-vindo à API da Horta Inteligente!"}
+
+@app.get("/saude/vivo", tags=["Root"])
+async def saude_vivo():
+    """
+    Liveness: o processo está respondendo. Não consulta o banco.
+    """
+    return {"status": "ok"}
+
+@app.get("/saude/pronto", tags=["Root"])
+async def saude_pronto():
+    """
+    Readiness: 200 quando o MongoDB respondeu a um ping rápido, 503 enquanto
+    a conexão ainda não foi estabelecida (ou caiu).
+    """
+    if await conexao_mongodb.verificar_banco(settings.SAUDE_TIMEOUT_PING_S):
+        return {"status": "pronto", "perfil": settings.PERFIL_API}
+    return JSONResponse(status_code=503, content={"status": "aguardando banco", "perfil": settings.PERFIL_API})
+
+@app.get("/metrics", include_in_schema=False)
+async def exportar_metricas():
+    """
+    Métricas no formato texto do Prometheus.
+    """
+    return PlainTextResponse(metricas.registro.exportar(), media_type="text/plain; version=0.0.4")
@@ -1,7 +1,18 @@
 import datetime
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel, Field
 
+# Campos numéricos de leitura, na ordem usada pelos agregados e formatos compactos
+METRICAS = (
+    "umidade",
+    "ph_solo",
+    "temperatura",
+    "condutividade_eletrica",
+    "nitrogenio",
+    "fosforo",
+    "potassio",
+)
+
 class DadosSensorBase(BaseModel):
     """
     Schema base para os dados do sensor. Todos os campos de leitura são opcionais
@@ -35,6 +46,18 @@ class DadosSensorCreate(DadosSensorBase):
     pass
 
 
+class DadosSensorLoteItem(DadosSensorCreate):
+    """
+    Item de um lote enviado pelo dispositivo. Diferente do envio unitário,
+    aqui o horário da leitura é preservado, pois o ESP32 guarda as medições
+    enquanto está sem Wi-Fi e as reenvia depois.
+    """
+    timestamp: Optional[datetime.datetime] = Field(
+        default=None,
+        description="Data e hora da leitura no dispositivo. Se ausente, usa o horário do servidor."
+    )
+
+
 class DadosSensor(DadosSensorBase):
     """
     Schema completo, representando os dados como são armazenados e retornados pela API.
@@ -53,4 +76,134 @@ class CreateResponse(BaseModel):
     Schema de resposta padrão para operações de criação bem-sucedidas.
     """
     status: str = "sucesso"
-    id_inserido: str
\ No newline at end of file
+    id_inserido: str
+
+
+class ResultadoItemLote(BaseModel):
+    """
+    Resultado individual de um item do lote, na mesma posição em que foi enviado.
+    """
+    indice: int = Field(..., description="Posição do item no lote enviado.")
+    status: str = Field(..., description="'sucesso' ou 'erro'.")
+    id_inserido: Optional[str] = None
+    erro: Optional[str] = None
+
+
+class LoteResponse(BaseModel):
+    """
+    Schema de resposta do envio em lote. Permite ao dispositivo reenviar
+    apenas os itens que falharam.
+    """
+    total: int
+    sucesso: int
+    falhas: int
+    resultados: List[ResultadoItemLote]
+
+
+class UltimaLeitura(BaseModel):
+    """
+    Última leitura conhecida de um dispositivo, servida a partir do cache em memória.
+    """
+    id_dispositivo: str
+    timestamp: datetime.datetime = Field(..., description="Momento da leitura (UTC).")
+    idade_segundos: float = Field(..., description="Tempo desde a leitura, em segundos.")
+    desatualizado: bool = Field(..., description="True se a leitura é mais antiga que o limite configurado.")
+    leitura: Dict[str, Any] = Field(..., description="Documento da leitura como foi gravado.")
+
+
+class EstatisticaMetrica(BaseModel):
+    """
+    Estatísticas de uma métrica dentro de um período agregado.
+    """
+    contagem: int
+    media: Optional[float] = None
+    desvio_padrao: Optional[float] = None
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+
+class AgregadoPeriodo(BaseModel):
+    """
+    Linha de agregado (hora, dia ou mês) de um dispositivo.
+    """
+    id_dispositivo: str
+    inicio: datetime.datetime = Field(..., description="Início do período (UTC).")
+    contagem: int = Field(..., description="Quantidade de leituras no período.")
+    metricas: Dict[str, EstatisticaMetrica]
+
+
+class PontoSerie(BaseModel):
+    timestamp: datetime.datetime
+    valor: float
+
+
+class HistoricoResponse(BaseModel):
+    """
+    Séries históricas por métrica, opcionalmente reduzidas para gráficos.
+    """
+    series: Dict[str, List[PontoSerie]]
+    pontos_originais: Dict[str, int] = Field(..., description="Quantidade de pontos antes da redução.")
+
+
+class LimiteMetrica(BaseModel):
+    min: Optional[float] = None
+    max: Optional[float] = None
+    ideal: Optional[float] = None
+    critico_min: Optional[float] = Field(default=None, description="Abaixo disso o estado é crítico.")
+    critico_max: Optional[float] = Field(default=None, description="Acima disso o estado é crítico.")
+
+
+class Cultura(BaseModel):
+    """
+    Faixas de referência de uma cultura, usadas pelo motor de regras.
+    """
+    nome: str
+    icone: str
+    descricao: str
+    limites: Dict[str, LimiteMetrica]
+
+
+class EstatisticaJanela(BaseModel):
+    """
+    Estatísticas de uma métrica na janela que termina na última leitura do dispositivo.
+    """
+    amostras: int
+    media: Optional[float] = None
+    desvio_padrao: Optional[float] = None
+    minimo: Optional[float] = None
+    maximo: Optional[float] = None
+    ultimo: Optional[float] = None
+
+
+class DiagnosticoMetrica(BaseModel):
+    estado: Optional[str] = Field(
+        default=None,
+        description="ok, baixo, alto, critico_baixo ou critico_alto (None se ainda não há leituras suficientes).",
+    )
+    dica: Optional[str] = None
+    janelas: Dict[str, EstatisticaJanela] = Field(..., description="Estatísticas por duração da janela (s).")
+
+
+class Diagnostico(BaseModel):
+    """
+    Situação atual de um dispositivo, mantida pelo motor de regras.
+    """
+    id_dispositivo: str
+    cultura: str
+    status: str = Field(..., description="Ideal, Atenção ou Alerta.")
+    ultima_leitura: Optional[datetime.datetime] = None
+    metricas: Dict[str, DiagnosticoMetrica]
+
+
+class Alerta(BaseModel):
+    """
+    Mudança de estado de uma métrica detectada pelo motor de regras.
+    """
+    id_dispositivo: str
+    cultura: str
+    metrica: str
+    estado: str
+    estado_anterior: str
+    valor: float = Field(..., description="Média da janela de avaliação no momento do alerta.")
+    timestamp: datetime.datetime
+    mensagem: str
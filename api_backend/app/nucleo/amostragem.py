@@ -0,0 +1,60 @@
+"""
+Redução de pontos de séries temporais para gráficos.
+
+Este módulo só depende do NumPy, para poder ser usado tanto pela API
+quanto pelo dashboard Streamlit.
+"""
+import numpy as np
+
+
+def lttb(x, y, limite: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: escolhe até 'limite' pontos que preservam
+    o formato visual da série (picos e vales), em vez de simplesmente pular pontos.
+
+    'x' deve estar em ordem crescente. Retorna os índices escolhidos, em ordem.
+    O primeiro e o último ponto são sempre mantidos.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if limite >= n:
+        return np.arange(n)
+    if limite < 3:
+        # Sem baldes internos: mantém apenas as extremidades
+        return np.array([0, n - 1], dtype=np.int64)[:max(limite, 0)]
+
+    # Divide os pontos internos em (limite - 2) baldes de tamanho parecido
+    bordas = np.linspace(1, n - 1, limite - 1).astype(np.int64)
+    # Média de cada balde, usada como vértice "seguinte" do triângulo
+    somas_x = np.add.reduceat(x[1:n - 1], bordas[:-1] - 1)
+    somas_y = np.add.reduceat(y[1:n - 1], bordas[:-1] - 1)
+    tamanhos = np.diff(bordas)
+    medias_x = np.append(somas_x / tamanhos, x[-1])
+    medias_y = np.append(somas_y / tamanhos, y[-1])
+
+    escolhidos = np.empty(limite, dtype=np.int64)
+    escolhidos[0] = 0
+    escolhidos[-1] = n - 1
+    anterior = 0
+    for balde in range(limite - 2):
+        inicio, fim = bordas[balde], bordas[balde + 1]
+        ax, ay = x[anterior], y[anterior]
+        cx, cy = medias_x[balde + 1], medias_y[balde + 1]
+        # Área (dobrada) do triângulo entre o ponto anterior, cada candidato e a média seguinte
+        areas = np.abs((ax - cx) * (y[inicio:fim] - ay) - (ax - x[inicio:fim]) * (cy - ay))
+        anterior = inicio + int(np.argmax(areas))
+        escolhidos[balde + 1] = anterior
+    return escolhidos
+
+
+def reduzir_serie(x, y, limite: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Aplica o LTTB ignorando valores ausentes (NaN) e retorna (x, y) reduzidos.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    validos = np.isfinite(x) & np.isfinite(y)
+    x, y = x[validos], y[validos]
+    indices = lttb(x, y, limite)
+    return x[indices], y[indices]
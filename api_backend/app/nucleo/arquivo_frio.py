@@ -0,0 +1,187 @@
+"""
+Arquivo frio das leituras: arquivos Parquet (zstd) em disco local,
+particionados por coleção, dispositivo e dia (UTC):
+
+    <diretorio>/<colecao>/id_dispositivo=<id>/dia=AAAA-MM-DD/leituras.parquet
+
+A escrita é feita pelo serviço de retenção, que depois apaga as mesmas
+leituras do MongoDB. A leitura abre só as partições do intervalo pedido,
+só as colunas pedidas e com memory map, então serve tanto ao dashboard
+quanto a scripts de análise.
+
+Requer o pacote 'pyarrow' (opcional para o resto da API).
+"""
+import datetime
+import os
+from pathlib import Path
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Campos que não vão para o arquivo: o _id só existe no MongoDB e os de
+# calendário (provisionamento.CAMPOS_CALENDARIO) são derivados de 'timestamp'
+CAMPOS_IGNORADOS = {"_id", "data", "hora", "dia", "mes", "ano", "hora_simples"}
+
+
+class ArquivoIndisponivelError(RuntimeError):
+    """O pacote 'pyarrow' não está instalado."""
+    pass
+
+
+def _exigir_pyarrow():
+    if pa is None:
+        raise ArquivoIndisponivelError("Arquivo frio indisponível: instale o pacote 'pyarrow'.")
+
+
+def _nome_particao(chave: str, valor: str) -> str:
+    # Barras no id do dispositivo criariam subpastas
+    return f"{chave}={str(valor).replace('/', '_')}"
+
+
+def diretorio_particao(diretorio: str, colecao: str, id_dispositivo: str, dia: datetime.date) -> Path:
+    return Path(diretorio, colecao, _nome_particao("id_dispositivo", id_dispositivo), f"dia={dia.isoformat()}")
+
+
+def _coluna(valores: list):
+    """float64 se todos os valores forem números (ou nulos); senão texto."""
+    if all(v is None or (isinstance(v, (int, float)) and not isinstance(v, bool)) for v in valores):
+        return pa.array(valores, type=pa.float64())
+    return pa.array([None if v is None else str(v) for v in valores], type=pa.string())
+
+
+def montar_tabela(documentos: list[dict]):
+    """Tabela Arrow com 'timestamp' (UTC, ms), 'id_dispositivo' e as demais colunas."""
+    _exigir_pyarrow()
+    nomes = []
+    for documento in documentos:
+        for campo in documento:
+            if campo not in CAMPOS_IGNORADOS and campo not in nomes:
+                nomes.append(campo)
+
+    colunas = {}
+    for nome in nomes:
+        valores = [documento.get(nome) for documento in documentos]
+        if nome == "timestamp":
+            # Datas do MongoDB chegam sem fuso, já em UTC
+            valores = [v.replace(tzinfo=datetime.timezone.utc) if v.tzinfo is None else v for v in valores]
+            colunas[nome] = pa.array(valores, type=pa.timestamp("ms", tz="UTC"))
+        elif nome == "id_dispositivo":
+            colunas[nome] = pa.array([None if v is None else str(v) for v in valores], type=pa.string())
+        else:
+            colunas[nome] = _coluna(valores)
+    return pa.table(colunas)
+
+
+def _sem_duplicatas(tabela):
+    """Remove linhas repetidas (todas as colunas iguais) e ordena por timestamp."""
+    return tabela.group_by(tabela.column_names, use_threads=False).aggregate([]).sort_by("timestamp")
+
+
+def escrever_particao(diretorio: str, colecao: str, id_dispositivo: str, dia: datetime.date,
+                      documentos: list[dict], linhas_por_grupo: int = 10_000) -> Path:
+    """
+    Grava as leituras de um dispositivo em um dia, juntando-as às que a
+    partição já tem: leituras atrasadas de um dia já arquivado entram no
+    arquivo em vez de substituí-lo, e arquivar de novo as mesmas leituras
+    (ex.: após uma falha antes de apagar do banco) não as duplica.
+    A gravação usa um arquivo temporário + rename.
+    """
+    _exigir_pyarrow()
+    tabela = montar_tabela(documentos)
+    pasta = diretorio_particao(diretorio, colecao, id_dispositivo, dia)
+    pasta.mkdir(parents=True, exist_ok=True)
+    caminho = pasta / "leituras.parquet"
+    # Inclui os arquivos 'leituras-<ms>.parquet' do formato anterior (um por rodada)
+    existentes = sorted(pasta.glob("*.parquet"))
+    if existentes:
+        partes = [pq.read_table(arquivo) for arquivo in existentes] + [tabela]
+        tabela = pa.concat_tables(partes, promote_options="permissive")
+    tabela = _sem_duplicatas(tabela)
+    temporario = caminho.with_suffix(".parquet.tmp")
+
+    pq.write_table(tabela, temporario, compression="zstd", row_group_size=linhas_por_grupo)
+    with open(temporario, "rb") as arquivo:
+        os.fsync(arquivo.fileno())
+    os.replace(temporario, caminho)
+    for arquivo in existentes:
+        if arquivo != caminho:
+            arquivo.unlink()
+    return caminho
+
+
+def _valor_particao(nome: str) -> str:
+    return nome.split("=", 1)[1] if "=" in nome else nome
+
+
+def listar_arquivos(diretorio: str, colecao: str, inicio: datetime.datetime | None = None,
+                    fim: datetime.datetime | None = None, id_dispositivo: str | None = None) -> list[Path]:
+    """Arquivos das partições que podem ter leituras em [inicio, fim), pelo nome das pastas."""
+    raiz = Path(diretorio, colecao)
+    if not raiz.is_dir():
+        return []
+    dia_inicio = inicio.date() if inicio else None
+    dia_fim = fim.date() if fim else None
+
+    arquivos = []
+    for pasta_dispositivo in sorted(raiz.iterdir()):
+        if id_dispositivo is not None and pasta_dispositivo.name != _nome_particao("id_dispositivo", id_dispositivo):
+            continue
+        for pasta_dia in sorted(pasta_dispositivo.glob("dia=*")):
+            try:
+                dia = datetime.date.fromisoformat(_valor_particao(pasta_dia.name))
+            except ValueError:
+                continue
+            if (dia_inicio and dia < dia_inicio) or (dia_fim and dia > dia_fim):
+                continue
+            arquivos.extend(sorted(pasta_dia.glob("*.parquet")))
+    return arquivos
+
+
+def primeiro_dia(diretorio: str, colecao: str) -> datetime.date | None:
+    """Dia mais antigo arquivado (pelo nome das pastas, sem abrir arquivos)."""
+    dias = []
+    for pasta_dia in Path(diretorio, colecao).glob("*/dia=*"):
+        try:
+            dias.append(datetime.date.fromisoformat(_valor_particao(pasta_dia.name)))
+        except ValueError:
+            continue
+    return min(dias) if dias else None
+
+
+def _utc(momento: datetime.datetime) -> datetime.datetime:
+    return momento.replace(tzinfo=datetime.timezone.utc) if momento.tzinfo is None else momento
+
+
+def ler_arquivo(diretorio: str, colecao: str, inicio: datetime.datetime | None = None,
+                fim: datetime.datetime | None = None, id_dispositivo: str | None = None,
+                colunas: list[str] | None = None):
+    """
+    Leituras arquivadas em [inicio, fim) como tabela Arrow ordenada por timestamp.
+    Datas sem fuso são tratadas como UTC. Com 'colunas', lê só elas (além de
+    'timestamp' e 'id_dispositivo'); colunas ausentes em um arquivo viram nulos.
+    """
+    _exigir_pyarrow()
+    partes = []
+    for caminho in listar_arquivos(diretorio, colecao, inicio, fim, id_dispositivo):
+        disponiveis = pq.read_schema(caminho, memory_map=True).names
+        selecionadas = None
+        if colunas is not None:
+            selecionadas = [c for c in ["timestamp", "id_dispositivo", *colunas] if c in disponiveis]
+        tabela = pq.read_table(caminho, columns=selecionadas, memory_map=True)
+
+        filtro = None
+        if inicio is not None:
+            filtro = pc.greater_equal(tabela["timestamp"], pa.scalar(_utc(inicio), type=tabela["timestamp"].type))
+        if fim is not None:
+            antes_do_fim = pc.less(tabela["timestamp"], pa.scalar(_utc(fim), type=tabela["timestamp"].type))
+            filtro = antes_do_fim if filtro is None else pc.and_(filtro, antes_do_fim)
+        partes.append(tabela if filtro is None else tabela.filter(filtro))
+
+    if not partes:
+        return pa.table({"timestamp": pa.array([], type=pa.timestamp("ms", tz="UTC"))})
+    tabela = pa.concat_tables(partes, promote_options="default")
+    return tabela.sort_by("timestamp")
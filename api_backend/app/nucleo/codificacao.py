@@ -0,0 +1,189 @@
+"""
+Decodificação dos corpos de requisição aceitos na ingestão de leituras.
+
+Formatos (pelo Content-Type):
+- application/json
+- application/msgpack (ou application/x-msgpack), se o pacote 'msgpack' estiver instalado
+- application/cbor, se o pacote 'cbor2' estiver instalado
+
+Qualquer um deles pode vir comprimido com Content-Encoding: gzip.
+
+O formato compacto de lote usa o subtipo 'vnd.horta.compacto' com o
+sufixo da serialização (ex: application/vnd.horta.compacto+msgpack):
+
+    [id_dispositivo, timestamp_base, [[delta_s, umidade, ph_solo, ...], ...]]
+
+'timestamp_base' é um epoch Unix em segundos (UTC) e cada linha traz o
+deslocamento em segundos seguido das métricas na ordem de METRICAS.
+Métricas ausentes podem ser null ou omitidas no fim da linha.
+
+Mensagens sem cabeçalhos (ex.: quadros do WebSocket de ingestão) usam
+decodificar_mensagem e codificar, com a serialização escolhida na conexão.
+"""
+import datetime
+import json
+import zlib
+
+from app.modelos.esquemas import METRICAS
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+SUBTIPO_COMPACTO = "vnd.horta.compacto"
+SERIALIZACOES = ("json", "msgpack", "cbor")
+
+
+class FormatoNaoSuportadoError(Exception):
+    """Content-Type ou Content-Encoding que a API não sabe (ou não pode) decodificar."""
+    pass
+
+
+class CorpoInvalidoError(Exception):
+    """O corpo não pôde ser lido no formato informado."""
+    pass
+
+
+class CorpoMuitoGrandeError(CorpoInvalidoError):
+    """O corpo (já descomprimido) passa do limite configurado."""
+    pass
+
+
+def _descomprimir_gzip(corpo: bytes, max_bytes: int) -> bytes:
+    """Descomprime gzip sem deixar o resultado passar de 'max_bytes'."""
+    descompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        dados = descompressor.decompress(corpo, max_bytes)
+    except zlib.error as e:
+        raise CorpoInvalidoError(f"Corpo gzip inválido: {e}")
+    if descompressor.unconsumed_tail:
+        raise CorpoMuitoGrandeError(f"Corpo descomprimido maior que o limite de {max_bytes} bytes.")
+    return dados
+
+
+def _tipo_e_formato(content_type: str | None) -> tuple[str, bool]:
+    """
+    Retorna a serialização ('json', 'msgpack' ou 'cbor') e se o corpo
+    está no formato compacto.
+    """
+    tipo = (content_type or "application/json").split(";", 1)[0].strip().lower()
+    principal, _, subtipo = tipo.partition("/")
+    if principal != "application":
+        raise FormatoNaoSuportadoError(f"Content-Type não suportado: {tipo}")
+
+    compacto = subtipo == SUBTIPO_COMPACTO or subtipo.startswith(SUBTIPO_COMPACTO + "+")
+    if compacto:
+        subtipo = subtipo[len(SUBTIPO_COMPACTO) + 1:] or "json"
+    subtipo = subtipo.removeprefix("x-")
+
+    if subtipo in ("json", "msgpack", "cbor"):
+        return subtipo, compacto
+    raise FormatoNaoSuportadoError(f"Content-Type não suportado: {tipo}")
+
+
+def _desserializar(corpo: bytes, serializacao: str):
+    if serializacao == "json":
+        try:
+            return json.loads(corpo)
+        except ValueError as e:
+            raise CorpoInvalidoError(f"JSON inválido: {e}")
+
+    if serializacao == "msgpack":
+        if msgpack is None:
+            raise FormatoNaoSuportadoError("MessagePack indisponível: instale o pacote 'msgpack'.")
+        try:
+            # timestamp=3: o tipo Timestamp do MessagePack vira datetime (UTC)
+            return msgpack.unpackb(corpo, raw=False, timestamp=3)
+        except Exception as e:
+            raise CorpoInvalidoError(f"MessagePack inválido: {e}")
+
+    if cbor2 is None:
+        raise FormatoNaoSuportadoError("CBOR indisponível: instale o pacote 'cbor2'.")
+    try:
+        return cbor2.loads(corpo)
+    except Exception as e:
+        raise CorpoInvalidoError(f"CBOR inválido: {e}")
+
+
+def expandir_compacto(dados) -> list[dict]:
+    """
+    Converte [id, timestamp_base, [[delta_s, m1, m2, ...], ...]] na lista
+    de leituras (dicts) usada pelo endpoint de lote.
+    """
+    if not isinstance(dados, (list, tuple)) or len(dados) != 3:
+        raise CorpoInvalidoError("Formato compacto deve ser [id_dispositivo, timestamp_base, linhas].")
+    id_dispositivo, base, linhas = dados
+    if not isinstance(id_dispositivo, str) or not isinstance(base, (int, float)) or not isinstance(linhas, (list, tuple)):
+        raise CorpoInvalidoError("Formato compacto deve ser [id_dispositivo, timestamp_base, linhas].")
+
+    leituras = []
+    for indice, linha in enumerate(linhas):
+        if not isinstance(linha, (list, tuple)) or not linha or len(linha) > len(METRICAS) + 1:
+            raise CorpoInvalidoError(f"Linha {indice} do formato compacto inválida.")
+        try:
+            momento = datetime.datetime.fromtimestamp(base + linha[0], datetime.timezone.utc)
+        except (TypeError, ValueError, OverflowError, OSError):
+            raise CorpoInvalidoError(f"Linha {indice}: deslocamento de tempo inválido.")
+        leitura = {"id_dispositivo": id_dispositivo, "timestamp": momento}
+        for metrica, valor in zip(METRICAS, linha[1:]):
+            if valor is not None:
+                leitura[metrica] = valor
+        leituras.append(leitura)
+    return leituras
+
+
+def decodificar_corpo(corpo: bytes, content_type: str | None, content_encoding: str | None, max_bytes: int):
+    """
+    Decodifica o corpo conforme os cabeçalhos. O formato compacto é
+    expandido para a lista de leituras equivalente.
+
+    Levanta FormatoNaoSuportadoError (HTTP 415), CorpoMuitoGrandeError (HTTP 413)
+    ou CorpoInvalidoError (HTTP 400).
+    """
+    codificacao = (content_encoding or "identity").strip().lower()
+    if codificacao == "gzip":
+        corpo = _descomprimir_gzip(corpo, max_bytes)
+    elif codificacao != "identity":
+        raise FormatoNaoSuportadoError(f"Content-Encoding não suportado: {codificacao}")
+    elif len(corpo) > max_bytes:
+        raise CorpoMuitoGrandeError(f"Corpo maior que o limite de {max_bytes} bytes.")
+
+    serializacao, compacto = _tipo_e_formato(content_type)
+    dados = _desserializar(corpo, serializacao)
+    return expandir_compacto(dados) if compacto else dados
+
+
+def serializacao_disponivel(serializacao: str) -> bool:
+    """Se a serialização é conhecida e o pacote dela está instalado."""
+    if serializacao == "msgpack":
+        return msgpack is not None
+    if serializacao == "cbor":
+        return cbor2 is not None
+    return serializacao == "json"
+
+
+def decodificar_mensagem(mensagem: bytes | str, serializacao: str, max_bytes: int):
+    """
+    Decodifica uma mensagem sem cabeçalhos. Mensagens de texto são sempre JSON;
+    as binárias usam a serialização informada.
+    """
+    if isinstance(mensagem, str):
+        mensagem, serializacao = mensagem.encode(), "json"
+    if len(mensagem) > max_bytes:
+        raise CorpoMuitoGrandeError(f"Mensagem maior que o limite de {max_bytes} bytes.")
+    return _desserializar(mensagem, serializacao)
+
+
+def codificar(dados, serializacao: str) -> bytes:
+    """Serializa 'dados' (tipos simples) em JSON, MessagePack ou CBOR."""
+    if serializacao == "msgpack":
+        return msgpack.packb(dados)
+    if serializacao == "cbor":
+        return cbor2.dumps(dados)
+    return json.dumps(dados, ensure_ascii=False, separators=(",", ":")).encode()
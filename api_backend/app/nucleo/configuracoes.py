@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import Optional
+from typing import Literal, Optional
 
 class Settings(BaseSettings):
     """
@@ -9,12 +9,170 @@ class Settings(BaseSettings):
     # Carrega as variáveis de um arquivo .env
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
 
+    # --- Perfil da API ---
+    # "completo": todas as rotas e serviços. "ingestao": só as rotas de
+    # /dados-sensores (sem chatbot, Telegram, alertas, regras e retenção),
+    # para réplicas de ingestão que precisam subir rápido
+    PERFIL_API: Literal["completo", "ingestao"] = "completo"
+    # Tempo máximo (s) do ping no MongoDB feito pela verificação de prontidão
+    SAUDE_TIMEOUT_PING_S: float = 1.0
+
     # --- Variáveis do Banco de Dados (Eduardo) ---
     MONGODB_URI: str
+    # Tamanho do pool de conexões do driver assíncrono (Motor)
+    MONGODB_MAX_POOL_SIZE: int = 100
+    MONGODB_MIN_POOL_SIZE: int = 0
+    # Tempo máximo (ms) para encontrar o servidor antes de falhar
+    MONGODB_TIMEOUT_SELECAO_MS: int = 5000
+    # Espera (s) entre tentativas de reconexão quando o banco está fora
+    MONGODB_RECONEXAO_INTERVALO_S: float = 5.0
+    MONGODB_RECONEXAO_INTERVALO_MAX_S: float = 60.0
+    # Cria 'dados_reais' como coleção de série temporal na inicialização
+    MONGODB_SERIE_TEMPORAL: bool = True
+    # Intervalo típico entre leituras de um dispositivo: "seconds", "minutes" ou "hours"
+    MONGODB_SERIE_GRANULARIDADE: Literal["seconds", "minutes", "hours"] = "minutes"
+    # Grava só timestamp, dispositivo e métricas (data, hora, dia, mes, ano e
+    # hora_simples ficam na visão 'dados_reais_bi', calculados na leitura)
+    ARMAZENAMENTO_COMPACTO: bool = False
+
+    # --- Ingestão em Lote ---
+    # Quantidade máxima de leituras aceitas em um único POST /dados-sensores/lote
+    LOTE_MAX_ITENS: int = 500
+    # Tamanho máximo do corpo das rotas de ingestão, já descomprimido (bytes)
+    INGESTAO_MAX_BYTES: int = 1_048_576
+    # A cada quantos segundos cada worker verifica se um comando de manutenção
+    # (migrar_serie_temporal, compactar_leituras) pausou a ingestão
+    PAUSA_VERIFICACAO_S: float = 2.0
+
+    # --- Ingestão por WebSocket ---
+    # Conexões abertas ao mesmo tempo em cada worker; as excedentes são recusadas
+    WS_MAX_CONEXOES: int = 5000
+    # Fecha a conexão após esse tempo (s) sem nenhuma mensagem (0 desliga)
+    WS_TEMPO_OCIOSO_S: float = 900.0
+
+    # --- Stream de Telemetria (SSE) ---
+    # Assinantes conectados ao mesmo tempo em cada worker
+    STREAM_MAX_ASSINANTES: int = 1000
+    # Leituras aguardando em cada assinante; se encher, o assinante é desligado
+    STREAM_CAPACIDADE_ASSINANTE: int = 256
+    # Comentário enviado a cada N segundos sem leituras, para manter a conexão viva
+    STREAM_INTERVALO_PING_S: float = 15.0
+
+    # --- Retenção e Arquivo Frio ---
+    # Arquiva em Parquet e apaga do banco as leituras mais antigas que a janela quente
+    RETENCAO_ATIVA: bool = False
+    RETENCAO_DIAS_QUENTES: int = 90
+    RETENCAO_INTERVALO_H: float = 24.0
+    RETENCAO_DIRETORIO: str = "arquivo_frio"
+    RETENCAO_COLECOES: list[str] = ["dados_reais", "dados_sinteticos"]
+    # Leituras buscadas por vez no banco (também é o tamanho dos row groups)
+    RETENCAO_LOTE: int = 5000
+
+    # --- Buffer de Escrita (group commit) ---
+    # Se ativo, salvar_dados_sensor apenas enfileira e responde na hora
+    BUFFER_ESCRITA_ATIVO: bool = False
+    # Grava a cada N documentos ou a cada M milissegundos, o que vier primeiro
+    BUFFER_TAMANHO_LOTE: int = 200
+    BUFFER_INTERVALO_MS: int = 250
+    # Quantidade máxima de documentos aguardando gravação
+    BUFFER_CAPACIDADE: int = 10000
+    # Buffer cheio: "bloquear" (espera uma vaga até o timeout) ou "rejeitar" (HTTP 503)
+    BUFFER_POLITICA_CHEIO: Literal["bloquear", "rejeitar"] = "bloquear"
+    BUFFER_TIMEOUT_BLOQUEIO_MS: int = 2000
+
+    # --- Agregados por Hora/Dia ---
+    # Atualiza agregados_hora e agregados_dia a cada gravação
+    AGREGADOS_ATIVO: bool = True
+
+    # --- Histórico para Gráficos ---
+    # Limite de pontos por série quando o cliente não informa 'max_pontos'
+    HISTORICO_MAX_PONTOS_PADRAO: int = 2000
+
+    # --- Cache de Últimas Leituras ---
+    # Idade (s) a partir da qual a última leitura de um dispositivo é marcada como desatualizada
+    CACHE_ULTIMAS_LIMITE_DESATUALIZADO_S: float = 300.0
+
+    # --- Motor de Regras e Alertas ---
+    # Avalia as faixas da cultura a cada leitura aceita
+    REGRAS_ATIVO: bool = True
+    # Janelas (s) das estatísticas por dispositivo; a primeira é a usada na avaliação
+    REGRAS_JANELAS_S: list[int] = [300, 3600]
+    # Leituras mínimas na janela antes de avaliar
+    REGRAS_MIN_AMOSTRAS: int = 3
+    # Histerese: fração da faixa adequada que a média precisa recuar para sair de um estado
+    REGRAS_HISTERESE_FRACAO: float = 0.05
+    # Intervalo mínimo (s) entre notificações da mesma métrica de um dispositivo
+    REGRAS_INTERVALO_MIN_ALERTA_S: float = 600.0
+    # Cultura de cada dispositivo (JSON, ex: {"horta-01": "Rúcula"}); os demais usam a padrão
+    REGRAS_CULTURA_PADRAO: str = "Alface Americana"
+    REGRAS_CULTURAS_POR_DISPOSITIVO: dict[str, str] = {}
+    # Dispositivos acompanhados em memória e alertas recentes guardados
+    REGRAS_MAX_DISPOSITIVOS: int = 10000
+    REGRAS_MAX_ALERTAS: int = 500
+    # Com vários workers (ESTADO_BACKEND diferente de "memoria"), cada worker lê as
+    # leituras do banco a cada REGRAS_LEITURA_INTERVALO_S, relendo os últimos
+    # REGRAS_LEITURA_MARGEM_S segundos para pegar as gravadas com atraso
+    REGRAS_LEITURA_INTERVALO_S: float = 2.0
+    REGRAS_LEITURA_MARGEM_S: float = 10.0
     
     # --- Variáveis do Chatbot (Aurélio) ---
     GOOGLE_API_KEY: Optional[str] = None
     TELEGRAM_BOT_TOKEN: Optional[str] = None
 
+    # --- Cliente LLM do Hortbot ---
+    # "gemini" usa a API do Google; "falso" responde localmente (testes/benchmarks)
+    LLM_BACKEND: Literal["gemini", "falso"] = "gemini"
+    LLM_MODELO: str = "gemini-2.0-flash"
+    # Chamadas ao modelo em andamento ao mesmo tempo; as demais aguardam na fila
+    LLM_MAX_CONCORRENTES: int = 4
+    # Tempo máximo (s) de uma resposta e de espera na fila
+    LLM_TIMEOUT_S: float = 30.0
+    LLM_TIMEOUT_FILA_S: float = 10.0
+    # Latência simulada pelo backend "falso"
+    LLM_FALSO_LATENCIA_MS: int = 200
+    # Cache das respostas da IA (primeira pergunta de cada conversa)
+    CHATBOT_CACHE_CAPACIDADE: int = 256
+    CHATBOT_CACHE_TTL_S: float = 300.0
+    # Memória das conversas: chats guardados, tempo parado até esquecer (s)
+    # e orçamento de cada conversa (turnos pergunta+resposta e tokens estimados)
+    CHATBOT_MAX_CONVERSAS: int = 1000
+    CHATBOT_CONVERSA_TTL_S: float = 6 * 3600
+    CHATBOT_MAX_TURNOS: int = 10
+    CHATBOT_MAX_TOKENS_HISTORICO: int = 4000
+
+    # --- Fila do Telegram ---
+    # URL base da Bot API (pode apontar para um servidor local nos testes)
+    TELEGRAM_API_URL: str = "https://api.telegram.org"
+    # Workers que processam as mensagens; cada chat fica sempre no mesmo worker
+    TELEGRAM_WORKERS: int = 8
+    # Mensagens aguardando em cada worker antes de começar a descartar
+    TELEGRAM_CAPACIDADE_FILA: int = 1000
+    # Limites de envio do Telegram: ~30 mensagens/s no total e ~1/s por chat
+    TELEGRAM_TAXA_GLOBAL_POR_S: float = 30.0
+    TELEGRAM_INTERVALO_POR_CHAT_S: float = 1.0
+    TELEGRAM_TENTATIVAS: int = 4
+    # Quantos update_id recentes são lembrados para ignorar reenvios do webhook
+    TELEGRAM_JANELA_DEDUP: int = 10000
+    # Por quanto tempo (s) um update_id é lembrado
+    TELEGRAM_DEDUP_TTL_S: float = 3600.0
+
+    # --- Estado Compartilhado (vários workers) ---
+    # Onde ficam o histórico das conversas, o cache de respostas e os updates já vistos:
+    # "memoria" (no processo, um worker), "sqlite" (arquivo WAL, vários workers na
+    # mesma máquina) ou "redis" (vários workers e réplicas)
+    ESTADO_BACKEND: Literal["memoria", "sqlite", "redis"] = "memoria"
+    ESTADO_SQLITE_CAMINHO: str = "estado_compartilhado.db"
+    ESTADO_REDIS_URL: str = "redis://localhost:6379/0"
+    ESTADO_REDIS_PREFIXO: str = "horta:"
+
+    # --- Métricas e Perfil ---
+    # Fração das requisições executadas sob o cProfile (0 desliga)
+    METRICAS_PERFIL_AMOSTRAGEM: float = 0.0
+    # Só salva o perfil das requisições mais lentas que isso (ms)
+    METRICAS_PERFIL_LIMITE_MS: int = 500
+    METRICAS_PERFIL_DIRETORIO: str = "perfis"
+    # Dispositivos com série própria em horta_leituras_recebidas_total; os demais somam em "outros"
+    METRICAS_MAX_DISPOSITIVOS: int = 1000
+
 # Cria uma instância única das configurações
 settings = Settings()
\ No newline at end of file
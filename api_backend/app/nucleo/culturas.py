@@ -0,0 +1,165 @@
+"""
+Tabela de referência das culturas e classificação das métricas.
+
+É a fonte única das faixas usadas pelo motor de regras, pelo dashboard e
+pelo Hortbot. As métricas usam os nomes da API (ver esquemas.METRICAS).
+
+Cada limite tem 'min' e 'max' da faixa adequada e, opcionalmente, 'ideal'
+e 'critico_min'/'critico_max', a partir dos quais o estado vira crítico.
+"""
+
+# Faixas comuns às hortaliças folhosas (condutividade e NPK)
+REFERENCIA_FOLHOSAS = {
+    "condutividade_eletrica": {"min": 1000, "max": 1800},
+    "nitrogenio": {"min": 150, "max": 200},
+    "fosforo": {"min": 60, "max": 100},
+    "potassio": {"min": 150, "max": 200},
+}
+
+CULTURAS = {
+    "Alface Americana": {
+        "icone": "🥬",
+        "descricao": "Sensível ao calor excessivo. Precisa de solo sempre úmido.",
+        "limites": {
+            "temperatura": {"min": 15, "max": 24, "ideal": 20},
+            # Acima do máximo já é risco de doenças
+            "umidade": {"min": 60, "max": 80, "ideal": 70, "critico_min": 40, "critico_max": 80},
+            "ph_solo": {"min": 6.0, "max": 7.0},
+            **REFERENCIA_FOLHOSAS,
+        },
+    },
+    "Rúcula": {
+        "icone": "🥗",
+        "descricao": "Ciclo rápido. Evitar encharcamento para não gerar fungos.",
+        "limites": {
+            "temperatura": {"min": 15, "max": 22, "ideal": 18},
+            "umidade": {"min": 50, "max": 70, "ideal": 60, "critico_min": 40, "critico_max": 70},
+            "ph_solo": {"min": 6.0, "max": 7.0},
+            **REFERENCIA_FOLHOSAS,
+        },
+    },
+    "Couve Manteiga": {
+        "icone": "🍃",
+        "descricao": "Alta exigência de nitrogênio. Resistente a variações.",
+        "limites": {
+            "temperatura": {"min": 10, "max": 28, "ideal": 22},
+            "umidade": {"min": 60, "max": 75, "ideal": 68, "critico_min": 40, "critico_max": 75},
+            "ph_solo": {"min": 6.0, "max": 7.5},
+            **REFERENCIA_FOLHOSAS,
+        },
+    },
+}
+
+CULTURA_PADRAO = "Alface Americana"
+
+NOMES_METRICAS = {
+    "umidade": ("Umidade", "%"),
+    "temperatura": ("Temperatura", "°C"),
+    "ph_solo": ("pH", ""),
+    "condutividade_eletrica": ("Condutividade (EC)", " µS/cm"),
+    "nitrogenio": ("Nitrogênio (N)", " mg/kg"),
+    "fosforo": ("Fósforo (P)", " mg/kg"),
+    "potassio": ("Potássio (K)", " mg/kg"),
+}
+
+# Manejo recomendado quando a métrica sai da faixa
+MANEJO = {
+    ("temperatura", "baixo"): "Proteger do frio (cobertura ou estufa fechada).",
+    ("temperatura", "alto"): "Sombrear e ventilar para reduzir o estresse térmico.",
+    ("umidade", "baixo"): "Aumentar a irrigação.",
+    ("umidade", "alto"): "Reduzir a irrigação: risco de doenças.",
+    ("ph_solo", "baixo"): "Aplicar calcário.",
+    ("ph_solo", "alto"): "Aplicar enxofre.",
+    ("condutividade_eletrica", "alto"): "Lavar o solo com irrigação controlada.",
+    ("nitrogenio", "baixo"): "Adubar com ureia ou esterco.",
+    ("fosforo", "baixo"): "Adubar com farinha de ossos.",
+    ("potassio", "baixo"): "Adubar com cloreto de potássio.",
+}
+
+ESTADOS_CRITICOS = ("critico_baixo", "critico_alto")
+
+
+def classificar(valor: float, limite: dict, estado_atual: str = "ok", margem: float = 0.0) -> str:
+    """
+    Estado da métrica: 'ok', 'baixo', 'alto', 'critico_baixo' ou 'critico_alto'.
+
+    Histerese: para sair de um estado, o valor precisa voltar 'margem' além do
+    limite que o fez entrar (ex.: entrou em 'baixo' abaixo de 60, só volta
+    para 'ok' acima de 60 + margem), evitando alertas a cada oscilação.
+    """
+    def abaixo(lim, estados):
+        return lim is not None and valor < (lim + margem if estado_atual in estados else lim)
+
+    def acima(lim, estados):
+        return lim is not None and valor > (lim - margem if estado_atual in estados else lim)
+
+    if abaixo(limite.get("critico_min"), ("critico_baixo",)):
+        return "critico_baixo"
+    if acima(limite.get("critico_max"), ("critico_alto",)):
+        return "critico_alto"
+    if abaixo(limite.get("min"), ("baixo", "critico_baixo")):
+        return "baixo"
+    if acima(limite.get("max"), ("alto", "critico_alto")):
+        return "alto"
+    return "ok"
+
+
+def margem_histerese(limite: dict, fracao: float) -> float:
+    """Margem da histerese como fração da largura da faixa adequada."""
+    if limite.get("min") is None or limite.get("max") is None:
+        return 0.0
+    return (limite["max"] - limite["min"]) * fracao
+
+
+def status_geral(estados: dict[str, str]) -> str:
+    """'Ideal', 'Atenção' ou 'Alerta' a partir dos estados das métricas."""
+    if any(e in ESTADOS_CRITICOS for e in estados.values()):
+        return "Alerta"
+    if any(e != "ok" for e in estados.values()):
+        return "Atenção"
+    return "Ideal"
+
+
+def descrever(metrica: str, estado: str, valor: float, limite: dict) -> str:
+    """Frase curta para o estado da métrica, com o manejo recomendado."""
+    nome, unidade = NOMES_METRICAS.get(metrica, (metrica, ""))
+    if estado == "ok":
+        return f"✅ {nome} ({valor:.1f}{unidade}) dentro da faixa."
+    direcao = "baixo" if estado.endswith("baixo") else "alto"
+    emoji = "🚨" if estado in ESTADOS_CRITICOS else "⚠️"
+    faixa = f"{limite.get('min')}-{limite.get('max')}{unidade}"
+    texto = f"{emoji} {nome} {'abaixo' if direcao == 'baixo' else 'acima'} da faixa: {valor:.1f}{unidade} (ideal {faixa})."
+    manejo = MANEJO.get((metrica, direcao))
+    return f"{texto} {manejo}" if manejo else texto
+
+
+def avaliar(valores: dict[str, float], cultura: str) -> dict:
+    """
+    Avaliação pontual (sem histerese) de um conjunto de valores, por exemplo
+    as médias de um período no dashboard.
+    """
+    limites = CULTURAS[cultura]["limites"]
+    estados, dicas = {}, []
+    for metrica, limite in limites.items():
+        valor = valores.get(metrica)
+        if valor is None or valor != valor:  # ausente ou NaN
+            continue
+        estados[metrica] = classificar(valor, limite)
+        dicas.append(descrever(metrica, estados[metrica], valor, limite))
+    return {"status": status_geral(estados), "estados": estados, "dicas": dicas}
+
+
+def texto_referencia() -> str:
+    """Tabela de referência em texto, usada nas instruções do Hortbot."""
+    linhas = []
+    for nome, cultura in CULTURAS.items():
+        linhas.append(f"- {nome}: {cultura['descricao']}")
+        for metrica, limite in cultura["limites"].items():
+            rotulo, unidade = NOMES_METRICAS.get(metrica, (metrica, ""))
+            extra = f" (abaixo de {limite['critico_min']}{unidade} = Crítico)" if "critico_min" in limite else ""
+            linhas.append(f"    {rotulo}: {limite['min']} a {limite['max']}{unidade}{extra}")
+    manejo = [
+        f"- {NOMES_METRICAS[m][0]} {'BAIXO' if d == 'baixo' else 'ALTO'}: {acao}"
+        for (m, d), acao in MANEJO.items()
+    ]
+    return "\n".join(linhas) + "\n\n=== GUIA DE MANEJO RÁPIDO ===\n" + "\n".join(manejo)
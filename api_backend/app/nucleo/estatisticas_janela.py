@@ -0,0 +1,99 @@
+"""
+Estatísticas de uma métrica em uma janela de tempo deslizante.
+
+Cada leitura entra e sai da janela uma única vez, então o custo por leitura
+é O(1) amortizado, independente do tamanho da janela:
+- média e variância pelo algoritmo de Welford (com remoção);
+- mínimo e máximo por filas monotônicas.
+As leituras precisam chegar em ordem de tempo.
+"""
+from collections import deque
+
+
+class EstatisticasJanela:
+    def __init__(self, janela_s: float):
+        self.janela_s = janela_s
+        self._valores: deque[tuple[float, float]] = deque()
+        # Candidatos a mínimo (valores crescentes) e a máximo (decrescentes)
+        self._minimos: deque[tuple[float, float]] = deque()
+        self._maximos: deque[tuple[float, float]] = deque()
+        self._media = 0.0
+        self._m2 = 0.0  # soma dos quadrados das diferenças para a média
+        self.ultimo_instante: float | None = None
+
+    def __len__(self) -> int:
+        return len(self._valores)
+
+    def adicionar(self, instante: float, valor: float):
+        """Inclui uma leitura ('instante' em segundos) e descarta as que saíram da janela."""
+        self._valores.append((instante, valor))
+        n = len(self._valores)
+        delta = valor - self._media
+        self._media += delta / n
+        self._m2 += delta * (valor - self._media)
+
+        while self._minimos and self._minimos[-1][1] >= valor:
+            self._minimos.pop()
+        self._minimos.append((instante, valor))
+        while self._maximos and self._maximos[-1][1] <= valor:
+            self._maximos.pop()
+        self._maximos.append((instante, valor))
+
+        self.ultimo_instante = instante
+        self.expirar(instante)
+
+    def expirar(self, agora: float):
+        """Remove as leituras mais antigas que 'janela_s' em relação a 'agora'."""
+        limite = agora - self.janela_s
+        while self._valores and self._valores[0][0] <= limite:
+            _, valor = self._valores.popleft()
+            n = len(self._valores)
+            if n == 0:
+                self._media = self._m2 = 0.0
+            else:
+                delta = valor - self._media
+                self._media -= delta / n
+                self._m2 -= delta * (valor - self._media)
+        while self._minimos and self._minimos[0][0] <= limite:
+            self._minimos.popleft()
+        while self._maximos and self._maximos[0][0] <= limite:
+            self._maximos.popleft()
+
+    @property
+    def media(self) -> float | None:
+        return self._media if self._valores else None
+
+    @property
+    def variancia(self) -> float | None:
+        """Variância amostral (None com menos de 2 leituras)."""
+        if len(self._valores) < 2:
+            return None
+        # Erros de arredondamento da remoção podem deixar o valor levemente negativo
+        return max(self._m2, 0.0) / (len(self._valores) - 1)
+
+    @property
+    def desvio_padrao(self) -> float | None:
+        variancia = self.variancia
+        return None if variancia is None else variancia ** 0.5
+
+    @property
+    def minimo(self) -> float | None:
+        return self._minimos[0][1] if self._minimos else None
+
+    @property
+    def maximo(self) -> float | None:
+        return self._maximos[0][1] if self._maximos else None
+
+    @property
+    def ultimo(self) -> float | None:
+        return self._valores[-1][1] if self._valores else None
+
+    def resumo(self) -> dict:
+        return {
+            "amostras": len(self._valores),
+            "media": self.media,
+            "desvio_padrao": self.desvio_padrao,
+            "minimo": self.minimo,
+            "maximo": self.maximo,
+            "ultimo": self.ultimo,
+        }
@@ -0,0 +1,325 @@
+"""
+Métricas da API no formato texto do Prometheus, sem dependências externas.
+
+As métricas são criadas uma vez (na importação do módulo que as usa) e
+atualizadas com operações baratas: um dicionário por combinação de rótulos
+e, nos histogramas, uma busca binária pelo balde.
+"""
+import bisect
+import cProfile
+import functools
+import inspect
+import io
+import os
+import pstats
+import random
+import time
+from contextlib import contextmanager
+from app.nucleo.configuracoes import settings
+
+# Valor dos rótulos das combinações que passam do limite de séries de uma métrica
+ROTULO_EXCEDENTE = "outros"
+
+# Baldes padrão (segundos), de 1 ms a 30 s
+BALDES_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _formatar_rotulos(nomes: tuple, valores: tuple, extra: str = "") -> str:
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatar_numero(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nome: str, ajuda: str, rotulos: tuple = (), max_series: int | None = None):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        # Limite de combinações de rótulos (ex.: rótulo com o id enviado pelo cliente);
+        # as novas depois do limite somam na série com todos os rótulos "outros"
+        self.max_series = max_series
+        self._valores: dict = {}
+
+    def _chave(self, rotulos: dict) -> tuple:
+        chave = tuple(rotulos.get(n, "") for n in self.rotulos)
+        if self.max_series is not None and chave not in self._valores and len(self._valores) >= self.max_series:
+            return (ROTULO_EXCEDENTE,) * len(self.rotulos)
+        return chave
+
+    def _cabecalho(self) -> list[str]:
+        return [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}"]
+
+    def exportar(self) -> list[str]:
+        linhas = self._cabecalho()
+        for chave, valor in list(self._valores.items()):
+            linhas.append(f"{self.nome}{_formatar_rotulos(self.rotulos, chave)} {_formatar_numero(valor)}")
+        return linhas
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def inc(self, valor: float = 1, **rotulos):
+        chave = self._chave(rotulos)
+        self._valores[chave] = self._valores.get(chave, 0) + valor
+
+
+class Medidor(_Metrica):
+    tipo = "gauge"
+
+    def set(self, valor: float, **rotulos):
+        self._valores[self._chave(rotulos)] = valor
+
+
+class MedidorCallback(_Metrica):
+    """
+    Medidor lido na hora da exportação. 'funcao' retorna um número ou,
+    se houver rótulos, um dict {tupla de valores dos rótulos: número}.
+    """
+    tipo = "gauge"
+
+    def __init__(self, nome: str, ajuda: str, funcao, rotulos: tuple = ()):
+        super().__init__(nome, ajuda, rotulos)
+        self.funcao = funcao
+
+    def exportar(self) -> list[str]:
+        try:
+            valores = self.funcao()
+        except Exception as e:
+            print(f"Erro ao ler a métrica '{self.nome}': {e}")
+            return []
+        if not isinstance(valores, dict):
+            valores = {(): valores}
+        linhas = self._cabecalho()
+        for chave, valor in valores.items():
+            linhas.append(f"{self.nome}{_formatar_rotulos(self.rotulos, chave)} {_formatar_numero(valor)}")
+        return linhas
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: tuple = (), baldes: tuple = BALDES_LATENCIA):
+        super().__init__(nome, ajuda, rotulos)
+        self.baldes = tuple(sorted(baldes))
+
+    def observar(self, valor: float, **rotulos):
+        chave = self._chave(rotulos)
+        serie = self._valores.get(chave)
+        if serie is None:
+            # Contagem por balde (o último é +Inf), soma e total
+            serie = self._valores[chave] = [[0] * (len(self.baldes) + 1), 0.0, 0]
+        serie[0][bisect.bisect_left(self.baldes, valor)] += 1
+        serie[1] += valor
+        serie[2] += 1
+
+    @contextmanager
+    def cronometrar(self, **rotulos):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **rotulos)
+
+    def exportar(self) -> list[str]:
+        linhas = self._cabecalho()
+        for chave, (contagens, soma, total) in list(self._valores.items()):
+            acumulado = 0
+            for limite, contagem in zip(self.baldes + (float("inf"),), contagens):
+                acumulado += contagem
+                le = f'le="{_formatar_numero(limite)}"'
+                linhas.append(f"{self.nome}_bucket{_formatar_rotulos(self.rotulos, chave, le)} {acumulado}")
+            rotulos = _formatar_rotulos(self.rotulos, chave)
+            linhas.append(f"{self.nome}_sum{rotulos} {soma}")
+            linhas.append(f"{self.nome}_count{rotulos} {total}")
+        return linhas
+
+
+class Registro:
+    """Conjunto de métricas exportadas juntas em /metrics."""
+
+    def __init__(self):
+        self._metricas: dict[str, _Metrica] = {}
+
+    def _adicionar(self, metrica: _Metrica):
+        if metrica.nome in self._metricas:
+            raise ValueError(f"Métrica '{metrica.nome}' já registrada.")
+        self._metricas[metrica.nome] = metrica
+        return metrica
+
+    def contador(self, nome: str, ajuda: str, rotulos: tuple = (), max_series: int | None = None) -> Contador:
+        return self._adicionar(Contador(nome, ajuda, rotulos, max_series))
+
+    def medidor(self, nome: str, ajuda: str, rotulos: tuple = ()) -> Medidor:
+        return self._adicionar(Medidor(nome, ajuda, rotulos))
+
+    def medidor_callback(self, nome: str, ajuda: str, funcao, rotulos: tuple = ()) -> MedidorCallback:
+        return self._adicionar(MedidorCallback(nome, ajuda, funcao, rotulos))
+
+    def histograma(self, nome: str, ajuda: str, rotulos: tuple = (), baldes: tuple = BALDES_LATENCIA) -> Histograma:
+        return self._adicionar(Histograma(nome, ajuda, rotulos, baldes))
+
+    def exportar(self) -> str:
+        linhas = []
+        for metrica in list(self._metricas.values()):
+            linhas.extend(metrica.exportar())
+        return "\n".join(linhas) + "\n"
+
+
+# Registro único da aplicação
+registro = Registro()
+
+# --- Métricas compartilhadas ---
+HTTP_LATENCIA = registro.histograma(
+    "horta_http_requisicao_segundos", "Duração das requisições HTTP por rota.", ("metodo", "rota", "status")
+)
+MONGO_LATENCIA = registro.histograma(
+    "horta_mongo_operacao_segundos", "Duração das operações no MongoDB.", ("operacao",)
+)
+MONGO_ERROS = registro.contador(
+    "horta_mongo_erros_total", "Operações no MongoDB que falharam.", ("operacao",)
+)
+ETAPA_INGESTAO = registro.histograma(
+    "horta_ingestao_etapa_segundos", "Duração de cada etapa da ingestão de leituras.", ("etapa",)
+)
+LEITURAS_RECEBIDAS = registro.contador(
+    "horta_leituras_recebidas_total", "Leituras aceitas por dispositivo.", ("id_dispositivo",),
+    max_series=settings.METRICAS_MAX_DISPOSITIVOS,
+)
+LLM_LATENCIA = registro.histograma(
+    "horta_llm_chamada_segundos", "Duração das chamadas ao modelo de linguagem.", ("resultado",)
+)
+LLM_TOKENS = registro.contador(
+    "horta_llm_tokens_total", "Tokens informados pelo modelo de linguagem.", ("tipo",)
+)
+TELEGRAM_LATENCIA = registro.histograma(
+    "horta_telegram_envio_segundos", "Duração das chamadas à API do Telegram.", ("status",)
+)
+
+
+def medir(histograma: Histograma, erros: Contador | None = None, **rotulos):
+    """
+    Decorador que registra a duração da função (síncrona ou assíncrona) no
+    histograma e, se 'erros' for informado, conta as exceções levantadas.
+    """
+    def decorador(funcao):
+        if inspect.iscoroutinefunction(funcao):
+            @functools.wraps(funcao)
+            async def envolvida(*args, **kwargs):
+                inicio = time.perf_counter()
+                try:
+                    return await funcao(*args, **kwargs)
+                except Exception:
+                    if erros is not None:
+                        erros.inc(**rotulos)
+                    raise
+                finally:
+                    histograma.observar(time.perf_counter() - inicio, **rotulos)
+        else:
+            @functools.wraps(funcao)
+            def envolvida(*args, **kwargs):
+                inicio = time.perf_counter()
+                try:
+                    return funcao(*args, **kwargs)
+                except Exception:
+                    if erros is not None:
+                        erros.inc(**rotulos)
+                    raise
+                finally:
+                    histograma.observar(time.perf_counter() - inicio, **rotulos)
+        return envolvida
+    return decorador
+
+
+@contextmanager
+def operacao_mongo(operacao: str):
+    """Mede uma operação no MongoDB e conta as falhas."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        MONGO_ERROS.inc(operacao=operacao)
+        raise
+    finally:
+        MONGO_LATENCIA.observar(time.perf_counter() - inicio, operacao=operacao)
+
+
+class MiddlewareMetricas:
+    """
+    Middleware ASGI que mede cada requisição HTTP pelo modelo da rota
+    (ex.: /api/v1/dados-sensores/ultimos), e não pela URL completa,
+    para não criar uma série por parâmetro.
+
+    Com 'perfil_amostragem' > 0, uma fração das requisições roda sob o
+    cProfile; as que passarem de 'perfil_limite_s' têm o perfil salvo em
+    'perfil_diretorio' e um resumo impresso no log. Só um perfil roda por vez,
+    e ele inclui o que outras corrotinas fizeram no mesmo intervalo.
+    """
+
+    def __init__(self, app, perfil_amostragem: float = 0.0, perfil_limite_s: float = 0.5, perfil_diretorio: str = "perfis"):
+        self.app = app
+        self.perfil_amostragem = perfil_amostragem
+        self.perfil_limite_s = perfil_limite_s
+        self.perfil_diretorio = perfil_diretorio
+        self._perfil_ativo = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_resposta = 500
+
+        async def send_com_status(mensagem):
+            nonlocal status_resposta
+            if mensagem["type"] == "http.response.start":
+                status_resposta = mensagem["status"]
+            await send(mensagem)
+
+        perfil = None
+        if self.perfil_amostragem > 0 and not self._perfil_ativo and random.random() < self.perfil_amostragem:
+            perfil = cProfile.Profile()
+            self._perfil_ativo = True
+            perfil.enable()
+
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_com_status)
+        finally:
+            duracao = time.perf_counter() - inicio
+            rota = scope.get("route")
+            if rota is not None:
+                modelo = rota.path_format
+            elif "endpoint" in scope:
+                # Rotas fixas do Starlette (ex.: /docs), que não expõem o modelo
+                modelo = scope["path"]
+            else:
+                modelo = "nao_encontrada"
+            HTTP_LATENCIA.observar(duracao, metodo=scope["method"], rota=modelo, status=status_resposta)
+            if perfil is not None:
+                perfil.disable()
+                self._perfil_ativo = False
+                if duracao >= self.perfil_limite_s:
+                    self._salvar_perfil(perfil, scope["method"], modelo, duracao)
+
+    def _salvar_perfil(self, perfil: cProfile.Profile, metodo: str, rota: str, duracao: float):
+        os.makedirs(self.perfil_diretorio, exist_ok=True)
+        nome = f"{int(time.time() * 1000)}_{metodo}_{rota.strip('/').replace('/', '_') or 'raiz'}.prof"
+        caminho = os.path.join(self.perfil_diretorio, nome)
+        perfil.dump_stats(caminho)
+        resumo = io.StringIO()
+        pstats.Stats(perfil, stream=resumo).sort_stats("cumulative").print_stats(15)
+        print(f"🐢 Requisição lenta {metodo} {rota} ({duracao * 1000:.0f} ms); perfil salvo em {caminho}\n{resumo.getvalue()}")
@@ -0,0 +1,225 @@
+import asyncio
+from typing import Awaitable, Callable
+from pymongo.errors import BulkWriteError
+from app.db.conexao_mongodb import get_db_collection
+from app.db.pausa_ingestao import exigir_ingestao_liberada
+from app.nucleo.metricas import operacao_mongo
+
+# Erros de escrita que não adianta repetir: o documento já está gravado ou é inválido
+CODIGO_DUPLICADO = 11000
+CODIGO_INVALIDO = 121
+
+
+class BufferCheioError(Exception):
+    """
+    Levantada quando o buffer está cheio e a política é rejeitar
+    (ou o tempo de espera pela vaga acabou).
+    """
+    pass
+
+
+class BufferEscrita:
+    """
+    Buffer de escrita em segundo plano (write-behind / group commit).
+
+    Os documentos entram numa fila limitada e uma tarefa de fundo os grava
+    com insert_many a cada 'tamanho_lote' documentos ou a cada 'intervalo_ms',
+    o que acontecer primeiro. O _id é gerado antes de entrar na fila. Como
+    coleções de série temporal não garantem _id único, um lote nunca é
+    regravado inteiro: depois de um BulkWriteError só voltam os documentos
+    recusados, e depois de uma falha sem resposta (ex.: timeout) os _id já
+    gravados são procurados no banco e saem do lote.
+
+    Os documentos já foram confirmados ao dispositivo, então um lote que
+    falha é regravado até o banco voltar. Enquanto isso a fila não é drenada:
+    ela enche e 'adicionar' passa a levantar BufferCheioError (HTTP 503 na
+    rota), o que faz os dispositivos segurarem as leituras. Documentos só são
+    descartados ao desligar, se o banco continuar fora.
+    """
+
+    def __init__(
+        self,
+        nome_colecao: str,
+        tamanho_lote: int,
+        intervalo_ms: int,
+        capacidade: int,
+        politica_cheio: str = "bloquear",
+        timeout_bloqueio_ms: int = 2000,
+        tentativas: int = 3,
+        espera_max_s: float = 30.0,
+        ao_gravar: Callable[[list[dict]], Awaitable[None]] | None = None,
+    ):
+        self.nome_colecao = nome_colecao
+        self.tamanho_lote = tamanho_lote
+        self.intervalo_s = intervalo_ms / 1000
+        self.capacidade = capacidade
+        self.politica_cheio = politica_cheio
+        self.timeout_bloqueio_s = timeout_bloqueio_ms / 1000
+        # Tentativas por lote ao desligar (em operação, tenta até conseguir)
+        self.tentativas = tentativas
+        self.espera_max_s = espera_max_s
+        # Chamada com os documentos efetivamente gravados (ex: atualizar agregados)
+        self.ao_gravar = ao_gravar
+
+        self.fila: asyncio.Queue | None = None
+        self._tarefa: asyncio.Task | None = None
+        # Lote retirado da fila que ainda não foi confirmado no banco
+        self._lote_atual: list[dict] = []
+
+    @property
+    def profundidade(self) -> int:
+        """Quantidade de documentos aguardando gravação."""
+        return (self.fila.qsize() if self.fila else 0) + len(self._lote_atual)
+
+    def iniciar(self):
+        """Cria a fila e a tarefa de fundo. Deve ser chamada com o loop rodando."""
+        self.fila = asyncio.Queue(maxsize=self.capacidade)
+        self._tarefa = asyncio.create_task(self._executar())
+        print(f"Buffer de escrita ativo para '{self.nome_colecao}' "
+              f"(lote={self.tamanho_lote}, intervalo={int(self.intervalo_s * 1000)}ms, capacidade={self.capacidade})")
+
+    async def adicionar(self, documento: dict):
+        """
+        Coloca um documento na fila. Se a fila estiver cheia, espera por
+        uma vaga ou levanta BufferCheioError, conforme a política configurada.
+        """
+        if self.fila is None:
+            raise BufferCheioError("O buffer de escrita não foi iniciado.")
+
+        if self.politica_cheio == "rejeitar":
+            try:
+                self.fila.put_nowait(documento)
+            except asyncio.QueueFull:
+                raise BufferCheioError("Buffer de escrita cheio.")
+            return
+
+        try:
+            await asyncio.wait_for(self.fila.put(documento), timeout=self.timeout_bloqueio_s)
+        except asyncio.TimeoutError:
+            raise BufferCheioError("Tempo esgotado aguardando vaga no buffer de escrita.")
+
+    async def _executar(self):
+        """Laço principal: junta documentos em lotes e grava no banco."""
+        while True:
+            primeiro = await self.fila.get()
+            self._lote_atual = [primeiro]
+            prazo = asyncio.get_running_loop().time() + self.intervalo_s
+
+            while len(self._lote_atual) < self.tamanho_lote:
+                restante = prazo - asyncio.get_running_loop().time()
+                if restante <= 0:
+                    break
+                try:
+                    self._lote_atual.append(await asyncio.wait_for(self.fila.get(), timeout=restante))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._gravar(self._lote_atual)
+            self._lote_atual = []
+
+    async def _gravar(self, lote: list[dict], tentativas: int | None = None) -> int:
+        """
+        Grava um lote com insert_many não ordenado, tentando novamente os
+        documentos ainda não gravados, com espera crescente. Sem 'tentativas',
+        insiste até conseguir. Retorna quantos documentos ficaram sem gravar.
+        """
+        pendentes = lote
+        # A última falha pode ter gravado parte dos pendentes sem avisar quais
+        incerto = False
+        tentativa = 0
+        while tentativas is None or tentativa < tentativas:
+            tentativa += 1
+            enviado = False
+            try:
+                # Durante a manutenção da coleção o lote espera, como com o banco fora
+                exigir_ingestao_liberada()
+                collection = get_db_collection(self.nome_colecao)
+                if incerto:
+                    pendentes = await self._sem_gravados(collection, pendentes)
+                    incerto = False
+                    if not pendentes:
+                        return 0
+                enviado = True
+                with operacao_mongo("buffer_insert_many"):
+                    await collection.insert_many(pendentes, ordered=False)
+                print(f"✅ [BUFFER] {len(pendentes)} documentos gravados em '{self.nome_colecao}'")
+                await self._notificar(pendentes)
+                return 0
+            except BulkWriteError as e:
+                falhas = {erro["index"]: erro for erro in e.details.get("writeErrors", [])}
+                await self._notificar([doc for i, doc in enumerate(pendentes) if i not in falhas])
+                rejeitados = [erro for erro in falhas.values() if erro.get("code") == CODIGO_INVALIDO]
+                if rejeitados:
+                    print(f"❌ [BUFFER] {len(rejeitados)} documentos rejeitados pelo banco: {rejeitados[0].get('errmsg')}")
+                pendentes = [
+                    pendentes[i] for i, erro in sorted(falhas.items())
+                    if erro.get("code") not in (CODIGO_DUPLICADO, CODIGO_INVALIDO)
+                ]
+                if not pendentes:
+                    return 0
+                print(f"❌ [BUFFER] {len(pendentes)} documentos recusados, regravando só eles "
+                      f"(tentativa {tentativa}): {falhas[min(falhas)].get('errmsg')}")
+            except Exception as e:
+                incerto = incerto or enviado
+                limite = tentativas if tentativas is not None else "∞"
+                print(f"❌ [BUFFER] Falha ao gravar {len(pendentes)} documentos (tentativa {tentativa}/{limite}): {e}")
+            if tentativas is None or tentativa < tentativas:
+                await asyncio.sleep(min(self.intervalo_s * 2 ** tentativa, self.espera_max_s))
+        return len(pendentes)
+
+    async def _sem_gravados(self, collection, lote: list[dict]) -> list[dict]:
+        """
+        Procura no banco os _id do lote (dentro do intervalo de tempo dele, que
+        as coleções de série temporal filtram pelos buckets). Os encontrados
+        são repassados como gravados; retorna os que faltam gravar.
+        """
+        momentos = [doc["timestamp"] for doc in lote]
+        filtro = {
+            "timestamp": {"$gte": min(momentos), "$lte": max(momentos)},
+            "_id": {"$in": [doc["_id"] for doc in lote]},
+        }
+        with operacao_mongo("buffer_conferir_lote"):
+            gravados = {doc["_id"] async for doc in collection.find(filtro, {"_id": 1})}
+        if gravados:
+            print(f"[BUFFER] {len(gravados)} documentos do lote já estavam gravados; não serão repetidos.")
+            await self._notificar([doc for doc in lote if doc["_id"] in gravados])
+        return [doc for doc in lote if doc["_id"] not in gravados]
+
+    async def _notificar(self, gravados: list[dict]):
+        """Repassa os documentos gravados para o callback 'ao_gravar'."""
+        if self.ao_gravar is None or not gravados:
+            return
+        try:
+            await self.ao_gravar(gravados)
+        except Exception as e:
+            print(f"⚠️ [BUFFER] Erro no pós-gravação: {e}")
+
+    async def encerrar(self):
+        """
+        Para a tarefa de fundo e grava tudo o que ainda está na fila.
+        Chamada pelo 'lifespan' ao desligar a API.
+        """
+        if self._tarefa is None:
+            return
+
+        self._tarefa.cancel()
+        try:
+            await self._tarefa
+        except asyncio.CancelledError:
+            pass
+        self._tarefa = None
+
+        # O lote interrompido volta para a frente da fila de drenagem
+        pendentes = self._lote_atual
+        self._lote_atual = []
+        while not self.fila.empty():
+            pendentes.append(self.fila.get_nowait())
+
+        print(f"Drenando buffer de escrita: {len(pendentes)} documentos pendentes.")
+        descartados = 0
+        for inicio in range(0, len(pendentes), self.tamanho_lote):
+            lote = pendentes[inicio:inicio + self.tamanho_lote]
+            descartados += await self._gravar(lote, self.tentativas)
+        if descartados:
+            print(f"❌ [BUFFER] {descartados} documentos descartados ao desligar: o banco não respondeu "
+                  f"após {self.tentativas} tentativas por lote.")
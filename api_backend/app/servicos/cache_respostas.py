@@ -0,0 +1,77 @@
+import asyncio
+import hashlib
+import json
+from app.servicos.estado_compartilhado import EstadoMemoria
+
+
+class CacheRespostas:
+    """
+    Cache LRU com validade (TTL) para respostas do modelo.
+
+    Pedidos simultâneos com a mesma chave são agrupados: apenas o primeiro
+    chama o modelo e os demais aguardam o mesmo resultado. Erros não são
+    guardados no cache.
+
+    Os valores ficam no estado compartilhado (ESTADO_BACKEND), então devem ser
+    serializáveis em JSON (tuplas voltam como listas). O agrupamento dos
+    pedidos simultâneos é por worker.
+    """
+
+    def __init__(self, capacidade: int, ttl_s: float, estado=None):
+        self.capacidade = capacidade
+        self.ttl_s = ttl_s
+        self.estado = estado if estado is not None else EstadoMemoria(capacidade)
+        self._em_andamento: dict[object, asyncio.Future] = {}
+        self.acertos = 0
+        self.falhas = 0
+        self.agrupados = 0
+
+    @staticmethod
+    def _chave_texto(chave) -> str:
+        """Chave do estado compartilhado: resumo da chave (ex.: tupla pergunta + telemetria)."""
+        return hashlib.sha256(json.dumps(chave, ensure_ascii=False, default=str).encode()).hexdigest()
+
+    async def obter_ou_calcular(self, chave, calcular):
+        """
+        Retorna o valor da chave, chamando 'calcular()' (corrotina) só se
+        ele não estiver no cache nem sendo calculado por outro pedido.
+        """
+        valor = await self.estado.obter(self._chave_texto(chave))
+        if valor is not None:
+            self.acertos += 1
+            return valor
+
+        pendente = self._em_andamento.get(chave)
+        if pendente is not None:
+            self.agrupados += 1
+            return await asyncio.shield(pendente)
+
+        self.falhas += 1
+        pendente = asyncio.get_running_loop().create_future()
+        self._em_andamento[chave] = pendente
+        try:
+            valor = await calcular()
+        except asyncio.CancelledError:
+            pendente.cancel()
+            raise
+        except Exception as e:
+            pendente.set_exception(e)
+            # Evita o aviso de exceção não lida quando ninguém mais aguardava
+            pendente.exception()
+            raise
+        else:
+            await self.estado.guardar(self._chave_texto(chave), valor, self.ttl_s)
+            pendente.set_result(valor)
+            return valor
+        finally:
+            del self._em_andamento[chave]
+
+    async def estatisticas(self) -> dict:
+        return {
+            "backend": self.estado.nome,
+            "itens": await self.estado.tamanho(),
+            "capacidade": self.capacidade,
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "agrupados": self.agrupados,
+        }
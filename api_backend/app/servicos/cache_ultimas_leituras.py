@@ -0,0 +1,102 @@
+import datetime
+
+
+def _como_utc(momento: datetime.datetime) -> datetime.datetime:
+    """
+    O Mongo devolve datas sem fuso (em UTC), enquanto as leituras novas
+    chegam com o fuso de Brasília. Converte tudo para UTC com fuso.
+    """
+    if momento.tzinfo is None:
+        return momento.replace(tzinfo=datetime.timezone.utc)
+    return momento.astimezone(datetime.timezone.utc)
+
+
+class CacheUltimasLeituras:
+    """
+    Guarda em memória a leitura mais recente de cada dispositivo.
+
+    É atualizado a cada gravação bem-sucedida e aquecido a partir do banco
+    quando a conexão é estabelecida, evitando uma ida ao Mongo a cada
+    mensagem do chatbot.
+    """
+
+    def __init__(self):
+        self._leituras: dict[str, dict] = {}
+        self._momentos: dict[str, datetime.datetime] = {}
+        # Fica True depois que o cache foi carregado do banco ao menos uma vez
+        self.aquecido = False
+
+    def __len__(self) -> int:
+        return len(self._leituras)
+
+    def atualizar(self, documento: dict):
+        """Guarda a leitura se ela for mais nova que a atual do dispositivo."""
+        id_dispositivo = documento.get("id_dispositivo")
+        momento = documento.get("timestamp")
+        if id_dispositivo is None or not isinstance(momento, datetime.datetime):
+            return
+
+        momento = _como_utc(momento)
+        atual = self._momentos.get(id_dispositivo)
+        if atual is not None and momento < atual:
+            # Leitura antiga reenviada em lote: não substitui a mais recente
+            return
+
+        self._leituras[id_dispositivo] = {k: v for k, v in documento.items() if k != "_id"}
+        self._momentos[id_dispositivo] = momento
+
+    def obter(self, id_dispositivo: str | None = None) -> dict | None:
+        """
+        Retorna a última leitura do dispositivo informado ou, sem dispositivo,
+        a leitura mais recente entre todos.
+        """
+        if id_dispositivo is not None:
+            return self._leituras.get(id_dispositivo)
+        if not self._momentos:
+            return None
+        mais_recente = max(self._momentos, key=self._momentos.get)
+        return self._leituras[mais_recente]
+
+    def estado(self, limite_desatualizado_s: float, id_dispositivo: str | None = None) -> list[dict]:
+        """
+        Lista as últimas leituras com a idade (em segundos) e um indicador
+        de desatualização, para o endpoint /dados-sensores/ultimos.
+        """
+        agora = datetime.datetime.now(datetime.timezone.utc)
+        dispositivos = [id_dispositivo] if id_dispositivo is not None else sorted(self._leituras)
+        estado = []
+        for dispositivo in dispositivos:
+            if dispositivo not in self._leituras:
+                continue
+            idade = (agora - self._momentos[dispositivo]).total_seconds()
+            estado.append({
+                "id_dispositivo": dispositivo,
+                "timestamp": self._momentos[dispositivo],
+                "idade_segundos": round(idade, 1),
+                "desatualizado": idade > limite_desatualizado_s,
+                "leitura": self._leituras[dispositivo],
+            })
+        return estado
+
+    async def carregar(self, collection, id_dispositivo: str | None = None) -> int:
+        """
+        Carrega do banco a leitura mais recente de cada dispositivo (ou só do
+        informado), pelo índice (id_dispositivo, timestamp). Retorna quantos vieram.
+        """
+        pipeline = [
+            {"$sort": {"id_dispositivo": 1, "timestamp": -1}},
+            {"$group": {"_id": "$id_dispositivo", "documento": {"$first": "$$ROOT"}}},
+        ]
+        if id_dispositivo is not None:
+            pipeline.insert(0, {"$match": {"id_dispositivo": id_dispositivo}})
+        quantidade = 0
+        async for item in collection.aggregate(pipeline):
+            self.atualizar(item["documento"])
+            quantidade += 1
+        return quantidade
+
+    async def aquecer(self, collection):
+        """Carrega do banco a leitura mais recente de cada dispositivo."""
+        quantidade = await self.carregar(collection)
+        self.aquecido = True
+        print(f"Cache de últimas leituras aquecido: {quantidade} dispositivos.")
@@ -0,0 +1,178 @@
+import asyncio
+import time
+from app.nucleo.configuracoes import settings
+from app.nucleo import metricas
+from app.nucleo.metricas import LLM_LATENCIA, LLM_TOKENS
+
+
+class LLMIndisponivelError(Exception):
+    """
+    Levantada quando o modelo não responde a tempo, a fila de espera
+    estoura ou o backend não está configurado.
+    """
+    pass
+
+
+class ClienteLLM:
+    """
+    Base dos clientes de LLM do Hortbot.
+
+    Controla quantas chamadas ficam em andamento ao mesmo tempo (as demais
+    aguardam numa fila com tempo limite) e o tempo máximo de cada resposta.
+    As subclasses implementam apenas '_conversar'.
+
+    O histórico é uma lista de dicts no formato {"role": ..., "parts": [texto]}.
+    A 'instrucao_sistema' é configurada uma vez no modelo e não entra no histórico.
+    """
+
+    def __init__(self, max_concorrentes: int, timeout_s: float, timeout_fila_s: float, instrucao_sistema: str | None = None):
+        self.max_concorrentes = max_concorrentes
+        self.timeout_s = timeout_s
+        self.timeout_fila_s = timeout_fila_s
+        self.instrucao_sistema = instrucao_sistema
+        self._semaforo = asyncio.Semaphore(max_concorrentes)
+        self.em_andamento = 0
+        self.na_fila = 0
+        # Contabilidade de tokens (valores informados pelo modelo)
+        self.chamadas = 0
+        self.tokens_entrada = 0
+        self.tokens_saida = 0
+
+    async def conversar(self, historico: list[dict], mensagem: str) -> tuple[str, list[dict]]:
+        """
+        Envia a mensagem com o histórico e retorna (texto da resposta, novo histórico).
+        """
+        self.na_fila += 1
+        try:
+            await asyncio.wait_for(self._semaforo.acquire(), timeout=self.timeout_fila_s)
+        except asyncio.TimeoutError:
+            raise LLMIndisponivelError("Muitas perguntas ao mesmo tempo; fila de espera esgotada.")
+        finally:
+            self.na_fila -= 1
+
+        self.em_andamento += 1
+        resultado = "erro"
+        inicio = time.perf_counter()
+        try:
+            texto, novo_historico, (entrada, saida) = await asyncio.wait_for(
+                self._conversar(historico, mensagem), timeout=self.timeout_s
+            )
+            resultado = "ok"
+            self._registrar_uso(entrada, saida)
+            return texto, novo_historico
+        except asyncio.TimeoutError:
+            resultado = "timeout"
+            raise LLMIndisponivelError(f"O modelo não respondeu em {self.timeout_s:.0f}s.")
+        finally:
+            LLM_LATENCIA.observar(time.perf_counter() - inicio, resultado=resultado)
+            self.em_andamento -= 1
+            self._semaforo.release()
+
+    def _registrar_uso(self, entrada: int, saida: int):
+        self.chamadas += 1
+        self.tokens_entrada += entrada
+        self.tokens_saida += saida
+        LLM_TOKENS.inc(entrada, tipo="entrada")
+        LLM_TOKENS.inc(saida, tipo="saida")
+        print(f"[LLM] Tokens: entrada={entrada} saída={saida} (total: {self.tokens_entrada}/{self.tokens_saida} em {self.chamadas} chamadas)")
+
+    def estatisticas(self) -> dict:
+        return {
+            "chamadas": self.chamadas,
+            "tokens_entrada": self.tokens_entrada,
+            "tokens_saida": self.tokens_saida,
+            "media_tokens_entrada": round(self.tokens_entrada / self.chamadas, 1) if self.chamadas else 0,
+            "em_andamento": self.em_andamento,
+            "na_fila": self.na_fila,
+        }
+
+    async def _conversar(self, historico: list[dict], mensagem: str) -> tuple[str, list[dict], tuple[int, int]]:
+        """Retorna (texto, novo histórico, (tokens de entrada, tokens de saída))."""
+        raise NotImplementedError
+
+
+class ClienteGemini(ClienteLLM):
+    """
+    Cliente do Google Gemini. O modelo é criado uma única vez e as
+    respostas usam a API assíncrona, sem travar o loop de eventos.
+    """
+
+    def __init__(self, api_key: str, modelo: str, **kwargs):
+        super().__init__(**kwargs)
+        # Importado só aqui: o SDK do Google é pesado e só o chatbot precisa dele
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        self._modelo = genai.GenerativeModel(modelo, system_instruction=self.instrucao_sistema)
+
+    async def _conversar(self, historico: list[dict], mensagem: str) -> tuple[str, list[dict], tuple[int, int]]:
+        chat = self._modelo.start_chat(history=historico)
+        response = await chat.send_message_async(mensagem)
+        novo_historico = [
+            {"role": conteudo.role, "parts": [parte.text for parte in conteudo.parts]}
+            for conteudo in chat.history
+        ]
+        uso = response.usage_metadata
+        return response.text, novo_historico, (uso.prompt_token_count, uso.candidates_token_count)
+
+
+class ClienteLLMFalso(ClienteLLM):
+    """
+    Backend local para testes e benchmarks: responde após uma latência
+    fixa, sem acessar a internet nem gastar cota.
+    """
+
+    def __init__(self, latencia_ms: int = 200, **kwargs):
+        super().__init__(**kwargs)
+        self.latencia_s = latencia_ms / 1000
+
+    async def _conversar(self, historico: list[dict], mensagem: str) -> tuple[str, list[dict], tuple[int, int]]:
+        await asyncio.sleep(self.latencia_s)
+        pergunta = mensagem.strip().splitlines()[-1] if mensagem.strip() else ""
+        texto = f"🌿 [Hortbot simulado] Recebi: {pergunta[:200]}"
+        novo_historico = historico + [
+            {"role": "user", "parts": [mensagem]},
+            {"role": "model", "parts": [texto]},
+        ]
+        # Estimativa de ~4 caracteres por token, como o modelo contaria a entrada
+        entrada = len(self.instrucao_sistema or "") + sum(len(p) for m in historico for p in m["parts"]) + len(mensagem)
+        return texto, novo_historico, (entrada // 4, len(texto) // 4)
+
+
+# Instância única, criada no primeiro uso
+_cliente: ClienteLLM | None = None
+
+metricas.registro.medidor_callback(
+    "horta_llm_fila", "Chamadas ao modelo em andamento e aguardando vaga.",
+    lambda: {
+        ("em_andamento",): _cliente.em_andamento if _cliente else 0,
+        ("na_fila",): _cliente.na_fila if _cliente else 0,
+    },
+    rotulos=("estado",),
+)
+
+def obter_cliente_llm(instrucao_sistema: str | None = None) -> ClienteLLM:
+    """
+    Retorna o cliente configurado em LLM_BACKEND ("gemini" ou "falso").
+    A instrução de sistema só é usada na primeira chamada, que cria o cliente.
+    """
+    global _cliente
+    if _cliente is not None:
+        return _cliente
+
+    limites = {
+        "max_concorrentes": settings.LLM_MAX_CONCORRENTES,
+        "timeout_s": settings.LLM_TIMEOUT_S,
+        "timeout_fila_s": settings.LLM_TIMEOUT_FILA_S,
+        "instrucao_sistema": instrucao_sistema,
+    }
+    if settings.LLM_BACKEND == "falso":
+        _cliente = ClienteLLMFalso(latencia_ms=settings.LLM_FALSO_LATENCIA_MS, **limites)
+    else:
+        if not settings.GOOGLE_API_KEY:
+            raise LLMIndisponivelError("Chave API ausente.")
+        _cliente = ClienteGemini(settings.GOOGLE_API_KEY, settings.LLM_MODELO, **limites)
+    return _cliente
+
+def estatisticas_llm() -> dict | None:
+    """Uso de tokens e fila do cliente, ou None se ele ainda não foi criado."""
+    return _cliente.estatisticas() if _cliente is not None else None
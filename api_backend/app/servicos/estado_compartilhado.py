@@ -0,0 +1,309 @@
+"""
+Estado compartilhado entre os workers da API: histórico das conversas,
+cache de respostas da IA e updates do Telegram já recebidos.
+
+Backends (ESTADO_BACKEND):
+- "memoria": dicionário no próprio processo (padrão; só para um worker).
+- "sqlite": arquivo local em modo WAL, para vários workers na mesma máquina.
+- "redis": servidor Redis (ou compatível), para vários workers e réplicas.
+  Requer o pacote 'redis'.
+
+Os valores precisam ser serializáveis em JSON (listas, dicionários, textos e
+números). Cada consumidor usa um 'espaco' próprio, que prefixa as chaves.
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from app.nucleo.configuracoes import settings
+
+
+class EstadoIndisponivelError(RuntimeError):
+    """O backend configurado não pode ser usado (ex.: pacote 'redis' ausente)."""
+    pass
+
+
+class EstadoMemoria:
+    """
+    Chaves com validade em um OrderedDict do processo, limitado a
+    'capacidade' itens (o menos usado sai primeiro).
+    """
+    nome = "memoria"
+
+    def __init__(self, capacidade: int):
+        self.capacidade = capacidade
+        # chave -> (expira em, valor), do menos para o mais recente
+        self._itens: OrderedDict = OrderedDict()
+        self.removidas_lru = 0
+        self.removidas_ttl = 0
+
+    def _expirar(self):
+        agora = time.monotonic()
+        # Só olha o início: as chaves menos usadas costumam ser as que expiram primeiro
+        while self._itens:
+            chave, (expira_em, _) = next(iter(self._itens.items()))
+            if expira_em >= agora:
+                break
+            del self._itens[chave]
+            self.removidas_ttl += 1
+
+    def _vivo(self, chave):
+        item = self._itens.get(chave)
+        if item is None:
+            return None
+        if item[0] < time.monotonic():
+            del self._itens[chave]
+            self.removidas_ttl += 1
+            return None
+        return item
+
+    async def obter(self, chave: str):
+        item = self._vivo(chave)
+        if item is None:
+            return None
+        self._itens.move_to_end(chave)
+        return item[1]
+
+    async def guardar(self, chave: str, valor, ttl_s: float):
+        self._itens[chave] = (time.monotonic() + ttl_s, valor)
+        self._itens.move_to_end(chave)
+        self._expirar()
+        while len(self._itens) > self.capacidade:
+            self._itens.popitem(last=False)
+            self.removidas_lru += 1
+
+    async def adicionar_se_ausente(self, chave: str, ttl_s: float) -> bool:
+        """Grava a chave só se ela não existir. Retorna False se já existia."""
+        if self._vivo(chave) is not None:
+            return False
+        await self.guardar(chave, True, ttl_s)
+        return True
+
+    async def apagar(self, chave: str):
+        self._itens.pop(chave, None)
+
+    async def tamanho(self) -> int:
+        self._expirar()
+        return len(self._itens)
+
+    def valores(self) -> list:
+        self._expirar()
+        return [valor for _, valor in self._itens.values()]
+
+    def estatisticas(self) -> dict:
+        return {"removidas_lru": self.removidas_lru, "removidas_ttl": self.removidas_ttl}
+
+
+class _ConexaoSQLite:
+    """Conexão única do processo com o arquivo, aberta no primeiro uso."""
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._conexao: sqlite3.Connection | None = None
+        self.lock = threading.Lock()
+
+    def obter(self) -> sqlite3.Connection:
+        if self._conexao is None:
+            conexao = sqlite3.connect(self.caminho, timeout=5.0, isolation_level=None, check_same_thread=False)
+            # WAL: leitores não esperam o escritor; vários processos no mesmo arquivo
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute("PRAGMA synchronous=NORMAL")
+            conexao.execute(
+                "CREATE TABLE IF NOT EXISTS estado ("
+                " chave TEXT PRIMARY KEY, valor TEXT NOT NULL, expira_em REAL NOT NULL, usado_em REAL NOT NULL)"
+            )
+            conexao.execute("CREATE INDEX IF NOT EXISTS estado_expira_em ON estado (expira_em)")
+            self._conexao = conexao
+        return self._conexao
+
+    def fechar(self):
+        if self._conexao is not None:
+            self._conexao.close()
+            self._conexao = None
+
+
+class EstadoSQLite:
+    """
+    Chaves com validade em uma tabela SQLite (modo WAL), compartilhada pelos
+    processos da máquina. As operações são consultas por chave primária, curtas
+    o bastante para rodar direto no event loop. A cada 'intervalo_limpeza'
+    gravações, apaga as chaves vencidas e as menos usadas além da 'capacidade'.
+    """
+    nome = "sqlite"
+
+    def __init__(self, conexao: _ConexaoSQLite, espaco: str, capacidade: int, intervalo_limpeza: int = 256):
+        self._conexao = conexao
+        self.prefixo = f"{espaco}:"
+        self.capacidade = capacidade
+        self.intervalo_limpeza = intervalo_limpeza
+        self._gravacoes = 0
+
+    def _executar(self, sql: str, parametros=()) -> sqlite3.Cursor:
+        with self._conexao.lock:
+            return self._conexao.obter().execute(sql, parametros)
+
+    async def obter(self, chave: str):
+        agora = time.time()
+        with self._conexao.lock:
+            conexao = self._conexao.obter()
+            linha = conexao.execute(
+                "SELECT valor FROM estado WHERE chave = ? AND expira_em > ?", (self.prefixo + chave, agora)
+            ).fetchone()
+            if linha is not None:
+                conexao.execute("UPDATE estado SET usado_em = ? WHERE chave = ?", (agora, self.prefixo + chave))
+        return None if linha is None else json.loads(linha[0])
+
+    async def guardar(self, chave: str, valor, ttl_s: float):
+        agora = time.time()
+        self._executar(
+            "INSERT INTO estado (chave, valor, expira_em, usado_em) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (chave) DO UPDATE SET valor = excluded.valor, expira_em = excluded.expira_em, "
+            "usado_em = excluded.usado_em",
+            (self.prefixo + chave, json.dumps(valor), agora + ttl_s, agora),
+        )
+        self._contar_gravacao()
+
+    async def adicionar_se_ausente(self, chave: str, ttl_s: float) -> bool:
+        agora = time.time()
+        # Atômico entre processos: só substitui uma chave que já venceu
+        cursor = self._executar(
+            "INSERT INTO estado (chave, valor, expira_em, usado_em) VALUES (?, 'true', ?, ?) "
+            "ON CONFLICT (chave) DO UPDATE SET valor = excluded.valor, expira_em = excluded.expira_em, "
+            "usado_em = excluded.usado_em WHERE estado.expira_em <= ?",
+            (self.prefixo + chave, agora + ttl_s, agora, agora),
+        )
+        self._contar_gravacao()
+        return cursor.rowcount > 0
+
+    async def apagar(self, chave: str):
+        self._executar("DELETE FROM estado WHERE chave = ?", (self.prefixo + chave,))
+
+    async def tamanho(self) -> int:
+        return self._executar(
+            "SELECT COUNT(*) FROM estado WHERE chave >= ? AND chave < ? AND expira_em > ?",
+            (self.prefixo, self.prefixo[:-1] + ";", time.time()),
+        ).fetchone()[0]
+
+    def _contar_gravacao(self):
+        self._gravacoes += 1
+        if self._gravacoes % self.intervalo_limpeza == 0:
+            self.limpar()
+
+    def limpar(self):
+        """Apaga as chaves vencidas e, deste espaço, as menos usadas além da capacidade."""
+        faixa = (self.prefixo, self.prefixo[:-1] + ";")
+        self._executar("DELETE FROM estado WHERE expira_em <= ?", (time.time(),))
+        self._executar(
+            "DELETE FROM estado WHERE chave IN (SELECT chave FROM estado WHERE chave >= ? AND chave < ? "
+            "ORDER BY usado_em DESC LIMIT -1 OFFSET ?)",
+            (*faixa, self.capacidade),
+        )
+
+    def estatisticas(self) -> dict:
+        return {"arquivo": self._conexao.caminho}
+
+
+class EstadoRedis:
+    """
+    Chaves com validade no Redis (SET com EX/NX). O limite de memória fica
+    a cargo do servidor (ex.: maxmemory-policy allkeys-lru).
+    """
+    nome = "redis"
+
+    def __init__(self, espaco: str):
+        self.prefixo = f"{settings.ESTADO_REDIS_PREFIXO}{espaco}:"
+
+    @property
+    def _cliente(self):
+        # Cliente do processo: recriado no primeiro uso após encerrar_estado()
+        return _obter_cliente_redis()
+
+    async def obter(self, chave: str):
+        valor = await self._cliente.get(self.prefixo + chave)
+        return None if valor is None else json.loads(valor)
+
+    async def guardar(self, chave: str, valor, ttl_s: float):
+        await self._cliente.set(self.prefixo + chave, json.dumps(valor), px=max(int(ttl_s * 1000), 1))
+
+    async def adicionar_se_ausente(self, chave: str, ttl_s: float) -> bool:
+        return bool(await self._cliente.set(self.prefixo + chave, "1", px=max(int(ttl_s * 1000), 1), nx=True))
+
+    async def apagar(self, chave: str):
+        await self._cliente.delete(self.prefixo + chave)
+
+    async def tamanho(self) -> int:
+        total = 0
+        async for _ in self._cliente.scan_iter(match=self.prefixo + "*", count=1000):
+            total += 1
+        return total
+
+    def estatisticas(self) -> dict:
+        return {}
+
+
+# Conexões do processo, criadas no primeiro uso e fechadas ao desligar a API
+_conexao_sqlite: _ConexaoSQLite | None = None
+_cliente_redis = None
+# Fábrica do cliente Redis; os testes podem trocar (ex: fakeredis.aioredis.FakeRedis)
+fabrica_redis = None
+
+
+def definir_fabrica_redis(fabrica):
+    """Troca a função que cria o cliente Redis a partir da URL."""
+    global fabrica_redis, _cliente_redis
+    fabrica_redis = fabrica
+    _cliente_redis = None
+
+
+def _obter_cliente_redis():
+    global _cliente_redis
+    if _cliente_redis is None:
+        if fabrica_redis is not None:
+            _cliente_redis = fabrica_redis(settings.ESTADO_REDIS_URL)
+        else:
+            # Importado só com ESTADO_BACKEND=redis, para não pesar na inicialização
+            try:
+                import redis.asyncio as redis_asyncio
+            except ImportError:
+                raise EstadoIndisponivelError("ESTADO_BACKEND=redis requer o pacote 'redis'.")
+            _cliente_redis = redis_asyncio.from_url(settings.ESTADO_REDIS_URL)
+    return _cliente_redis
+
+
+def criar_estado(espaco: str, capacidade: int):
+    """
+    Estado de um consumidor no backend configurado. 'capacidade' limita a
+    quantidade de chaves na memória e no SQLite (no Redis vale a política do servidor).
+    """
+    global _conexao_sqlite
+    if settings.ESTADO_BACKEND == "sqlite":
+        if _conexao_sqlite is None:
+            _conexao_sqlite = _ConexaoSQLite(settings.ESTADO_SQLITE_CAMINHO)
+        return EstadoSQLite(_conexao_sqlite, espaco, capacidade)
+    if settings.ESTADO_BACKEND == "redis":
+        return EstadoRedis(espaco)
+    return EstadoMemoria(capacidade)
+
+
+async def encerrar_estado():
+    """Fecha as conexões do backend. Chamada pelo 'lifespan' ao desligar."""
+    global _cliente_redis
+    if _conexao_sqlite is not None:
+        _conexao_sqlite.fechar()
+    if _cliente_redis is not None:
+        try:
+            await _cliente_redis.aclose()
+        except Exception as e:
+            print(f"⚠️ Erro ao fechar o cliente Redis: {e}")
+        _cliente_redis = None
+
+
+async def verificar_estado():
+    """Falha cedo se o backend não estiver acessível (chamada ao iniciar a API)."""
+    if settings.ESTADO_BACKEND == "redis":
+        await _obter_cliente_redis().ping()
+    elif settings.ESTADO_BACKEND == "sqlite":
+        criar_estado("verificacao", 1)
+        _conexao_sqlite.obter()
+    print(f"Estado compartilhado: backend '{settings.ESTADO_BACKEND}'.")
@@ -0,0 +1,105 @@
+"""
+Distribuição em tempo real das leituras aceitas pela API (pub/sub no processo).
+
+Cada assinante tem uma fila limitada. A publicação nunca espera: se a fila
+de um assinante lenta enche, ele é desligado (e reconecta para se atualizar),
+em vez de atrasar a ingestão ou acumular memória.
+
+O hub é por worker: com vários workers, cada assinante só recebe as leituras
+aceitas pelo worker em que está conectado.
+"""
+import asyncio
+import datetime
+from app.modelos.esquemas import METRICAS
+from app.nucleo import metricas
+from app.nucleo.configuracoes import settings
+
+ASSINANTES_DESLIGADOS = metricas.registro.contador(
+    "horta_stream_assinantes_desligados_total", "Assinantes do stream desligados por não acompanharem as leituras."
+)
+
+
+class Assinatura:
+    """Fila de um assinante, com os filtros de dispositivo e métricas."""
+
+    def __init__(self, dispositivos: set[str] | None, metricas_desejadas: tuple[str, ...], capacidade: int):
+        self.dispositivos = dispositivos
+        self.metricas = metricas_desejadas
+        self.fila: asyncio.Queue = asyncio.Queue(maxsize=capacidade)
+        self.desligada = False
+
+    def aceita(self, id_dispositivo) -> bool:
+        return self.dispositivos is None or id_dispositivo in self.dispositivos
+
+    async def proxima(self, timeout: float | None = None) -> dict | None:
+        """
+        Próxima leitura. Retorna None se nada chegar em 'timeout' segundos
+        ou se a assinatura foi desligada e a fila já está vazia.
+        """
+        if self.desligada and self.fila.empty():
+            return None
+        try:
+            return await asyncio.wait_for(self.fila.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class HubTelemetria:
+    def __init__(self, max_assinantes: int = 1000, capacidade_assinante: int = 256):
+        self.max_assinantes = max_assinantes
+        self.capacidade_assinante = capacidade_assinante
+        self._assinaturas: set[Assinatura] = set()
+
+    def __len__(self) -> int:
+        return len(self._assinaturas)
+
+    def assinar(self, dispositivos=None, metricas_desejadas=None) -> Assinatura | None:
+        """Nova assinatura, ou None se o limite de assinantes foi atingido."""
+        if len(self._assinaturas) >= self.max_assinantes:
+            return None
+        assinatura = Assinatura(
+            set(dispositivos) if dispositivos else None,
+            tuple(metricas_desejadas or METRICAS),
+            self.capacidade_assinante,
+        )
+        self._assinaturas.add(assinatura)
+        return assinatura
+
+    def cancelar(self, assinatura: Assinatura):
+        self._assinaturas.discard(assinatura)
+
+    def publicar(self, documento: dict):
+        """Entrega a leitura (documento gravado) a cada assinante interessado."""
+        if not self._assinaturas:
+            return
+        timestamp = documento.get("timestamp")
+        if isinstance(timestamp, datetime.datetime):
+            # Sempre em UTC; datas sem fuso já estão em UTC (padrão do MongoDB)
+            if timestamp.tzinfo is None:
+                timestamp = timestamp.replace(tzinfo=datetime.timezone.utc)
+            timestamp = timestamp.astimezone(datetime.timezone.utc).isoformat()
+        id_dispositivo = documento.get("id_dispositivo")
+
+        for assinatura in list(self._assinaturas):
+            if not assinatura.aceita(id_dispositivo):
+                continue
+            mensagem = {"id_dispositivo": id_dispositivo, "timestamp": timestamp}
+            for metrica in assinatura.metricas:
+                if documento.get(metrica) is not None:
+                    mensagem[metrica] = documento[metrica]
+            try:
+                assinatura.fila.put_nowait(mensagem)
+            except asyncio.QueueFull:
+                # Assinante lento: desliga em vez de segurar a ingestão
+                assinatura.desligada = True
+                self._assinaturas.discard(assinatura)
+                ASSINANTES_DESLIGADOS.inc()
+                print("⚠️ Assinante do stream de telemetria desligado: fila cheia.")
+
+
+# Instância única usada pela ingestão e pela rota de stream
+hub_telemetria = HubTelemetria(settings.STREAM_MAX_ASSINANTES, settings.STREAM_CAPACIDADE_ASSINANTE)
+
+metricas.registro.medidor_callback(
+    "horta_stream_assinantes", "Assinantes conectados ao stream de telemetria.", lambda: len(hub_telemetria)
+)
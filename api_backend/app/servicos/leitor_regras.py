@@ -0,0 +1,106 @@
+"""
+Alimenta o motor de regras com as leituras gravadas no banco, quando a API
+roda com vários workers ou réplicas (ESTADO_BACKEND diferente de "memoria").
+
+Com um único worker, o motor recebe cada leitura aceita direto da ingestão
+(servico_banco_de_dados.registrar_leitura_aceita). Com vários, cada worker
+veria só parte das leituras de um dispositivo, e as janelas e a histerese
+dariam resultados diferentes em cada um. Então cada worker do perfil
+"completo" lê de 'dados_reais' todas as leituras gravadas (inclusive as
+recebidas pelas réplicas do perfil "ingestao") e mantém o mesmo estado; os
+alertas repetidos entre workers são descartados pelo estado compartilhado
+(servico_alertas).
+
+A cada REGRAS_LEITURA_INTERVALO_S, busca as leituras a partir do último
+timestamp visto menos REGRAS_LEITURA_MARGEM_S (leituras gravadas com algum
+atraso, ex.: pelo buffer de escrita) e pula as já processadas, pelo _id.
+Leituras que chegam ao banco com atraso maior que a margem não são avaliadas.
+Ao iniciar, relê a maior janela do motor para aquecer as estatísticas.
+"""
+import asyncio
+import datetime
+from app.db.conexao_mongodb import get_db_collection
+from app.db.provisionamento import COLECAO_LEITURAS
+from app.modelos.esquemas import METRICAS
+from app.nucleo.configuracoes import settings
+from app.servicos.motor_regras import MotorRegras, motor_regras
+
+_tarefa: asyncio.Task | None = None
+
+
+def alimentado_pelo_banco() -> bool:
+    """True quando o motor lê as leituras do banco em vez de recebê-las da ingestão."""
+    return settings.ESTADO_BACKEND != "memoria"
+
+
+def _agora() -> datetime.datetime:
+    # Datas do MongoDB chegam sem fuso, em UTC
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class LeitorRegras:
+    def __init__(self, motor: MotorRegras, margem_s: float, inicio: datetime.datetime):
+        self.motor = motor
+        self.margem = datetime.timedelta(seconds=margem_s)
+        # Maior timestamp processado (nunca além do relógio, para leituras com data futura)
+        self.ultimo = inicio
+        # _id -> timestamp das leituras já processadas dentro da margem
+        self._vistos: dict = {}
+
+    async def ler(self) -> int:
+        """Processa as leituras novas no banco. Retorna quantas foram processadas."""
+        collection = get_db_collection(COLECAO_LEITURAS)
+        projecao = {"id_dispositivo": 1, "timestamp": 1}
+        projecao.update({metrica: 1 for metrica in METRICAS})
+        cursor = collection.find({"timestamp": {"$gte": self.ultimo - self.margem}}, projecao).sort("timestamp", 1)
+
+        novas = 0
+        maior = self.ultimo
+        async for documento in cursor:
+            if documento["_id"] in self._vistos:
+                continue
+            self._vistos[documento["_id"]] = documento["timestamp"]
+            self.motor.processar(documento)
+            maior = max(maior, documento["timestamp"])
+            novas += 1
+
+        self.ultimo = min(maior, _agora())
+        corte = self.ultimo - self.margem
+        self._vistos = {_id: momento for _id, momento in self._vistos.items() if momento >= corte}
+        return novas
+
+
+async def _laco_leitor(leitor: LeitorRegras):
+    while True:
+        try:
+            await leitor.ler()
+        except Exception as e:
+            # Banco fora: tenta de novo no próximo ciclo, a partir do mesmo ponto
+            print(f"⚠️ Erro ao ler as leituras para o motor de regras: {e}")
+        await asyncio.sleep(settings.REGRAS_LEITURA_INTERVALO_S)
+
+
+def iniciar_leitor_regras():
+    """
+    Começa a ler as leituras do banco, se o motor de regras estiver ativo e
+    a API rodar com vários workers. Chamada pelo 'lifespan' (perfil "completo").
+    """
+    global _tarefa
+    if not settings.REGRAS_ATIVO or not alimentado_pelo_banco():
+        return
+    inicio = _agora() - datetime.timedelta(seconds=max(settings.REGRAS_JANELAS_S))
+    leitor = LeitorRegras(motor_regras, settings.REGRAS_LEITURA_MARGEM_S, inicio)
+    _tarefa = asyncio.create_task(_laco_leitor(leitor))
+    print("Motor de regras: lendo as leituras do banco (vários workers).")
+
+
+async def encerrar_leitor_regras():
+    global _tarefa
+    if _tarefa is None:
+        return
+    _tarefa.cancel()
+    try:
+        await _tarefa
+    except asyncio.CancelledError:
+        pass
+    _tarefa = None
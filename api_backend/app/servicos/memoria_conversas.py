@@ -0,0 +1,67 @@
+from app.servicos.estado_compartilhado import EstadoMemoria
+
+
+def estimar_tokens(historico: list[dict]) -> int:
+    """Estimativa barata: ~4 caracteres por token."""
+    return sum(len(parte) for mensagem in historico for parte in mensagem["parts"]) // 4
+
+
+class MemoriaConversas:
+    """
+    Histórico das conversas do chatbot com tamanho limitado.
+
+    - Guarda no máximo 'max_conversas' chats; o menos usado sai primeiro (LRU).
+    - Conversas paradas há mais de 'ttl_s' segundos são esquecidas.
+    - Cada conversa mantém até 'max_turnos' turnos (pergunta + resposta) e
+      cerca de 'max_tokens' tokens; os turnos mais antigos são descartados.
+
+    As conversas ficam no estado compartilhado (ESTADO_BACKEND), então
+    qualquer worker que atenda o chat vê o mesmo histórico.
+    """
+
+    def __init__(self, max_conversas: int, ttl_s: float, max_turnos: int, max_tokens: int, estado=None):
+        self.max_conversas = max_conversas
+        self.ttl_s = ttl_s
+        self.max_turnos = max_turnos
+        self.max_tokens = max_tokens
+        # chat_id -> histórico, com validade renovada a cada uso
+        self.estado = estado if estado is not None else EstadoMemoria(max_conversas)
+        self.turnos_cortados = 0
+
+    async def obter(self, chat_id) -> list[dict]:
+        """Histórico do chat (lista vazia se não existir ou tiver expirado)."""
+        historico = await self.estado.obter(str(chat_id))
+        if historico is None:
+            return []
+        # Renova a validade: o tempo conta a partir do último uso
+        await self.estado.guardar(str(chat_id), historico, self.ttl_s)
+        return list(historico)
+
+    async def salvar(self, chat_id, historico: list[dict]):
+        """Guarda o histórico do chat, cortando os turnos que passarem do orçamento."""
+        historico = list(historico)
+        tamanho_inicial = len(historico)
+        if len(historico) > 2 * self.max_turnos:
+            historico = historico[-2 * self.max_turnos:]
+        # Mantém sempre o último turno, mesmo que ele sozinho passe do limite
+        while len(historico) > 2 and estimar_tokens(historico) > self.max_tokens:
+            historico = historico[2:]
+        self.turnos_cortados += (tamanho_inicial - len(historico)) // 2
+
+        await self.estado.guardar(str(chat_id), historico, self.ttl_s)
+
+    async def limpar(self, chat_id):
+        await self.estado.apagar(str(chat_id))
+
+    async def estatisticas(self) -> dict:
+        estatisticas = {
+            "backend": self.estado.nome,
+            "conversas": await self.estado.tamanho(),
+            "max_conversas": self.max_conversas,
+        }
+        if isinstance(self.estado, EstadoMemoria):
+            # Nos backends compartilhados, somar as mensagens exigiria ler todas as conversas
+            historicos = self.estado.valores()
+            estatisticas["mensagens"] = sum(len(h) for h in historicos)
+            estatisticas["tokens_estimados"] = sum(estimar_tokens(h) for h in historicos)
+        return {**estatisticas, **self.estado.estatisticas(), "turnos_cortados": self.turnos_cortados}
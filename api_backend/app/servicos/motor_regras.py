@@ -0,0 +1,251 @@
+"""
+Motor de regras: avalia as faixas da cultura de cada dispositivo à medida
+que as leituras são aceitas, sem reler o banco.
+
+Para cada dispositivo e métrica são mantidas estatísticas em janelas de
+tempo (REGRAS_JANELAS_S), atualizadas em O(1) por leitura. A média da
+primeira janela é classificada com histerese (app/nucleo/culturas.py): uma
+mudança de estado gera um alerta, guardado na lista de alertas recentes e
+entregue aos notificadores registrados (ex.: assinantes do Telegram).
+
+O estado fica em memória. Com um único worker, ele avalia as leituras que
+recebe; com vários, cada worker lê todas as leituras do banco
+(app/servicos/leitor_regras.py), para que todos tenham o mesmo estado. O
+diagnóstico é o mesmo lido pela API, pelo dashboard e pelo Hortbot.
+"""
+import datetime
+from collections import OrderedDict, deque
+from typing import Callable
+from app.modelos.esquemas import METRICAS
+from app.nucleo import culturas, metricas
+from app.nucleo.configuracoes import settings
+from app.nucleo.estatisticas_janela import EstatisticasJanela
+
+ALERTAS_GERADOS = metricas.registro.contador(
+    "horta_regras_alertas_total", "Mudanças de estado detectadas pelo motor de regras.", ("metrica", "estado")
+)
+
+
+class EstadoMetrica:
+    """Janelas de uma métrica de um dispositivo e o estado atual (com histerese)."""
+
+    def __init__(self, janelas_s: list[int]):
+        self.janelas = [EstatisticasJanela(janela) for janela in janelas_s]
+        self.estado = "ok"
+        self.ultima_notificacao: float | None = None
+
+    def adicionar(self, instante: float, valor: float):
+        for janela in self.janelas:
+            janela.adicionar(instante, valor)
+
+    @property
+    def principal(self) -> EstatisticasJanela:
+        return self.janelas[0]
+
+
+class EstadoDispositivo:
+    def __init__(self, cultura: str):
+        self.cultura = cultura
+        self.metricas: dict[str, EstadoMetrica] = {}
+        self.ultimo_instante: float | None = None
+
+
+def _instante(documento: dict) -> float:
+    timestamp = documento.get("timestamp")
+    if isinstance(timestamp, datetime.datetime):
+        # Datas sem fuso já estão em UTC (padrão do MongoDB)
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=datetime.timezone.utc)
+        return timestamp.timestamp()
+    return datetime.datetime.now(datetime.timezone.utc).timestamp()
+
+
+def _iso(instante: float) -> str:
+    return datetime.datetime.fromtimestamp(instante, datetime.timezone.utc).isoformat()
+
+
+class MotorRegras:
+    def __init__(
+        self,
+        janelas_s: list[int] | None = None,
+        min_amostras: int = 3,
+        histerese_fracao: float = 0.05,
+        intervalo_min_alerta_s: float = 600.0,
+        cultura_padrao: str = culturas.CULTURA_PADRAO,
+        culturas_por_dispositivo: dict[str, str] | None = None,
+        max_dispositivos: int = 10000,
+        max_alertas: int = 500,
+    ):
+        self.janelas_s = list(janelas_s or [300, 3600])
+        self.min_amostras = min_amostras
+        self.histerese_fracao = histerese_fracao
+        self.intervalo_min_alerta_s = intervalo_min_alerta_s
+        self.cultura_padrao = cultura_padrao
+        self.culturas_por_dispositivo = dict(culturas_por_dispositivo or {})
+        self.max_dispositivos = max_dispositivos
+        self._dispositivos: OrderedDict[str, EstadoDispositivo] = OrderedDict()
+        self._alertas: deque[dict] = deque(maxlen=max_alertas)
+        self._notificadores: list[Callable[[dict], None]] = []
+
+    def __len__(self) -> int:
+        return len(self._dispositivos)
+
+    def registrar_notificador(self, funcao: Callable[[dict], None]):
+        """Função chamada (sem esperar) com cada alerta que deve ser notificado."""
+        if funcao not in self._notificadores:
+            self._notificadores.append(funcao)
+
+    def remover_notificador(self, funcao: Callable[[dict], None]):
+        if funcao in self._notificadores:
+            self._notificadores.remove(funcao)
+
+    def cultura_do_dispositivo(self, id_dispositivo: str) -> str:
+        cultura = self.culturas_por_dispositivo.get(id_dispositivo, self.cultura_padrao)
+        return cultura if cultura in culturas.CULTURAS else self.cultura_padrao
+
+    def _estado_dispositivo(self, id_dispositivo: str) -> EstadoDispositivo:
+        estado = self._dispositivos.get(id_dispositivo)
+        if estado is None:
+            estado = EstadoDispositivo(self.cultura_do_dispositivo(id_dispositivo))
+            self._dispositivos[id_dispositivo] = estado
+            if len(self._dispositivos) > self.max_dispositivos:
+                self._dispositivos.popitem(last=False)
+        else:
+            self._dispositivos.move_to_end(id_dispositivo)
+        return estado
+
+    def processar(self, documento: dict) -> list[dict]:
+        """Atualiza as janelas com a leitura e retorna os alertas gerados."""
+        id_dispositivo = documento.get("id_dispositivo")
+        if id_dispositivo is None:
+            return []
+        dispositivo = self._estado_dispositivo(id_dispositivo)
+        instante = _instante(documento)
+        # As janelas exigem ordem de tempo: leituras atrasadas não entram
+        if dispositivo.ultimo_instante is not None and instante < dispositivo.ultimo_instante:
+            return []
+        dispositivo.ultimo_instante = instante
+
+        limites = culturas.CULTURAS[dispositivo.cultura]["limites"]
+        alertas = []
+        for metrica in METRICAS:
+            valor = documento.get(metrica)
+            if not isinstance(valor, (int, float)) or isinstance(valor, bool):
+                continue
+            estado_metrica = dispositivo.metricas.get(metrica)
+            if estado_metrica is None:
+                estado_metrica = dispositivo.metricas[metrica] = EstadoMetrica(self.janelas_s)
+            estado_metrica.adicionar(instante, float(valor))
+
+            limite = limites.get(metrica)
+            if limite is None or len(estado_metrica.principal) < self.min_amostras:
+                continue
+            media = estado_metrica.principal.media
+            novo = culturas.classificar(
+                media, limite, estado_metrica.estado, culturas.margem_histerese(limite, self.histerese_fracao)
+            )
+            if novo != estado_metrica.estado:
+                alertas.append(self._registrar_alerta(
+                    id_dispositivo, dispositivo.cultura, metrica, estado_metrica, novo, media, limite, instante
+                ))
+        return alertas
+
+    def _registrar_alerta(self, id_dispositivo, cultura, metrica, estado_metrica: EstadoMetrica,
+                          novo: str, media: float, limite: dict, instante: float) -> dict:
+        alerta = {
+            "id_dispositivo": id_dispositivo,
+            "cultura": cultura,
+            "metrica": metrica,
+            "estado": novo,
+            "estado_anterior": estado_metrica.estado,
+            "valor": round(media, 2),
+            "timestamp": _iso(instante),
+            "mensagem": culturas.descrever(metrica, novo, media, limite),
+        }
+        estado_metrica.estado = novo
+        self._alertas.append(alerta)
+        ALERTAS_GERADOS.inc(metrica=metrica, estado=novo)
+
+        # Limita as notificações de uma métrica que oscila em volta do limite;
+        # escalar para crítico sempre notifica
+        recente = (
+            estado_metrica.ultima_notificacao is not None
+            and instante - estado_metrica.ultima_notificacao < self.intervalo_min_alerta_s
+        )
+        if not recente or novo in culturas.ESTADOS_CRITICOS:
+            estado_metrica.ultima_notificacao = instante
+            for notificador in self._notificadores:
+                try:
+                    notificador(alerta)
+                except Exception as e:
+                    print(f"⚠️ Erro ao notificar alerta: {e}")
+        return alerta
+
+    def alertas_recentes(self, id_dispositivo: str | None = None, limite: int = 50) -> list[dict]:
+        """Alertas mais recentes primeiro."""
+        alertas = [
+            alerta for alerta in reversed(self._alertas)
+            if id_dispositivo is None or alerta["id_dispositivo"] == id_dispositivo
+        ]
+        return alertas[:limite]
+
+    def dispositivos(self) -> list[str]:
+        return list(self._dispositivos)
+
+    def diagnostico(self, id_dispositivo: str, cultura: str | None = None) -> dict | None:
+        """
+        Situação atual do dispositivo: estado, estatísticas das janelas e dica
+        de cada métrica. As janelas terminam na última leitura recebida.
+        Com outra 'cultura', as médias são reclassificadas sem histerese.
+        """
+        dispositivo = self._dispositivos.get(id_dispositivo)
+        if dispositivo is None:
+            return None
+        cultura = cultura or dispositivo.cultura
+        limites = culturas.CULTURAS[cultura]["limites"]
+
+        metricas_diag, estados = {}, {}
+        for metrica, estado_metrica in dispositivo.metricas.items():
+            media = estado_metrica.principal.media
+            limite = limites.get(metrica)
+            avaliada = limite is not None and media is not None and len(estado_metrica.principal) >= self.min_amostras
+            if not avaliada:
+                estado = None
+            elif cultura == dispositivo.cultura:
+                estado = estado_metrica.estado
+            else:
+                estado = culturas.classificar(media, limite)
+            if estado is not None:
+                estados[metrica] = estado
+            metricas_diag[metrica] = {
+                "estado": estado,
+                "dica": culturas.descrever(metrica, estado, media, limite) if estado is not None else None,
+                "janelas": {
+                    str(janela.janela_s): janela.resumo() for janela in estado_metrica.janelas
+                },
+            }
+        return {
+            "id_dispositivo": id_dispositivo,
+            "cultura": cultura,
+            "status": culturas.status_geral(estados),
+            "ultima_leitura": _iso(dispositivo.ultimo_instante) if dispositivo.ultimo_instante else None,
+            "metricas": metricas_diag,
+        }
+
+
+# Instância única alimentada pela ingestão (servico_banco_de_dados.registrar_leitura_aceita)
+# ou, com vários workers, pelo leitor_regras
+motor_regras = MotorRegras(
+    janelas_s=settings.REGRAS_JANELAS_S,
+    min_amostras=settings.REGRAS_MIN_AMOSTRAS,
+    histerese_fracao=settings.REGRAS_HISTERESE_FRACAO,
+    intervalo_min_alerta_s=settings.REGRAS_INTERVALO_MIN_ALERTA_S,
+    cultura_padrao=settings.REGRAS_CULTURA_PADRAO,
+    culturas_por_dispositivo=settings.REGRAS_CULTURAS_POR_DISPOSITIVO,
+    max_dispositivos=settings.REGRAS_MAX_DISPOSITIVOS,
+    max_alertas=settings.REGRAS_MAX_ALERTAS,
+)
+
+metricas.registro.medidor_callback(
+    "horta_regras_dispositivos", "Dispositivos acompanhados pelo motor de regras.", lambda: len(motor_regras)
+)
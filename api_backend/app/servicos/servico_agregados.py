@@ -0,0 +1,169 @@
+import datetime
+import math
+import pytz
+from pymongo import UpdateOne
+from app.db.conexao_mongodb import get_db_collection
+from app.db.provisionamento import COLECOES_AGREGADOS
+from app.modelos.esquemas import METRICAS
+from app.nucleo.metricas import MONGO_ERROS, MONGO_LATENCIA, medir, operacao_mongo
+
+# Fuso dos períodos (o mesmo do calendário gravado nas leituras)
+NOME_FUSO = "America/Sao_Paulo"
+FUSO_BRASIL = pytz.timezone(NOME_FUSO)
+
+def inicio_periodo(momento: datetime.datetime, granularidade: str) -> datetime.datetime:
+    """
+    Trunca o momento da leitura para o início da hora ou do dia (horário de Brasília).
+    """
+    if momento.tzinfo is None:
+        # Datas sem fuso vindas do Mongo estão em UTC
+        momento = momento.replace(tzinfo=datetime.timezone.utc)
+    local = momento.astimezone(FUSO_BRASIL).replace(minute=0, second=0, microsecond=0, tzinfo=None)
+    if granularidade == "dia":
+        local = local.replace(hour=0)
+    return FUSO_BRASIL.localize(local)
+
+def _acumular(acumulado: dict, documento: dict):
+    """Soma as métricas de uma leitura ao acumulado de um período."""
+    acumulado["contagem"] += 1
+    for metrica in METRICAS:
+        valor = documento.get(metrica)
+        if not isinstance(valor, (int, float)) or isinstance(valor, bool):
+            continue
+        estatistica = acumulado["metricas"].setdefault(
+            metrica, {"contagem": 0, "soma": 0.0, "soma_quadrados": 0.0, "min": valor, "max": valor}
+        )
+        estatistica["contagem"] += 1
+        estatistica["soma"] += valor
+        estatistica["soma_quadrados"] += valor * valor
+        estatistica["min"] = min(estatistica["min"], valor)
+        estatistica["max"] = max(estatistica["max"], valor)
+
+def _operacao_upsert(id_dispositivo: str, inicio: datetime.datetime, acumulado: dict) -> UpdateOne:
+    """Monta o upsert que incorpora o acumulado ao documento do período."""
+    incrementos = {"contagem": acumulado["contagem"]}
+    minimos, maximos = {}, {}
+    for metrica, estatistica in acumulado["metricas"].items():
+        prefixo = f"metricas.{metrica}"
+        incrementos[f"{prefixo}.contagem"] = estatistica["contagem"]
+        incrementos[f"{prefixo}.soma"] = estatistica["soma"]
+        incrementos[f"{prefixo}.soma_quadrados"] = estatistica["soma_quadrados"]
+        minimos[f"{prefixo}.min"] = estatistica["min"]
+        maximos[f"{prefixo}.max"] = estatistica["max"]
+
+    atualizacao = {"$inc": incrementos}
+    if minimos:
+        atualizacao["$min"] = minimos
+        atualizacao["$max"] = maximos
+    return UpdateOne({"id_dispositivo": id_dispositivo, "inicio": inicio}, atualizacao, upsert=True)
+
+async def atualizar_agregados(documentos: list[dict]):
+    """
+    Incorpora leituras recém-gravadas aos agregados por hora e por dia.
+    Leituras do mesmo dispositivo e período são somadas antes, gerando
+    um único upsert por documento de agregado.
+    """
+    for granularidade, nome_colecao in COLECOES_AGREGADOS.items():
+        periodos: dict[tuple, dict] = {}
+        for documento in documentos:
+            id_dispositivo = documento.get("id_dispositivo")
+            momento = documento.get("timestamp")
+            if id_dispositivo is None or not isinstance(momento, datetime.datetime):
+                continue
+            chave = (id_dispositivo, inicio_periodo(momento, granularidade))
+            acumulado = periodos.setdefault(chave, {"contagem": 0, "metricas": {}})
+            _acumular(acumulado, documento)
+
+        if not periodos:
+            continue
+
+        try:
+            collection = get_db_collection(nome_colecao)
+            operacoes = [_operacao_upsert(id_disp, inicio, acc) for (id_disp, inicio), acc in periodos.items()]
+            with operacao_mongo(f"agregados_{granularidade}_bulk_write"):
+                await collection.bulk_write(operacoes, ordered=False)
+        except Exception as e:
+            print(f"❌ Erro ao atualizar agregados '{nome_colecao}': {e}")
+
+def _estatisticas(bruto: dict) -> dict:
+    """Converte contagem/soma/soma dos quadrados em média e desvio padrão."""
+    contagem = bruto.get("contagem", 0)
+    if not contagem:
+        return {"contagem": 0}
+    media = bruto["soma"] / contagem
+    variancia = max(bruto["soma_quadrados"] / contagem - media * media, 0.0)
+    return {
+        "contagem": contagem,
+        "media": media,
+        "desvio_padrao": math.sqrt(variancia),
+        "min": bruto.get("min"),
+        "max": bruto.get("max"),
+    }
+
+def _pipeline_mensal(metricas: list[str]) -> list[dict]:
+    """Reagrupa os documentos diários por mês, direto no MongoDB."""
+    grupo = {
+        "_id": {
+            "id_dispositivo": "$id_dispositivo",
+            "inicio": {"$dateTrunc": {"date": "$inicio", "unit": "month", "timezone": NOME_FUSO}},
+        },
+        "contagem": {"$sum": "$contagem"},
+    }
+    projecao = {"_id": 0, "id_dispositivo": "$_id.id_dispositivo", "inicio": "$_id.inicio", "contagem": 1, "metricas": {}}
+    for metrica in metricas:
+        campo = f"$metricas.{metrica}"
+        for nome in ("contagem", "soma", "soma_quadrados"):
+            grupo[f"{metrica}__{nome}"] = {"$sum": f"{campo}.{nome}"}
+        grupo[f"{metrica}__min"] = {"$min": f"{campo}.min"}
+        grupo[f"{metrica}__max"] = {"$max": f"{campo}.max"}
+        projecao["metricas"][metrica] = {
+            nome: f"${metrica}__{nome}" for nome in ("contagem", "soma", "soma_quadrados", "min", "max")
+        }
+    return [{"$group": grupo}, {"$project": projecao}, {"$sort": {"inicio": 1, "id_dispositivo": 1}}]
+
+@medir(MONGO_LATENCIA, MONGO_ERROS, operacao="consultar_agregados")
+async def consultar_agregados(
+    granularidade: str,
+    id_dispositivo: str | None = None,
+    inicio: datetime.datetime | None = None,
+    fim: datetime.datetime | None = None,
+    metricas: list[str] | None = None,
+) -> list[dict]:
+    """
+    Lê os agregados por 'hora', 'dia' ou 'mes' (este calculado a partir dos diários),
+    já convertidos em média, desvio padrão, mínimo e máximo por métrica.
+    """
+    metricas = [m for m in (metricas or METRICAS) if m in METRICAS]
+    colecao = COLECOES_AGREGADOS["dia" if granularidade == "mes" else granularidade]
+    collection = get_db_collection(colecao)
+
+    filtro: dict = {}
+    if id_dispositivo is not None:
+        filtro["id_dispositivo"] = id_dispositivo
+    if inicio is not None or fim is not None:
+        filtro["inicio"] = {}
+        if inicio is not None:
+            filtro["inicio"]["$gte"] = inicio
+        if fim is not None:
+            filtro["inicio"]["$lt"] = fim
+
+    if granularidade == "mes":
+        cursor = collection.aggregate([{"$match": filtro}] + _pipeline_mensal(metricas))
+    else:
+        projecao = {"_id": 0, "id_dispositivo": 1, "inicio": 1, "contagem": 1}
+        projecao.update({f"metricas.{m}": 1 for m in metricas})
+        cursor = collection.find(filtro, projecao).sort([("inicio", 1), ("id_dispositivo", 1)])
+
+    linhas = []
+    async for documento in cursor:
+        linhas.append({
+            "id_dispositivo": documento["id_dispositivo"],
+            "inicio": documento["inicio"],
+            "contagem": documento.get("contagem", 0),
+            "metricas": {
+                metrica: _estatisticas(bruto)
+                for metrica, bruto in documento.get("metricas", {}).items()
+                if bruto.get("contagem")
+            },
+        })
+    return linhas
@@ -0,0 +1,102 @@
+"""
+Alertas do motor de regras para os assinantes do Telegram.
+
+Os chats se inscrevem pelo Hortbot (/alertas [dispositivo]) e ficam na
+coleção 'assinantes_alertas', compartilhada entre workers. A cada alerta
+notificado pelo motor, os assinantes são lidos do banco (alertas são raros:
+só mudanças de estado) e a mensagem vai para a fila de envio do Telegram.
+
+Com vários workers, todos calculam os mesmos alertas (app/servicos/leitor_regras.py):
+cada alerta é enviado só pelo primeiro worker que o registrar no estado compartilhado.
+"""
+import asyncio
+import datetime
+from typing import Callable
+from app.db.conexao_mongodb import get_db_collection
+from app.nucleo import culturas
+from app.nucleo.configuracoes import settings
+from app.servicos.estado_compartilhado import criar_estado
+from app.servicos.leitor_regras import alimentado_pelo_banco
+from app.servicos.motor_regras import motor_regras
+
+COLECAO_ASSINANTES = "assinantes_alertas"
+# Alertas já enviados por algum worker (só usado com vários workers)
+alertas_enviados = criar_estado("alertas_enviados", settings.REGRAS_MAX_ALERTAS)
+ALERTAS_ENVIADOS_TTL_S = 3600.0
+
+# Função que envia uma mensagem a um chat (fila_telegram.enviar), definida ao iniciar
+_enviar: Callable[[str, str], None] | None = None
+# Notificações em andamento (referência para não serem coletadas antes do fim)
+_tarefas: set[asyncio.Task] = set()
+
+
+async def assinar(chat_id: str, id_dispositivo: str | None = None):
+    """Inscreve o chat nos alertas de um dispositivo (ou de todos, sem 'id_dispositivo')."""
+    collection = get_db_collection(COLECAO_ASSINANTES)
+    atualizacao = {"$setOnInsert": {"desde": datetime.datetime.now(datetime.timezone.utc)}}
+    if id_dispositivo is None:
+        atualizacao["$set"] = {"dispositivos": []}
+    else:
+        atualizacao["$addToSet"] = {"dispositivos": id_dispositivo}
+    await collection.update_one({"_id": str(chat_id)}, atualizacao, upsert=True)
+
+
+async def cancelar(chat_id: str) -> bool:
+    """Remove a inscrição do chat. Retorna False se ele não estava inscrito."""
+    resultado = await get_db_collection(COLECAO_ASSINANTES).delete_one({"_id": str(chat_id)})
+    return resultado.deleted_count > 0
+
+
+def formatar_alerta(alerta: dict) -> str:
+    cultura = culturas.CULTURAS.get(alerta["cultura"], {})
+    return (
+        f"{cultura.get('icone', '🌱')} Alerta da horta ({alerta['id_dispositivo']}, {alerta['cultura']})\n"
+        f"{alerta['mensagem']}"
+    )
+
+
+def _chave_alerta(alerta: dict) -> str:
+    return "|".join(str(alerta[campo]) for campo in ("id_dispositivo", "metrica", "estado", "timestamp"))
+
+
+async def _notificar(alerta: dict):
+    try:
+        if alimentado_pelo_banco() and not await alertas_enviados.adicionar_se_ausente(
+            _chave_alerta(alerta), ALERTAS_ENVIADOS_TTL_S
+        ):
+            return
+        collection = get_db_collection(COLECAO_ASSINANTES)
+        filtro = {"$or": [{"dispositivos": []}, {"dispositivos": alerta["id_dispositivo"]}]}
+        texto = formatar_alerta(alerta)
+        async for assinante in collection.find(filtro, {"_id": 1}):
+            _enviar(assinante["_id"], texto)
+    except Exception as e:
+        print(f"⚠️ Erro ao enviar alerta aos assinantes: {e}")
+
+
+def notificar(alerta: dict):
+    """Notificador do motor de regras: agenda o envio sem segurar a ingestão."""
+    if _enviar is None:
+        return
+    tarefa = asyncio.get_running_loop().create_task(_notificar(alerta))
+    _tarefas.add(tarefa)
+    tarefa.add_done_callback(_tarefas.discard)
+
+
+def iniciar_alertas(enviar: Callable[[str, str], None]):
+    """
+    Liga o envio dos alertas. Chamada pelo 'lifespan' com a função de envio
+    do Telegram (recebida aqui para não importar o serviço do Telegram).
+    """
+    global _enviar
+    _enviar = enviar
+    motor_regras.registrar_notificador(notificar)
+
+
+async def encerrar_alertas():
+    global _enviar
+    motor_regras.remover_notificador(notificar)
+    _enviar = None
+    # Espera os envios já agendados entrarem na fila do Telegram
+    if _tarefas:
+        await asyncio.gather(*_tarefas, return_exceptions=True)
@@ -1,42 +1,160 @@
 import datetime
+import math
 from app.modelos import esquemas
 from app.db.conexao_mongodb import get_db_collection
-from pymongo.errors import PyMongoError
+from app.db.pausa_ingestao import IngestaoPausadaError, exigir_ingestao_liberada
+from app.db.provisionamento import COLECAO_LEITURAS
+from app.nucleo.configuracoes import settings
+from app.nucleo.amostragem import reduzir_serie
+from app.nucleo import metricas
+from app.nucleo.metricas import ETAPA_INGESTAO, LEITURAS_RECEBIDAS, MONGO_ERROS, MONGO_LATENCIA, operacao_mongo
+from app.servicos import servico_agregados
+from app.servicos.buffer_escrita import BufferEscrita, BufferCheioError
+from app.servicos.cache_ultimas_leituras import CacheUltimasLeituras
+from app.servicos.hub_telemetria import hub_telemetria
+from app.servicos.leitor_regras import alimentado_pelo_banco
+from app.servicos.motor_regras import motor_regras
+from pymongo.errors import BulkWriteError, PyMongoError
 from pymongo import DESCENDING
 import pytz
+import numpy as np
+from bson import ObjectId
 
 # Nome da coleção
-COLLECTION_NAME = "dados_reais"
+COLLECTION_NAME = COLECAO_LEITURAS
 
-def salvar_dados_sensor(dados: esquemas.DadosSensorCreate):
+# Fuso usado para o calendário gravado junto com cada leitura
+FUSO_BRASIL = pytz.timezone('America/Sao_Paulo')
+
+# Última leitura de cada dispositivo, mantida em memória
+cache_ultimas = CacheUltimasLeituras()
+
+# Buffer de escrita (só existe quando BUFFER_ESCRITA_ATIVO=true)
+buffer_escrita: BufferEscrita | None = None
+
+metricas.registro.medidor_callback(
+    "horta_buffer_escrita_profundidade", "Leituras aguardando no buffer de escrita.",
+    lambda: buffer_escrita.profundidade if buffer_escrita is not None else 0,
+)
+metricas.registro.medidor_callback(
+    "horta_dispositivos_conhecidos", "Dispositivos com última leitura em cache.",
+    lambda: len(cache_ultimas),
+)
+
+def iniciar_buffer_escrita():
+    """
+    Cria e inicia o buffer de escrita, se estiver habilitado nas configurações.
+    Chamada pelo 'lifespan' ao iniciar a API.
+    """
+    global buffer_escrita
+    if not settings.BUFFER_ESCRITA_ATIVO:
+        return
+
+    buffer_escrita = BufferEscrita(
+        COLLECTION_NAME,
+        tamanho_lote=settings.BUFFER_TAMANHO_LOTE,
+        intervalo_ms=settings.BUFFER_INTERVALO_MS,
+        capacidade=settings.BUFFER_CAPACIDADE,
+        politica_cheio=settings.BUFFER_POLITICA_CHEIO,
+        timeout_bloqueio_ms=settings.BUFFER_TIMEOUT_BLOQUEIO_MS,
+        ao_gravar=apos_gravar,
+    )
+    buffer_escrita.iniciar()
+
+async def encerrar_buffer_escrita():
+    """
+    Grava tudo o que ainda está no buffer. Chamada pelo 'lifespan' ao desligar.
+    """
+    global buffer_escrita
+    if buffer_escrita is not None:
+        await buffer_escrita.encerrar()
+        buffer_escrita = None
+
+def montar_documento(dados: esquemas.DadosSensorCreate, momento: datetime.datetime | None = None) -> dict:
     """
     1. Limpa campos vazios.
-    2. Adiciona Data/Hora completa.
-    3. Salva no Mongo.
+    2. Adiciona Data/Hora completa (do servidor ou a enviada pelo dispositivo).
+       No armazenamento compacto, grava apenas o timestamp.
+    """
+    # 1. LIMPEZA: Converte para dicionário removendo os Nulos (None)
+    # Isso remove ph, npk, etc., se não vierem do Arduino
+    dados_dict = dados.model_dump(exclude_none=True, exclude={"timestamp"})
+
+    # 2. ENRIQUECIMENTO: Adiciona o Calendário (Fuso Brasil)
+    if momento is None:
+        agora = datetime.datetime.now(FUSO_BRASIL)
+    elif momento.tzinfo is None:
+        # Horário sem fuso vindo do dispositivo: assume horário de Brasília
+        agora = FUSO_BRASIL.localize(momento)
+    else:
+        agora = momento.astimezone(FUSO_BRASIL)
+
+    dados_dict["timestamp"] = agora
+    if settings.ARMAZENAMENTO_COMPACTO:
+        # Calendário calculado na leitura (visão VISAO_BI)
+        return dados_dict
+
+    dados_dict["data"] = agora.strftime("%d/%m/%Y") # 03/12/2025
+    dados_dict["hora"] = agora.strftime("%H:%M:%S") # 19:30:00
+
+    # Campos para filtros fáceis no Dashboard
+    dados_dict["dia"] = agora.day
+    dados_dict["mes"] = agora.month
+    dados_dict["ano"] = agora.year
+    dados_dict["hora_simples"] = agora.hour
+
+    return dados_dict
+
+def registrar_leitura_aceita(documento: dict):
+    """
+    Executada para cada leitura aceita: atualiza o cache de últimas leituras,
+    a contagem por dispositivo, publica no stream de telemetria e alimenta
+    o motor de regras (que não roda no perfil "ingestao"; com vários workers,
+    ele lê as leituras do banco: app/servicos/leitor_regras.py).
     """
+    cache_ultimas.atualizar(documento)
+    LEITURAS_RECEBIDAS.inc(id_dispositivo=documento.get("id_dispositivo"))
+    hub_telemetria.publicar(documento)
+    if settings.REGRAS_ATIVO and settings.PERFIL_API == "completo" and not alimentado_pelo_banco():
+        motor_regras.processar(documento)
+
+async def apos_gravar(documentos: list[dict]):
+    """
+    Executada com as leituras que acabaram de ser confirmadas no banco.
+    Mantém os agregados por hora e por dia atualizados.
+    """
+    if settings.AGREGADOS_ATIVO:
+        await servico_agregados.atualizar_agregados(documentos)
+
+async def salvar_dados_sensor(dados: esquemas.DadosSensorCreate):
+    """
+    1. Limpa e enriquece o documento (ver montar_documento).
+    2. Salva no Mongo (ou enfileira no buffer de escrita, se ativo).
+
+    Com o buffer ativo, levanta BufferCheioError quando não há vaga.
+    Levanta IngestaoPausadaError durante a manutenção da coleção (app/db/pausa_ingestao.py).
+    """
+    exigir_ingestao_liberada()
+    if buffer_escrita is not None:
+        with ETAPA_INGESTAO.cronometrar(etapa="enriquecimento"):
+            dados_dict = montar_documento(dados)
+        dados_dict["_id"] = ObjectId()
+        with ETAPA_INGESTAO.cronometrar(etapa="buffer"):
+            await buffer_escrita.adicionar(dados_dict)
+        registrar_leitura_aceita(dados_dict)
+        return dados_dict["_id"]
+
     try:
         collection = get_db_collection(COLLECTION_NAME)
-        
-        # 1. LIMPEZA: Converte para dicionário removendo os Nulos (None)
-        # Isso remove ph, npk, etc., se não vierem do Arduino
-        dados_dict = dados.model_dump(exclude_none=True) 
-        
-        # 2. ENRIQUECIMENTO: Adiciona o Calendário (Fuso Brasil)
-        fuso_brasil = pytz.timezone('America/Sao_Paulo')
-        agora = datetime.datetime.now(fuso_brasil)
-        
-        dados_dict["timestamp"] = agora
-        dados_dict["data"] = agora.strftime("%d/%m/%Y") # 03/12/2025
-        dados_dict["hora"] = agora.strftime("%H:%M:%S") # 19:30:00
-        
-        # Campos para filtros fáceis no Dashboard
-        dados_dict["dia"] = agora.day
-        dados_dict["mes"] = agora.month
-        dados_dict["ano"] = agora.year
-        dados_dict["hora_simples"] = agora.hour
-        
-        # 3. PERSISTÊNCIA: Salva o dicionário completo
-        result = collection.insert_one(dados_dict)
+
+        with ETAPA_INGESTAO.cronometrar(etapa="enriquecimento"):
+            dados_dict = montar_documento(dados)
+
+        # PERSISTÊNCIA: Salva o dicionário completo
+        with ETAPA_INGESTAO.cronometrar(etapa="mongo"), operacao_mongo("insert_one"):
+            result = await collection.insert_one(dados_dict)
+        registrar_leitura_aceita(dados_dict)
+        await apos_gravar([dados_dict])
         
         print(f"✅ [REAL] Salvo em '{COLLECTION_NAME}' | ID: {result.inserted_id}")
         return result.inserted_id
@@ -45,10 +163,189 @@ def salvar_dados_sensor(dados: esquemas.DadosSensorCreate):
         print(f"❌ Erro ao salvar: {e}")
         return None
 
-def buscar_ultimos_dados():
+async def salvar_lote_dados_sensor(lote: list[esquemas.DadosSensorLoteItem]) -> list[tuple]:
+    """
+    Salva várias leituras com um único insert_many não ordenado.
+
+    Retorna uma lista alinhada com 'lote', onde cada posição é uma tupla
+    (id_inserido, erro). Um item com falha não impede a gravação dos demais.
+    Levanta IngestaoPausadaError durante a manutenção da coleção.
+    """
+    if not lote:
+        return []
+    exigir_ingestao_liberada()
+
     try:
         collection = get_db_collection(COLLECTION_NAME)
-        return collection.find_one({}, sort=[("timestamp", DESCENDING)], projection={'_id': 0})
+    except Exception as e:
+        print(f"❌ Erro ao salvar lote: {e}")
+        return [(None, str(e))] * len(lote)
+
+    with ETAPA_INGESTAO.cronometrar(etapa="enriquecimento"):
+        documentos = [montar_documento(item, item.timestamp) for item in lote]
+    # O _id é gerado aqui mesmo, assim sabemos o ID de cada posição
+    # mesmo quando parte do lote falha
+    for documento in documentos:
+        documento["_id"] = ObjectId()
+
+    resultados = [(documento["_id"], None) for documento in documentos]
+
+    try:
+        with ETAPA_INGESTAO.cronometrar(etapa="mongo"), operacao_mongo("insert_many"):
+            await collection.insert_many(documentos, ordered=False)
+    except BulkWriteError as e:
+        for erro in e.details.get("writeErrors", []):
+            resultados[erro["index"]] = (None, erro.get("errmsg", "Erro de escrita."))
+    except PyMongoError as e:
+        print(f"❌ Erro ao salvar lote: {e}")
+        return [(None, str(e))] * len(lote)
+
+    gravados = [doc for doc, (id_inserido, _) in zip(documentos, resultados) if id_inserido is not None]
+    for documento in gravados:
+        registrar_leitura_aceita(documento)
+    await apos_gravar(gravados)
+
+    print(f"✅ [REAL] Lote salvo em '{COLLECTION_NAME}' | {len(gravados)}/{len(lote)} itens")
+    return resultados
+
+async def buscar_ultimos_dados(id_dispositivo: str | None = None):
+    """
+    Retorna a leitura mais recente (de um dispositivo ou de todos).
+    Usa o cache em memória; só consulta o banco se o cache ainda não foi aquecido.
+    Com estado compartilhado (vários workers), o cache do worker não vê as
+    leituras recebidas pelos outros, então a consulta vai sempre ao banco.
+    """
+    if cache_ultimas.aquecido and settings.ESTADO_BACKEND == "memoria":
+        return cache_ultimas.obter(id_dispositivo)
+
+    try:
+        collection = get_db_collection(COLLECTION_NAME)
+        filtro = {} if id_dispositivo is None else {"id_dispositivo": id_dispositivo}
+        with operacao_mongo("find_one_ultimos"):
+            return await collection.find_one(filtro, sort=[("timestamp", DESCENDING)], projection={'_id': 0})
     except Exception as e:
         print(f"Erro busca: {e}")
-        return None
\ No newline at end of file
+        return None
+
+async def buscar_ultimos_dados_dispositivo(id_dispositivo: str):
+    """Atalho para a leitura mais recente de um dispositivo específico."""
+    return await buscar_ultimos_dados(id_dispositivo)
+
+# Baldes agregados no banco por ponto pedido, antes do LTTB
+BALDES_POR_PONTO = 4
+
+def _segundos(momento: datetime.datetime) -> float:
+    # Datas do MongoDB chegam sem fuso, em UTC
+    if momento.tzinfo is None:
+        momento = momento.replace(tzinfo=datetime.timezone.utc)
+    return momento.timestamp()
+
+async def _ler_pontos(collection, filtro: dict, campos: list[str]):
+    """Todas as leituras do filtro: (momentos, valores por métrica, pontos por métrica)."""
+    projecao = {"_id": 0, "timestamp": 1, **{m: 1 for m in campos}}
+    momentos = []
+    valores = {m: [] for m in campos}
+    async for documento in collection.find(filtro, projecao).sort("timestamp", 1):
+        momento = documento.get("timestamp")
+        if not isinstance(momento, datetime.datetime):
+            continue
+        momentos.append(_segundos(momento))
+        for m in campos:
+            valor = documento.get(m)
+            valores[m].append(valor if isinstance(valor, (int, float)) else np.nan)
+    originais = {m: int(np.isfinite(np.asarray(valores[m], dtype=np.float64)).sum()) for m in campos}
+    return momentos, valores, originais
+
+async def _ler_baldes(collection, filtro: dict, campos: list[str], max_pontos: int):
+    """
+    Médias das leituras do filtro em cerca de BALDES_POR_PONTO * max_pontos
+    baldes de tempo, calculadas no banco (o intervalo inteiro não passa pela
+    API). Cada balde vira um ponto no seu início; o LTTB escolhe entre eles.
+    """
+    filtro = {**filtro, "timestamp": {**filtro.get("timestamp", {}), "$type": "date"}}
+    primeiro = await collection.find_one(filtro, {"timestamp": 1}, sort=[("timestamp", 1)])
+    ultimo = await collection.find_one(filtro, {"timestamp": 1}, sort=[("timestamp", -1)])
+    if primeiro is None:
+        return [], {m: [] for m in campos}, {m: 0 for m in campos}
+
+    duracao_s = (ultimo["timestamp"] - primeiro["timestamp"]).total_seconds()
+    largura_s = max(1, math.ceil(duracao_s / (BALDES_POR_PONTO * max_pontos)))
+    grupo: dict = {"_id": {"$dateTrunc": {"date": "$timestamp", "unit": "second", "binSize": largura_s}}}
+    for m in campos:
+        # $avg ignora valores não numéricos, como a leitura completa
+        grupo[m] = {"$avg": f"${m}"}
+        grupo[f"{m}__contagem"] = {"$sum": {"$cond": [{"$isNumber": f"${m}"}, 1, 0]}}
+    pipeline = [{"$match": filtro}, {"$group": grupo}, {"$sort": {"_id": 1}}]
+
+    momentos = []
+    valores = {m: [] for m in campos}
+    originais = {m: 0 for m in campos}
+    async for balde in collection.aggregate(pipeline):
+        momentos.append(_segundos(balde["_id"]))
+        for m in campos:
+            valores[m].append(np.nan if balde.get(m) is None else balde[m])
+            originais[m] += balde.get(f"{m}__contagem", 0)
+    return momentos, valores, originais
+
+@metricas.medir(MONGO_LATENCIA, MONGO_ERROS, operacao="buscar_historico")
+async def buscar_historico(
+    campos: list[str],
+    id_dispositivo: str | None = None,
+    inicio: datetime.datetime | None = None,
+    fim: datetime.datetime | None = None,
+    max_pontos: int | None = None,
+) -> dict:
+    """
+    Retorna as séries das métricas pedidas ('campos') no intervalo, em ordem de tempo.
+    Com 'max_pontos', o banco agrega o intervalo em baldes de tempo e cada
+    série é reduzida pelo LTTB para caber no gráfico.
+    """
+    filtro: dict = {}
+    if id_dispositivo is not None:
+        filtro["id_dispositivo"] = id_dispositivo
+    if inicio is not None or fim is not None:
+        filtro["timestamp"] = {}
+        if inicio is not None:
+            filtro["timestamp"]["$gte"] = inicio
+        if fim is not None:
+            filtro["timestamp"]["$lt"] = fim
+
+    collection = get_db_collection(COLLECTION_NAME)
+    if max_pontos:
+        momentos, valores, originais = await _ler_baldes(collection, filtro, campos, max_pontos)
+    else:
+        momentos, valores, originais = await _ler_pontos(collection, filtro, campos)
+
+    series = {}
+    for m in campos:
+        x = np.asarray(momentos, dtype=np.float64)
+        y = np.asarray(valores[m], dtype=np.float64)
+        x, y = reduzir_serie(x, y, max_pontos if max_pontos else len(x))
+        series[m] = [
+            {"timestamp": datetime.datetime.fromtimestamp(t, datetime.timezone.utc), "valor": float(v)}
+            for t, v in zip(x, y)
+        ]
+    return {"series": series, "pontos_originais": originais}
+
+async def estado_ultimas_leituras(id_dispositivo: str | None = None) -> list[dict]:
+    """
+    Últimas leituras com idade e indicador de desatualização, a partir do cache.
+    Com estado compartilhado (vários workers), o cache do worker só conhece os
+    dispositivos que enviaram para ele, então as leituras vêm do banco.
+    """
+    if settings.ESTADO_BACKEND == "memoria":
+        return cache_ultimas.estado(settings.CACHE_ULTIMAS_LIMITE_DESATUALIZADO_S, id_dispositivo)
+
+    ultimas = CacheUltimasLeituras()
+    with operacao_mongo("aggregate_ultimas"):
+        await ultimas.carregar(get_db_collection(COLLECTION_NAME), id_dispositivo)
+    return ultimas.estado(settings.CACHE_ULTIMAS_LIMITE_DESATUALIZADO_S, id_dispositivo)
+
+async def aquecer_cache_ultimas_leituras(db):
+    """
+    Gancho de conexão: carrega a última leitura de cada dispositivo.
+    """
+    try:
+        await cache_ultimas.aquecer(db[COLLECTION_NAME])
+    except Exception as e:
+        print(f"⚠️ Erro ao aquecer cache de últimas leituras: {e}")
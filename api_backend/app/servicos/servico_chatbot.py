@@ -1,41 +1,234 @@
-import google.generativeai as genai
+import datetime
+from app.nucleo import culturas
+from app.servicos import servico_alertas, servico_banco_de_dados
 from app.nucleo.configuracoes import settings
-from app.servicos import servico_banco_de_dados
-
-if settings.GOOGLE_API_KEY:
-    genai.configure(api_key=settings.GOOGLE_API_KEY)
+from app.servicos.cache_respostas import CacheRespostas
+from app.servicos.estado_compartilhado import criar_estado
+from app.servicos.memoria_conversas import MemoriaConversas
+from app.servicos.motor_regras import motor_regras
+from app.servicos.cliente_llm import LLMIndisponivelError, obter_cliente_llm
 
 # Link do Dashboard (Certifique-se que é o seu link atual do ngrok)
 # Como não temos dois túneis, enviamos uma mensagem instruindo a olhar o telão
 LINK_DASHBOARD = "O Dashboard está aberto no computador da apresentação. Acompanhe no telão! 🖥️"
 
-# --- MEMÓRIA VOLÁTIL ---
-historico_conversas = {}
-
-CONHECIMENTO_TECNICO = """
-PROJETO: "Horta Inteligente" (Sistema IoT de Horticultura de Precisão).
-
-=== 1. TABELA DE REFERÊNCIA (Hortaliças Folhosas/Alface) ===
-- Umidade: Ideal 60% a 80%. (Abaixo de 40% = Crítico/Seco).
-- pH: Ideal 6.0 a 7.0.
-- EC (Condutividade): 1000 a 1800 µS/cm.
-- Nitrogênio (N): 150-200 mg/kg.
-- Fósforo (P): 60-100 mg/kg.
-- Potássio (K): 150-200 mg/kg.
-
-=== 2. GUIA DE MANEJO RÁPIDO ===
-- pH BAIXO (< 5.5): Aplicar Calcário.
-- pH ALTO (> 7.5): Aplicar Enxofre.
-- N BAIXO: Adubar com Ureia ou Esterco.
-- P BAIXO: Adubar com Farinha de Ossos.
-- K BAIXO: Adubar com Cloreto de Potássio.
-- EC ALTA: Lavar o solo (irrigação excessiva controlada).
-"""
-
-def get_chat_history(chat_id):
-    if chat_id not in historico_conversas:
-        historico_conversas[chat_id] = []
-    return historico_conversas[chat_id]
+# --- MEMÓRIA DAS CONVERSAS ---
+# Limitada por número de conversas, tempo parado e turnos/tokens por conversa.
+# Fica no estado compartilhado (ESTADO_BACKEND), visível a todos os workers
+historico_conversas = MemoriaConversas(
+    max_conversas=settings.CHATBOT_MAX_CONVERSAS,
+    ttl_s=settings.CHATBOT_CONVERSA_TTL_S,
+    max_turnos=settings.CHATBOT_MAX_TURNOS,
+    max_tokens=settings.CHATBOT_MAX_TOKENS_HISTORICO,
+    estado=criar_estado("conversas", settings.CHATBOT_MAX_CONVERSAS),
+)
+
+# Respostas da IA para a primeira pergunta de cada conversa, por telemetria
+cache_respostas = CacheRespostas(
+    settings.CHATBOT_CACHE_CAPACIDADE, settings.CHATBOT_CACHE_TTL_S,
+    estado=criar_estado("respostas", settings.CHATBOT_CACHE_CAPACIDADE),
+)
+
+# Marcam a telemetria e a pergunta dentro da mensagem enviada à IA
+MARCADOR_TELEMETRIA = "DADOS DO CAMPO:"
+MARCADOR_PERGUNTA = "PERGUNTA DO USUÁRIO:"
+
+# Opções do menu respondidas sem chamar a IA
+PEDIDOS_TELEMETRIA = {'2', 'telemetria', 'dados', 'dados atuais', 'quais os dados atuais'}
+PEDIDOS_DASHBOARD = {'3', 'dashboard', 'gráficos', 'graficos', 'quero ver gráficos', 'quero ver graficos'}
+# Inscrição nos alertas do motor de regras (opcionalmente de um dispositivo)
+COMANDO_ALERTAS = '/alertas'
+COMANDO_PARAR_ALERTAS = '/parar_alertas'
+
+CONHECIMENTO_TECNICO = (
+    'PROJETO: "Horta Inteligente" (Sistema IoT de Horticultura de Precisão).\n\n'
+    "=== TABELA DE REFERÊNCIA (Hortaliças Folhosas) ===\n"
+    f"{culturas.texto_referencia()}\n"
+)
+
+# --- PROMPT BLINDADO (MODO AGRO) ---
+# Instrução de sistema: configurada uma única vez no modelo, fora do histórico
+INSTRUCOES_SISTEMA = (
+    f"IDENTIDADE: Hortbot (Assistente Técnico do projeto Horta Inteligente).\n"
+    f"IDIOMA: Português do Brasil (PT-BR) OBRIGATÓRIO.\n\n"
+
+    f"PROTOCOLO DE SEGURANÇA (IMPORTANTE):\n"
+    f"1. SEU FOCO É EXCLUSIVO: Agronomia, Horticultura, Botânica e o projeto Horta Inteligente.\n"
+    f"2. BLOQUEIO DE ASSUNTO: Se o usuário perguntar sobre futebol, política, piadas ou assuntos aleatórios, RECUSE.\n"
+    f"   - Exceção: Se o usuário enviar apenas números ('1', '2', '3'), trate como escolha de menu.\n\n"
+
+    f"DADOS DO CAMPO: chegam nas mensagens do usuário, após '{MARCADOR_TELEMETRIA}'. "
+    f"Use sempre a telemetria mais recente da conversa.\n"
+    f"MANUAL TÉCNICO:\n{CONHECIMENTO_TECNICO}\n\n"
+
+    f"DIRETRIZES DE RESPOSTA:\n"
+    f"- Se o usuário digitar '1', 'diagnóstico' ou perguntar 'como está': Faça uma análise completa cruzando dados com a tabela.\n"
+    f"- Se o usuário digitar '2', 'telemetria' ou perguntar 'dados': Liste apenas os valores atuais dos sensores com emojis.\n"
+    f"- Se o usuário digitar '3', 'dashboard' ou 'gráficos': Envie apenas o link: {LINK_DASHBOARD}\n"
+    f"- O DIAGNÓSTICO DO MOTOR DE REGRAS (quando presente) já cruzou as médias recentes com a tabela: use-o como base.\n"
+    f"- Use emojis técnicos (🌿, 💧, ⚠️) mas não exagere. NÃO use Markdown (negrito/itálico).\n"
+    f"- Seja gentil, mas profissional."
+)
+
+async def get_chat_history(chat_id):
+    return await historico_conversas.obter(chat_id)
+
+def ultima_telemetria_enviada(historico: list[dict]) -> str | None:
+    """Telemetria da mensagem mais recente da conversa que a incluiu."""
+    for mensagem in reversed(historico):
+        if mensagem["role"] != "user":
+            continue
+        for parte in mensagem["parts"]:
+            if parte.startswith(MARCADOR_TELEMETRIA):
+                return parte[len(MARCADOR_TELEMETRIA):].split(MARCADOR_PERGUNTA, 1)[0].strip()
+    return None
+
+def montar_mensagem_turno(texto_usuario: str, contexto_sensores: str, historico: list[dict]) -> str:
+    """
+    Pergunta do usuário, precedida da telemetria só se ela mudou desde a
+    última vez que foi enviada nesta conversa (ou se saiu do histórico).
+    """
+    pergunta = f"{MARCADOR_PERGUNTA} {texto_usuario}"
+    if ultima_telemetria_enviada(historico) == contexto_sensores.strip():
+        return pergunta
+    return f"{MARCADOR_TELEMETRIA}\n{contexto_sensores}\n{pergunta}"
+
+async def registrar_turno(chat_id, pergunta: str, resposta: str):
+    """Guarda no histórico um turno respondido sem passar pela IA."""
+    historico = await get_chat_history(chat_id)
+    historico.append({"role": "user", "parts": [pergunta]})
+    historico.append({"role": "model", "parts": [resposta]})
+    await historico_conversas.salvar(chat_id, historico)
+
+def normalizar_pergunta(texto: str) -> str:
+    """Minúsculas, espaços simples e sem pontuação final ('Dados?' == 'dados')."""
+    return " ".join(texto.lower().split()).rstrip("?!. ")
+
+def obter_valor(dados: dict, chaves):
+    for k in chaves:
+        val = dados.get(k)
+        if val is not None:
+            # Se vier dicionário do Mongo, limpa
+            if isinstance(val, dict): val = list(val.values())[0]
+            try:
+                val_float = float(val)
+                # CORREÇÃO DA UMIDADE (0.3 -> 30.0%)
+                if 'umidade' in chaves[0] or 'h' in chaves:
+                    if val_float <= 1.0: val_float *= 100
+                return round(val_float, 2)
+            except:
+                return val
+    return '?'
+
+def formatar_telemetria(dados: dict) -> dict:
+    """
+    Extrai da última leitura o momento e os valores já tratados de cada sensor.
+    """
+    # Tratamento de Data/Hora
+    data_str = dados.get('data')
+    hora_str = dados.get('hora')
+    ts = dados.get('timestamp', 'Agora')
+    if data_str and hora_str:
+        momento = f"{data_str} às {hora_str}"
+    elif isinstance(ts, datetime.datetime):
+        # Armazenamento compacto: calcula a data/hora a partir do timestamp
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=datetime.timezone.utc)
+        ts = ts.astimezone(servico_banco_de_dados.FUSO_BRASIL)
+        momento = ts.strftime("%d/%m/%Y às %H:%M:%S")
+    else:
+        momento = str(ts)[0:16]
+
+    return {
+        "momento": momento,
+        "umidade": obter_valor(dados, ['h', 'umidade']),
+        "temperatura": obter_valor(dados, ['temperatura', 'temp']),
+        "ph": obter_valor(dados, ['ph_solo', 'ph']),
+        "condutividade": obter_valor(dados, ['condutividade_elétrica', 'condutividade_eletrica']),
+        "nitrogenio": obter_valor(dados, ['nitrogênio', 'nitrogenio']),
+        "fosforo": obter_valor(dados, ['fósforo', 'fosforo']),
+        "potassio": obter_valor(dados, ['potássio', 'potassio']),
+    }
+
+def formatar_contexto_sensores(dados: dict | None) -> str:
+    if not dados:
+        return "STATUS: Dados dos sensores indisponíveis no momento."
+    t = formatar_telemetria(dados)
+    # Contexto formatado
+    return (
+        f"TELEMETRIA ATUAL ({t['momento']}):\n"
+        f"- Umidade: {t['umidade']}%\n"
+        f"- Temp: {t['temperatura']}°C\n"
+        f"- pH: {t['ph']}\n"
+        f"- EC: {t['condutividade']} µS/cm\n"
+        f"- Nitrogênio (N): {t['nitrogenio']} mg/kg\n"
+        f"- Fósforo (P): {t['fosforo']} mg/kg\n"
+        f"- Potássio (K): {t['potassio']} mg/kg\n"
+    )
+
+def formatar_diagnostico(diagnostico: dict | None) -> str:
+    """
+    Diagnóstico do motor de regras para o contexto da IA. Só estados e manejo
+    (sem os valores, que já estão na telemetria), para não mudar a cada leitura.
+    """
+    if not diagnostico:
+        return ""
+    linhas = [f"DIAGNÓSTICO DO MOTOR DE REGRAS ({diagnostico['cultura']}): {diagnostico['status']}"]
+    for metrica, info in diagnostico["metricas"].items():
+        estado = info["estado"]
+        if estado is None or estado == "ok":
+            continue
+        nome = culturas.NOMES_METRICAS.get(metrica, (metrica,))[0]
+        direcao = "baixo" if estado.endswith("baixo") else "alto"
+        critico = " (CRÍTICO)" if estado in culturas.ESTADOS_CRITICOS else ""
+        manejo = culturas.MANEJO.get((metrica, direcao), "")
+        linhas.append(f"- {nome}: {direcao.upper()}{critico}. {manejo}".rstrip())
+    return "\n".join(linhas) + "\n"
+
+async def responder_comando_alertas(texto_usuario: str, chat_id: str) -> str | None:
+    """/alertas [dispositivo] e /parar_alertas. Retorna None para as demais mensagens."""
+    partes = texto_usuario.strip().split()
+    if not partes or partes[0].lower() not in (COMANDO_ALERTAS, COMANDO_PARAR_ALERTAS):
+        return None
+    try:
+        if partes[0].lower() == COMANDO_PARAR_ALERTAS:
+            if await servico_alertas.cancelar(chat_id):
+                return "🔕 Você não receberá mais alertas da horta."
+            return "Você não estava inscrito nos alertas."
+        id_dispositivo = partes[1] if len(partes) > 1 else None
+        await servico_alertas.assinar(chat_id, id_dispositivo)
+    except Exception as e:
+        print(f"[ERRO ALERTAS] {e}")
+        return "⚠️ Não foi possível atualizar sua inscrição agora. Tente novamente."
+    alvo = f"do dispositivo {id_dispositivo}" if id_dispositivo else "de todos os dispositivos"
+    return f"🔔 Pronto! Você receberá os alertas {alvo}. Envie {COMANDO_PARAR_ALERTAS} para cancelar."
+
+def responder_localmente(texto_usuario: str, dados: dict | None) -> str | None:
+    """
+    Responde as opções 2 (telemetria) e 3 (dashboard) do menu, que não
+    dependem da IA. Retorna None para as demais perguntas.
+    """
+    pergunta = normalizar_pergunta(texto_usuario)
+
+    if pergunta in PEDIDOS_DASHBOARD:
+        return LINK_DASHBOARD
+
+    if pergunta in PEDIDOS_TELEMETRIA:
+        if not dados:
+            return "⚠️ Dados dos sensores indisponíveis no momento. Tente novamente em instantes."
+        t = formatar_telemetria(dados)
+        return (
+            f"📡 Telemetria atual ({t['momento']}):\n"
+            f"💧 Umidade: {t['umidade']}%\n"
+            f"🌡️ Temperatura: {t['temperatura']}°C\n"
+            f"🧪 pH: {t['ph']}\n"
+            f"⚡ EC: {t['condutividade']} µS/cm\n"
+            f"🌿 Nitrogênio (N): {t['nitrogenio']} mg/kg\n"
+            f"🌿 Fósforo (P): {t['fosforo']} mg/kg\n"
+            f"🌿 Potássio (K): {t['potassio']} mg/kg"
+        )
+
+    return None
 
 async def processar_mensagem_usuario(texto_usuario: str, chat_id: str = "default") -> str:
     print(f"[DEBUG] Mensagem de {chat_id}: {texto_usuario}")
@@ -45,7 +238,7 @@ async def processar_mensagem_usuario(texto_usuario: str, chat_id: str = "default
     
     # Verifica saudação simples
     if texto_usuario.lower().strip() in saudacoes:
-        historico_conversas[chat_id] = [] # Limpa memória anterior
+        await historico_conversas.limpar(chat_id) # Limpa memória anterior
         return (
             "🌿 **Olá! Eu sou o Hortbot.**\n\n"
             "Sou a Inteligência Artificial do projeto **Horta Inteligente**.\n"
@@ -53,92 +246,57 @@ async def processar_mensagem_usuario(texto_usuario: str, chat_id: str = "default
             "**Como posso ajudar?**\n"
             "1️⃣ *Como está a horta?* (Diagnóstico)\n"
             "2️⃣ *Quais os dados atuais?* (Telemetria)\n"
-            "3️⃣ *Quero ver gráficos* (Dashboard)\n"
+            "3️⃣ *Quero ver gráficos* (Dashboard)\n\n"
+            f"🔔 Envie {COMANDO_ALERTAS} para receber alertas da horta.\n"
         )
 
+    # --- 1.1 INSCRIÇÃO NOS ALERTAS ---
+    resposta_alertas = await responder_comando_alertas(texto_usuario, chat_id)
+    if resposta_alertas is not None:
+        return resposta_alertas
+
     # --- 2. BUSCA E TRATAMENTO DE DADOS ---
-    dados = servico_banco_de_dados.buscar_ultimos_dados()
-    
-    if dados:
-        # Tratamento de Data/Hora
-        data_str = dados.get('data')
-        hora_str = dados.get('hora')
-        if data_str and hora_str:
-            momento = f"{data_str} às {hora_str}"
-        else:
-            ts = dados.get('timestamp', 'Agora')
-            momento = str(ts)[0:16]
-
-        def obter_valor(chaves):
-            for k in chaves:
-                val = dados.get(k)
-                if val is not None:
-                    # Se vier dicionário do Mongo, limpa
-                    if isinstance(val, dict): val = list(val.values())[0]
-                    try:
-                        val_float = float(val)
-                        # CORREÇÃO DA UMIDADE (0.3 -> 30.0%)
-                        if 'umidade' in chaves[0] or 'h' in chaves:
-                            if val_float <= 1.0: val_float *= 100
-                        return round(val_float, 2)
-                    except:
-                        return val
-            return '?'
-
-        # Contexto formatado
-        contexto_sensores = (
-            f"TELEMETRIA ATUAL ({momento}):\n"
-            f"- Umidade: {obter_valor(['h', 'umidade'])}%\n"
-            f"- Temp: {obter_valor(['temperatura', 'temp'])}°C\n"
-            f"- pH: {obter_valor(['ph_solo', 'ph'])}\n"
-            f"- EC: {obter_valor(['condutividade_elétrica', 'condutividade_eletrica'])} µS/cm\n"
-            f"- Nitrogênio (N): {obter_valor(['nitrogênio', 'nitrogenio'])} mg/kg\n"
-            f"- Fósforo (P): {obter_valor(['fósforo', 'fosforo'])} mg/kg\n"
-            f"- Potássio (K): {obter_valor(['potássio', 'potassio'])} mg/kg\n"
-        )
-    else:
-        contexto_sensores = "STATUS: Dados dos sensores indisponíveis no momento."
+    dados = await servico_banco_de_dados.buscar_ultimos_dados()
+    contexto_sensores = formatar_contexto_sensores(dados)
+    if dados and dados.get("id_dispositivo"):
+        # Diagnóstico já calculado pelo motor de regras a cada leitura
+        contexto_sensores += formatar_diagnostico(motor_regras.diagnostico(dados["id_dispositivo"]))
 
-    # --- 3. PROMPT BLINDADO (MODO AGRO) ---
-    # --- 3. PROMPT BLINDADO (MODO AGRO) ---
-    prompt_completo = (
-        f"IDENTIDADE: Hortbot (Assistente Técnico do projeto Horta Inteligente).\n"
-        f"IDIOMA: Português do Brasil (PT-BR) OBRIGATÓRIO.\n\n"
-        
-        f"PROTOCOLO DE SEGURANÇA (IMPORTANTE):\n"
-        f"1. SEU FOCO É EXCLUSIVO: Agronomia, Horticultura, Botânica e o projeto Horta Inteligente.\n"
-        f"2. BLOQUEIO DE ASSUNTO: Se o usuário perguntar sobre futebol, política, piadas ou assuntos aleatórios, RECUSE.\n"
-        f"   - Exceção: Se o usuário enviar apenas números ('1', '2', '3'), trate como escolha de menu.\n\n"
+    # --- 2.1 RESPOSTAS LOCAIS (telemetria e dashboard não precisam da IA) ---
+    resposta_local = responder_localmente(texto_usuario, dados)
+    if resposta_local is not None:
+        await registrar_turno(chat_id, texto_usuario, resposta_local)
+        return resposta_local
 
-        f"DADOS DO CAMPO:\n{contexto_sensores}\n"
-        f"MANUAL TÉCNICO:\n{CONHECIMENTO_TECNICO}\n\n"
-        
-        f"DIRETRIZES DE RESPOSTA:\n"
-        f"- Se o usuário digitar '1', 'diagnóstico' ou perguntar 'como está': Faça uma análise completa cruzando dados com a tabela.\n"
-        f"- Se o usuário digitar '2', 'telemetria' ou perguntar 'dados': Liste apenas os valores atuais dos sensores com emojis.\n"
-        f"- Se o usuário digitar '3', 'dashboard' ou 'gráficos': Envie apenas o link: {LINK_DASHBOARD}\n"
-        f"- Use emojis técnicos (🌿, 💧, ⚠️) mas não exagere. NÃO use Markdown (negrito/itálico).\n"
-        f"- Seja gentil, mas profissional.\n\n"
-        
-        f"PERGUNTA DO USUÁRIO: {texto_usuario}"
-    )
+    # --- 3. MENSAGEM DO TURNO ---
+    # As instruções fixas ficam no modelo; aqui vai só a pergunta e, quando
+    # mudou desde a última mensagem desta conversa, a telemetria atual
+    historico_atual = await get_chat_history(chat_id)
+    mensagem_turno = montar_mensagem_turno(texto_usuario, contexto_sensores, historico_atual)
 
     try:
-        if not settings.GOOGLE_API_KEY:
-            return "⚠️ Erro: Chave API ausente."
+        cliente = obter_cliente_llm(INSTRUCOES_SISTEMA)
 
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        
-        # Histórico
-        historico_atual = get_chat_history(chat_id)
-        chat = model.start_chat(history=historico_atual)
-        
-        response = chat.send_message(prompt_completo)
+        if historico_atual:
+            texto_resposta, novo_historico = await cliente.conversar(historico_atual, mensagem_turno)
+        else:
+            # Primeira pergunta da conversa: a resposta depende só da pergunta e
+            # da telemetria, então pode ser reaproveitada entre usuários
+            chave = (normalizar_pergunta(texto_usuario), contexto_sensores)
+            texto_resposta, novo_historico = await cache_respostas.obter_ou_calcular(
+                chave, lambda: cliente.conversar([], mensagem_turno)
+            )
         
         # Salva histórico
-        historico_conversas[chat_id] = chat.history
+        await historico_conversas.salvar(chat_id, novo_historico)
+
+        return texto_resposta
 
-        return response.text
+    except LLMIndisponivelError as e:
+        print(f"[ERRO IA] {e}")
+        if "Chave API" in str(e):
+            return "⚠️ Erro: Chave API ausente."
+        return "Hortbot está atendendo muitas perguntas agora. Tente novamente em instantes."
 
     except Exception as e:
         print(f"[ERRO IA] {e}")
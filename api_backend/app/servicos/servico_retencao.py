@@ -0,0 +1,184 @@
+"""
+Retenção das leituras: o MongoDB guarda só a janela quente
+(RETENCAO_DIAS_QUENTES); os dias mais antigos vão para o arquivo frio em
+Parquet (app/nucleo/arquivo_frio.py) e são apagados do banco.
+
+Para cada coleção, dia (UTC) e dispositivo anteriores ao corte:
+1. As leituras são lidas em lotes (ordenadas por timestamp) e gravadas em um
+   arquivo da partição (dispositivo, dia).
+2. Só depois do arquivo salvo, as leituras daquele dia e dispositivo são
+   apagadas com um filtro de datas, conferindo antes se a quantidade no banco
+   é a mesma que foi arquivada (se chegou algo no meio, o dia fica para a
+   próxima rodada).
+
+O arquivamento usa o driver síncrono (pymongo): na API roda em uma thread,
+a cada RETENCAO_INTERVALO_H, e também pode ser chamado pelo terminal
+(python -m app.comandos.arquivar_leituras). Com vários workers ou réplicas,
+uma trava com validade na coleção 'tarefas' garante uma execução por vez.
+"""
+import asyncio
+import datetime
+import os
+import socket
+import threading
+from pymongo import ASCENDING, MongoClient, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app.db.conexao_mongodb import NOME_BANCO
+from app.nucleo.configuracoes import settings
+
+COLECAO_TAREFAS = "tarefas"
+ID_TRAVA = "retencao"
+
+# Tarefa periódica da API (só existe quando RETENCAO_ATIVA=true)
+tarefa_retencao: asyncio.Task | None = None
+# Pede para o arquivamento em andamento parar entre duas partições
+parar_arquivamento = threading.Event()
+
+
+def inicio_do_dia(momento: datetime.datetime) -> datetime.datetime:
+    return momento.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def corte_retencao(dias_quentes: int, agora: datetime.datetime | None = None) -> datetime.datetime:
+    """Início (UTC, sem fuso) do dia mais antigo que continua no banco."""
+    agora = agora or datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    return inicio_do_dia(agora) - datetime.timedelta(days=dias_quentes)
+
+
+def adquirir_trava(db, duracao_s: float) -> bool:
+    """Trava com validade: só uma execução por vez entre workers e máquinas."""
+    agora = datetime.datetime.now(datetime.timezone.utc)
+    dono = f"{socket.gethostname()}:{os.getpid()}"
+    try:
+        trava = db[COLECAO_TAREFAS].find_one_and_update(
+            {"_id": ID_TRAVA, "$or": [{"ate": {"$lt": agora}}, {"dono": dono}]},
+            {"$set": {"ate": agora + datetime.timedelta(seconds=duracao_s), "dono": dono}},
+            upsert=True, return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # O documento existe e a trava é de outro processo
+        return False
+    return trava is not None
+
+
+def liberar_trava(db):
+    dono = f"{socket.gethostname()}:{os.getpid()}"
+    db[COLECAO_TAREFAS].update_one({"_id": ID_TRAVA, "dono": dono}, {"$set": {"ate": datetime.datetime.now(datetime.timezone.utc)}})
+
+
+def arquivar_dispositivo_dia(collection, nome_colecao: str, id_dispositivo: str, inicio: datetime.datetime,
+                             fim: datetime.datetime, diretorio: str, tamanho_lote: int, apagar: bool) -> int:
+    """Arquiva e apaga as leituras de um dispositivo em [inicio, fim). Retorna quantas foram arquivadas."""
+    from app.nucleo import arquivo_frio
+    filtro = {"id_dispositivo": id_dispositivo, "timestamp": {"$gte": inicio, "$lt": fim}}
+    cursor = collection.find(filtro).sort("timestamp", ASCENDING).batch_size(tamanho_lote)
+    documentos = list(cursor)
+    if not documentos:
+        return 0
+
+    caminho = arquivo_frio.escrever_particao(
+        diretorio, nome_colecao, id_dispositivo, inicio.date(), documentos, tamanho_lote
+    )
+    if not apagar:
+        return len(documentos)
+
+    # Confere antes de apagar: o que estiver no intervalo tem que ser o que foi arquivado
+    no_banco = collection.count_documents(filtro)
+    if no_banco != len(documentos):
+        print(f"⚠️ {nome_colecao}/{id_dispositivo}/{inicio.date()}: {no_banco} no banco e "
+              f"{len(documentos)} arquivadas. Não apagado; fica para a próxima rodada.")
+        return len(documentos)
+    resultado = collection.delete_many(filtro)
+    print(f"🧊 {nome_colecao}/{id_dispositivo}/{inicio.date()}: {len(documentos)} leituras -> {caminho.name}, "
+          f"{resultado.deleted_count} apagadas do banco")
+    return len(documentos)
+
+
+def arquivar_colecao(db, nome_colecao: str, corte: datetime.datetime, diretorio: str,
+                     tamanho_lote: int = 5000, apagar: bool = True) -> int:
+    """Arquiva, dia a dia, todas as leituras da coleção anteriores ao 'corte'."""
+    collection = db[nome_colecao]
+    mais_antiga = collection.find_one(
+        {"timestamp": {"$type": "date", "$lt": corte}}, {"timestamp": 1}, sort=[("timestamp", ASCENDING)]
+    )
+    if mais_antiga is None:
+        return 0
+
+    total = 0
+    dia = inicio_do_dia(mais_antiga["timestamp"].replace(tzinfo=None))
+    while dia < corte and not parar_arquivamento.is_set():
+        proximo = dia + datetime.timedelta(days=1)
+        for id_dispositivo in collection.distinct("id_dispositivo", {"timestamp": {"$gte": dia, "$lt": proximo}}):
+            if parar_arquivamento.is_set():
+                break
+            if id_dispositivo is None:
+                continue
+            total += arquivar_dispositivo_dia(
+                collection, nome_colecao, id_dispositivo, dia, proximo, diretorio, tamanho_lote, apagar
+            )
+        dia = proximo
+    return total
+
+
+def executar_retencao(db, colecoes: list[str] | None = None, dias_quentes: int | None = None,
+                      diretorio: str | None = None, tamanho_lote: int | None = None, apagar: bool = True) -> dict:
+    """Uma rodada de retenção em todas as coleções configuradas. Retorna quantas leituras saíram de cada uma."""
+    colecoes = colecoes or settings.RETENCAO_COLECOES
+    dias_quentes = settings.RETENCAO_DIAS_QUENTES if dias_quentes is None else dias_quentes
+    diretorio = diretorio or settings.RETENCAO_DIRETORIO
+    tamanho_lote = tamanho_lote or settings.RETENCAO_LOTE
+
+    if not adquirir_trava(db, settings.RETENCAO_INTERVALO_H * 3600):
+        print("Retenção já em execução em outro processo.")
+        return {}
+    try:
+        corte = corte_retencao(dias_quentes)
+        print(f"🧊 Retenção: arquivando leituras anteriores a {corte:%Y-%m-%d} (UTC) em '{diretorio}'")
+        return {nome: arquivar_colecao(db, nome, corte, diretorio, tamanho_lote, apagar) for nome in colecoes}
+    finally:
+        liberar_trava(db)
+
+
+async def _laco_retencao():
+    client = MongoClient(settings.MONGODB_URI, serverSelectionTimeoutMS=settings.MONGODB_TIMEOUT_SELECAO_MS)
+    try:
+        while True:
+            try:
+                resumo = await asyncio.to_thread(executar_retencao, client[NOME_BANCO])
+                if resumo:
+                    print(f"✅ Retenção concluída: {resumo}")
+            except Exception as e:
+                print(f"❌ Erro na retenção: {e}")
+            await asyncio.sleep(settings.RETENCAO_INTERVALO_H * 3600)
+    finally:
+        client.close()
+
+
+def iniciar_retencao():
+    """Agenda a retenção periódica, se RETENCAO_ATIVA estiver ligada."""
+    global tarefa_retencao
+    if not settings.RETENCAO_ATIVA:
+        return
+    # O pyarrow só é carregado com a retenção ligada
+    from app.nucleo import arquivo_frio
+    if arquivo_frio.pa is None:
+        print("⚠️ RETENCAO_ATIVA ignorada: instale o pacote 'pyarrow'.")
+        return
+    parar_arquivamento.clear()
+    tarefa_retencao = asyncio.create_task(_laco_retencao())
+    print(f"Retenção ativa: {settings.RETENCAO_DIAS_QUENTES} dias no banco, "
+          f"rodando a cada {settings.RETENCAO_INTERVALO_H} h.")
+
+
+async def encerrar_retencao():
+    global tarefa_retencao
+    if tarefa_retencao is None:
+        return
+    # A thread termina a partição atual e para
+    parar_arquivamento.set()
+    tarefa_retencao.cancel()
+    try:
+        await tarefa_retencao
+    except asyncio.CancelledError:
+        pass
+    tarefa_retencao = None
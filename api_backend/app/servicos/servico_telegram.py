@@ -0,0 +1,284 @@
+import asyncio
+import time
+import httpx
+from app.nucleo.configuracoes import settings
+from app.nucleo import metricas
+from app.nucleo.metricas import TELEGRAM_LATENCIA
+from app.servicos.estado_compartilhado import EstadoMemoria, criar_estado
+
+
+def limpar_texto_para_telegram(texto: str) -> str:
+    """
+    Remove caracteres de formatação Markdown que podem quebrar o envio.
+    """
+    # Remove asteriscos duplos e simples
+    texto_limpo = texto.replace("**", "").replace("*", "")
+    # Remove sublinhados que também podem dar erro
+    texto_limpo = texto_limpo.replace("__", "")
+    return texto_limpo
+
+
+class LimitadorTaxa:
+    """
+    Balde de fichas: permite 'taxa' envios por segundo, com rajada de até 'rajada'.
+    """
+
+    def __init__(self, taxa: float, rajada: float | None = None):
+        self.taxa = taxa
+        self.rajada = rajada if rajada is not None else max(taxa, 1.0)
+        self._fichas = self.rajada
+        self._ultimo = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def aguardar(self):
+        async with self._lock:
+            while True:
+                agora = time.monotonic()
+                self._fichas = min(self.rajada, self._fichas + (agora - self._ultimo) * self.taxa)
+                self._ultimo = agora
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+                await asyncio.sleep((1 - self._fichas) / self.taxa)
+
+
+class DeduplicadorUpdates:
+    """
+    Lembra os update_id recebidos (até 'capacidade', por 'ttl_s' segundos).
+    O Telegram reenvia o webhook quando a resposta demora; assim cada update
+    é tratado uma vez. Com um estado compartilhado, o reenvio é reconhecido
+    mesmo que caia em outro worker.
+    """
+
+    def __init__(self, capacidade: int, ttl_s: float = 3600.0, estado=None):
+        self.capacidade = capacidade
+        self.ttl_s = ttl_s
+        self.estado = estado if estado is not None else EstadoMemoria(capacidade)
+
+    async def registrar(self, update_id) -> bool:
+        """Retorna False se o update já tinha sido recebido."""
+        if update_id is None:
+            return True
+        return await self.estado.adicionar_se_ausente(str(update_id), self.ttl_s)
+
+    async def esquecer(self, update_id):
+        """Desfaz o registro, para que o reenvio do update seja aceito."""
+        if update_id is not None:
+            await self.estado.apagar(str(update_id))
+
+
+class FilaTelegram:
+    """
+    Atende o webhook do Telegram em segundo plano.
+
+    Os updates são distribuídos entre 'workers' filas pelo chat_id, então as
+    mensagens de um mesmo chat são respondidas e enviadas na ordem em que
+    chegaram. As respostas saem por um único cliente HTTP com keep-alive,
+    respeitando o limite global e por chat do Telegram, com novas tentativas.
+    """
+
+    def __init__(
+        self,
+        token: str | None,
+        url_base: str,
+        workers: int,
+        capacidade: int,
+        taxa_global: float,
+        intervalo_por_chat_s: float,
+        tentativas: int,
+        janela_dedup: int,
+        dedup_ttl_s: float = 3600.0,
+    ):
+        self.token = token
+        self.url_base = url_base.rstrip("/")
+        self.workers = workers
+        self.capacidade = capacidade
+        self.intervalo_por_chat_s = intervalo_por_chat_s
+        self.tentativas = tentativas
+
+        self.dedup = DeduplicadorUpdates(janela_dedup, dedup_ttl_s, criar_estado("updates_telegram", janela_dedup))
+        self.limitador_global = LimitadorTaxa(taxa_global)
+        # Momento do último envio para cada chat (limite por chat)
+        self._ultimo_envio_chat: dict = {}
+
+        self.cliente: httpx.AsyncClient | None = None
+        self.filas_entrada: list[asyncio.Queue] = []
+        self.filas_saida: list[asyncio.Queue] = []
+        self._tarefas: list[asyncio.Task] = []
+
+    @property
+    def profundidade(self) -> dict:
+        """Itens aguardando em cada etapa."""
+        return {
+            "entrada": sum(f.qsize() for f in self.filas_entrada),
+            "saida": sum(f.qsize() for f in self.filas_saida),
+        }
+
+    def iniciar(self):
+        self.cliente = httpx.AsyncClient(
+            timeout=httpx.Timeout(10.0, connect=5.0),
+            limits=httpx.Limits(max_connections=self.workers, max_keepalive_connections=self.workers),
+        )
+        for _ in range(self.workers):
+            entrada = asyncio.Queue(maxsize=self.capacidade)
+            saida = asyncio.Queue(maxsize=self.capacidade)
+            self.filas_entrada.append(entrada)
+            self.filas_saida.append(saida)
+            self._tarefas.append(asyncio.create_task(self._trabalhador_entrada(entrada)))
+            self._tarefas.append(asyncio.create_task(self._trabalhador_saida(saida)))
+        print(f"Fila do Telegram ativa com {self.workers} workers.")
+
+    def _fila(self, filas: list[asyncio.Queue], chat_id) -> asyncio.Queue:
+        return filas[hash(str(chat_id)) % len(filas)]
+
+    async def receber_update(self, update: dict) -> str:
+        """
+        Registra o update e o coloca na fila do chat. Não espera a resposta.
+        Retorna o status devolvido ao Telegram; com a fila cheia, "fila_cheia"
+        (o webhook responde 503 e o Telegram reenvia o update mais tarde).
+        """
+        update_id = update.get("update_id")
+        if not await self.dedup.registrar(update_id):
+            return "duplicado"
+
+        message = update.get("message", {})
+        texto_usuario = message.get("text", "")
+        chat_id = message.get("chat", {}).get("id")
+        if not texto_usuario or not chat_id:
+            return "ignorado"
+
+        print(f"--- Telegram: Mensagem de {chat_id}: {texto_usuario}")
+        try:
+            self._fila(self.filas_entrada, chat_id).put_nowait((chat_id, texto_usuario))
+        except asyncio.QueueFull:
+            # Não fica como recebido: o reenvio do Telegram precisa ser aceito
+            await self.dedup.esquecer(update_id)
+            print(f"Fila do Telegram cheia; mensagem de {chat_id} recusada (o Telegram reenvia).")
+            return "fila_cheia"
+        return "recebido"
+
+    def enviar(self, chat_id, texto: str):
+        """Agenda o envio de uma mensagem, mantendo a ordem por chat."""
+        try:
+            self._fila(self.filas_saida, chat_id).put_nowait((chat_id, texto))
+        except asyncio.QueueFull:
+            print(f"Fila de envio do Telegram cheia; resposta para {chat_id} descartada.")
+
+    async def _trabalhador_entrada(self, fila: asyncio.Queue):
+        # O chatbot (e o cliente da IA) só é carregado quando chega a primeira mensagem
+        from app.servicos import servico_chatbot
+        while True:
+            chat_id, texto_usuario = await fila.get()
+            try:
+                resposta_ia = await servico_chatbot.processar_mensagem_usuario(texto_usuario, str(chat_id))
+                self.enviar(chat_id, resposta_ia)
+            except Exception as e:
+                print(f"Erro ao processar mensagem do Telegram: {e}")
+
+    async def _trabalhador_saida(self, fila: asyncio.Queue):
+        while True:
+            chat_id, texto = await fila.get()
+            try:
+                await self._aguardar_vez(chat_id)
+                await self._enviar_com_retentativas(chat_id, texto)
+            except Exception as e:
+                print(f"Erro de conexão com Telegram: {e}")
+
+    async def _aguardar_vez(self, chat_id):
+        """Respeita o intervalo mínimo por chat e o limite global de envios."""
+        ultimo = self._ultimo_envio_chat.get(chat_id)
+        if ultimo is not None:
+            espera = ultimo + self.intervalo_por_chat_s - time.monotonic()
+            if espera > 0:
+                await asyncio.sleep(espera)
+        await self.limitador_global.aguardar()
+        self._ultimo_envio_chat[chat_id] = time.monotonic()
+
+        # Esquece chats parados para o dicionário não crescer sem limite
+        if len(self._ultimo_envio_chat) > 10 * self.capacidade:
+            limite = time.monotonic() - 60
+            self._ultimo_envio_chat = {c: t for c, t in self._ultimo_envio_chat.items() if t > limite}
+
+    async def _enviar_com_retentativas(self, chat_id, texto: str):
+        if not self.token:
+            print("ERRO: Token do Telegram não configurado.")
+            return
+
+        # Enviamos sem parse_mode, garantindo que vá como texto puro
+        payload = {"chat_id": chat_id, "text": limpar_texto_para_telegram(texto)}
+        url = f"{self.url_base}/bot{self.token}/sendMessage"
+
+        for tentativa in range(1, self.tentativas + 1):
+            espera = 0.5 * 2 ** (tentativa - 1)
+            inicio = time.perf_counter()
+            try:
+                response = await self.cliente.post(url, json=payload)
+            except httpx.HTTPError as e:
+                TELEGRAM_LATENCIA.observar(time.perf_counter() - inicio, status="erro_conexao")
+                print(f"Erro de conexão com Telegram (tentativa {tentativa}/{self.tentativas}): {e}")
+            else:
+                TELEGRAM_LATENCIA.observar(time.perf_counter() - inicio, status=response.status_code)
+                if response.status_code == 200:
+                    return
+                if response.status_code == 429:
+                    # O Telegram informa quanto tempo esperar
+                    try:
+                        espera = response.json()["parameters"]["retry_after"]
+                    except (ValueError, KeyError, TypeError):
+                        # Corpo fora do formato do Telegram (ex.: erro de um proxy): mantém o backoff
+                        pass
+                elif response.status_code < 500:
+                    print(f"Erro ao enviar para Telegram: {response.text}")
+                    return
+                print(f"Telegram respondeu {response.status_code}; nova tentativa em {espera}s.")
+
+            if tentativa < self.tentativas:
+                await asyncio.sleep(espera)
+
+        print(f"Mensagem para {chat_id} descartada após {self.tentativas} tentativas.")
+
+    async def encerrar(self):
+        for tarefa in self._tarefas:
+            tarefa.cancel()
+        await asyncio.gather(*self._tarefas, return_exceptions=True)
+        self._tarefas = []
+        if self.cliente is not None:
+            await self.cliente.aclose()
+            self.cliente = None
+
+
+# Instância única, criada pelo 'lifespan'
+fila_telegram: FilaTelegram | None = None
+
+metricas.registro.medidor_callback(
+    "horta_telegram_fila", "Mensagens aguardando na fila do Telegram.",
+    lambda: {(etapa,): n for etapa, n in fila_telegram.profundidade.items()} if fila_telegram else {},
+    rotulos=("etapa",),
+)
+
+def iniciar_fila_telegram():
+    """
+    Cria a fila do Telegram e seus workers. Chamada pelo 'lifespan' ao iniciar a API.
+    """
+    global fila_telegram
+    fila_telegram = FilaTelegram(
+        token=settings.TELEGRAM_BOT_TOKEN,
+        url_base=settings.TELEGRAM_API_URL,
+        workers=settings.TELEGRAM_WORKERS,
+        capacidade=settings.TELEGRAM_CAPACIDADE_FILA,
+        taxa_global=settings.TELEGRAM_TAXA_GLOBAL_POR_S,
+        intervalo_por_chat_s=settings.TELEGRAM_INTERVALO_POR_CHAT_S,
+        tentativas=settings.TELEGRAM_TENTATIVAS,
+        janela_dedup=settings.TELEGRAM_JANELA_DEDUP,
+        dedup_ttl_s=settings.TELEGRAM_DEDUP_TTL_S,
+    )
+    fila_telegram.iniciar()
+
+async def encerrar_fila_telegram():
+    """
+    Para os workers e fecha o cliente HTTP. Chamada pelo 'lifespan' ao desligar.
+    """
+    global fila_telegram
+    if fila_telegram is not None:
+        await fila_telegram.encerrar()
+        fila_telegram = None
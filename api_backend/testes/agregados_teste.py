@@ -0,0 +1,107 @@
+"""
+Testes dos agregados por hora e por dia: contagem, soma, mínimo, máximo e
+desvio padrão, limites de hora e de dia no horário de Brasília e a junção de
+gravações sucessivas no mesmo período.
+
+Uso (a partir de api_backend/):
+    python -m unittest discover -s testes -t . -p "*_teste.py"
+"""
+import datetime
+import statistics
+import unittest
+from unittest import mock
+from mongomock_motor import AsyncMongoMockClient
+from app.servicos import servico_agregados
+from app.servicos.servico_agregados import FUSO_BRASIL, inicio_periodo
+
+UTC = datetime.timezone.utc
+
+
+def _leitura(momento: datetime.datetime, **metricas) -> dict:
+    return {"id_dispositivo": "horta-01", "timestamp": momento, **metricas}
+
+
+class TesteInicioPeriodo(unittest.TestCase):
+    def test_limite_do_dia_e_no_horario_de_brasilia(self):
+        # 02:59 UTC ainda é o dia anterior em Brasília (UTC-3); 03:00 UTC já é meia-noite
+        antes = inicio_periodo(datetime.datetime(2025, 3, 2, 2, 59, tzinfo=UTC), "dia")
+        depois = inicio_periodo(datetime.datetime(2025, 3, 2, 3, 0, tzinfo=UTC), "dia")
+        self.assertEqual(antes, FUSO_BRASIL.localize(datetime.datetime(2025, 3, 1)))
+        self.assertEqual(depois, FUSO_BRASIL.localize(datetime.datetime(2025, 3, 2)))
+        self.assertEqual(depois.astimezone(UTC), datetime.datetime(2025, 3, 2, 3, tzinfo=UTC))
+
+    def test_limite_da_hora(self):
+        momento = FUSO_BRASIL.localize(datetime.datetime(2025, 3, 1, 14, 59, 59, 999999))
+        self.assertEqual(inicio_periodo(momento, "hora"), FUSO_BRASIL.localize(datetime.datetime(2025, 3, 1, 14)))
+        self.assertEqual(inicio_periodo(momento + datetime.timedelta(microseconds=1), "hora"),
+                         FUSO_BRASIL.localize(datetime.datetime(2025, 3, 1, 15)))
+
+    def test_data_sem_fuso_e_utc(self):
+        # Como o Mongo devolve: sem fuso, em UTC
+        self.assertEqual(inicio_periodo(datetime.datetime(2025, 3, 2, 1, 30), "dia"),
+                         FUSO_BRASIL.localize(datetime.datetime(2025, 3, 1)))
+
+
+class TesteAgregados(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        banco = AsyncMongoMockClient()["horta"]
+        patcher = mock.patch.object(servico_agregados, "get_db_collection", side_effect=lambda nome: banco[nome])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_estatisticas_do_periodo(self):
+        valores = [2, 4, 4, 4, 5, 5, 7, 9]
+        inicio = FUSO_BRASIL.localize(datetime.datetime(2025, 3, 1, 10))
+        leituras = [_leitura(inicio + datetime.timedelta(minutes=i), umidade=v) for i, v in enumerate(valores)]
+        # Valores não numéricos contam na leitura, mas não na métrica
+        leituras.append(_leitura(inicio + datetime.timedelta(minutes=30), umidade="erro", temperatura=20.0))
+        await servico_agregados.atualizar_agregados(leituras)
+
+        hora = await servico_agregados.consultar_agregados("hora")
+        self.assertEqual(len(hora), 1)
+        self.assertEqual(hora[0]["contagem"], 9)
+        umidade = hora[0]["metricas"]["umidade"]
+        self.assertEqual(umidade["contagem"], 8)
+        self.assertAlmostEqual(umidade["media"], statistics.fmean(valores))
+        self.assertAlmostEqual(umidade["desvio_padrao"], statistics.pstdev(valores))
+        self.assertEqual((umidade["min"], umidade["max"]), (2, 9))
+        self.assertEqual(hora[0]["metricas"]["temperatura"]["contagem"], 1)
+
+    async def test_gravacoes_sucessivas_se_somam(self):
+        inicio = FUSO_BRASIL.localize(datetime.datetime(2025, 3, 1, 10))
+        await servico_agregados.atualizar_agregados([_leitura(inicio, umidade=50.0), _leitura(inicio, umidade=60.0)])
+        await servico_agregados.atualizar_agregados([_leitura(inicio + datetime.timedelta(minutes=5), umidade=10.0)])
+
+        umidade = (await servico_agregados.consultar_agregados("hora"))[0]["metricas"]["umidade"]
+        self.assertEqual(umidade["contagem"], 3)
+        self.assertAlmostEqual(umidade["media"], 40.0)
+        self.assertAlmostEqual(umidade["desvio_padrao"], statistics.pstdev([50.0, 60.0, 10.0]))
+        self.assertEqual((umidade["min"], umidade["max"]), (10.0, 60.0))
+
+    async def test_leituras_separadas_por_hora_e_dia(self):
+        leituras = [
+            _leitura(datetime.datetime(2025, 3, 2, 2, 30, tzinfo=UTC), umidade=1.0),  # 23:30 de 01/03
+            _leitura(datetime.datetime(2025, 3, 2, 2, 59, tzinfo=UTC), umidade=2.0),  # 23:59 de 01/03
+            _leitura(datetime.datetime(2025, 3, 2, 3, 0, tzinfo=UTC), umidade=3.0),   # 00:00 de 02/03
+        ]
+        await servico_agregados.atualizar_agregados(leituras)
+
+        dias = await servico_agregados.consultar_agregados("dia")
+        self.assertEqual([d["contagem"] for d in dias], [2, 1])
+        self.assertEqual([d["metricas"]["umidade"]["media"] for d in dias], [1.5, 3.0])
+        inicio_dia = FUSO_BRASIL.localize(datetime.datetime(2025, 3, 2)).astimezone(UTC).replace(tzinfo=None)
+        self.assertEqual(dias[1]["inicio"], inicio_dia)
+
+        horas = await servico_agregados.consultar_agregados("hora")
+        self.assertEqual([h["contagem"] for h in horas], [2, 1])
+
+    async def test_leitura_sem_dispositivo_ou_data_e_ignorada(self):
+        await servico_agregados.atualizar_agregados([
+            {"timestamp": datetime.datetime(2025, 3, 1, tzinfo=UTC), "umidade": 1.0},
+            {"id_dispositivo": "horta-01", "umidade": 1.0},
+        ])
+        self.assertEqual(await servico_agregados.consultar_agregados("dia"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+"""
+Testes da redução de séries (LTTB): extremidades mantidas, escolha do ponto
+de cada balde (comparada com uma implementação direta do algoritmo), valores
+ausentes e os baldes de tempo que o /historico pede ao banco antes do LTTB.
+
+Uso (a partir de api_backend/):
+    python -m unittest discover -s testes -t . -p "*_teste.py"
+"""
+import datetime
+import unittest
+from unittest import mock
+import numpy as np
+from app.nucleo.amostragem import lttb, reduzir_serie
+from app.servicos import servico_banco_de_dados
+
+
+def _lttb_direto(x, y, limite):
+    """LTTB escrito ponto a ponto, com os mesmos baldes de lttb()."""
+    n = len(x)
+    bordas = np.linspace(1, n - 1, limite - 1).astype(np.int64)
+    escolhidos = [0]
+    for balde in range(limite - 2):
+        inicio, fim = bordas[balde], bordas[balde + 1]
+        if balde + 2 < len(bordas):
+            seguinte = range(bordas[balde + 1], bordas[balde + 2])
+            cx = sum(x[i] for i in seguinte) / len(seguinte)
+            cy = sum(y[i] for i in seguinte) / len(seguinte)
+        else:
+            cx, cy = x[n - 1], y[n - 1]
+        ax, ay = x[escolhidos[-1]], y[escolhidos[-1]]
+        areas = [abs((ax - cx) * (y[i] - ay) - (ax - x[i]) * (cy - ay)) for i in range(inicio, fim)]
+        escolhidos.append(inicio + int(np.argmax(areas)))
+    escolhidos.append(n - 1)
+    return escolhidos
+
+
+class TesteLttb(unittest.TestCase):
+    def test_mantem_as_extremidades(self):
+        x = np.arange(1000, dtype=float)
+        y = np.sin(x / 50)
+        indices = lttb(x, y, 50)
+        self.assertEqual(len(indices), 50)
+        self.assertEqual((indices[0], indices[-1]), (0, 999))
+        self.assertTrue(np.all(np.diff(indices) > 0))
+
+    def test_limite_maior_que_a_serie_devolve_tudo(self):
+        self.assertEqual(list(lttb([0, 1, 2], [5, 6, 7], 10)), [0, 1, 2])
+        self.assertEqual(list(lttb([0, 1, 2], [5, 6, 7], 3)), [0, 1, 2])
+
+    def test_limites_pequenos(self):
+        x = np.arange(10, dtype=float)
+        self.assertEqual(list(lttb(x, x, 2)), [0, 9])
+        self.assertEqual(list(lttb(x, x, 1)), [0])
+        self.assertEqual(list(lttb(x, x, 0)), [])
+
+    def test_escolhe_o_pico_do_balde(self):
+        x = np.arange(101, dtype=float)
+        y = np.zeros(101)
+        y[37] = 100.0
+        y[71] = -80.0
+        indices = lttb(x, y, 12)
+        self.assertIn(37, indices)
+        self.assertIn(71, indices)
+
+    def test_igual_a_implementacao_direta(self):
+        sorteio = np.random.default_rng(7)
+        for n, limite in [(500, 40), (101, 10), (37, 5), (1000, 333)]:
+            x = np.cumsum(sorteio.uniform(0.5, 2.0, n))
+            y = sorteio.normal(0, 1, n).cumsum()
+            self.assertEqual(list(lttb(x, y, limite)), _lttb_direto(x, y, limite), (n, limite))
+
+
+class TesteReduzirSerie(unittest.TestCase):
+    def test_ignora_valores_ausentes(self):
+        x = np.arange(6, dtype=float)
+        y = np.array([1.0, np.nan, 3.0, np.nan, 5.0, 6.0])
+        xr, yr = reduzir_serie(x, y, 10)
+        self.assertEqual(list(xr), [0, 2, 4, 5])
+        self.assertEqual(list(yr), [1, 3, 5, 6])
+
+    def test_reduz_depois_de_tirar_os_ausentes(self):
+        x = np.arange(200, dtype=float)
+        y = np.where(x % 2 == 0, x, np.nan)
+        xr, yr = reduzir_serie(x, y, 20)
+        self.assertEqual(len(xr), 20)
+        self.assertFalse(np.isnan(yr).any())
+        self.assertEqual((xr[0], xr[-1]), (0, 198))
+
+
+class ColecaoBaldes:
+    """Guarda o pipeline recebido e devolve baldes prontos (o mongomock não tem $dateTrunc)."""
+
+    def __init__(self, primeiro, ultimo, baldes):
+        self.limites = {1: {"timestamp": primeiro}, -1: {"timestamp": ultimo}}
+        self.baldes = baldes
+        self.pipeline = None
+
+    async def find_one(self, filtro, projecao=None, sort=None):
+        return self.limites[sort[0][1]] if self.baldes else None
+
+    def aggregate(self, pipeline):
+        self.pipeline = pipeline
+
+        async def cursor():
+            for balde in self.baldes:
+                yield balde
+        return cursor()
+
+
+class TesteHistoricoEmBaldes(unittest.IsolatedAsyncioTestCase):
+    async def _buscar(self, colecao, max_pontos):
+        with mock.patch.object(servico_banco_de_dados, "get_db_collection", return_value=colecao):
+            return await servico_banco_de_dados.buscar_historico(
+                ["umidade", "temperatura"], "horta-01", None, None, max_pontos
+            )
+
+    async def test_largura_dos_baldes_e_pontos_originais(self):
+        inicio = datetime.datetime(2025, 1, 1)
+        baldes = [
+            {"_id": inicio + datetime.timedelta(minutes=45 * i), "umidade": 50.0 + i, "umidade__contagem": 3,
+             "temperatura": None if i % 2 else 20.0, "temperatura__contagem": 0 if i % 2 else 2}
+            for i in range(40)
+        ]
+        colecao = ColecaoBaldes(inicio, inicio + datetime.timedelta(days=30), baldes)
+        resultado = await self._buscar(colecao, 10)
+
+        # 30 dias em 4 * 10 baldes: 18 horas cada
+        grupo = colecao.pipeline[1]["$group"]
+        self.assertEqual(grupo["_id"]["$dateTrunc"]["binSize"], 30 * 86400 // 40)
+        self.assertEqual(colecao.pipeline[0]["$match"]["id_dispositivo"], "horta-01")
+        self.assertEqual(resultado["pontos_originais"], {"umidade": 120, "temperatura": 40})
+        self.assertEqual(len(resultado["series"]["umidade"]), 10)
+        self.assertEqual(len(resultado["series"]["temperatura"]), 10)
+        # O primeiro ponto é o início do primeiro balde, em UTC
+        self.assertEqual(resultado["series"]["umidade"][0]["timestamp"],
+                         datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc))
+
+    async def test_intervalo_curto_usa_baldes_de_um_segundo(self):
+        inicio = datetime.datetime(2025, 1, 1)
+        colecao = ColecaoBaldes(inicio, inicio + datetime.timedelta(seconds=5),
+                                [{"_id": inicio, "umidade": 1.0, "umidade__contagem": 1}])
+        await self._buscar(colecao, 100)
+        self.assertEqual(colecao.pipeline[1]["$group"]["_id"]["$dateTrunc"]["binSize"], 1)
+
+    async def test_sem_leituras(self):
+        resultado = await self._buscar(ColecaoBaldes(None, None, []), 10)
+        self.assertEqual(resultado, {"series": {"umidade": [], "temperatura": []},
+                                     "pontos_originais": {"umidade": 0, "temperatura": 0}})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,280 @@
+"""
+Teste de carga da API: N dispositivos ESP32 enviando leituras para
+/api/v1/dados-sensores e usuários do Telegram chamando /api/v1/chatbot/webhook.
+
+Uso (a partir de api_backend/):
+    python -m testes.benchmark_carga --dispositivos 50 --taxa 2 --duracao 30 --saida resultado.json
+
+Por padrão a API roda no próprio processo (httpx + ASGI, sem rede), com:
+- banco em memória (mongomock-motor) ou o MongoDB de --mongo-uri;
+- modelo de linguagem simulado (LLM_BACKEND=falso);
+- Telegram simulado, que só conta as mensagens enviadas.
+
+Com --url, a carga vai para uma API já rodando (ex: uvicorn com um worker).
+Nesse caso configure nela LLM_BACKEND=falso e TELEGRAM_API_URL apontando
+para um servidor local, para não gastar cota nem enviar mensagens reais.
+
+--taxa é o número de leituras por segundo de cada dispositivo. A latência é
+medida a partir do horário agendado de cada envio, então filas no servidor
+aparecem nos percentis. Com --taxa 0 cada dispositivo envia sem pausa (o
+próximo envio sai quando o anterior responde), para achar o teto da API.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+import httpx
+import numpy as np
+
+PERGUNTAS = ["oi", "1", "2", "3", "Como está o pH?", "Preciso adubar?", "dados", "A umidade está boa?"]
+
+
+class Cenario:
+    """Resultados de um tipo de requisição."""
+
+    def __init__(self, nome: str):
+        self.nome = nome
+        self.latencias: list[float] = []
+        self.status: dict[str, int] = {}
+        self.erros = 0
+
+    def registrar(self, latencia: float, status):
+        self.latencias.append(latencia)
+        self.status[str(status)] = self.status.get(str(status), 0) + 1
+
+    def resumo(self, duracao: float) -> dict:
+        sucesso = sum(n for s, n in self.status.items() if s.startswith("2"))
+        resumo = {
+            "requisicoes": len(self.latencias),
+            "sucesso": sucesso,
+            "status": self.status,
+            "vazao_por_s": round(sucesso / duracao, 1),
+        }
+        if self.latencias:
+            ms = np.asarray(self.latencias) * 1000
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            resumo.update({
+                "p50_ms": round(float(p50), 2),
+                "p95_ms": round(float(p95), 2),
+                "p99_ms": round(float(p99), 2),
+                "max_ms": round(float(ms.max()), 2),
+            })
+        return resumo
+
+
+def gerar_leitura(id_dispositivo: str) -> dict:
+    return {
+        "id_dispositivo": id_dispositivo,
+        "umidade": round(random.uniform(20, 90), 1),
+        "temperatura": round(random.uniform(12, 35), 1),
+        "ph_solo": round(random.uniform(5.0, 8.0), 2),
+        "condutividade_eletrica": round(random.uniform(800, 2000), 0),
+        "nitrogenio": round(random.uniform(100, 220), 0),
+        "fosforo": round(random.uniform(40, 120), 0),
+        "potassio": round(random.uniform(100, 220), 0),
+    }
+
+
+def codificar(corpo: dict, formato: str) -> tuple[bytes, dict]:
+    """Serializa o corpo no formato pedido e retorna (bytes, cabeçalhos)."""
+    if formato == "msgpack":
+        import msgpack
+        return msgpack.packb(corpo), {"content-type": "application/msgpack"}
+    if formato == "cbor":
+        import cbor2
+        return cbor2.dumps(corpo), {"content-type": "application/cbor"}
+    conteudo = json.dumps(corpo).encode()
+    if formato == "json+gzip":
+        return gzip.compress(conteudo), {"content-type": "application/json", "content-encoding": "gzip"}
+    return conteudo, {"content-type": "application/json"}
+
+
+async def enviar(cliente: httpx.AsyncClient, cenario: Cenario, limite: asyncio.Semaphore, agendado: float, url: str, corpo: dict, formato: str = "json"):
+    conteudo, cabecalhos = codificar(corpo, formato)
+    async with limite:
+        try:
+            resposta = await cliente.post(url, content=conteudo, headers=cabecalhos)
+            status = resposta.status_code
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+            cenario.erros += 1
+    cenario.registrar(time.perf_counter() - agendado, status)
+
+
+async def simular_dispositivo(cliente, cenario, limite, id_dispositivo: str, taxa: float, fim: float, tarefas: list, formato: str):
+    if taxa <= 0:
+        # Modo teto: envia o próximo assim que o anterior responde
+        while time.perf_counter() < fim:
+            await enviar(cliente, cenario, limite, time.perf_counter(), "/api/v1/dados-sensores", gerar_leitura(id_dispositivo), formato)
+        return
+
+    intervalo = 1 / taxa
+    # Espalha o primeiro envio para os dispositivos não dispararem juntos
+    proximo = time.perf_counter() + random.uniform(0, intervalo)
+    while proximo < fim:
+        await asyncio.sleep(max(0.0, proximo - time.perf_counter()))
+        tarefas.append(asyncio.create_task(
+            enviar(cliente, cenario, limite, proximo, "/api/v1/dados-sensores", gerar_leitura(id_dispositivo), formato)
+        ))
+        proximo += intervalo
+
+
+async def simular_telegram(cliente, cenario, limite, taxa: float, chats: int, fim: float, tarefas: list):
+    if taxa <= 0:
+        return
+    update_id = 0
+    proximo = time.perf_counter()
+    while proximo < fim:
+        await asyncio.sleep(max(0.0, proximo - time.perf_counter()))
+        update_id += 1
+        update = {
+            "update_id": update_id,
+            "message": {"text": random.choice(PERGUNTAS), "chat": {"id": random.randint(1, chats)}},
+        }
+        tarefas.append(asyncio.create_task(
+            enviar(cliente, cenario, limite, proximo, "/api/v1/chatbot/webhook", update)
+        ))
+        proximo += 1 / taxa
+
+
+@asynccontextmanager
+async def api_no_processo(args, mensagens_telegram: list):
+    """
+    Sobe a API no próprio processo com banco, modelo e Telegram simulados.
+    As variáveis de ambiente precisam ser definidas antes de importar o app.
+    """
+    os.environ["LLM_BACKEND"] = "falso"
+    os.environ["LLM_FALSO_LATENCIA_MS"] = str(args.latencia_llm_ms)
+    os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+    os.environ["MONGODB_URI"] = args.mongo_uri or "mongodb://memoria"
+
+    from app.db import conexao_mongodb
+    if not args.mongo_uri:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise SystemExit("Banco em memória requer 'pip install mongomock-motor' (ou use --mongo-uri).")
+        conexao_mongodb.definir_fabrica_cliente(AsyncMongoMockClient)
+
+    from app.main import app
+    from app.servicos import servico_telegram
+
+    async def telegram_falso(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(args.latencia_telegram_ms / 1000)
+        mensagens_telegram.append(time.perf_counter())
+        return httpx.Response(200, json={"ok": True})
+
+    async with app.router.lifespan_context(app):
+        # Troca o cliente HTTP da fila do Telegram por um que responde localmente
+        await servico_telegram.fila_telegram.cliente.aclose()
+        servico_telegram.fila_telegram.cliente = httpx.AsyncClient(transport=httpx.MockTransport(telegram_falso))
+        transporte = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://benchmark") as cliente:
+            yield cliente
+
+
+@asynccontextmanager
+async def api_remota(args):
+    limites = httpx.Limits(max_connections=args.concorrencia, max_keepalive_connections=args.concorrencia)
+    async with httpx.AsyncClient(base_url=args.url, limits=limites, timeout=30.0) as cliente:
+        yield cliente
+
+
+def versao_git() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def executar(args) -> dict:
+    random.seed(args.semente)
+    mensagens_telegram: list[float] = []
+    contexto = api_remota(args) if args.url else api_no_processo(args, mensagens_telegram)
+
+    ingestao = Cenario("ingestao")
+    webhook = Cenario("webhook")
+    limite = asyncio.Semaphore(args.concorrencia)
+    tarefas: list[asyncio.Task] = []
+
+    async with contexto as cliente:
+        inicio = time.perf_counter()
+        fim = inicio + args.duracao
+        geradores = [
+            simular_dispositivo(cliente, ingestao, limite, f"ESP32_BENCH_{i:03d}", args.taxa, fim, tarefas, args.formato)
+            for i in range(args.dispositivos)
+        ]
+        geradores.append(simular_telegram(cliente, webhook, limite, args.webhooks_por_s, args.chats, fim, tarefas))
+        await asyncio.gather(*geradores)
+        await asyncio.gather(*tarefas)
+        duracao = time.perf_counter() - inicio
+        if not args.url:
+            # Dá tempo para a fila do Telegram terminar de responder
+            await asyncio.sleep(args.espera_final)
+
+    resultado = {
+        "data": datetime.now(timezone.utc).isoformat(),
+        "commit": versao_git(),
+        "python": platform.python_version(),
+        "configuracao": vars(args),
+        "duracao_s": round(duracao, 2),
+        "ingestao": ingestao.resumo(duracao),
+        "webhook": webhook.resumo(duracao),
+    }
+    if not args.url:
+        resultado["telegram_respostas_enviadas"] = len(mensagens_telegram)
+    return resultado
+
+
+def imprimir(resultado: dict):
+    print(f"\nDuração: {resultado['duracao_s']}s")
+    for nome in ("ingestao", "webhook"):
+        r = resultado[nome]
+        if not r["requisicoes"]:
+            continue
+        print(
+            f"{nome:>9}: {r['requisicoes']} req | {r['vazao_por_s']}/s com sucesso | "
+            f"p50 {r['p50_ms']} ms | p95 {r['p95_ms']} ms | p99 {r['p99_ms']} ms | max {r['max_ms']} ms | status {r['status']}"
+        )
+    if "telegram_respostas_enviadas" in resultado:
+        print(f" telegram: {resultado['telegram_respostas_enviadas']} respostas enviadas")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga da API da Horta Inteligente.")
+    parser.add_argument("--dispositivos", type=int, default=20, help="Dispositivos simulados.")
+    parser.add_argument("--taxa", type=float, default=1.0, help="Leituras/s por dispositivo (0 = sem pausa).")
+    parser.add_argument("--duracao", type=float, default=10.0, help="Duração da carga em segundos.")
+    parser.add_argument("--formato", choices=["json", "json+gzip", "msgpack", "cbor"], default="json",
+                        help="Formato do corpo das leituras.")
+    parser.add_argument("--webhooks-por-s", type=float, default=2.0, help="Mensagens do Telegram por segundo (0 desliga).")
+    parser.add_argument("--chats", type=int, default=20, help="Chats distintos do Telegram.")
+    parser.add_argument("--concorrencia", type=int, default=200, help="Máximo de requisições em andamento.")
+    parser.add_argument("--url", help="URL de uma API já rodando (ex: http://127.0.0.1:8000).")
+    parser.add_argument("--mongo-uri", help="MongoDB local para o modo no processo (padrão: banco em memória).")
+    parser.add_argument("--latencia-llm-ms", type=int, default=200, help="Latência do modelo simulado.")
+    parser.add_argument("--latencia-telegram-ms", type=int, default=20, help="Latência do Telegram simulado.")
+    parser.add_argument("--espera-final", type=float, default=2.0, help="Segundos aguardando as respostas do Telegram.")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--saida", help="Arquivo JSON para salvar o resultado.")
+    args = parser.parse_args()
+
+    resultado = asyncio.run(executar(args))
+    imprimir(resultado)
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+        print(f"Resultado salvo em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
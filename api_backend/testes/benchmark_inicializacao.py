@@ -0,0 +1,190 @@
+"""
+Tempo de inicialização da API: quanto leva para importar o app, rodar o
+'lifespan' e aceitar a primeira leitura, em cada perfil (PERFIL_API) e com
+o banco disponível ou fora do ar.
+
+Uso (a partir de api_backend/):
+    python -m testes.benchmark_inicializacao --repeticoes 5 --saida inicializacao.json
+
+Cada medição roda em um processo Python novo (sem módulos já importados),
+com a API no próprio processo (httpx + ASGI, sem rede) e:
+- banco "memoria": mongomock-motor, que responde na hora;
+- banco "fora": MONGODB_URI apontando para uma porta fechada, para mostrar
+  que a API sobe e responde /saude/vivo sem esperar o MongoDB.
+
+Medidas (medianas das repetições):
+- processo_s: duração total do processo (interpretador, import, medições e desligamento);
+- importacao_s: 'import app.main';
+- lifespan_s: código do 'lifespan' antes do 'yield';
+- primeira_leitura_s: do início do 'lifespan' até o primeiro POST
+  /api/v1/dados-sensores com sucesso (só com o banco "memoria");
+- pronto_s: do início do 'lifespan' até /saude/pronto responder 200.
+Também registra se os pacotes pesados (SDK do Gemini, pyarrow, redis) foram
+carregados no import.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+PERFIS = ["completo", "ingestao"]
+BANCOS = {"memoria": "mongodb://memoria", "fora": "mongodb://127.0.0.1:1"}
+MODULOS_PESADOS = ["google.generativeai", "pyarrow", "redis"]
+LEITURA = {"id_dispositivo": "ESP32_INICIALIZACAO", "umidade": 55.0, "temperatura": 21.0, "ph_solo": 6.3}
+
+
+async def _esperar(cliente, url: str, limite_s: float, metodo: str = "get", **kwargs) -> float | None:
+    """Repete a requisição até responder 2xx. Retorna o instante do sucesso (ou None)."""
+    fim = time.perf_counter() + limite_s
+    while time.perf_counter() < fim:
+        resposta = await getattr(cliente, metodo)(url, **kwargs)
+        if resposta.is_success:
+            return time.perf_counter()
+        await asyncio.sleep(0.01)
+    return None
+
+
+async def _medir_lifespan(app, banco: str, limite_s: float) -> dict:
+    import httpx
+
+    inicio = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        fim_lifespan = time.perf_counter()
+        transporte = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://benchmark") as cliente:
+            vivo = (await cliente.get("/saude/vivo")).status_code
+            primeira_leitura = None
+            if banco == "memoria":
+                primeira_leitura = await _esperar(cliente, "/api/v1/dados-sensores", limite_s, "post", json=LEITURA)
+            pronto = await _esperar(cliente, "/saude/pronto", limite_s if banco == "memoria" else 0.5)
+
+    def desde_inicio(instante):
+        return None if instante is None else round(instante - inicio, 4)
+
+    return {
+        "lifespan_s": round(fim_lifespan - inicio, 4),
+        "vivo_status": vivo,
+        "primeira_leitura_s": desde_inicio(primeira_leitura),
+        "pronto_s": desde_inicio(pronto),
+    }
+
+
+def medir_no_processo(banco: str, limite_s: float) -> dict:
+    """Roda dentro do processo filho (o ambiente já vem definido pelo pai)."""
+    inicio = time.perf_counter()
+    from app.main import app
+    importacao = time.perf_counter() - inicio
+    modulos = {nome: nome in sys.modules for nome in MODULOS_PESADOS}
+
+    if banco == "memoria":
+        # Depois do import, para o mongomock (e o Motor) não entrarem na medida acima
+        from mongomock_motor import AsyncMongoMockClient
+        from app.db import conexao_mongodb
+        conexao_mongodb.definir_fabrica_cliente(AsyncMongoMockClient)
+
+    resultado = asyncio.run(_medir_lifespan(app, banco, limite_s))
+    resultado.update({"importacao_s": round(importacao, 4), "modulos_carregados": modulos})
+    return resultado
+
+
+def executar_filho(perfil: str, banco: str, limite_s: float) -> dict:
+    ambiente = dict(
+        os.environ,
+        PERFIL_API=perfil,
+        MONGODB_URI=BANCOS[banco],
+        MONGODB_TIMEOUT_SELECAO_MS="500",
+        LLM_BACKEND="falso",
+        BUFFER_ESCRITA_ATIVO="false",
+        RETENCAO_ATIVA="false",
+    )
+    comando = [sys.executable, "-m", "testes.benchmark_inicializacao", "--filho", perfil, banco, "--limite", str(limite_s)]
+    inicio = time.perf_counter()
+    processo = subprocess.run(comando, env=ambiente, capture_output=True, text=True)
+    duracao = time.perf_counter() - inicio
+    if processo.returncode != 0:
+        raise SystemExit(f"Falha medindo {perfil}/{banco}:\n{processo.stderr}")
+    # A última linha é o JSON; as anteriores são os prints da API
+    resultado = json.loads(processo.stdout.strip().splitlines()[-1])
+    resultado["processo_s"] = round(duracao, 4)
+    return resultado
+
+
+def mediana(valores: list) -> float | None:
+    valores = [valor for valor in valores if valor is not None]
+    return round(statistics.median(valores), 4) if valores else None
+
+
+def resumir(execucoes: list[dict]) -> dict:
+    resumo = {
+        chave: mediana([execucao[chave] for execucao in execucoes])
+        for chave in ("processo_s", "importacao_s", "lifespan_s", "primeira_leitura_s", "pronto_s")
+    }
+    resumo["vivo_status"] = execucoes[-1]["vivo_status"]
+    resumo["modulos_carregados"] = execucoes[-1]["modulos_carregados"]
+    return resumo
+
+
+def versao_git() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def imprimir(resultado: dict):
+    def segundos(valor):
+        return "-" if valor is None else f"{valor}s"
+
+    print()
+    for nome, r in resultado["cenarios"].items():
+        carregados = [modulo for modulo, sim in r["modulos_carregados"].items() if sim] or ["nenhum"]
+        print(
+            f"{nome:>17}: processo {segundos(r['processo_s'])} | import {segundos(r['importacao_s'])} | "
+            f"lifespan {segundos(r['lifespan_s'])} | 1ª leitura {segundos(r['primeira_leitura_s'])} | "
+            f"pronto {segundos(r['pronto_s'])} | vivo {r['vivo_status']} | pesados: {', '.join(carregados)}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo de inicialização da API da Horta Inteligente.")
+    parser.add_argument("--repeticoes", type=int, default=3, help="Processos medidos por cenário.")
+    parser.add_argument("--perfis", nargs="+", choices=PERFIS, default=PERFIS)
+    parser.add_argument("--bancos", nargs="+", choices=list(BANCOS), default=list(BANCOS))
+    parser.add_argument("--limite", type=float, default=10.0, help="Segundos aguardando a primeira leitura e o /saude/pronto.")
+    parser.add_argument("--saida", help="Arquivo JSON para salvar o resultado.")
+    parser.add_argument("--filho", nargs=2, metavar=("PERFIL", "BANCO"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.filho:
+        print(json.dumps(medir_no_processo(args.filho[1], args.limite)))
+        return
+
+    cenarios = {}
+    for perfil in args.perfis:
+        for banco in args.bancos:
+            execucoes = [executar_filho(perfil, banco, args.limite) for _ in range(args.repeticoes)]
+            cenarios[f"{perfil}/{banco}"] = resumir(execucoes)
+
+    resultado = {
+        "data": datetime.now(timezone.utc).isoformat(),
+        "commit": versao_git(),
+        "python": platform.python_version(),
+        "configuracao": vars(args),
+        "cenarios": cenarios,
+    }
+    imprimir(resultado)
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+        print(f"Resultado salvo em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
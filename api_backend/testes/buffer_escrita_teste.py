@@ -0,0 +1,173 @@
+"""
+Testes do buffer de escrita: gravação por tamanho e por intervalo,
+recusa quando a fila enche (503 na rota), drenagem ao desligar e regravação
+sem duplicar documentos depois de falhas parciais.
+
+Uso (a partir de api_backend/):
+    python -m unittest discover -s testes -t . -p "*_teste.py"
+"""
+import asyncio
+import datetime
+import unittest
+from unittest import mock
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, NetworkTimeout
+from app.servicos import buffer_escrita
+from app.servicos.buffer_escrita import BufferCheioError, BufferEscrita
+
+INICIO = datetime.datetime(2025, 1, 1)
+
+
+def _documento(i: int) -> dict:
+    return {"_id": ObjectId(), "id_dispositivo": "horta-01", "timestamp": INICIO + datetime.timedelta(seconds=i), "umidade": i}
+
+
+class ColecaoFalsa:
+    """
+    Coleção sem _id único (como a de série temporal). Cada item de 'falhas'
+    é usado por uma chamada de insert_many: recebe os documentos, pode gravar
+    parte deles e levanta o erro.
+    """
+
+    def __init__(self):
+        self.documentos = []
+        self.falhas = []
+        self.fora = False
+
+    async def insert_many(self, documentos, ordered=True):
+        if self.fora:
+            raise NetworkTimeout("banco fora")
+        if self.falhas:
+            self.falhas.pop(0)(self, documentos)
+        self.documentos.extend(documentos)
+
+    def find(self, filtro, projecao=None):
+        ids = set(filtro["_id"]["$in"])
+        encontrados = [{"_id": doc["_id"]} for doc in self.documentos if doc["_id"] in ids]
+
+        async def cursor():
+            for doc in encontrados:
+                yield doc
+        return cursor()
+
+
+def _grava_metade_e_expira(colecao, documentos):
+    colecao.documentos.extend(documentos[:len(documentos) // 2])
+    raise NetworkTimeout("tempo esgotado")
+
+
+def _recusa_dois(colecao, documentos):
+    colecao.documentos.extend(doc for i, doc in enumerate(documentos) if i not in (1, 3))
+    raise BulkWriteError({"writeErrors": [
+        {"index": 1, "code": 91, "errmsg": "primário mudou"},
+        {"index": 3, "code": 121, "errmsg": "documento inválido"},
+    ]})
+
+
+class TesteBufferEscrita(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.colecao = ColecaoFalsa()
+        self.notificados = []
+        patcher = mock.patch.object(buffer_escrita, "get_db_collection", return_value=self.colecao)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def _ao_gravar(self, documentos):
+        self.notificados.extend(documentos)
+
+    def _buffer(self, **kwargs) -> BufferEscrita:
+        opcoes = dict(nome_colecao="dados_reais", tamanho_lote=3, intervalo_ms=20, capacidade=10,
+                      espera_max_s=0.01, ao_gravar=self._ao_gravar)
+        opcoes.update(kwargs)
+        return BufferEscrita(**opcoes)
+
+    async def _esperar(self, condicao, limite_s=2.0):
+        fim = asyncio.get_running_loop().time() + limite_s
+        while not condicao():
+            self.assertLess(asyncio.get_running_loop().time(), fim, "condição não atingida a tempo")
+            await asyncio.sleep(0.005)
+
+    async def test_grava_por_tamanho_e_por_intervalo(self):
+        buffer = self._buffer(intervalo_ms=60_000)
+        buffer.iniciar()
+        for i in range(3):
+            await buffer.adicionar(_documento(i))
+        await self._esperar(lambda: len(self.colecao.documentos) == 3)
+        await buffer.encerrar()
+
+        buffer = self._buffer(tamanho_lote=100, intervalo_ms=20)
+        buffer.iniciar()
+        await buffer.adicionar(_documento(10))
+        await self._esperar(lambda: len(self.colecao.documentos) == 4)
+        self.assertEqual(buffer.profundidade, 0)
+        await buffer.encerrar()
+        self.assertEqual(len(self.notificados), 4)
+
+    async def test_fila_cheia_recusa(self):
+        self.colecao.fora = True
+        buffer = self._buffer(capacidade=2, tamanho_lote=1, politica_cheio="rejeitar", tentativas=1)
+        buffer.iniciar()
+        # Um documento fica preso no lote atual, mais dois enchem a fila
+        for i in range(3):
+            await buffer.adicionar(_documento(i))
+            await asyncio.sleep(0.01)
+        with self.assertRaises(BufferCheioError):
+            await buffer.adicionar(_documento(3))
+        await buffer.encerrar()
+
+    async def test_fila_cheia_vira_503_na_rota(self):
+        import httpx
+        from app.main import app
+        from app.servicos import servico_banco_de_dados
+
+        buffer = self._buffer(capacidade=1, politica_cheio="rejeitar")
+        buffer.fila = asyncio.Queue(maxsize=1)
+        buffer.fila.put_nowait(_documento(0))
+        with mock.patch.object(servico_banco_de_dados, "buffer_escrita", buffer):
+            transporte = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transporte, base_url="http://teste") as cliente:
+                resposta = await cliente.post("/api/v1/dados-sensores", json={"id_dispositivo": "horta-01", "umidade": 50})
+        self.assertEqual(resposta.status_code, 503)
+        self.assertEqual(resposta.headers.get("retry-after"), "1")
+
+    async def test_drena_ao_desligar(self):
+        self.colecao.fora = True
+        buffer = self._buffer(tamanho_lote=2)
+        buffer.iniciar()
+        documentos = [_documento(i) for i in range(5)]
+        for documento in documentos:
+            await buffer.adicionar(documento)
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.colecao.documentos, [])
+
+        self.colecao.fora = False
+        await buffer.encerrar()
+        self.assertCountEqual([d["_id"] for d in self.colecao.documentos], [d["_id"] for d in documentos])
+        self.assertEqual(buffer.profundidade, 0)
+
+    async def test_timeout_parcial_nao_duplica(self):
+        self.colecao.falhas = [_grava_metade_e_expira]
+        lote = [_documento(i) for i in range(6)]
+        self.assertEqual(await self._buffer()._gravar(lote), 0)
+        ids = [d["_id"] for d in self.colecao.documentos]
+        self.assertEqual(len(ids), 6)
+        self.assertCountEqual(ids, [d["_id"] for d in lote])
+        # Os agregados recebem cada documento uma vez
+        self.assertCountEqual([d["_id"] for d in self.notificados], ids)
+
+    async def test_bulk_write_error_regrava_so_os_recusados(self):
+        self.colecao.falhas = [_recusa_dois]
+        lote = [_documento(i) for i in range(5)]
+        self.assertEqual(await self._buffer()._gravar(lote), 0)
+        # O recusado por erro passageiro é regravado uma vez; o inválido é descartado
+        esperados = [lote[i]["_id"] for i in (0, 1, 2, 4)]
+        self.assertCountEqual([d["_id"] for d in self.colecao.documentos], esperados)
+        self.assertCountEqual([d["_id"] for d in self.notificados], esperados)
+
+    async def test_tentativas_esgotadas_retorna_pendentes(self):
+        self.colecao.fora = True
+        self.assertEqual(await self._buffer()._gravar([_documento(i) for i in range(4)], tentativas=2), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
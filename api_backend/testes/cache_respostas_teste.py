@@ -0,0 +1,102 @@
+"""
+Testes do cache de respostas da IA: chave formada pela pergunta normalizada
+e pela telemetria, pedidos simultâneos agrupados e erros fora do cache.
+
+Uso (a partir de api_backend/):
+    python -m unittest discover -s testes -t . -p "*_teste.py"
+"""
+import asyncio
+import unittest
+from app.servicos.cache_respostas import CacheRespostas
+from app.servicos.servico_chatbot import normalizar_pergunta
+
+TELEMETRIA = "TELEMETRIA ATUAL (10:00):\n- Umidade: 55.0%\n"
+
+
+class Modelo:
+    """Conta as chamadas e devolve uma resposta diferente a cada uma."""
+
+    def __init__(self, espera: float = 0):
+        self.chamadas = 0
+        self.espera = espera
+
+    async def responder(self):
+        self.chamadas += 1
+        await asyncio.sleep(self.espera)
+        return [f"resposta {self.chamadas}", [{"role": "model", "parts": ["..."]}]]
+
+
+class TesteChaveDoCache(unittest.IsolatedAsyncioTestCase):
+    async def test_pergunta_normalizada_reaproveita_a_resposta(self):
+        cache = CacheRespostas(10, 60)
+        modelo = Modelo()
+        for pergunta in ("Como está a horta?", "  como   está a HORTA ", "como está a horta."):
+            valor = await cache.obter_ou_calcular((normalizar_pergunta(pergunta), TELEMETRIA), modelo.responder)
+            self.assertEqual(valor[0], "resposta 1")
+        self.assertEqual(modelo.chamadas, 1)
+        self.assertEqual((cache.acertos, cache.falhas), (2, 1))
+
+    async def test_telemetria_diferente_e_outra_chave(self):
+        cache = CacheRespostas(10, 60)
+        modelo = Modelo()
+        pergunta = normalizar_pergunta("Como está a horta?")
+        await cache.obter_ou_calcular((pergunta, TELEMETRIA), modelo.responder)
+        valor = await cache.obter_ou_calcular((pergunta, TELEMETRIA.replace("55.0", "56.0")), modelo.responder)
+        self.assertEqual(valor[0], "resposta 2")
+        # Outra pergunta com a mesma telemetria também chama o modelo
+        await cache.obter_ou_calcular(("quais os nutrientes", TELEMETRIA), modelo.responder)
+        self.assertEqual(modelo.chamadas, 3)
+
+    def test_chave_texto_estavel_e_sem_colisao_entre_partes(self):
+        self.assertEqual(CacheRespostas._chave_texto(("a", "b")), CacheRespostas._chave_texto(("a", "b")))
+        # A chave do estado depende só do conteúdo (o JSON), igual em todos os workers
+        self.assertEqual(CacheRespostas._chave_texto(("a", "b")), CacheRespostas._chave_texto(["a", "b"]))
+        self.assertNotEqual(CacheRespostas._chave_texto(("a b", "c")), CacheRespostas._chave_texto(("a", "b c")))
+        self.assertEqual(len(CacheRespostas._chave_texto(("ç", TELEMETRIA))), 64)
+
+    async def test_validade(self):
+        cache = CacheRespostas(10, 0.05)
+        modelo = Modelo()
+        await cache.obter_ou_calcular(("p", TELEMETRIA), modelo.responder)
+        await cache.obter_ou_calcular(("p", TELEMETRIA), modelo.responder)
+        self.assertEqual(modelo.chamadas, 1)
+        await asyncio.sleep(0.06)
+        await cache.obter_ou_calcular(("p", TELEMETRIA), modelo.responder)
+        self.assertEqual(modelo.chamadas, 2)
+
+
+class TesteAgrupamento(unittest.IsolatedAsyncioTestCase):
+    async def test_pedidos_simultaneos_chamam_o_modelo_uma_vez(self):
+        cache = CacheRespostas(10, 60)
+        modelo = Modelo(espera=0.01)
+        valores = await asyncio.gather(*(
+            cache.obter_ou_calcular(("p", TELEMETRIA), modelo.responder) for _ in range(5)
+        ))
+        self.assertEqual(modelo.chamadas, 1)
+        self.assertEqual({v[0] for v in valores}, {"resposta 1"})
+        self.assertEqual(cache.agrupados, 4)
+
+    async def test_erro_chega_a_todos_e_nao_fica_no_cache(self):
+        cache = CacheRespostas(10, 60)
+        chamadas = 0
+
+        async def falhar():
+            nonlocal chamadas
+            chamadas += 1
+            await asyncio.sleep(0.01)
+            raise RuntimeError("modelo fora do ar")
+
+        resultados = await asyncio.gather(*(
+            cache.obter_ou_calcular(("p", TELEMETRIA), falhar) for _ in range(3)
+        ), return_exceptions=True)
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in resultados))
+        self.assertEqual(chamadas, 1)
+
+        modelo = Modelo()
+        valor = await cache.obter_ou_calcular(("p", TELEMETRIA), modelo.responder)
+        self.assertEqual(valor[0], "resposta 1")
+        self.assertEqual(await cache.estado.tamanho(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+"""
+Testes do cache de últimas leituras: um lote atrasado (leituras antigas
+reenviadas pelo dispositivo) não substitui a leitura mais recente, com datas
+com e sem fuso, e o carregamento a partir do banco.
+
+Uso (a partir de api_backend/):
+    python -m unittest discover -s testes -t . -p "*_teste.py"
+"""
+import datetime
+import unittest
+import pytz
+from mongomock_motor import AsyncMongoMockClient
+from app.servicos.cache_ultimas_leituras import CacheUltimasLeituras
+
+FUSO_BRASIL = pytz.timezone("America/Sao_Paulo")
+
+
+def _leitura(dispositivo: str, momento: datetime.datetime, umidade: float) -> dict:
+    return {"id_dispositivo": dispositivo, "timestamp": momento, "umidade": umidade}
+
+
+class TesteCacheUltimasLeituras(unittest.IsolatedAsyncioTestCase):
+    def test_lote_atrasado_nao_substitui_a_mais_recente(self):
+        cache = CacheUltimasLeituras()
+        agora = FUSO_BRASIL.localize(datetime.datetime(2025, 1, 1, 12, 0))
+        cache.atualizar(_leitura("horta-01", agora, 70.0))
+        # Lote reenviado depois, com as leituras guardadas offline
+        for minutos in (30, 20, 10):
+            cache.atualizar(_leitura("horta-01", agora - datetime.timedelta(minutes=minutos), 10.0))
+        self.assertEqual(cache.obter("horta-01")["umidade"], 70.0)
+
+        cache.atualizar(_leitura("horta-01", agora + datetime.timedelta(minutes=1), 71.0))
+        self.assertEqual(cache.obter("horta-01")["umidade"], 71.0)
+
+    def test_compara_datas_com_e_sem_fuso(self):
+        cache = CacheUltimasLeituras()
+        # Do banco: sem fuso, em UTC (15:00 UTC = 12:00 em Brasília)
+        cache.atualizar(_leitura("horta-01", datetime.datetime(2025, 1, 1, 15, 0), 70.0))
+        # Da ingestão: com fuso de Brasília, uma hora antes
+        cache.atualizar(_leitura("horta-01", FUSO_BRASIL.localize(datetime.datetime(2025, 1, 1, 11, 0)), 10.0))
+        self.assertEqual(cache.obter("horta-01")["umidade"], 70.0)
+        estado = cache.estado(60)[0]
+        self.assertEqual(estado["timestamp"], datetime.datetime(2025, 1, 1, 15, tzinfo=datetime.timezone.utc))
+
+    def test_mais_recente_entre_dispositivos(self):
+        cache = CacheUltimasLeituras()
+        base = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+        cache.atualizar(_leitura("horta-01", base, 1.0))
+        cache.atualizar(_leitura("horta-02", base + datetime.timedelta(hours=1), 2.0))
+        cache.atualizar(_leitura("horta-01", base - datetime.timedelta(hours=1), 3.0))
+        self.assertEqual(cache.obter()["id_dispositivo"], "horta-02")
+        self.assertEqual([e["id_dispositivo"] for e in cache.estado(60)], ["horta-01", "horta-02"])
+        self.assertTrue(all(e["desatualizado"] for e in cache.estado(60)))
+
+    def test_ignora_leitura_sem_dispositivo_ou_data(self):
+        cache = CacheUltimasLeituras()
+        cache.atualizar({"timestamp": datetime.datetime(2025, 1, 1), "umidade": 1.0})
+        cache.atualizar({"id_dispositivo": "horta-01", "timestamp": "2025-01-01", "umidade": 1.0})
+        self.assertEqual(len(cache), 0)
+
+    async def test_carregar_do_banco(self):
+        colecao = AsyncMongoMockClient()["horta"]["dados_reais"]
+        base = datetime.datetime(2025, 1, 1)
+        await colecao.insert_many([
+            _leitura("horta-01", base + datetime.timedelta(minutes=i), float(i)) for i in range(5)
+        ] + [_leitura("horta-02", base, 99.0)])
+
+        cache = CacheUltimasLeituras()
+        self.assertEqual(await cache.carregar(colecao), 2)
+        self.assertEqual(cache.obter("horta-01")["umidade"], 4.0)
+        self.assertNotIn("_id", cache.obter("horta-01"))
+
+        # O carregamento não volta para trás uma leitura mais nova já no cache
+        cache.atualizar(_leitura("horta-02", base + datetime.timedelta(days=1), 1.0))
+        await cache.carregar(colecao, "horta-02")
+        self.assertEqual(cache.obter("horta-02")["umidade"], 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+"""
+Testes da decodificação dos corpos de ingestão: JSON, MessagePack e CBOR,
+com e sem gzip, o formato compacto e os limites de tamanho (recebido e
+descomprimido), direto em codificacao e pela rota de lote.
+
+Uso (a partir de api_backend/):
+    python -m unittest discover -s testes -t . -p "*_teste.py"
+"""
+import datetime
+import gzip
+import json
+import unittest
+from unittest import mock
+import cbor2
+import httpx
+import msgpack
+from app.main import app
+from app.nucleo import codificacao
+from app.nucleo.configuracoes import settings
+from app.servicos import servico_banco_de_dados
+
+LEITURAS = [
+    {"id_dispositivo": "horta-01", "umidade": 55.5, "temperatura": 21.0},
+    {"id_dispositivo": "horta-02", "ph_solo": 6.2},
+]
+SERIALIZAR = {
+    "application/json": lambda dados: json.dumps(dados).encode(),
+    "application/msgpack": msgpack.packb,
+    "application/cbor": cbor2.dumps,
+}
+
+
+class TesteDecodificarCorpo(unittest.TestCase):
+    def test_formatos_com_e_sem_gzip(self):
+        for tipo, serializar in SERIALIZAR.items():
+            corpo = serializar(LEITURAS)
+            self.assertEqual(codificacao.decodificar_corpo(corpo, tipo, None, 10_000), LEITURAS, tipo)
+            self.assertEqual(codificacao.decodificar_corpo(gzip.compress(corpo), tipo, "gzip", 10_000), LEITURAS, tipo)
+
+    def test_variantes_do_content_type(self):
+        corpo = msgpack.packb(LEITURAS)
+        self.assertEqual(codificacao.decodificar_corpo(corpo, "application/x-msgpack", "identity", 10_000), LEITURAS)
+        self.assertEqual(codificacao.decodificar_corpo(corpo, "Application/MsgPack; charset=binary", None, 10_000), LEITURAS)
+        # Sem Content-Type, o corpo é JSON
+        self.assertEqual(codificacao.decodificar_corpo(b"[]", None, None, 10), [])
+
+    def test_timestamp_do_msgpack_vira_datetime(self):
+        momento = datetime.datetime(2025, 1, 1, 12, tzinfo=datetime.timezone.utc)
+        corpo = msgpack.packb({"timestamp": msgpack.Timestamp.from_datetime(momento)})
+        self.assertEqual(codificacao.decodificar_corpo(corpo, "application/msgpack", None, 100)["timestamp"], momento)
+
+    def test_formato_compacto(self):
+        base = int(datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc).timestamp())
+        corpo = gzip.compress(cbor2.dumps(["horta-01", base, [[0, 50.0], [60, None, 6.5]]]))
+        leituras = codificacao.decodificar_corpo(corpo, "application/vnd.horta.compacto+cbor", "gzip", 1000)
+        self.assertEqual(len(leituras), 2)
+        self.assertEqual(leituras[0]["umidade"], 50.0)
+        self.assertNotIn("umidade", leituras[1])
+        self.assertEqual(leituras[1]["timestamp"] - leituras[0]["timestamp"], datetime.timedelta(seconds=60))
+
+    def test_limite_vale_para_o_corpo_descomprimido(self):
+        corpo = gzip.compress(json.dumps(["x" * 5000]).encode())
+        self.assertLess(len(corpo), 1000)
+        with self.assertRaises(codificacao.CorpoMuitoGrandeError):
+            codificacao.decodificar_corpo(corpo, "application/json", "gzip", 1000)
+        with self.assertRaises(codificacao.CorpoMuitoGrandeError):
+            codificacao.decodificar_corpo(b"[" + b"1," * 600 + b"1]", "application/json", None, 1000)
+
+    def test_erros(self):
+        with self.assertRaises(codificacao.FormatoNaoSuportadoError):
+            codificacao.decodificar_corpo(b"oi", "text/plain", None, 100)
+        with self.assertRaises(codificacao.FormatoNaoSuportadoError):
+            codificacao.decodificar_corpo(b"[]", "application/xml", None, 100)
+        with self.assertRaises(codificacao.FormatoNaoSuportadoError):
+            codificacao.decodificar_corpo(b"[]", "application/json", "br", 100)
+        with self.assertRaises(codificacao.CorpoInvalidoError):
+            codificacao.decodificar_corpo(b"nao e gzip", "application/json", "gzip", 100)
+        with self.assertRaises(codificacao.CorpoInvalidoError):
+            codificacao.decodificar_corpo(b"\xc1", "application/msgpack", None, 100)
+        with self.assertRaises(codificacao.CorpoInvalidoError):
+            codificacao.decodificar_corpo(cbor2.dumps(["horta-01", 0]), "application/vnd.horta.compacto+cbor", None, 100)
+
+    def test_pacote_ausente(self):
+        with mock.patch.object(codificacao, "msgpack", None):
+            self.assertFalse(codificacao.serializacao_disponivel("msgpack"))
+            with self.assertRaises(codificacao.FormatoNaoSuportadoError):
+                codificacao.decodificar_corpo(b"\x90", "application/msgpack", None, 100)
+
+
+class ColecaoFalsa:
+    def __init__(self):
+        self.documentos = []
+
+    async def insert_many(self, documentos, ordered=True):
+        self.documentos.extend(documentos)
+
+
+class TesteRotaLote(unittest.IsolatedAsyncioTestCase):
+    async def _enviar(self, corpo, cabecalhos: dict, max_bytes: int = 10_000):
+        colecao = ColecaoFalsa()
+        with mock.patch.object(servico_banco_de_dados, "get_db_collection", return_value=colecao), \
+                mock.patch.object(settings, "AGREGADOS_ATIVO", False), \
+                mock.patch.object(settings, "REGRAS_ATIVO", False), \
+                mock.patch.object(settings, "INGESTAO_MAX_BYTES", max_bytes):
+            transporte = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transporte, base_url="http://teste") as cliente:
+                resposta = await cliente.post("/api/v1/dados-sensores/lote", content=corpo, headers=cabecalhos)
+        return resposta, colecao.documentos
+
+    async def test_msgpack_e_cbor_comprimidos(self):
+        for tipo in ("application/msgpack", "application/cbor"):
+            corpo = gzip.compress(SERIALIZAR[tipo](LEITURAS))
+            resposta, documentos = await self._enviar(corpo, {"content-type": tipo, "content-encoding": "gzip"})
+            self.assertEqual(resposta.status_code, 200, tipo)
+            self.assertEqual(resposta.json()["sucesso"], 2)
+            self.assertEqual([d["id_dispositivo"] for d in documentos], ["horta-01", "horta-02"])
+
+    async def test_corpo_em_partes_acima_do_limite(self):
+        partes_lidas = 0
+
+        async def partes():
+            nonlocal partes_lidas
+            yield b"["
+            for _ in range(100):
+                partes_lidas += 1
+                yield json.dumps(LEITURAS[0]).encode() + b","
+            yield b"{}]"
+
+        # Sem Content-Length: a leitura para assim que passa do limite
+        resposta, documentos = await self._enviar(partes(), {"content-type": "application/json"}, max_bytes=500)
+        self.assertEqual(resposta.status_code, 413)
+        self.assertLess(partes_lidas, 100)
+        self.assertEqual(documentos, [])
+
+    async def test_content_length_acima_do_limite(self):
+        corpo = json.dumps(LEITURAS * 20).encode()
+        resposta, _ = await self._enviar(corpo, {"content-type": "application/json"}, max_bytes=500)
+        self.assertEqual(resposta.status_code, 413)
+
+    async def test_descomprimido_acima_do_limite(self):
+        corpo = gzip.compress(json.dumps(LEITURAS * 50).encode())
+        self.assertLess(len(corpo), 500)
+        resposta, _ = await self._enviar(corpo, {"content-type": "application/json", "content-encoding": "gzip"}, 500)
+        self.assertEqual(resposta.status_code, 413)
+
+    async def test_formato_desconhecido_e_corpo_invalido(self):
+        resposta, _ = await self._enviar(b"<xml/>", {"content-type": "application/xml"})
+        self.assertEqual(resposta.status_code, 415)
+        resposta, _ = await self._enviar(b"[{", {"content-type": "application/json"})
+        self.assertEqual(resposta.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+"""
+Testes do estado compartilhado em SQLite: adicionar_se_ausente atômico entre
+conexões (como entre workers), validade das chaves, limpeza das menos usadas
+por espaço e contagem restrita à faixa de chaves do espaço.
+
+Uso (a partir de api_backend/):
+    python -m unittest discover -s testes -t . -p "*_teste.py"
+"""
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+from app.servicos.estado_compartilhado import EstadoSQLite, _ConexaoSQLite
+
+
+class TesteEstadoSQLite(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.caminho = os.path.join(pasta.name, "estado.db")
+        self.conexoes = []
+
+    def tearDown(self):
+        for conexao in self.conexoes:
+            conexao.fechar()
+
+    def _estado(self, espaco: str = "teste", capacidade: int = 100, intervalo_limpeza: int = 256,
+                conexao: _ConexaoSQLite | None = None) -> EstadoSQLite:
+        if conexao is None:
+            conexao = _ConexaoSQLite(self.caminho)
+            self.conexoes.append(conexao)
+        return EstadoSQLite(conexao, espaco, capacidade, intervalo_limpeza)
+
+    async def test_adicionar_se_ausente_entre_conexoes(self):
+        # Duas conexões no mesmo arquivo, como dois workers
+        primeiro, segundo = self._estado(), self._estado()
+        self.assertTrue(await primeiro.adicionar_se_ausente("update:1", 60))
+        self.assertFalse(await segundo.adicionar_se_ausente("update:1", 60))
+        self.assertFalse(await primeiro.adicionar_se_ausente("update:1", 60))
+        self.assertTrue(await segundo.adicionar_se_ausente("update:2", 60))
+
+        await primeiro.apagar("update:1")
+        self.assertTrue(await segundo.adicionar_se_ausente("update:1", 60))
+
+    async def test_adicionar_se_ausente_substitui_chave_vencida(self):
+        estado = self._estado()
+        self.assertTrue(await estado.adicionar_se_ausente("k", 0.05))
+        self.assertFalse(await estado.adicionar_se_ausente("k", 60))
+        time.sleep(0.06)
+        self.assertTrue(await estado.adicionar_se_ausente("k", 60))
+        self.assertFalse(await estado.adicionar_se_ausente("k", 60))
+
+    async def test_espacos_separados(self):
+        updates, respostas = self._estado("updates"), self._estado("respostas")
+        self.assertTrue(await updates.adicionar_se_ausente("1", 60))
+        self.assertTrue(await respostas.adicionar_se_ausente("1", 60))
+        await respostas.guardar("2", {"texto": "oi", "lista": [1, 2]}, 60)
+        self.assertEqual(await respostas.obter("2"), {"texto": "oi", "lista": [1, 2]})
+        self.assertIsNone(await updates.obter("2"))
+
+    async def test_guardar_e_obter_com_validade(self):
+        estado = self._estado()
+        await estado.guardar("k", [1, "dois"], 0.05)
+        self.assertEqual(await estado.obter("k"), [1, "dois"])
+        time.sleep(0.06)
+        self.assertIsNone(await estado.obter("k"))
+
+    async def test_tamanho_conta_so_a_faixa_do_espaco(self):
+        conexao = _ConexaoSQLite(self.caminho)
+        self.conexoes.append(conexao)
+        # A faixa do espaço "a" é [a:, a;): pega qualquer chave depois do prefixo, mas não "ab:" nem "a;:"
+        a = self._estado("a", conexao=conexao)
+        ab = self._estado("ab", conexao=conexao)
+        a_ponto = self._estado("a;", conexao=conexao)
+        for chave in ("1", "2", "~~", "\U0001F331"):
+            await a.guardar(chave, True, 60)
+        await ab.guardar("1", True, 60)
+        await a_ponto.guardar("1", True, 60)
+        await a.guardar("vencida", True, 0.01)
+        time.sleep(0.02)
+
+        self.assertEqual(await a.tamanho(), 4)
+        self.assertEqual(await ab.tamanho(), 1)
+        self.assertEqual(await a_ponto.tamanho(), 1)
+
+    async def test_tamanho_usa_o_indice_da_chave(self):
+        estado = self._estado()
+        await estado.guardar("k", True, 60)
+        plano = estado._executar(
+            "EXPLAIN QUERY PLAN SELECT COUNT(*) FROM estado WHERE chave >= ? AND chave < ? AND expira_em > ?",
+            ("teste:", "teste;", time.time()),
+        ).fetchall()
+        self.assertTrue(any("chave>? AND chave<?" in linha[-1] for linha in plano), plano)
+
+    async def test_limpar_mantem_as_mais_usadas_do_espaco(self):
+        conexao = _ConexaoSQLite(self.caminho)
+        self.conexoes.append(conexao)
+        estado = self._estado("conversas", capacidade=3, conexao=conexao)
+        outro = self._estado("respostas", capacidade=3, conexao=conexao)
+        relogio = [1000.0]
+        with mock.patch("app.servicos.estado_compartilhado.time.time", side_effect=lambda: relogio[0]):
+            for chave in ("a", "b", "c", "d", "e"):
+                relogio[0] += 1
+                await estado.guardar(chave, chave, 3600)
+            for chave in ("x", "y"):
+                relogio[0] += 1
+                await outro.guardar(chave, chave, 3600)
+            # Ler 'a' e 'b' os torna os mais usados
+            relogio[0] += 1
+            await estado.obter("a")
+            relogio[0] += 1
+            await estado.obter("b")
+
+            estado.limpar()
+            self.assertEqual(await estado.tamanho(), 3)
+            self.assertEqual([await estado.obter(c) for c in "abcde"], ["a", "b", None, None, "e"])
+            # O outro espaço não é afetado pela capacidade deste
+            self.assertEqual(await outro.tamanho(), 2)
+
+    async def test_limpeza_a_cada_intervalo_de_gravacoes(self):
+        estado = self._estado(capacidade=2, intervalo_limpeza=4)
+        for numero in range(3):
+            await estado.guardar(str(numero), numero, 60)
+        self.assertEqual(await estado.tamanho(), 3)
+        # A quarta gravação dispara a limpeza
+        self.assertTrue(await estado.adicionar_se_ausente("3", 60))
+        self.assertEqual(await estado.tamanho(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+Testes da rota de envio em lote (/api/v1/dados-sensores/lote): resultado
+de cada item na posição enviada, com itens inválidos e falhas de escrita que
+não derrubam o restante do lote.
+
+Uso (a partir de api_backend/):
+    python -m unittest discover -s testes -t . -p "*_teste.py"
+"""
+import datetime
+import unittest
+from unittest import mock
+import httpx
+from pymongo.errors import BulkWriteError
+from app.main import app
+from app.nucleo.configuracoes import settings
+from app.servicos import servico_banco_de_dados
+
+
+class ColecaoFalsa:
+    """Grava os documentos, exceto os das posições em 'recusar' (BulkWriteError)."""
+
+    def __init__(self, recusar=()):
+        self.documentos = []
+        self.recusar = set(recusar)
+
+    async def insert_many(self, documentos, ordered=True):
+        self.documentos.extend(doc for i, doc in enumerate(documentos) if i not in self.recusar)
+        if self.recusar:
+            raise BulkWriteError({"writeErrors": [
+                {"index": i, "code": 121, "errmsg": "documento inválido"} for i in sorted(self.recusar)
+            ]})
+
+
+class TesteLote(unittest.IsolatedAsyncioTestCase):
+    async def _enviar(self, corpo, colecao: ColecaoFalsa) -> httpx.Response:
+        with mock.patch.object(servico_banco_de_dados, "get_db_collection", return_value=colecao), \
+                mock.patch.object(settings, "AGREGADOS_ATIVO", False), \
+                mock.patch.object(settings, "REGRAS_ATIVO", False):
+            transporte = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transporte, base_url="http://teste") as cliente:
+                return await cliente.post("/api/v1/dados-sensores/lote", json=corpo)
+
+    async def test_resultado_por_item(self):
+        colecao = ColecaoFalsa()
+        resposta = await self._enviar([
+            {"id_dispositivo": "horta-01", "umidade": 55.0, "timestamp": "2025-01-01T10:00:00-03:00"},
+            {"umidade": 60.0},  # sem id_dispositivo
+            {"id_dispositivo": "horta-01", "ph_solo": 20},  # fora da escala
+            {"id_dispositivo": "horta-02", "temperatura": 21.5},
+        ], colecao)
+
+        self.assertEqual(resposta.status_code, 200)
+        corpo = resposta.json()
+        self.assertEqual((corpo["total"], corpo["sucesso"], corpo["falhas"]), (4, 2, 2))
+        resultados = corpo["resultados"]
+        self.assertEqual([r["indice"] for r in resultados], [0, 1, 2, 3])
+        self.assertEqual([r["status"] for r in resultados], ["sucesso", "erro", "erro", "sucesso"])
+        self.assertIn("id_dispositivo", resultados[1]["erro"])
+        self.assertIn("ph_solo", resultados[2]["erro"])
+
+        # Os válidos vão numa única escrita, com o _id devolvido ao dispositivo
+        self.assertEqual([str(doc["_id"]) for doc in colecao.documentos],
+                         [resultados[0]["id_inserido"], resultados[3]["id_inserido"]])
+        # O horário enviado pelo dispositivo é preservado
+        momento = colecao.documentos[0]["timestamp"]
+        self.assertEqual(momento.astimezone(datetime.timezone.utc),
+                         datetime.datetime(2025, 1, 1, 13, tzinfo=datetime.timezone.utc))
+
+    async def test_falha_de_escrita_marca_so_o_item(self):
+        colecao = ColecaoFalsa(recusar={1})
+        resposta = await self._enviar([
+            {"id_dispositivo": "horta-01", "umidade": 50.0},
+            {"id_dispositivo": "horta-01", "umidade": 51.0},
+            {"id_dispositivo": "horta-01", "umidade": 52.0},
+        ], colecao)
+
+        resultados = resposta.json()["resultados"]
+        self.assertEqual([r["status"] for r in resultados], ["sucesso", "erro", "sucesso"])
+        self.assertEqual(resultados[1]["erro"], "documento inválido")
+        self.assertIsNone(resultados[1]["id_inserido"])
+        self.assertEqual(len(colecao.documentos), 2)
+
+    async def test_corpo_que_nao_e_lista(self):
+        resposta = await self._enviar({"id_dispositivo": "horta-01"}, ColecaoFalsa())
+        self.assertEqual(resposta.status_code, 422)
+
+    async def test_lote_acima_do_limite(self):
+        colecao = ColecaoFalsa()
+        with mock.patch.object(settings, "LOTE_MAX_ITENS", 2):
+            resposta = await self._enviar([{"id_dispositivo": "horta-01"}] * 3, colecao)
+        self.assertEqual(resposta.status_code, 413)
+        self.assertEqual(colecao.documentos, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+"""
+Testes da memória das conversas do chatbot: corte por turnos e por tokens
+(sempre mantendo o último turno), limite de conversas e validade.
+
+Uso (a partir de api_backend/):
+    python -m unittest discover -s testes -t . -p "*_teste.py"
+"""
+import asyncio
+import unittest
+from app.servicos.memoria_conversas import MemoriaConversas, estimar_tokens
+
+
+def _turno(numero: int, tamanho: int = 8) -> list[dict]:
+    """Pergunta e resposta, cada uma com 'tamanho' caracteres (tamanho // 4 tokens)."""
+    return [
+        {"role": "user", "parts": [f"p{numero}".ljust(tamanho, ".")]},
+        {"role": "model", "parts": [f"r{numero}".ljust(tamanho, ".")]},
+    ]
+
+
+def _conversa(turnos: int, tamanho: int = 8) -> list[dict]:
+    return [mensagem for numero in range(turnos) for mensagem in _turno(numero, tamanho)]
+
+
+def _memoria(max_turnos: int = 10, max_tokens: int = 10_000, max_conversas: int = 10, ttl_s: float = 60):
+    return MemoriaConversas(max_conversas=max_conversas, ttl_s=ttl_s, max_turnos=max_turnos, max_tokens=max_tokens)
+
+
+class TesteEstimarTokens(unittest.TestCase):
+    def test_quatro_caracteres_por_token(self):
+        self.assertEqual(estimar_tokens([]), 0)
+        self.assertEqual(estimar_tokens(_turno(0, 8)), 4)
+        self.assertEqual(estimar_tokens([{"role": "user", "parts": ["abc", "defgh"]}]), 2)
+
+
+class TesteCorte(unittest.IsolatedAsyncioTestCase):
+    async def test_mantem_os_ultimos_turnos(self):
+        memoria = _memoria(max_turnos=3)
+        await memoria.salvar("chat", _conversa(5))
+        historico = await memoria.obter("chat")
+        self.assertEqual(historico, _conversa(5)[-6:])
+        self.assertEqual(historico[0]["parts"][0][:2], "p2")
+        self.assertEqual(memoria.turnos_cortados, 2)
+
+    async def test_corta_pelo_orcamento_de_tokens(self):
+        # Cada turno tem 2 mensagens de 40 caracteres: 20 tokens
+        memoria = _memoria(max_tokens=50)
+        await memoria.salvar("chat", _conversa(4, tamanho=40))
+        historico = await memoria.obter("chat")
+        self.assertEqual(len(historico), 4)
+        self.assertLessEqual(estimar_tokens(historico), 50)
+        self.assertEqual(historico, _conversa(4, tamanho=40)[-4:])
+        self.assertEqual(memoria.turnos_cortados, 2)
+
+    async def test_turnos_e_tokens_juntos(self):
+        memoria = _memoria(max_turnos=3, max_tokens=30)
+        await memoria.salvar("chat", _conversa(6, tamanho=40))
+        # Primeiro fica com 3 turnos; depois o orçamento deixa 1
+        self.assertEqual(await memoria.obter("chat"), _conversa(6, tamanho=40)[-2:])
+        self.assertEqual(memoria.turnos_cortados, 5)
+
+    async def test_ultimo_turno_fica_mesmo_acima_do_limite(self):
+        memoria = _memoria(max_tokens=5)
+        await memoria.salvar("chat", _conversa(3, tamanho=400))
+        self.assertEqual(await memoria.obter("chat"), _turno(2, 400))
+
+    async def test_nao_altera_a_lista_recebida(self):
+        memoria = _memoria(max_turnos=1)
+        conversa = _conversa(3)
+        await memoria.salvar("chat", conversa)
+        self.assertEqual(len(conversa), 6)
+        historico = await memoria.obter("chat")
+        historico.append({"role": "user", "parts": ["extra"]})
+        self.assertEqual(len(await memoria.obter("chat")), 2)
+
+
+class TesteConversas(unittest.IsolatedAsyncioTestCase):
+    async def test_conversa_menos_usada_sai_primeiro(self):
+        memoria = _memoria(max_conversas=2)
+        await memoria.salvar(1, _turno(1))
+        await memoria.salvar(2, _turno(2))
+        await memoria.obter(1)  # o chat 1 passa a ser o mais recente
+        await memoria.salvar(3, _turno(3))
+        self.assertEqual(await memoria.obter(1), _turno(1))
+        self.assertEqual(await memoria.obter(2), [])
+        # chat_id numérico e em texto são a mesma conversa
+        self.assertEqual(await memoria.obter("3"), _turno(3))
+
+    async def test_validade_renovada_a_cada_uso(self):
+        memoria = _memoria(ttl_s=0.08)
+        await memoria.salvar("chat", _turno(1))
+        await asyncio.sleep(0.05)
+        self.assertEqual(await memoria.obter("chat"), _turno(1))
+        await asyncio.sleep(0.05)
+        self.assertEqual(await memoria.obter("chat"), _turno(1))
+        await asyncio.sleep(0.1)
+        self.assertEqual(await memoria.obter("chat"), [])
+
+    async def test_limpar_e_estatisticas(self):
+        memoria = _memoria(max_turnos=1)
+        await memoria.salvar("a", _conversa(2))
+        await memoria.salvar("b", _turno(0))
+        await memoria.limpar("b")
+        estatisticas = await memoria.estatisticas()
+        self.assertEqual(estatisticas["conversas"], 1)
+        self.assertEqual(estatisticas["mensagens"], 2)
+        self.assertEqual(estatisticas["tokens_estimados"], 4)
+        self.assertEqual(estatisticas["turnos_cortados"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
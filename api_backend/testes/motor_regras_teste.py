@@ -0,0 +1,135 @@
+"""
+Testes das partes puras do motor de regras: estatísticas em janela
+deslizante (Welford com remoção e filas monotônicas), histerese da
+classificação das culturas e alertas do MotorRegras.
+
+Uso (a partir de api_backend/):
+    python -m unittest discover -s testes -t . -p "*_teste.py"
+"""
+import datetime
+import random
+import statistics
+import unittest
+from app.nucleo import culturas
+from app.nucleo.estatisticas_janela import EstatisticasJanela
+from app.servicos.motor_regras import MotorRegras
+
+LIMITE_UMIDADE = culturas.CULTURAS["Alface Americana"]["limites"]["umidade"]  # 60-80, crítico < 40
+
+
+class TesteEstatisticasJanela(unittest.TestCase):
+    def test_igual_ao_calculo_direto(self):
+        """Após cada leitura, compara com as estatísticas recalculadas da janela inteira."""
+        sorteio = random.Random(42)
+        janela = EstatisticasJanela(60)
+        leituras = []
+        instante = 0.0
+        for _ in range(2000):
+            instante += sorteio.uniform(0.1, 5.0)
+            valor = sorteio.gauss(25.0, 8.0)
+            janela.adicionar(instante, valor)
+            leituras.append((instante, valor))
+
+            valores = [v for t, v in leituras if t > instante - 60]
+            self.assertEqual(len(janela), len(valores))
+            self.assertAlmostEqual(janela.media, statistics.fmean(valores), places=6)
+            self.assertEqual(janela.minimo, min(valores))
+            self.assertEqual(janela.maximo, max(valores))
+            self.assertEqual(janela.ultimo, valor)
+            if len(valores) >= 2:
+                self.assertAlmostEqual(janela.variancia, statistics.variance(valores), places=4)
+            else:
+                self.assertIsNone(janela.variancia)
+
+    def test_leitura_no_limite_da_janela_sai(self):
+        janela = EstatisticasJanela(10)
+        janela.adicionar(0, 1.0)
+        janela.adicionar(10, 3.0)
+        self.assertEqual(len(janela), 1)
+        self.assertEqual(janela.media, 3.0)
+
+    def test_minimo_e_maximo_expiram_em_ordem(self):
+        janela = EstatisticasJanela(10)
+        for instante, valor in [(0, 5.0), (1, 1.0), (2, 9.0), (3, 4.0)]:
+            janela.adicionar(instante, valor)
+        self.assertEqual((janela.minimo, janela.maximo), (1.0, 9.0))
+        janela.expirar(11.5)  # saem as leituras de 0 e 1
+        self.assertEqual((janela.minimo, janela.maximo), (4.0, 9.0))
+        janela.expirar(12.5)  # sai a de 2
+        self.assertEqual((janela.minimo, janela.maximo), (4.0, 4.0))
+
+    def test_janela_vazia_recomeca(self):
+        janela = EstatisticasJanela(5)
+        janela.adicionar(0, 100.0)
+        janela.adicionar(1, 200.0)
+        janela.expirar(100)
+        self.assertEqual(len(janela), 0)
+        self.assertIsNone(janela.media)
+        self.assertIsNone(janela.minimo)
+        self.assertEqual(janela.resumo()["amostras"], 0)
+        janela.adicionar(101, 7.0)
+        self.assertEqual((janela.media, janela.minimo, janela.maximo), (7.0, 7.0, 7.0))
+        self.assertIsNone(janela.variancia)
+
+
+class TesteClassificar(unittest.TestCase):
+    def test_faixas_sem_histerese(self):
+        self.assertEqual(culturas.classificar(70, LIMITE_UMIDADE), "ok")
+        self.assertEqual(culturas.classificar(55, LIMITE_UMIDADE), "baixo")
+        self.assertEqual(culturas.classificar(30, LIMITE_UMIDADE), "critico_baixo")
+        self.assertEqual(culturas.classificar(85, LIMITE_UMIDADE), "critico_alto")
+
+    def test_histerese_para_sair_de_baixo(self):
+        margem = culturas.margem_histerese(LIMITE_UMIDADE, 0.05)  # 1.0
+        self.assertEqual(margem, 1.0)
+        # Em 'baixo', só volta para 'ok' acima de 60 + margem
+        self.assertEqual(culturas.classificar(60.5, LIMITE_UMIDADE, "baixo", margem), "baixo")
+        self.assertEqual(culturas.classificar(61.5, LIMITE_UMIDADE, "baixo", margem), "ok")
+        # Vindo de 'ok', a entrada continua no limite
+        self.assertEqual(culturas.classificar(60.5, LIMITE_UMIDADE, "ok", margem), "ok")
+        self.assertEqual(culturas.classificar(59.5, LIMITE_UMIDADE, "ok", margem), "baixo")
+
+    def test_histerese_do_critico(self):
+        margem = 1.0
+        # Em 'critico_baixo', continua crítico até passar de 40 + margem
+        self.assertEqual(culturas.classificar(40.5, LIMITE_UMIDADE, "critico_baixo", margem), "critico_baixo")
+        # Saindo do crítico, a faixa de 'baixo' também usa a margem
+        self.assertEqual(culturas.classificar(41.5, LIMITE_UMIDADE, "critico_baixo", margem), "baixo")
+        self.assertEqual(culturas.classificar(60.5, LIMITE_UMIDADE, "critico_baixo", margem), "baixo")
+        self.assertEqual(culturas.classificar(61.5, LIMITE_UMIDADE, "critico_baixo", margem), "ok")
+
+    def test_margem_sem_faixa(self):
+        self.assertEqual(culturas.margem_histerese({"max": 10}, 0.05), 0.0)
+
+
+class TesteMotorRegras(unittest.TestCase):
+    def _motor(self) -> MotorRegras:
+        return MotorRegras(janelas_s=[300], min_amostras=3, histerese_fracao=0.05, intervalo_min_alerta_s=600)
+
+    def _leitura(self, instante: float, umidade: float) -> dict:
+        momento = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc) + datetime.timedelta(seconds=instante)
+        return {"id_dispositivo": "horta-01", "timestamp": momento, "umidade": umidade}
+
+    def test_oscilacao_no_limite_gera_um_alerta(self):
+        motor = self._motor()
+        notificados = []
+        motor.registrar_notificador(notificados.append)
+        alertas = []
+        # Média cai abaixo de 60 e depois oscila entre 59.6 e 60.6 (dentro da margem de 1.0)
+        for i, valor in enumerate([70, 70, 70] + [50] * 6 + [60.6, 59.6] * 20):
+            alertas += motor.processar(self._leitura(i * 60, valor))
+        self.assertEqual([a["estado"] for a in alertas], ["baixo"])
+        self.assertEqual(len(notificados), 1)
+        self.assertEqual(motor.diagnostico("horta-01")["metricas"]["umidade"]["estado"], "baixo")
+
+    def test_leitura_atrasada_nao_entra(self):
+        motor = self._motor()
+        for i in range(3):
+            motor.processar(self._leitura(100 + i, 70))
+        self.assertEqual(motor.processar(self._leitura(50, 10)), [])
+        janela = motor.diagnostico("horta-01")["metricas"]["umidade"]["janelas"]["300"]
+        self.assertEqual((janela["amostras"], janela["minimo"]), (3, 70))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,174 @@
+"""
+Testes da fila do Telegram: updates reenviados tratados uma vez, reenvio
+aceito depois de uma recusa por fila cheia, ordem das mensagens de cada chat
+e novas tentativas após um 429.
+
+Uso (a partir de api_backend/):
+    python -m unittest discover -s testes -t . -p "*_teste.py"
+"""
+import asyncio
+import json
+import unittest
+from unittest import mock
+import httpx
+from app.servicos import servico_chatbot
+from app.servicos.servico_telegram import DeduplicadorUpdates, FilaTelegram
+
+
+def _update(update_id: int, chat_id, texto: str) -> dict:
+    return {"update_id": update_id, "message": {"chat": {"id": chat_id}, "text": texto}}
+
+
+def _fila(workers: int = 4, capacidade: int = 100, tentativas: int = 3) -> FilaTelegram:
+    return FilaTelegram(
+        token="teste", url_base="http://telegram", workers=workers, capacidade=capacidade,
+        taxa_global=1000, intervalo_por_chat_s=0, tentativas=tentativas, janela_dedup=100,
+    )
+
+
+class TesteDeduplicador(unittest.IsolatedAsyncioTestCase):
+    async def test_registra_uma_vez(self):
+        dedup = DeduplicadorUpdates(10)
+        self.assertTrue(await dedup.registrar(1))
+        self.assertFalse(await dedup.registrar(1))
+        # O update_id é comparado como texto
+        self.assertFalse(await dedup.registrar("1"))
+        self.assertTrue(await dedup.registrar(2))
+
+    async def test_sem_update_id_sempre_passa(self):
+        dedup = DeduplicadorUpdates(10)
+        self.assertTrue(await dedup.registrar(None))
+        self.assertTrue(await dedup.registrar(None))
+
+    async def test_esquecer_aceita_o_reenvio(self):
+        dedup = DeduplicadorUpdates(10)
+        await dedup.registrar(7)
+        await dedup.esquecer(7)
+        self.assertTrue(await dedup.registrar(7))
+
+    async def test_capacidade_esquece_os_mais_antigos(self):
+        dedup = DeduplicadorUpdates(3)
+        for update_id in range(4):
+            await dedup.registrar(update_id)
+        self.assertTrue(await dedup.registrar(0))
+        self.assertFalse(await dedup.registrar(3))
+
+
+class TesteReceberUpdate(unittest.IsolatedAsyncioTestCase):
+    async def test_update_reenviado_e_duplicado(self):
+        fila = _fila(workers=1)
+        fila.filas_entrada = [asyncio.Queue()]
+        self.assertEqual(await fila.receber_update(_update(1, 10, "oi")), "recebido")
+        self.assertEqual(await fila.receber_update(_update(1, 10, "oi")), "duplicado")
+        self.assertEqual(fila.filas_entrada[0].qsize(), 1)
+
+    async def test_update_sem_texto_e_ignorado(self):
+        fila = _fila(workers=1)
+        fila.filas_entrada = [asyncio.Queue()]
+        self.assertEqual(await fila.receber_update({"update_id": 1, "message": {"chat": {"id": 10}}}), "ignorado")
+        self.assertEqual(await fila.receber_update({"update_id": 2}), "ignorado")
+
+    async def test_fila_cheia_aceita_o_reenvio(self):
+        fila = _fila(workers=1)
+        fila.filas_entrada = [asyncio.Queue(maxsize=1)]
+        self.assertEqual(await fila.receber_update(_update(1, 10, "primeira")), "recebido")
+        self.assertEqual(await fila.receber_update(_update(2, 10, "segunda")), "fila_cheia")
+
+        # O Telegram reenvia o update 2 depois que a fila andou
+        fila.filas_entrada[0].get_nowait()
+        self.assertEqual(await fila.receber_update(_update(2, 10, "segunda")), "recebido")
+        self.assertEqual(fila.filas_entrada[0].get_nowait(), (10, "segunda"))
+
+    async def test_mesmo_chat_vai_para_a_mesma_fila(self):
+        fila = _fila(workers=8)
+        fila.filas_entrada = [asyncio.Queue() for _ in range(8)]
+        for update_id in range(20):
+            await fila.receber_update(_update(update_id, 42, f"mensagem {update_id}"))
+        # O chat_id numérico e o mesmo id em texto caem na mesma fila
+        await fila.receber_update(_update(99, "42", "mensagem 99"))
+
+        ocupadas = [f for f in fila.filas_entrada if f.qsize()]
+        self.assertEqual(len(ocupadas), 1)
+        textos = [ocupadas[0].get_nowait()[1] for _ in range(21)]
+        self.assertEqual(textos, [f"mensagem {i}" for i in range(20)] + ["mensagem 99"])
+
+
+class TesteOrdemPorChat(unittest.IsolatedAsyncioTestCase):
+    async def test_respostas_saem_na_ordem_de_chegada(self):
+        enviados = []
+        todos_enviados = asyncio.Event()
+        total = 30
+
+        def responder(request: httpx.Request) -> httpx.Response:
+            corpo = json.loads(request.content)
+            enviados.append((corpo["chat_id"], corpo["text"]))
+            if len(enviados) == total:
+                todos_enviados.set()
+            return httpx.Response(200, json={"ok": True})
+
+        async def processar(texto, chat_id):
+            # As mensagens pares demoram mais: sem a fila por chat, a ordem se perderia
+            await asyncio.sleep(0.01 if int(texto.split()[1]) % 2 == 0 else 0)
+            return f"resposta {texto.split()[1]}"
+
+        fila = _fila(workers=3)
+        with mock.patch.object(servico_chatbot, "processar_mensagem_usuario", side_effect=processar):
+            fila.iniciar()
+            await fila.cliente.aclose()
+            fila.cliente = httpx.AsyncClient(transport=httpx.MockTransport(responder))
+            try:
+                for i in range(total):
+                    chat_id = 100 + i % 3
+                    await fila.receber_update(_update(i, chat_id, f"mensagem {i}"))
+                await asyncio.wait_for(todos_enviados.wait(), timeout=5)
+            finally:
+                await fila.encerrar()
+
+        for chat_id in (100, 101, 102):
+            recebidas = [int(texto.split()[1]) for chat, texto in enviados if chat == chat_id]
+            self.assertEqual(recebidas, sorted(recebidas))
+            self.assertEqual(len(recebidas), total // 3)
+
+
+class TesteEnvioComRetentativas(unittest.IsolatedAsyncioTestCase):
+    async def _enviar(self, respostas: list) -> tuple:
+        chamadas = []
+
+        def responder(request: httpx.Request) -> httpx.Response:
+            chamadas.append(request)
+            return respostas.pop(0)
+
+        fila = _fila(tentativas=3)
+        fila.cliente = httpx.AsyncClient(transport=httpx.MockTransport(responder))
+        with mock.patch("app.servicos.servico_telegram.asyncio.sleep") as dormir:
+            await fila._enviar_com_retentativas(10, "**oi**")
+        await fila.cliente.aclose()
+        return chamadas, [c.args[0] for c in dormir.call_args_list]
+
+    async def test_429_usa_o_retry_after(self):
+        chamadas, esperas = await self._enviar([
+            httpx.Response(429, json={"ok": False, "parameters": {"retry_after": 7}}),
+            httpx.Response(200, json={"ok": True}),
+        ])
+        self.assertEqual(len(chamadas), 2)
+        self.assertEqual(esperas, [7])
+        # Enviado como texto puro, sem a formatação Markdown
+        self.assertEqual(json.loads(chamadas[0].content)["text"], "oi")
+
+    async def test_429_fora_do_formato_mantem_o_backoff(self):
+        chamadas, esperas = await self._enviar([
+            httpx.Response(429, text="<html>Too Many Requests</html>"),
+            httpx.Response(429, json={"ok": False}),
+            httpx.Response(200, json={"ok": True}),
+        ])
+        self.assertEqual(len(chamadas), 3)
+        self.assertEqual(esperas, [0.5, 1.0])
+
+    async def test_erro_do_cliente_nao_repete(self):
+        chamadas, esperas = await self._enviar([httpx.Response(400, json={"ok": False})])
+        self.assertEqual(len(chamadas), 1)
+        self.assertEqual(esperas, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
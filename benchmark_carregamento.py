@@ -0,0 +1,107 @@
+"""
+Compara o carregamento antigo do dashboard (lista de dicts -> DataFrame -> apply)
+com o carregamento colunar de dashboard_dados.py.
+
+Uso:
+    python benchmark_carregamento.py [--linhas 1000000] [--saida resultado.json]
+
+Os documentos são gerados em memória no mesmo formato que o PyMongo devolve,
+então o teste mede só a decodificação e não depende do MongoDB.
+"""
+import argparse
+import gc
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from dashboard_dados import COLUNAS_METRICAS, carregar_colunar
+
+
+def gerar_documentos(linhas):
+    """Leituras sintéticas de 1 em 1 minuto, com alguns valores faltando ou como texto."""
+    inicio = datetime(2024, 1, 1)
+    documentos = []
+    for i in range(linhas):
+        doc = {
+            "timestamp": inicio + timedelta(minutes=i),
+            "umidade": random.uniform(0.2, 0.9) if i % 2 else random.uniform(20, 90),
+            "temperatura": random.uniform(12, 32),
+            "ph": random.uniform(5.5, 7.5),
+            "condutividade": random.uniform(0.8, 2.0),
+            "nitrogenio": random.uniform(100, 220),
+            "fosforo": random.uniform(40, 120),
+            "potassio": random.uniform(100, 220),
+        }
+        if i % 97 == 0:
+            del doc["ph"]
+        if i % 1009 == 0:
+            doc["temperatura"] = str(round(doc["temperatura"], 2))
+        documentos.append(doc)
+    return documentos
+
+
+def carregar_linhas(data):
+    """Caminho antigo do load_data, mantido aqui só como referência."""
+    if not data: return pd.DataFrame()
+    df = pd.DataFrame(data)
+
+    for c in COLUNAS_METRICAS:
+        if c in df.columns: df[c] = pd.to_numeric(df[c], errors='coerce')
+
+    if 'umidade' in df.columns:
+        df['umidade'] = df['umidade'].apply(lambda x: x * 100 if x <= 1.0 else x)
+
+    if "timestamp" in df.columns:
+        df["timestamp"] = pd.to_datetime(df["timestamp"], errors='coerce')
+        df["timestamp"] = df["timestamp"].dt.tz_localize(None)
+
+    return df.dropna(subset=['timestamp'])
+
+
+def medir(nome, funcao, documentos, repeticoes):
+    tempos = []
+    df = None
+    for _ in range(repeticoes):
+        df = None
+        gc.collect()
+        t0 = time.perf_counter()
+        df = funcao(documentos)
+        tempos.append(time.perf_counter() - t0)
+    memoria_mb = df.memory_usage(deep=True).sum() / 1024 ** 2
+    print(f"{nome:>10}: {min(tempos):.3f}s (melhor de {repeticoes}) | {memoria_mb:.1f} MB | {len(df)} linhas")
+    return {"segundos": min(tempos), "memoria_mb": memoria_mb, "linhas": len(df)}, df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do carregamento de dados do dashboard.")
+    parser.add_argument("--linhas", type=int, default=1_000_000)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--saida", help="Arquivo JSON para salvar o resultado.")
+    args = parser.parse_args()
+
+    print(f"Gerando {args.linhas} documentos sintéticos...")
+    random.seed(42)
+    documentos = gerar_documentos(args.linhas)
+
+    resultado_linhas, df_linhas = medir("linhas", carregar_linhas, documentos, args.repeticoes)
+    resultado_colunar, df_colunar = medir("colunar", carregar_colunar, documentos, args.repeticoes)
+
+    # Confere se os dois caminhos chegam aos mesmos números (a menos da precisão float32)
+    for c in COLUNAS_METRICAS:
+        diferenca = (df_linhas[c] - df_colunar[c].astype("float64")).abs().max()
+        assert diferenca < 1e-3 * max(1.0, df_linhas[c].abs().max()), f"Coluna '{c}' divergiu: {diferenca}"
+
+    ganho = resultado_linhas["segundos"] / resultado_colunar["segundos"]
+    economia = 1 - resultado_colunar["memoria_mb"] / resultado_linhas["memoria_mb"]
+    print(f"Colunar: {ganho:.1f}x mais rápido, {economia:.0%} menos memória.")
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            json.dump({"linhas": args.linhas, "linhas_antigo": resultado_linhas, "colunar": resultado_colunar}, arquivo, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,11 @@ import plotly.express as px
 from pymongo import MongoClient
 from dotenv import load_dotenv
 import os
-from datetime import datetime, date
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, date, timedelta
 
 # --- 1. CONFIGURAÇÃO DA PÁGINA ---
 st.set_page_config(
@@ -17,6 +21,35 @@ st.set_page_config(
 # Carregar variáveis de ambiente
 load_dotenv("api_backend/.env")
 
+# Reaproveita o redutor de séries (LTTB) da API
+sys.path.insert(0, "api_backend")
+from app.nucleo import arquivo_frio, culturas
+from app.nucleo.amostragem import reduzir_serie
+from dashboard_dados import (
+    COLUNAS_METRICAS, MAPA_CAMPOS_STREAM, TAMANHO_LOTE, ConsumidorStream, buscar_diagnostico,
+    carregar_arquivo, carregar_colunar, somar_arquivo,
+)
+
+# Máximo de pontos por série no gráfico principal
+MAX_PONTOS_GRAFICO = int(os.getenv("DASHBOARD_MAX_PONTOS", "2000"))
+# Stream de telemetria da API (ex: http://localhost:8000/api/v1/dados-sensores/stream).
+# Só é usado quando o painel lê 'dados_reais' (as leituras que a API publica nele):
+# as leituras novas aparecem por ele entre as releituras do banco.
+DASHBOARD_STREAM_URL = os.getenv("DASHBOARD_STREAM_URL")
+# API da horta (ex: http://localhost:8000/api/v1). Se definida, o estado atual de
+# um dispositivo vem do diagnóstico pré-calculado pelo motor de regras.
+DASHBOARD_API_URL = os.getenv("DASHBOARD_API_URL")
+# Coleção lida pelo painel ('dados_sinteticos', do simulador, ou 'dados_reais', gravada
+# pela API) e pasta do arquivo frio (leituras que a retenção tirou do banco).
+# Os agregados por hora/dia da API só são mantidos para 'dados_reais', então as médias
+# e o gráfico mensal do painel agregam as leituras brutas, nas duas coleções.
+COLECAO_PAINEL = os.getenv("DASHBOARD_COLECAO", "dados_sinteticos")
+# Coleção em que a API grava (COLECAO_LEITURAS) e cujas leituras publica no stream
+COLECAO_API = "dados_reais"
+# Nome de cada coluna do painel na coleção lida, quando difere ('dados_reais' usa os da API)
+CAMPOS_COLECAO = {coluna: campo for campo, coluna in MAPA_CAMPOS_STREAM.items()} if COLECAO_PAINEL == COLECAO_API else {}
+DIRETORIO_ARQUIVO = os.getenv("DASHBOARD_ARQUIVO_DIR", "api_backend/arquivo_frio")
+
 # --- 2. DESIGN SYSTEM & CSS ---
 COLORS = {
     "primary": "#2E7D32",      # Verde Folha
@@ -56,65 +89,26 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- 3. REGRAS AGRONÔMICAS (BANCO DE CONHECIMENTO) ---
-DB_CULTURAS = {
-    "Alface Americana": {
-        "icon": "🥬",
-        "temp": {"min": 15, "max": 24, "ideal": 20},
-        "umid": {"min": 60, "max": 80, "ideal": 70},
-        "ph":   {"min": 6.0, "max": 7.0},
-        "desc": "Sensível ao calor excessivo. Precisa de solo sempre úmido."
-    },
-    "Rúcula": {
-        "icon": "🥗",
-        "temp": {"min": 15, "max": 22, "ideal": 18},
-        "umid": {"min": 50, "max": 70, "ideal": 60},
-        "ph":   {"min": 6.0, "max": 7.0},
-        "desc": "Ciclo rápido. Evitar encharcamento para não gerar fungos."
-    },
-    "Couve Manteiga": {
-        "icon": "🍃",
-        "temp": {"min": 10, "max": 28, "ideal": 22},
-        "umid": {"min": 60, "max": 75, "ideal": 68},
-        "ph":   {"min": 6.0, "max": 7.5},
-        "desc": "Alta exigência de nitrogênio. Resistente a variações."
-    }
-}
+# Faixas de cada cultura: mesma tabela usada pelo motor de regras da API
+CULTURAS = culturas.CULTURAS
+# Métricas avaliadas no diagnóstico do período (nomes da API)
+METRICAS_DIAGNOSTICO = ("temperatura", "umidade", "ph_solo")
 
-def gerar_diagnostico(df, regras):
+def gerar_diagnostico(medias, cultura):
     """Calcula saúde da planta baseada nas regras da cultura selecionada."""
-    dicas = []
-    status = "Ideal"
-    
-    if df.empty: return [], "Sem Dados"
+    if medias.get("contagem", 0) == 0: return [], "Sem Dados"
 
-    m = df.mean() # Médias do período
+    # Médias do período (MongoDB + arquivo frio), com os nomes da API
+    valores = {m: medias.get(MAPA_CAMPOS_STREAM.get(m, m)) for m in METRICAS_DIAGNOSTICO}
+    avaliacao = culturas.avaliar(valores, cultura)
+    return avaliacao["dicas"], avaliacao["status"]
 
-    # 1. Temperatura
-    if m['temperatura'] < regras['temp']['min']:
-        dicas.append(f"❄️ Temperatura média ({m['temperatura']:.1f}°C) abaixo do ideal.")
-        status = "Atenção"
-    elif m['temperatura'] > regras['temp']['max']:
-        dicas.append(f"🔥 Temperatura média ({m['temperatura']:.1f}°C) muito alta. Risco de estresse.")
-        status = "Atenção"
-    else:
-        dicas.append("✅ Temperatura dentro da faixa ideal.")
-
-    # 2. Umidade
-    if m['umidade'] < regras['umid']['min']:
-        dicas.append(f"🌵 Umidade ({m['umidade']:.1f}%) baixa. Aumentar irrigação.")
-        status = "Atenção" if status != "Alerta" else "Alerta"
-    elif m['umidade'] > regras['umid']['max']:
-        dicas.append(f"💧 Umidade ({m['umidade']:.1f}%) excessiva. Risco de doenças.")
-        status = "Alerta"
-    else:
-        dicas.append("✅ Irrigação adequada.")
-
-    # 3. pH
-    if not (regras['ph']['min'] <= m['ph'] <= regras['ph']['max']):
-        dicas.append(f"⚖️ pH ({m['ph']:.1f}) fora da faixa ({regras['ph']['min']}-{regras['ph']['max']}).")
-        status = "Atenção"
-
-    return dicas, status
+@st.cache_data(ttl=10)
+def diagnostico_ao_vivo(dispositivo, cultura):
+    """Diagnóstico mantido pelo motor de regras da API (só com DASHBOARD_API_URL)."""
+    if not DASHBOARD_API_URL or dispositivo is None:
+        return None
+    return buscar_diagnostico(DASHBOARD_API_URL, dispositivo, cultura)
 
 # --- 4. CONEXÃO E DADOS ---
 
@@ -126,35 +120,268 @@ def init_connection():
         return MongoClient(uri)
     except Exception as e: st.error(f"Erro Conexão: {e}"); st.stop()
 
-@st.cache_data(ttl=60)
-def load_data():
+# Intervalo mínimo (s) entre duas buscas de dados novos no banco
+INTERVALO_ATUALIZACAO_S = 60
+# Quantas combinações de filtro mantêm o frame carregado em memória
+MAX_CONSULTAS_EM_CACHE = 8
+# Segundos relidos antes do último 'timestamp' carregado, para pegar as leituras com
+# o mesmo timestamp e as gravadas com atraso (reenvios com a data do dispositivo)
+MARGEM_ATUALIZACAO_S = 300
+
+def reduzir_para_grafico(df, colunas, limite):
+    """
+    Reduz cada série a no máximo 'limite' pontos com LTTB e devolve o
+    formato longo (timestamp, variavel, valor) usado pelo px.line.
+    """
+    x = df['timestamp'].to_numpy(dtype='datetime64[ns]').astype('int64').astype('float64')
+    partes = []
+    for c in colunas:
+        xr, yr = reduzir_serie(x, df[c].to_numpy(dtype='float64'), limite)
+        partes.append(pd.DataFrame({'timestamp': pd.to_datetime(xr.astype('int64')), 'variavel': c, 'valor': yr}))
+    return pd.concat(partes, ignore_index=True)
+
+def get_collection():
     client = init_connection()
-    db = client["horta_inteligente"]
-    collection = db["dados_sinteticos"]
+    return client["horta_inteligente"][COLECAO_PAINEL]
+
+def filtro_periodo(inicio, fim, dispositivo):
+    """Monta o filtro do 'find' para o período (dias inteiros) e o dispositivo escolhidos."""
+    filtro = {"timestamp": {
+        "$gte": datetime.combine(inicio, datetime.min.time()),
+        "$lt": datetime.combine(fim, datetime.min.time()) + timedelta(days=1),
+    }}
+    if dispositivo:
+        filtro["id_dispositivo"] = dispositivo
+    return filtro
+
+def _valor_numerico(coluna):
+    """Expressão de agregação equivalente ao pd.to_numeric + correção da umidade."""
+    valor = {"$convert": {"input": f"${CAMPOS_COLECAO.get(coluna, coluna)}", "to": "double", "onError": None, "onNull": None}}
+    if coluna == "umidade":
+        return {"$cond": [{"$lte": [valor, 1.0]}, {"$multiply": [valor, 100]}, valor]}
+    return valor
 
-    projection = {
-        "_id": 0, "umidade": 1, "temperatura": 1, "ph": 1, "condutividade": 1,
-        "nitrogenio": 1, "fosforo": 1, "potassio": 1, "timestamp": 1
-    }
-    
-    cursor = collection.find({}, projection).sort("timestamp", -1)
-    data = list(cursor)
+@st.cache_data(ttl=60)
+def limites_datas():
+    """
+    Primeira e última data da coleção, via índice de 'timestamp' (sem ler a coleção).
+    Dias que já foram para o arquivo frio também contam.
+    """
+    collection = get_collection()
+    primeiro = collection.find_one({"timestamp": {"$type": "date"}}, {"_id": 0, "timestamp": 1}, sort=[("timestamp", 1)])
+    ultimo = collection.find_one({"timestamp": {"$type": "date"}}, {"_id": 0, "timestamp": 1}, sort=[("timestamp", -1)])
+    arquivado = arquivo_frio.primeiro_dia(DIRETORIO_ARQUIVO, COLECAO_PAINEL)
+    if not ultimo: return arquivado, arquivado
+    inicio = primeiro["timestamp"].date()
+    return (min(inicio, arquivado) if arquivado else inicio), ultimo["timestamp"].date()
+
+@st.cache_data(ttl=300)
+def listar_dispositivos():
+    return sorted(d for d in get_collection().distinct("id_dispositivo") if d)
+
+def _somas_mongo(colunas):
+    """Acumuladores do $group: soma e contagem dos valores numéricos de cada coluna."""
+    grupo = {"contagem": {"$sum": 1}}
+    for c in colunas:
+        valor = _valor_numerico(c)
+        grupo[f"{c}__soma"] = {"$sum": valor}
+        grupo[f"{c}__contagem"] = {"$sum": {"$cond": [{"$eq": [valor, None]}, 0, 1]}}
+    return grupo
+
+def _somas_arquivo(inicio, fim, dispositivo, colunas, mensal=False):
+    """Somas e contagens das leituras do período que já estão no arquivo frio."""
+    if arquivo_frio.pa is None: return pd.DataFrame()
+    periodo = filtro_periodo(inicio, fim, dispositivo)["timestamp"]
+    return somar_arquivo(DIRETORIO_ARQUIVO, COLECAO_PAINEL, periodo["$gte"], periodo["$lt"], dispositivo, colunas, mensal,
+                         CAMPOS_COLECAO)
+
+def _medias(partes, colunas):
+    """
+    Junta as somas do MongoDB e do arquivo frio (mesmo índice = mesmo grupo)
+    e divide pelas contagens: a média ponderada pelas leituras de cada parte.
+    """
+    partes = [p for p in partes if not p.empty]
+    if not partes: return pd.DataFrame()
+    somas = pd.concat(partes).fillna(0).groupby(level=0).sum()
+    medias = pd.DataFrame({"contagem": somas["contagem"]}, index=somas.index)
+    for c in colunas:
+        if f"{c}__soma" in somas:
+            medias[c] = (somas[f"{c}__soma"] / somas[f"{c}__contagem"].where(somas[f"{c}__contagem"] > 0)).astype("float64")
+        else:
+            medias[c] = float("nan")
+    return medias
 
-    if not data: return pd.DataFrame()
-    df = pd.DataFrame(data)
+@st.cache_data(ttl=60)
+def agregar_medias(inicio, fim, dispositivo):
+    """
+    Médias de todas as métricas no período: somas calculadas no MongoDB e,
+    para os dias que a retenção já tirou do banco, no arquivo frio.
+    Lê as leituras brutas: 'dados_sinteticos' não tem agregados por dia.
+    """
+    grupo = {"_id": None, **_somas_mongo(COLUNAS_METRICAS)}
+    resultado = list(get_collection().aggregate([
+        {"$match": filtro_periodo(inicio, fim, dispositivo)},
+        {"$group": grupo},
+    ]))
+    # Grupo único: índice 0, o mesmo do somar_arquivo
+    resultado = pd.DataFrame(resultado, index=[0] * len(resultado)).drop(columns="_id", errors="ignore")
+    medias = _medias([resultado, _somas_arquivo(inicio, fim, dispositivo, COLUNAS_METRICAS)], COLUNAS_METRICAS)
+    if medias.empty: return pd.Series({"contagem": 0}, dtype="float64")
+    return medias.iloc[0].astype("float64")
 
-    cols = ["umidade", "temperatura", "ph", "condutividade", "nitrogenio", "fosforo", "potassio"]
-    for c in cols: 
-        if c in df.columns: df[c] = pd.to_numeric(df[c], errors='coerce')
-    
-    if 'umidade' in df.columns:
-        df['umidade'] = df['umidade'].apply(lambda x: x * 100 if x <= 1.0 else x)
+@st.cache_data(ttl=60)
+def agregar_mensal(inicio, fim, dispositivo, colunas):
+    """
+    Médias mensais das colunas escolhidas: $dateTrunc no MongoDB mais
+    group-by por mês no arquivo frio, combinados pelas contagens.
+    """
+    grupo = {"_id": {"$dateTrunc": {"date": "$timestamp", "unit": "month"}}, **_somas_mongo(colunas)}
+    resultado = pd.DataFrame(list(get_collection().aggregate([
+        {"$match": filtro_periodo(inicio, fim, dispositivo)},
+        {"$group": grupo},
+    ])))
+    if not resultado.empty: resultado = resultado.set_index("_id")
+    medias = _medias([resultado, _somas_arquivo(inicio, fim, dispositivo, colunas, mensal=True)], colunas)
+    if medias.empty: return pd.DataFrame(columns=["timestamp", *colunas]).astype({"timestamp": "datetime64[ns]"})
+    medias = medias.drop(columns="contagem").sort_index()
+    medias.index = pd.to_datetime(medias.index)
+    return medias.rename_axis("timestamp").reset_index()
 
-    if "timestamp" in df.columns:
-        df["timestamp"] = pd.to_datetime(df["timestamp"], errors='coerce')
-        df["timestamp"] = df["timestamp"].dt.tz_localize(None)
-    
-    return df.dropna(subset=['timestamp'])
+@st.cache_resource
+def cache_incremental():
+    """
+    Frames já carregados por combinação de filtros, compartilhados por todas
+    as sessões do processo. Cada entrada guarda o maior 'timestamp' visto e
+    as leituras já carregadas dentro da margem de releitura.
+    """
+    return {"consultas": OrderedDict(), "lock": threading.Lock()}
+
+@st.cache_resource
+def consumidor_stream():
+    """
+    Leitor do stream da API, único no processo. None se não configurado ou se
+    o painel lê outra coleção que não a publicada pelo stream.
+    """
+    if not DASHBOARD_STREAM_URL or COLECAO_PAINEL != COLECAO_API: return None
+    return ConsumidorStream(DASHBOARD_STREAM_URL).iniciar()
+
+def _anexar(entrada, novos):
+    if novos.empty: return
+    if entrada["df"].empty:
+        entrada["df"] = novos
+        return
+    df = pd.concat([entrada["df"], novos], ignore_index=True)
+    # Leituras atrasadas: o LTTB do gráfico precisa da série em ordem de tempo
+    if novos["timestamp"].min() < entrada["df"]["timestamp"].iloc[-1]:
+        df = df.sort_values("timestamp", kind="stable", ignore_index=True)
+    entrada["df"] = df
+
+def _avancar_banco(entrada, novos):
+    """
+    Avança o maior 'timestamp' lido do banco (ou do arquivo frio), de onde parte
+    a próxima releitura, e esquece as leituras vistas antes da margem dela.
+    """
+    if not novos.empty:
+        maior = novos["timestamp"].max().to_pydatetime()
+        entrada["ultimo_ts"] = maior if entrada["ultimo_ts"] is None else max(entrada["ultimo_ts"], maior)
+    if entrada["ultimo_ts"] is None: return
+    corte = entrada["ultimo_ts"] - timedelta(seconds=MARGEM_ATUALIZACAO_S)
+    entrada["vistos"] = {chave: momento for chave, momento in entrada["vistos"].items() if momento >= corte}
+
+def _nao_vistos(entrada, documentos):
+    """
+    Pula as leituras já carregadas: as do banco relidas na margem, pelo _id,
+    e as que vieram pelo banco e pelo stream, que não traz o _id, pelo
+    dispositivo e timestamp.
+    """
+    vistos = entrada["vistos"]
+    for documento in documentos:
+        momento = documento["timestamp"]
+        origem, outra = ("banco", "stream") if "_id" in documento else ("stream", "banco")
+        if documento.get("_id") in vistos or (outra, documento.get("id_dispositivo"), momento) in vistos: continue
+        vistos[(origem, documento.get("id_dispositivo"), momento)] = momento
+        if "_id" in documento: vistos[documento["_id"]] = momento
+        yield documento
+
+def _anexar_do_stream(entrada, stream, inicio, fim, dispositivo, colunas):
+    """
+    Anexa as leituras que chegaram pelo stream desde a última vez.
+    Retorna False se o stream teve falha e o banco precisa ser relido.
+    """
+    novas = stream.novas_desde(entrada["marca_stream"])
+    if novas is None: return False
+    leituras, entrada["marca_stream"] = novas
+    filtro = filtro_periodo(inicio, fim, dispositivo)["timestamp"]
+    selecionadas = [
+        l for l in leituras
+        if l["timestamp"] is not None and filtro["$gte"] <= l["timestamp"] < filtro["$lt"]
+        and (not dispositivo or l.get("id_dispositivo") == dispositivo)
+    ]
+    if selecionadas:
+        _anexar(entrada, carregar_colunar(_nao_vistos(entrada, selecionadas), colunas))
+    return True
+
+def load_data(inicio, fim, dispositivo, colunas):
+    """
+    Carrega as leituras do período, dispositivo e colunas escolhidos.
+    O filtro e a projeção são aplicados no MongoDB e, a cada atualização,
+    só os documentos a partir do último 'timestamp' carregado (menos
+    MARGEM_ATUALIZACAO_S) são buscados; os já carregados são pulados pelo _id.
+
+    Com o stream da API (ver consumidor_stream), as leituras novas aparecem
+    por ele entre uma releitura e outra; o banco continua sendo relido a cada
+    INTERVALO_ATUALIZACAO_S, já que o stream só traz as leituras do worker
+    que atende a conexão.
+    Leituras anteriores à janela quente do banco vêm do arquivo frio (Parquet).
+    """
+    cache = cache_incremental()
+    chave = (inicio, fim, dispositivo, tuple(colunas))
+    with cache["lock"]:
+        consultas = cache["consultas"]
+        if chave not in consultas:
+            consultas[chave] = {"df": pd.DataFrame(), "ultimo_ts": None, "vistos": {},
+                                "atualizado_em": 0.0, "marca_stream": None}
+            # Na primeira carga, o que já saiu do banco vem do arquivo frio
+            if arquivo_frio.pa is not None:
+                periodo = filtro_periodo(inicio, fim, dispositivo)["timestamp"]
+                arquivados = carregar_arquivo(
+                    DIRETORIO_ARQUIVO, COLECAO_PAINEL, periodo["$gte"], periodo["$lt"], dispositivo, colunas, CAMPOS_COLECAO
+                )
+                _anexar(consultas[chave], arquivados)
+                _avancar_banco(consultas[chave], arquivados)
+        consultas.move_to_end(chave)
+        while len(consultas) > MAX_CONSULTAS_EM_CACHE:
+            consultas.popitem(last=False)
+
+        entrada = consultas[chave]
+        stream = consumidor_stream()
+        if stream is not None and entrada["marca_stream"] is not None:
+            if not _anexar_do_stream(entrada, stream, inicio, fim, dispositivo, colunas):
+                entrada["marca_stream"] = None
+
+        if time.monotonic() - entrada["atualizado_em"] < INTERVALO_ATUALIZACAO_S:
+            return entrada["df"]
+        if stream is not None and stream.conectado and entrada["marca_stream"] is None:
+            # Marca antes da consulta: o que chegar durante ela vem pelo stream
+            entrada["marca_stream"] = stream.posicao()
+
+        filtro = filtro_periodo(inicio, fim, dispositivo)
+        if entrada["ultimo_ts"] is not None and entrada["vistos"]:
+            filtro["timestamp"]["$gte"] = max(
+                filtro["timestamp"]["$gte"], entrada["ultimo_ts"] - timedelta(seconds=MARGEM_ATUALIZACAO_S)
+            )
+        elif entrada["ultimo_ts"] is not None:
+            # Só o arquivo frio foi carregado: o banco tem o que vem depois dele
+            filtro["timestamp"]["$gt"] = entrada["ultimo_ts"]
+        projection = {"_id": 1, "timestamp": 1, "id_dispositivo": 1}
+        projection.update({c: f"${CAMPOS_COLECAO[c]}" if c in CAMPOS_COLECAO else 1 for c in colunas})
+
+        cursor = get_collection().find(filtro, projection).sort("timestamp", 1).batch_size(TAMANHO_LOTE)
+        novos = carregar_colunar(_nao_vistos(entrada, cursor), colunas)
+        entrada["atualizado_em"] = time.monotonic()
+        _anexar(entrada, novos)
+        _avancar_banco(entrada, novos)
+        return entrada["df"]
 
 # --- 5. INTERFACE (SIDEBAR) ---
 st.sidebar.title("⚙️ Configuração")
@@ -163,17 +390,17 @@ st.sidebar.title("⚙️ Configuração")
 st.sidebar.markdown("### 🌱 Cultura Monitorada")
 cultura_selecionada = st.sidebar.selectbox(
     "Selecione o canteiro:",
-    list(DB_CULTURAS.keys())
+    list(CULTURAS.keys())
 )
-REGRAS_ATUAIS = DB_CULTURAS[cultura_selecionada]
+REGRAS_ATUAIS = CULTURAS[cultura_selecionada]
+LIMITES = REGRAS_ATUAIS["limites"]
 
 st.sidebar.divider()
 
 # 5.2 Filtros de Data
-df_raw = load_data()
-if df_raw.empty: st.warning("Sem dados."); st.stop()
+min_d, max_d = limites_datas()
+if min_d is None: st.warning("Sem dados."); st.stop()
 
-min_d, max_d = df_raw["timestamp"].min().date(), df_raw["timestamp"].max().date()
 st.sidebar.markdown("### 📅 Período de Análise")
 c1, c2 = st.sidebar.columns(2)
 start = c1.date_input("Início", min_d, min_value=min_d, max_value=max_d)
@@ -190,22 +417,39 @@ variaveis_selecionadas = st.sidebar.multiselect(
     format_func=lambda x: x.capitalize()
 )
 
-mask = (df_raw["timestamp"].dt.date >= start) & (df_raw["timestamp"].dt.date <= end)
-df_filtered = df_raw.loc[mask].sort_values("timestamp")
+# 5.4 Dispositivo (quando a coleção identifica o canteiro)
+dispositivos = listar_dispositivos()
+dispositivo = None
+if dispositivos:
+    st.sidebar.divider()
+    st.sidebar.markdown("### 📟 Dispositivo")
+    escolha = st.sidebar.selectbox("Canteiro/sensor:", ["Todos"] + dispositivos)
+    dispositivo = None if escolha == "Todos" else escolha
+
+# Filtros aplicados direto no MongoDB
+medias = agregar_medias(start, end, dispositivo)
+df_filtered = load_data(start, end, dispositivo, variaveis_selecionadas)
 
 st.sidebar.divider()
 st.sidebar.download_button("📥 Exportar Dados", df_filtered.to_csv(index=False).encode('utf-8'), "dados_horta.csv", "text/csv")
 
 # --- 6. DASHBOARD PRINCIPAL ---
 
-st.title(f"{REGRAS_ATUAIS['icon']} Painel: {cultura_selecionada}")
-st.markdown(f"**Perfil da Cultura:** {REGRAS_ATUAIS['desc']}")
+st.title(f"{REGRAS_ATUAIS['icone']} Painel: {cultura_selecionada}")
+st.markdown(f"**Perfil da Cultura:** {REGRAS_ATUAIS['descricao']}")
 
-if df_filtered.empty:
+if medias["contagem"] == 0:
     st.error("Sem dados para o filtro selecionado.")
 else:
     # --- CÁLCULO DE DIAGNÓSTICO ---
-    dicas, status_saude = gerar_diagnostico(df_filtered, REGRAS_ATUAIS)
+    # Com a API, o estado do dispositivo vem do motor de regras (médias recentes,
+    # com histerese); senão é calculado a partir das médias do período
+    ao_vivo = diagnostico_ao_vivo(dispositivo, cultura_selecionada)
+    if ao_vivo is not None:
+        dicas = [m["dica"] for m in ao_vivo["metricas"].values() if m["dica"]]
+        status_saude = ao_vivo["status"]
+    else:
+        dicas, status_saude = gerar_diagnostico(medias, cultura_selecionada)
     
     if status_saude == "Ideal": cor_status = COLORS["primary"]
     elif status_saude == "Atenção": cor_status = COLORS["accent"]
@@ -219,18 +463,18 @@ else:
     """, unsafe_allow_html=True)
 
     # --- KPIS ---
-    m_temp = df_filtered['temperatura'].mean()
-    m_umid = df_filtered['umidade'].mean()
-    m_ph = df_filtered['ph'].mean()
+    m_temp = medias['temperatura']
+    m_umid = medias['umidade']
+    m_ph = medias['ph']
     
-    target_temp = REGRAS_ATUAIS['temp']['ideal']
-    target_umid = REGRAS_ATUAIS['umid']['ideal']
+    target_temp = LIMITES['temperatura']['ideal']
+    target_umid = LIMITES['umidade']['ideal']
 
     k1, k2, k3, k4 = st.columns(4)
     k1.metric("Temperatura", f"{m_temp:.1f} °C", delta=f"{m_temp - target_temp:.1f} °C (vs Ideal)", delta_color="inverse")
     k2.metric("Umidade Solo", f"{m_umid:.1f} %", delta=f"{m_umid - target_umid:.1f} % (vs Ideal)", delta_color="inverse")
-    k3.metric("pH Solo", f"{m_ph:.1f}", delta="Faixa OK" if REGRAS_ATUAIS['ph']['min'] <= m_ph <= REGRAS_ATUAIS['ph']['max'] else "Ajustar", delta_color="normal")
-    k4.metric("Condutividade", f"{df_filtered['condutividade'].mean():.2f} µS")
+    k3.metric("pH Solo", f"{m_ph:.1f}", delta="Faixa OK" if LIMITES['ph_solo']['min'] <= m_ph <= LIMITES['ph_solo']['max'] else "Ajustar", delta_color="normal")
+    k4.metric("Condutividade", f"{medias['condutividade']:.2f} µS")
 
     st.divider()
 
@@ -242,13 +486,15 @@ else:
         
         if variaveis_selecionadas:
             # Usa as variáveis selecionadas no filtro lateral
-            df_smooth = df_filtered.set_index('timestamp')[variaveis_selecionadas].rolling(window=12, min_periods=1).mean().reset_index()
+            df_smooth = df_filtered.sort_values('timestamp').set_index('timestamp')[variaveis_selecionadas].rolling(window=12, min_periods=1).mean().reset_index()
+            # Limita os pontos enviados ao navegador, preservando o formato das curvas
+            df_plot = reduzir_para_grafico(df_smooth, variaveis_selecionadas, MAX_PONTOS_GRAFICO)
             
-            fig = px.line(df_smooth, x='timestamp', y=variaveis_selecionadas, 
+            fig = px.line(df_plot, x='timestamp', y='valor', color='variavel',
                           color_discrete_map=COLORS["chart_colors"], # Usa o mapa de cores fixo
                           template="plotly_white")
             
-            fig.update_layout(height=350, xaxis_title=None, yaxis_title="Valor", legend=dict(orientation="h", y=1.1))
+            fig.update_layout(height=350, xaxis_title=None, yaxis_title="Valor", legend_title_text=None, legend=dict(orientation="h", y=1.1))
             st.plotly_chart(fig, use_container_width=True)
         else:
             st.warning("⚠️ Selecione pelo menos um sensor na barra lateral para visualizar o gráfico.")
@@ -257,11 +503,13 @@ else:
         st.subheader("🤖 Recomendações")
         for dica in dicas:
             if "✅" in dica: st.success(dica)
-            elif "❄️" in dica or "🔥" in dica: st.warning(dica)
-            elif "🌵" in dica or "💧" in dica: st.info(dica)
+            elif "⚠️" in dica: st.warning(dica)
             else: st.error(dica)
             
-        st.caption("ℹ️ Dicas ajustadas para a cultura selecionada.")
+        if ao_vivo is not None:
+            st.caption(f"ℹ️ Estado em tempo real do motor de regras (última leitura: {ao_vivo['ultima_leitura']}).")
+        else:
+            st.caption("ℹ️ Dicas ajustadas para a cultura selecionada.")
 
     # --- ABAS INFERIORES ---
     st.divider()
@@ -269,7 +517,7 @@ else:
 
     with t1:
         if variaveis_selecionadas:
-            df_m = df_filtered.set_index('timestamp')[variaveis_selecionadas].resample('ME').mean().reset_index()
+            df_m = agregar_mensal(start, end, dispositivo, variaveis_selecionadas)
             df_m['mes'] = df_m['timestamp'].dt.strftime('%b/%Y')
             
             fig_m = px.bar(df_m, x='mes', y=variaveis_selecionadas, barmode='group',
@@ -281,8 +529,8 @@ else:
 
     with t2:
         cols_npk = ['nitrogenio', 'fosforo', 'potassio']
-        if all(c in df_filtered.columns for c in cols_npk):
-            df_npk = df_filtered[cols_npk].mean().reset_index()
+        if all(pd.notna(medias.get(c)) for c in cols_npk):
+            df_npk = medias[cols_npk].reset_index()
             df_npk.columns = ['Elemento', 'Valor']
             df_npk['Elemento'] = df_npk['Elemento'].map({'nitrogenio': 'Nitrogênio (N)', 'fosforo': 'Fósforo (P)', 'potassio': 'Potássio (K)'})
             
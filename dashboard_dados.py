@@ -0,0 +1,260 @@
+"""
+Carregamento colunar dos dados do dashboard e leitura do stream de
+telemetria e do diagnóstico do motor de regras da API.
+
+Fica fora do dashboard.py (sem Streamlit) para poder ser reaproveitado
+pelo benchmark_carregamento.py.
+"""
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+import requests
+
+# Métricas lidas pelo dashboard (nomes usados em 'dados_sinteticos')
+COLUNAS_METRICAS = ["umidade", "temperatura", "ph", "condutividade", "nitrogenio", "fosforo", "potassio"]
+
+# Documentos decodificados por vez (também usado como batch_size do cursor)
+TAMANHO_LOTE = 10_000
+
+# Nomes das métricas na API (stream) -> colunas do dashboard
+MAPA_CAMPOS_STREAM = {"ph_solo": "ph", "condutividade_eletrica": "condutividade"}
+
+
+def _coluna_numerica(valores):
+    """Converte uma lista de valores em float32; None e textos inválidos viram NaN."""
+    try:
+        return np.array(valores, dtype=np.float64).astype(np.float32)
+    except (TypeError, ValueError):
+        # Lote com textos ou tipos misturados: cai no conversor tolerante do pandas
+        return pd.to_numeric(pd.Series(valores, dtype=object), errors="coerce").to_numpy(dtype=np.float32)
+
+
+def _coluna_datas(valores):
+    """Converte uma lista de datas em datetime64[ms]; valores inválidos viram NaT."""
+    try:
+        return pd.DatetimeIndex(valores).as_unit("ms").to_numpy()
+    except (TypeError, ValueError):
+        datas = pd.to_datetime(pd.Series(valores, dtype=object), errors="coerce", utc=True)
+        return datas.dt.tz_localize(None).to_numpy(dtype="datetime64[ms]")
+
+
+def carregar_colunar(documentos, colunas=COLUNAS_METRICAS, tamanho_lote=TAMANHO_LOTE):
+    """
+    Monta o DataFrame coluna a coluna, decodificando os documentos em lotes
+    direto para arrays NumPy tipados (float32 para as métricas).
+
+    A conversão de tipos e a correção da umidade (0.3 -> 30%) são feitas de
+    forma vetorizada, sem laço Python por linha.
+    """
+    iterador = iter(documentos)
+    partes = {"timestamp": [], "id_dispositivo": [], **{c: [] for c in colunas}}
+    tem_dispositivo = False
+
+    while True:
+        lote = list(islice(iterador, tamanho_lote))
+        if not lote:
+            break
+        partes["timestamp"].append(_coluna_datas([d.get("timestamp") for d in lote]))
+        dispositivos = [d.get("id_dispositivo") for d in lote]
+        tem_dispositivo = tem_dispositivo or any(d is not None for d in dispositivos)
+        partes["id_dispositivo"].append(np.array(dispositivos, dtype=object))
+        for c in colunas:
+            partes[c].append(_coluna_numerica([d.get(c) for d in lote]))
+
+    if not partes["timestamp"]:
+        return pd.DataFrame()
+
+    dados = {"timestamp": np.concatenate(partes["timestamp"])}
+    if tem_dispositivo:
+        dados["id_dispositivo"] = pd.Categorical(np.concatenate(partes["id_dispositivo"]))
+    for c in colunas:
+        dados[c] = np.concatenate(partes[c])
+    return _montar_frame(dados, colunas)
+
+
+def _ler_arquivo(diretorio, colecao, inicio, fim, dispositivo, colunas, campos):
+    """Tabela Arrow do arquivo frio, com as colunas renomeadas para os nomes do painel."""
+    from app.nucleo import arquivo_frio
+
+    campos = campos or {}
+    tabela = arquivo_frio.ler_arquivo(diretorio, colecao, inicio, fim, dispositivo, [campos.get(c, c) for c in colunas])
+    colunas_painel = {campo: coluna for coluna, campo in campos.items()}
+    return tabela.rename_columns([colunas_painel.get(nome, nome) for nome in tabela.column_names])
+
+
+def carregar_arquivo(diretorio, colecao, inicio, fim, dispositivo=None, colunas=COLUNAS_METRICAS, campos=None):
+    """
+    Leituras do arquivo frio (Parquet) em [inicio, fim), no mesmo formato de
+    carregar_colunar. Só as partições do período e as colunas pedidas são lidas.
+    'campos' dá o nome na coleção (e no arquivo) das colunas do painel que diferem.
+    Requer 'api_backend' no sys.path (como no dashboard.py).
+    """
+    tabela = _ler_arquivo(diretorio, colecao, inicio, fim, dispositivo, colunas, campos)
+    if tabela.num_rows == 0:
+        return pd.DataFrame()
+
+    dados = {"timestamp": tabela["timestamp"].to_pandas().dt.tz_localize(None).to_numpy(dtype="datetime64[ms]")}
+    if "id_dispositivo" in tabela.column_names:
+        dados["id_dispositivo"] = pd.Categorical(tabela["id_dispositivo"].to_numpy(zero_copy_only=False))
+    for c in colunas:
+        if c in tabela.column_names:
+            dados[c] = _coluna_numerica(tabela[c].to_pylist()) if tabela[c].type == "string" \
+                else tabela[c].to_numpy(zero_copy_only=False).astype(np.float32)
+        else:
+            dados[c] = np.full(tabela.num_rows, np.nan, dtype=np.float32)
+    return _montar_frame(dados, colunas)
+
+
+def somar_arquivo(diretorio, colecao, inicio, fim, dispositivo=None, colunas=COLUNAS_METRICAS, mensal=False, campos=None):
+    """
+    Soma e contagem de cada coluna das leituras arquivadas em [inicio, fim),
+    com group-by do Arrow (sem montar o DataFrame das leituras). Com 'mensal',
+    agrupa pelo mês (UTC) do timestamp. Retorna um DataFrame indexado pelo
+    grupo, com 'contagem' (leituras) e '<coluna>__soma'/'<coluna>__contagem'
+    (valores numéricos), ou vazio se não houver leituras arquivadas.
+    'campos' como em carregar_arquivo.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    tabela = _ler_arquivo(diretorio, colecao, inicio, fim, dispositivo, colunas, campos)
+    if tabela.num_rows == 0:
+        return pd.DataFrame()
+
+    if mensal:
+        grupo = pc.floor_temporal(tabela["timestamp"], unit="month").cast(pa.timestamp("ms"))
+    else:
+        # Grupo único (0)
+        grupo = pa.array(np.zeros(tabela.num_rows, dtype=np.int64))
+    valores = {"grupo": grupo, "contagem": pa.array(np.ones(tabela.num_rows))}
+    for c in colunas:
+        if c not in tabela.column_names:
+            continue
+        coluna = tabela[c]
+        if coluna.type == pa.string():
+            coluna = pa.array(_coluna_numerica(coluna.to_pylist()), type=pa.float64(), from_pandas=True)
+        # Mesma correção da umidade de _montar_frame (0.3 -> 30%)
+        if c == "umidade":
+            coluna = pc.if_else(pc.less_equal(coluna, 1.0), pc.multiply(coluna, 100.0), coluna)
+        valores[c] = coluna
+
+    metricas = [c for c in colunas if c in valores]
+    agregado = pa.table(valores).group_by("grupo").aggregate(
+        [("contagem", "sum")] + [(c, "sum") for c in metricas] + [(c, "count") for c in metricas]
+    ).to_pandas()
+    nomes = {"contagem_sum": "contagem"}
+    nomes.update({f"{c}_sum": f"{c}__soma" for c in metricas})
+    nomes.update({f"{c}_count": f"{c}__contagem" for c in metricas})
+    return agregado.rename(columns=nomes).set_index("grupo")
+
+
+def _montar_frame(dados, colunas):
+    """Correção da umidade e limpeza finais, comuns ao banco e ao arquivo."""
+    if "umidade" in dados:
+        u = dados["umidade"]
+        dados["umidade"] = np.where(u <= 1.0, u * np.float32(100), u)
+
+    df = pd.DataFrame(dados)
+    # Colunas que não vieram em nenhum documento não entram no frame
+    vazias = [c for c in colunas if df[c].isna().all()]
+    return df.drop(columns=vazias).dropna(subset=["timestamp"]).reset_index(drop=True)
+
+
+def converter_leitura_stream(leitura):
+    """Leitura do stream no formato dos documentos do dashboard (datas em UTC sem fuso)."""
+    documento = {MAPA_CAMPOS_STREAM.get(k, k): v for k, v in leitura.items()}
+    try:
+        momento = datetime.fromisoformat(documento["timestamp"])
+        if momento.tzinfo is not None:
+            momento = momento.astimezone(timezone.utc).replace(tzinfo=None)
+        documento["timestamp"] = momento
+    except (KeyError, TypeError, ValueError):
+        documento["timestamp"] = None
+    return documento
+
+
+def buscar_diagnostico(url_api, dispositivo, cultura, timeout=3):
+    """
+    Diagnóstico pré-calculado pelo motor de regras da API para um dispositivo,
+    ou None se a API não responder ou ainda não tiver leituras dele.
+    """
+    try:
+        resposta = requests.get(f"{url_api.rstrip('/')}/regras/diagnostico",
+                                params={"id_dispositivo": dispositivo, "cultura": cultura}, timeout=timeout)
+        if resposta.status_code != 200:
+            return None
+        diagnosticos = resposta.json()
+        return diagnosticos[0] if diagnosticos else None
+    except (requests.RequestException, ValueError) as e:
+        print(f"Diagnóstico da API indisponível: {e}")
+        return None
+
+
+class ConsumidorStream:
+    """
+    Lê em segundo plano o stream SSE de /api/v1/dados-sensores/stream e
+    guarda as leituras mais recentes, numeradas em ordem de chegada.
+
+    Quem consome guarda a posição (e a geração) da última leitura vista e
+    pede só as novas. Se a conexão caiu ou as leituras pedidas já saíram da
+    memória, 'novas_desde' retorna None e o chamador deve reler do banco.
+    """
+
+    def __init__(self, url, capacidade=100_000, espera_reconexao_s=5.0):
+        self.url = url
+        self.espera_reconexao_s = espera_reconexao_s
+        self._leituras = deque(maxlen=capacidade)
+        self._recebidas = 0
+        self._geracao = 0
+        self.conectado = False
+        self._lock = threading.Lock()
+
+    def iniciar(self):
+        threading.Thread(target=self._executar, name="stream-telemetria", daemon=True).start()
+        return self
+
+    def posicao(self):
+        """(geração, total de leituras recebidas): marca a partir da qual ler."""
+        with self._lock:
+            return self._geracao, self._recebidas
+
+    def novas_desde(self, marca):
+        """Leituras recebidas depois de 'marca' e a nova marca, ou None se houve falha."""
+        geracao, vistas = marca
+        with self._lock:
+            faltam = self._recebidas - vistas
+            if not self.conectado or geracao != self._geracao or faltam > len(self._leituras):
+                return None
+            novas = list(islice(self._leituras, len(self._leituras) - faltam, None))
+            return novas, (self._geracao, self._recebidas)
+
+    def _executar(self):
+        while True:
+            try:
+                with requests.get(self.url, stream=True, timeout=(5, 60),
+                                  headers={"Accept": "text/event-stream"}) as resposta:
+                    resposta.raise_for_status()
+                    with self._lock:
+                        # Nova conexão: o que chegou antes pode ter lacunas
+                        self._geracao += 1
+                        self.conectado = True
+                    for linha in resposta.iter_lines(decode_unicode=True):
+                        if linha.startswith("event: desligado"):
+                            break
+                        if not linha.startswith("data: "):
+                            continue
+                        documento = converter_leitura_stream(json.loads(linha[6:]))
+                        with self._lock:
+                            self._leituras.append(documento)
+                            self._recebidas += 1
+            except (requests.RequestException, ValueError) as e:
+                print(f"Stream de telemetria indisponível: {e}")
+            with self._lock:
+                self.conectado = False
+            time.sleep(self.espera_reconexao_s)